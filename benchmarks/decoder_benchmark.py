@@ -0,0 +1,98 @@
+"""
+Result Decoding Memory Benchmark
+
+Compares peak memory and time of the previous ``to_dict()`` -> ``pd.DataFrame``
+path with ``results.decode_result_table`` on a StormEvents-like primary result.
+
+Usage:
+    python -m benchmarks.decoder_benchmark [--rows N ...]
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from azure.kusto.data._models import KustoResultTable
+
+from mcp_kql_server.results import decode_result_table
+
+COLUMNS = [
+    ("StartTime", "datetime"),
+    ("State", "string"),
+    ("EventCount", "long"),
+    ("DamageProperty", "real"),
+    ("Injured", "bool"),
+    ("Duration", "timespan"),
+    ("Properties", "dynamic"),
+]
+
+
+def make_table(rows: int, seed: int = 42) -> KustoResultTable:
+    """A primary result table shaped like the v2 JSON the SDK parses."""
+    rng = np.random.default_rng(seed)
+    states = ["TEXAS", "KANSAS", "IOWA", None]
+    raw_rows = [
+        [
+            f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:{i % 60:02d}.{i % 10**7:07d}Z",
+            states[i % 4],
+            int(rng.integers(0, 10_000)),
+            None if i % 10 == 0 else float(rng.random() * 1e6),
+            bool(i % 2),
+            f"{i % 3}.{i % 24:02d}:{i % 60:02d}:{i % 60:02d}.{i % 10**7:07d}",
+            {"source": "radar", "id": i % 100},
+        ]
+        for i in range(rows)
+    ]
+    return KustoResultTable({
+        "TableName": "PrimaryResult",
+        "TableKind": "PrimaryResult",
+        "Columns": [{"ColumnName": name, "ColumnType": ctype} for name, ctype in COLUMNS],
+        "Rows": raw_rows,
+    })
+
+
+def legacy_decode(table: KustoResultTable) -> pd.DataFrame:
+    """The previous _parse_kusto_response path."""
+    return pd.DataFrame(table.to_dict()["data"])
+
+
+def measure(func, table: KustoResultTable):
+    """Return (peak traced bytes, untraced seconds, resulting frame bytes)."""
+    table.kusto_result_rows = None
+    gc.collect()
+    started = time.perf_counter()
+    df = func(table)
+    elapsed = time.perf_counter() - started
+    frame = int(df.memory_usage(index=True, deep=True).sum())
+    del df
+
+    table.kusto_result_rows = None
+    gc.collect()
+    tracemalloc.start()
+    func(table)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'path':>9} {'peak MB':>9} {'frame MB':>9} {'seconds':>8}")
+    for rows in args.rows:
+        table = make_table(rows)
+        for name, func in (("to_dict", legacy_decode), ("decoder", decode_result_table)):
+            peak, elapsed, frame = measure(func, table)
+            print(f"{rows:>8} {name:>9} {peak / 2**20:>9.1f} {frame / 2**20:>9.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
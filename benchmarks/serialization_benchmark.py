@@ -0,0 +1,88 @@
+"""
+DataFrame Serialization Benchmark
+
+Compares the per-cell ``iterrows`` conversion that the tools used to run on
+every result with ``results.dataframe_to_records`` on Kusto-shaped frames.
+
+Usage:
+    python -m benchmarks.serialization_benchmark [--repeat N]
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from mcp_kql_server.results import dataframe_to_records
+
+
+def legacy_records(df):
+    """The iterrows conversion previously inlined in the execute tools."""
+    try:
+        records = []
+        for _, row in df.iterrows():
+            record = {}
+            for col, value in row.items():
+                if pd.isna(value):
+                    record[col] = None
+                elif hasattr(value, 'isoformat'):
+                    record[col] = value.isoformat()
+                elif hasattr(value, 'strftime'):
+                    record[col] = value.strftime('%Y-%m-%d %H:%M:%S')
+                elif isinstance(value, type):
+                    record[col] = value.__name__
+                elif hasattr(value, 'item'):
+                    record[col] = value.item()
+                else:
+                    record[col] = value
+            records.append(record)
+        return records
+    except Exception:
+        return df.astype(str).to_dict("records")
+
+
+def make_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """A StormEvents-like result: datetimes, strings, longs, reals, timespans and dynamics."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01", tz="UTC")
+    return pd.DataFrame({
+        "StartTime": start + pd.to_timedelta(rng.integers(0, 365 * 86400 * 10**6, rows), unit="us"),
+        "State": rng.choice(["TEXAS", "KANSAS", "IOWA", None], rows),
+        "EventCount": rng.integers(0, 10_000, rows),
+        "DamageProperty": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows) * 1e6),
+        "Duration": pd.to_timedelta(rng.integers(0, 86400, rows), unit="s"),
+        "Properties": [{"source": "radar", "id": int(i)} for i in rng.integers(0, 100, rows)],
+    })
+
+
+def rows_per_second(func, df: pd.DataFrame, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - started)
+    return len(df) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'iterrows rows/s':>16} {'columnar rows/s':>16} {'speedup':>8}")
+    for rows in (1_000, 10_000, 100_000):
+        df = make_frame(rows)
+        # Guard the comparison: both paths must produce identical JSON
+        assert json.dumps(legacy_records(df.head(1000)), default=str) == json.dumps(dataframe_to_records(df.head(1000)), default=str)
+        legacy = rows_per_second(legacy_records, df, 1 if rows >= 100_000 else args.repeat)
+        columnar = rows_per_second(dataframe_to_records, df, args.repeat)
+        print(f"{rows:>8} {legacy:>16,.0f} {columnar:>16,.0f} {columnar / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Async Kusto Client Module
+
+This module provides an asyncio-native transport for the Kusto REST API built
+on httpx. Schema discovery and the async execution helpers await queries
+directly, with awaitable retries and real cancellation, instead of parking a
+worker thread on the blocking SDK client for every request.
+
+Responses are parsed with the SDK's own response classes, so callers get the
+same ``KustoResponseDataSet`` objects the synchronous ``KustoClient`` returns.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import logging
+import re
+import uuid
+import weakref
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+from azure.kusto.data import ClientRequestProperties
+from azure.kusto.data.exceptions import (
+    KustoApiError,
+    KustoNetworkError,
+    KustoServiceError,
+    KustoThrottlingError,
+)
+from azure.kusto.data.response import (
+    KustoResponseDataSet,
+    KustoResponseDataSetV1,
+    KustoResponseDataSetV2,
+)
+
+from .connection import get_circuit_breaker, normalize_cluster_url
+from .kql_auth import get_token_provider, token_scope
+from .constants import (
+    CONNECTION_CONFIG,
+    NON_RETRYABLE_ERROR_PATTERNS,
+    RETRYABLE_ERROR_PATTERNS,
+    __version__,
+)
+
+logger = logging.getLogger(__name__)
+
+# Async callable returning a bearer token for an AAD scope
+TokenProvider = Callable[[str], Awaitable[str]]
+
+KUSTO_API_VERSION = "2024-12-12"
+QUERY_ENDPOINT = "v2/rest/query"
+MGMT_ENDPOINT = "v1/rest/mgmt"
+
+# Extra time the client waits past the server timeout, as the SDK client does
+CLIENT_SERVER_DELTA = 30.0
+
+
+def new_request_id() -> str:
+    """Create a client request id; it is also the handle used to cancel the query."""
+    return f"KQLMCP.execute;{uuid.uuid4()}"
+
+
+def build_request_properties(timeout_seconds: Optional[float] = None, request_id: Optional[str] = None) -> ClientRequestProperties:
+    """
+    Build request properties carrying a server timeout and a client request id.
+
+    The SDK client and AsyncKustoClient both derive their HTTP timeout from
+    ``servertimeout``, so one value bounds the query on both ends.
+    """
+    properties = ClientRequestProperties()
+    if timeout_seconds:
+        properties.set_option(ClientRequestProperties.request_timeout_option_name, timedelta(seconds=timeout_seconds))
+    properties.client_request_id = request_id or new_request_id()
+    return properties
+
+
+async def _default_token_provider(scope: str) -> str:
+    """Tokens from the shared in-process cache for the current auth method."""
+    return await get_token_provider()(scope)
+
+
+class AsyncKustoClient:
+    """
+    Minimal asyncio Kusto client speaking the v2 query and v1 management REST APIs.
+
+    Mirrors the subset of ``azure.kusto.data.KustoClient`` used by this server:
+    ``execute`` (routes ``.`` commands to management), ``execute_query``,
+    ``execute_mgmt`` and ``close``.
+    """
+
+    def __init__(
+        self,
+        cluster_url: str,
+        token_provider: Optional[TokenProvider] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.cluster_url = normalize_cluster_url(cluster_url)
+        self._token_provider = token_provider or _default_token_provider
+        self._scope = token_scope(self.cluster_url)
+        self._owns_http_client = http_client is None
+        self._http = http_client or httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                CONNECTION_CONFIG.get("read_timeout", 300.0),
+                connect=CONNECTION_CONFIG.get("connection_timeout", 30.0),
+            ),
+            limits=httpx.Limits(max_connections=CONNECTION_CONFIG.get("pool_max_size", 10)),
+            follow_redirects=False,
+        )
+        self._background: Set[asyncio.Task] = set()
+        self._closed = False
+
+    async def execute(self, database: str, query: str, properties: Optional[ClientRequestProperties] = None) -> KustoResponseDataSet:
+        """Execute a query or, for ``.``-prefixed text, a management command."""
+        if query.strip().startswith("."):
+            return await self.execute_mgmt(database, query, properties)
+        return await self.execute_query(database, query, properties)
+
+    async def execute_query(self, database: str, query: str, properties: Optional[ClientRequestProperties] = None) -> KustoResponseDataSet:
+        """Execute a query through the v2 query endpoint."""
+        return await self._execute(QUERY_ENDPOINT, database, query, properties, cancellable=True)
+
+    async def execute_mgmt(self, database: str, command: str, properties: Optional[ClientRequestProperties] = None) -> KustoResponseDataSet:
+        """Execute a management command through the v1 management endpoint."""
+        return await self._execute(MGMT_ENDPOINT, database, command, properties, cancellable=False)
+
+    async def close(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        self._closed = True
+        if self._owns_http_client:
+            await self._http.aclose()
+
+    async def _execute(
+        self,
+        endpoint: str,
+        database: str,
+        query: str,
+        properties: Optional[ClientRequestProperties],
+        cancellable: bool,
+    ) -> KustoResponseDataSet:
+        if self._closed:
+            raise RuntimeError(f"Async Kusto client for {self.cluster_url} is closed")
+
+        url = f"{self.cluster_url}/{endpoint}"
+        request_id = (properties.client_request_id if properties else None) or new_request_id()
+        payload: Dict[str, Any] = {"db": database, "csl": query}
+        timeout = httpx.USE_CLIENT_DEFAULT
+        if properties is not None:
+            payload["properties"] = properties.to_json()
+            server_timeout = properties.get_option(ClientRequestProperties.request_timeout_option_name, None)
+            if isinstance(server_timeout, timedelta):
+                timeout = httpx.Timeout(
+                    server_timeout.total_seconds() + CLIENT_SERVER_DELTA,
+                    connect=CONNECTION_CONFIG.get("connection_timeout", 30.0),
+                )
+
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json; charset=utf-8",
+            "x-ms-version": KUSTO_API_VERSION,
+            "x-ms-client-request-id": request_id,
+            "x-ms-app": "mcp-kql-server",
+            "x-ms-client-version": f"mcp-kql-server:{__version__}",
+            "Authorization": f"Bearer {await self._token_provider(self._scope)}",
+        }
+
+        try:
+            response = await self._http.post(url, json=payload, headers=headers, timeout=timeout)
+        except asyncio.CancelledError:
+            if cancellable:
+                self._cancel_on_server(database, request_id)
+            raise
+        except httpx.HTTPError as e:
+            raise KustoNetworkError(url, request_id) from e
+
+        return self._parse_response(endpoint, url, response)
+
+    @staticmethod
+    def _parse_response(endpoint: str, url: str, response: httpx.Response) -> KustoResponseDataSet:
+        """Turn an HTTP response into a Kusto data set or the matching Kusto exception."""
+        response_json = None
+        if response.content:
+            try:
+                response_json = response.json()
+            except ValueError:
+                response_json = None
+
+        if response.status_code >= 300:
+            if response.status_code == 404:
+                raise KustoServiceError(f"The requested endpoint '{url}' does not exist.", response)
+            if response.status_code == 429:
+                raise KustoThrottlingError("The request was throttled by the server.", response)
+            if response.status_code == 401:
+                raise KustoServiceError("401. Missing adequate access rights.", response)
+            if isinstance(response_json, dict) and "error" in response_json:
+                raise KustoApiError(response_json, http_response=response)
+            raise KustoServiceError(
+                f"{response.status_code} {response.reason_phrase}: {response.text or 'Server error response contains no data.'}",
+                response,
+            )
+
+        if response_json is None:
+            raise KustoServiceError("The content of the response contains no data.", response)
+
+        if endpoint == QUERY_ENDPOINT:
+            return KustoResponseDataSetV2(response_json)
+        return KustoResponseDataSetV1(response_json)
+
+    def _cancel_on_server(self, database: str, request_id: str) -> None:
+        """Ask the cluster to stop a query whose caller was cancelled (best effort)."""
+        try:
+            task = asyncio.get_running_loop().create_task(self.cancel_query(database, request_id))
+        except RuntimeError:
+            return
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def cancel_query(self, database: str, request_id: str) -> bool:
+        """Cancel a running query by its client request id; returns whether the cluster accepted it."""
+        try:
+            await self.execute_mgmt(database, f'.cancel query "{request_id}"')
+            logger.debug(f"Cancelled query {request_id} on {self.cluster_url}")
+            return True
+        except Exception as e:
+            logger.debug(f"Server-side cancel of {request_id} failed: {e}")
+            return False
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Decide whether a failed Kusto call is worth retrying."""
+    if isinstance(error, (KustoNetworkError, KustoThrottlingError)):
+        return True
+
+    status = getattr(getattr(error, "http_response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+
+    error_str = str(error)
+    # Non-retryable patterns take precedence
+    for pattern in NON_RETRYABLE_ERROR_PATTERNS:
+        if re.search(pattern, error_str, re.IGNORECASE):
+            return False
+    for pattern in RETRYABLE_ERROR_PATTERNS:
+        if re.search(pattern, error_str, re.IGNORECASE):
+            return True
+    return False
+
+
+# One client per (event loop, cluster): httpx connections are bound to the loop
+# that opened them.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncKustoClient]]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client(cluster_url: str) -> AsyncKustoClient:
+    """Get the shared async client for a cluster on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = normalize_cluster_url(cluster_url)
+    client = clients.get(key)
+    if client is None or client._closed:
+        client = clients[key] = AsyncKustoClient(key)
+    return client
+
+
+def schedule_cancel_query(cluster_url: str, database: str, request_id: str) -> None:
+    """
+    Fire-and-forget ``.cancel query`` for a query running on a worker thread.
+
+    Used when the MCP request that started a blocking SDK call is cancelled:
+    the cluster aborts the query, which unblocks the worker and frees its slot.
+    Must be called from the event loop.
+    """
+    client = get_async_client(cluster_url)
+    client._cancel_on_server(database, request_id)
+
+
+async def close_async_clients() -> None:
+    """Close the async clients that belong to the running event loop."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug(f"Error closing async Kusto client for {client.cluster_url}: {e}")
+
+
+async def execute_kusto_async(
+    cluster_url: str,
+    database: str,
+    query: str,
+    is_mgmt: Optional[bool] = None,
+    properties: Optional[ClientRequestProperties] = None,
+    max_retries: Optional[int] = None,
+) -> KustoResponseDataSet:
+    """
+    Execute a query or management command with awaitable retries.
+
+    Retries use exponential backoff from CONNECTION_CONFIG and ``asyncio.sleep``,
+    so cancelling the calling task stops both the in-flight request and any
+    pending retry immediately. The call as a whole records one outcome with the
+    cluster's circuit breaker, so its own retries cannot trip it; if other calls
+    open the breaker meanwhile, remaining retries fail fast with
+    CircuitOpenError instead of walking the whole backoff schedule.
+    """
+    client = get_async_client(cluster_url)
+    breaker = get_circuit_breaker(cluster_url)
+    if is_mgmt is None:
+        is_mgmt = query.strip().startswith(".")
+    if max_retries is None:
+        max_retries = CONNECTION_CONFIG.get("max_retries", 5)
+    delay = CONNECTION_CONFIG.get("retry_delay", 2.0)
+    backoff_factor = CONNECTION_CONFIG.get("retry_backoff_factor", 2.0)
+    max_delay = CONNECTION_CONFIG.get("max_retry_delay", 60.0)
+
+    attempt = 0
+    with breaker.guard():
+        while True:
+            attempt += 1
+            if attempt > 1 and breaker.state == breaker.OPEN:
+                # Opened by other calls during the backoff
+                breaker.before_call()
+            try:
+                if is_mgmt:
+                    return await client.execute_mgmt(database, query, properties)
+                return await client.execute_query(database, query, properties)
+            except Exception as e:
+                logger.warning(f"Kusto execution attempt {attempt}/{max_retries + 1} failed: {e}")
+                if attempt > max_retries or not is_retryable_error(e):
+                    raise
+                logger.info(f"Retrying in {delay:.1f}s due to retryable error...")
+                await asyncio.sleep(delay)
+                delay = min(delay * backoff_factor, max_delay)
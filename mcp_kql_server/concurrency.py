@@ -0,0 +1,356 @@
+"""
+Query Concurrency Module
+
+This module runs blocking query work off the MCP event loop on a bounded
+worker pool. It caps how many queries may run against a single cluster and
+schedules queued work round-robin between client sessions, so one busy agent
+cannot starve the others or freeze unrelated tool calls.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from .connection import normalize_cluster_url
+from .constants import LIMITS
+
+logger = logging.getLogger(__name__)
+
+# Worker threads remember which event loop dispatched their current job so that
+# follow-up coroutines (e.g. background learning) can be scheduled back onto it.
+_worker_context = threading.local()
+
+
+def get_dispatch_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """Return the event loop that submitted the job running on this worker thread."""
+    return getattr(_worker_context, "loop", None)
+
+
+@dataclass
+class QueryJob:
+    """A unit of blocking work waiting for, or running on, a worker thread."""
+    func: Callable[..., Any]
+    args: tuple
+    kwargs: Dict[str, Any]
+    cluster: str
+    session_id: str
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished: bool = False
+    cancelled: bool = False
+
+
+class QueryExecutor:
+    """
+    Bounded, fair executor for blocking query calls.
+
+    - At most ``max_workers`` jobs run at once (LIMITS["max_concurrent_queries"]).
+    - At most ``per_cluster_limit`` of them target the same cluster
+      (LIMITS["max_concurrent_queries_per_cluster"]); other clusters keep flowing.
+    - Waiting jobs are grouped per session and served round-robin.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, per_cluster_limit: Optional[int] = None):
+        self.max_workers = max(1, int(max_workers or LIMITS.get("max_concurrent_queries", 5)))
+        self.per_cluster_limit = max(1, int(
+            per_cluster_limit or LIMITS.get("max_concurrent_queries_per_cluster", self.max_workers)
+        ))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="kql-query")
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, Deque[QueryJob]]" = OrderedDict()
+        self._running = 0
+        self._running_by_cluster: Dict[str, int] = {}
+        self._closed = False
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+        self._peak_queue_depth = 0
+        self._started = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args,
+        cluster: str = "",
+        session_id: str = "default",
+        on_cancel: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Run ``func(*args, **kwargs)`` on a worker thread and await its result.
+
+        ``cluster`` and ``session_id`` are scheduling hints and are not passed to
+        ``func``. Cancelling the awaiting task removes a queued job; for a job
+        that has already started, ``on_cancel`` is called on the event loop so
+        the caller can abort the blocking call, and its result is discarded.
+        """
+        loop = asyncio.get_running_loop()
+        job = QueryJob(
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            cluster=normalize_cluster_url(cluster) if cluster else "",
+            session_id=session_id or "default",
+            loop=loop,
+            future=loop.create_future(),
+        )
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Query executor has been shut down")
+            self._queues.setdefault(job.session_id, deque()).append(job)
+            self._counters["submitted"] += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, self._queue_depth_locked())
+
+        self._dispatch()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            if self._cancel(job) and on_cancel is not None:
+                try:
+                    on_cancel()
+                except Exception as e:
+                    logger.debug(f"Cancel hook for query on {job.cluster or 'unknown cluster'} failed: {e}")
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return worker usage, queue depths and wait-time metrics."""
+        with self._lock:
+            started = self._started
+            return {
+                "max_workers": self.max_workers,
+                "per_cluster_limit": self.per_cluster_limit,
+                "running": self._running,
+                "running_by_cluster": {k: v for k, v in self._running_by_cluster.items() if v},
+                "queue_depth": self._queue_depth_locked(),
+                "queue_depth_by_session": {sid: len(q) for sid, q in self._queues.items()},
+                "peak_queue_depth": self._peak_queue_depth,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                **self._counters,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting work and fail any jobs that are still queued."""
+        with self._lock:
+            self._closed = True
+            pending = [job for queue in self._queues.values() for job in queue]
+            self._queues.clear()
+        for job in pending:
+            self._resolve(job, error=RuntimeError("Query executor has been shut down"))
+        self._pool.shutdown(wait=wait)
+
+    def _queue_depth_locked(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_job_locked(self) -> Optional[QueryJob]:
+        """Pick the next runnable job, rotating between sessions."""
+        for session_id in list(self._queues):
+            queue = self._queues[session_id]
+            for job in queue:
+                if not job.cluster or self._running_by_cluster.get(job.cluster, 0) < self.per_cluster_limit:
+                    queue.remove(job)
+                    if queue:
+                        self._queues.move_to_end(session_id)
+                    else:
+                        del self._queues[session_id]
+                    return job
+        return None
+
+    def _dispatch(self) -> None:
+        """Start as many queued jobs as the worker and cluster limits allow."""
+        with self._lock:
+            while not self._closed and self._running < self.max_workers:
+                job = self._next_job_locked()
+                if job is None:
+                    break
+                job.started_at = time.monotonic()
+                wait = job.started_at - job.enqueued_at
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                self._started += 1
+                self._running += 1
+                if job.cluster:
+                    self._running_by_cluster[job.cluster] = self._running_by_cluster.get(job.cluster, 0) + 1
+                self._pool.submit(self._run_job, job)
+
+    def _run_job(self, job: QueryJob) -> None:
+        """Worker-thread entry point."""
+        _worker_context.loop = job.loop
+        result, error = None, None
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except BaseException as e:
+            error = e
+        finally:
+            _worker_context.loop = None
+            with self._lock:
+                job.finished = True
+                self._running -= 1
+                if job.cluster:
+                    self._running_by_cluster[job.cluster] -= 1
+                # Each job ends up in exactly one of completed, failed and cancelled
+                if not job.cancelled:
+                    self._counters["failed" if error is not None else "completed"] += 1
+
+        self._resolve(job, result=result, error=error)
+        self._dispatch()
+
+    def _cancel(self, job: QueryJob) -> bool:
+        """Drop a job whose caller went away; returns True if it was already running."""
+        with self._lock:
+            queue = self._queues.get(job.session_id)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.session_id]
+            running = job.started_at is not None and not job.finished
+            if not job.finished:
+                # A job that already finished was counted when its worker returned
+                job.cancelled = True
+                self._counters["cancelled"] += 1
+        if running:
+            logger.debug(f"Query on {job.cluster or 'unknown cluster'} was cancelled while running; result will be discarded")
+            return True
+        return False
+
+    @staticmethod
+    def _resolve(job: QueryJob, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Hand a job's outcome back to the loop that is awaiting it."""
+        def _set():
+            if job.future.done():
+                return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+        try:
+            job.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            # The awaiting loop has already been closed; nobody is left to notify
+            logger.debug("Dropping query result for a closed event loop")
+
+
+@dataclass
+class Flight:
+    """A shared in-flight call and the number of callers awaiting it."""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async calls into one execution.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same result or exception. Nothing is remembered once
+    the call finishes, so failures are never cached. A caller that is cancelled
+    only stops waiting; the shared call is cancelled when its last waiter goes.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        # Tasks are bound to their event loop, so flights are shared per loop
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], Flight] = {}
+        self._counters = {
+            "executed": 0,
+            "coalesced": 0,
+            "abandoned": 0,
+        }
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``func()``, or the identical call already in flight for ``key``."""
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            if flight is None:
+                flight = Flight(task=loop.create_task(func()))
+                self._flights[flight_key] = flight
+                flight.task.add_done_callback(lambda _task: self._forget(flight_key, flight))
+                self._counters["executed"] += 1
+            else:
+                self._counters["coalesced"] += 1
+            flight.waiters += 1
+
+        try:
+            # Shield so one waiter's cancellation doesn't cancel the others' result
+            return await asyncio.shield(flight.task)
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                abandon = flight.waiters == 0 and not flight.task.done()
+                if abandon:
+                    # Late arrivals must start a fresh call, not join a cancelled one
+                    self._forget_locked(flight_key, flight)
+                    self._counters["abandoned"] += 1
+            if abandon:
+                flight.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return in-flight and coalescing counters."""
+        with self._lock:
+            return {"in_flight": len(self._flights), **self._counters}
+
+    def _forget(self, flight_key: Tuple[asyncio.AbstractEventLoop, Hashable], flight: Flight) -> None:
+        with self._lock:
+            self._forget_locked(flight_key, flight)
+
+    def _forget_locked(self, flight_key: Tuple[asyncio.AbstractEventLoop, Hashable], flight: Flight) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+
+
+# Coalescers shared by query execution ("query") and schema discovery ("schema")
+_single_flights: Dict[str, SingleFlight] = {}
+_single_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Get the process-wide coalescer for a kind of call, creating it on first use."""
+    with _single_flights_lock:
+        if name not in _single_flights:
+            _single_flights[name] = SingleFlight(name)
+        return _single_flights[name]
+
+
+# Global executor shared by all tool calls
+_query_executor: Optional[QueryExecutor] = None
+_query_executor_lock = threading.Lock()
+
+
+def get_query_executor() -> QueryExecutor:
+    """Get the process-wide query executor, creating it on first use."""
+    global _query_executor
+    if _query_executor is None:
+        with _query_executor_lock:
+            if _query_executor is None:
+                _query_executor = QueryExecutor()
+    return _query_executor
+
+
+def shutdown_query_executor(wait: bool = False) -> None:
+    """Shut down the global query executor."""
+    global _query_executor
+    with _query_executor_lock:
+        executor, _query_executor = _query_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
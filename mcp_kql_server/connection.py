@@ -0,0 +1,513 @@
+"""
+Kusto Connection Management Module
+
+This module keeps a process-wide registry of pooled KustoClient instances so
+that query execution and schema discovery reuse authenticated clients (and
+their keep-alive HTTP sessions) instead of paying for a new client, token
+lookup and TLS handshake on every call. It also holds the per-cluster circuit
+breakers that make calls to an unhealthy cluster fail fast.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+from azure.kusto.data.exceptions import KustoNetworkError, KustoServiceError
+
+from .constants import CONNECTION_CONFIG, ERROR_HANDLING_CONFIG
+from .kql_auth import cluster_token_callback
+
+logger = logging.getLogger(__name__)
+
+ClientFactory = Callable[[str], Any]
+
+
+def normalize_cluster_url(cluster_url: str) -> str:
+    """Normalize a cluster URI into the key used by the client pool."""
+    if not cluster_url:
+        raise ValueError("Cluster URI cannot be None or empty")
+    cluster_url = cluster_url.strip()
+    # Plain http is kept as-is for local emulators; everything else is https
+    if not cluster_url.startswith(("https://", "http://")):
+        cluster_url = f"https://{cluster_url}"
+    return cluster_url.rstrip("/")
+
+
+def create_kusto_client(cluster_url: str) -> KustoClient:
+    """Create a Kusto client that takes tokens from the shared token cache."""
+    kcsb = KustoConnectionStringBuilder.with_token_provider(cluster_url, cluster_token_callback(cluster_url))
+    return KustoClient(kcsb)
+
+
+@dataclass
+class PooledClient:
+    """A client leased from the pool together with its bookkeeping."""
+    key: str
+    client: Any
+    pooled: bool = True
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    uses: int = 0
+
+
+class KustoClientPool:
+    """
+    Thread-safe registry of reusable Kusto clients keyed by cluster URL.
+
+    Honors CONNECTION_CONFIG:
+        enable_connection_pooling: when False every lease gets a fresh client
+            that is closed on release (the historical behaviour).
+        pool_max_size: maximum number of pooled clients kept per cluster.
+        pool_block: when the per-cluster limit is reached, wait for a client to
+            be released (True) or hand out a temporary overflow client that is
+            closed after use (False).
+        pool_idle_timeout: idle clients older than this are closed and evicted.
+    """
+
+    def __init__(
+        self,
+        client_factory: Optional[ClientFactory] = None,
+        max_size: Optional[int] = None,
+        block: Optional[bool] = None,
+        idle_timeout: Optional[float] = None,
+        acquire_timeout: Optional[float] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self._client_factory = client_factory or create_kusto_client
+        self.enabled = CONNECTION_CONFIG.get("enable_connection_pooling", True) if enabled is None else enabled
+        self.max_size = max(1, int(CONNECTION_CONFIG.get("pool_max_size", 10) if max_size is None else max_size))
+        self.block = CONNECTION_CONFIG.get("pool_block", False) if block is None else block
+        self.idle_timeout = CONNECTION_CONFIG.get("pool_idle_timeout", 300.0) if idle_timeout is None else idle_timeout
+        self.acquire_timeout = (
+            CONNECTION_CONFIG.get("connection_timeout", 30.0) if acquire_timeout is None else acquire_timeout
+        )
+
+        self._condition = threading.Condition()
+        self._idle: Dict[str, List[PooledClient]] = {}
+        self._leased: Dict[str, int] = {}
+        self._closed = False
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "overflow": 0,
+            "evicted": 0,
+            "discarded": 0,
+            "waits": 0,
+        }
+
+    @contextmanager
+    def client(self, cluster_url: str, factory: Optional[ClientFactory] = None) -> Iterator[Any]:
+        """
+        Lease a client for the duration of a ``with`` block.
+
+        Clients that fail without a service response (network errors or any
+        non-Kusto exception) are discarded instead of returned, so a broken
+        session is never handed to the next caller.
+        """
+        entry = self.acquire(cluster_url, factory)
+        try:
+            yield entry.client
+        except BaseException as e:
+            healthy = isinstance(e, KustoServiceError) and not isinstance(e, KustoNetworkError)
+            self.release(entry, discard=not healthy)
+            raise
+        else:
+            self.release(entry)
+
+    def acquire(self, cluster_url: str, factory: Optional[ClientFactory] = None) -> PooledClient:
+        """Lease a client for a cluster, creating one if the pool allows it."""
+        key = normalize_cluster_url(cluster_url)
+        deadline = time.monotonic() + self.acquire_timeout
+        pooled = True
+        expired: List[PooledClient] = []
+
+        with self._condition:
+            expired = self._collect_idle_locked()
+            while True:
+                if self._closed:
+                    raise RuntimeError("Kusto client pool has been shut down")
+
+                idle = self._idle.get(key)
+                if idle:
+                    entry = idle.pop()
+                    self._leased[key] = self._leased.get(key, 0) + 1
+                    self._counters["reused"] += 1
+                    break
+
+                if not self.enabled:
+                    pooled = False
+                    entry = None
+                    break
+
+                if self._leased.get(key, 0) < self.max_size:
+                    # Reserve the slot now, build the client outside the lock
+                    self._leased[key] = self._leased.get(key, 0) + 1
+                    entry = None
+                    break
+
+                if not self.block:
+                    pooled = False
+                    self._counters["overflow"] += 1
+                    entry = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out after {self.acquire_timeout}s waiting for a pooled Kusto client for {key}"
+                    )
+                self._counters["waits"] += 1
+                self._condition.wait(remaining)
+
+        self._close_entries(expired)
+
+        if entry is None:
+            try:
+                client = (factory or self._client_factory)(key)
+            except BaseException:
+                if pooled:
+                    with self._condition:
+                        self._leased[key] -= 1
+                        self._condition.notify()
+                raise
+            entry = PooledClient(key=key, client=client, pooled=pooled)
+            with self._condition:
+                self._counters["created"] += 1
+            logger.debug(f"Created {'pooled' if pooled else 'unpooled'} Kusto client for {key}")
+
+        entry.uses += 1
+        return entry
+
+    def release(self, entry: PooledClient, discard: bool = False) -> None:
+        """Return a leased client to the pool, or close it if it should not be kept."""
+        entry.last_used = time.monotonic()
+        if not entry.pooled:
+            self._close_entries([entry])
+            return
+
+        close_entry = False
+        with self._condition:
+            self._leased[entry.key] = max(0, self._leased.get(entry.key, 0) - 1)
+            if discard or self._closed:
+                close_entry = True
+                if discard:
+                    self._counters["discarded"] += 1
+            else:
+                self._idle.setdefault(entry.key, []).append(entry)
+            self._condition.notify()
+
+        if close_entry:
+            self._close_entries([entry])
+
+    def evict_idle(self) -> int:
+        """Close clients that have been idle longer than the idle timeout."""
+        with self._condition:
+            expired = self._collect_idle_locked()
+        self._close_entries(expired)
+        return len(expired)
+
+    def invalidate(self, cluster_url: str) -> int:
+        """Close all idle clients for a cluster (e.g. after credentials change)."""
+        key = normalize_cluster_url(cluster_url)
+        with self._condition:
+            entries = self._idle.pop(key, [])
+            self._counters["discarded"] += len(entries)
+        self._close_entries(entries)
+        return len(entries)
+
+    def shutdown(self) -> None:
+        """Close every idle client; leased clients are closed when released."""
+        with self._condition:
+            self._closed = True
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        self._close_entries(entries)
+        if entries:
+            logger.info(f"Closed {len(entries)} pooled Kusto client(s)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return pool configuration, per-cluster occupancy and lifetime counters."""
+        with self._condition:
+            clusters = {}
+            for key in set(self._idle) | set(self._leased):
+                idle = len(self._idle.get(key, []))
+                leased = self._leased.get(key, 0)
+                if idle or leased:
+                    clusters[key] = {"idle": idle, "leased": leased}
+            return {
+                "enabled": self.enabled,
+                "max_size": self.max_size,
+                "block": self.block,
+                "idle_timeout": self.idle_timeout,
+                "clusters": clusters,
+                **self._counters,
+            }
+
+    def _collect_idle_locked(self) -> List[PooledClient]:
+        """Remove idle clients past their idle timeout; caller holds the lock."""
+        if not self.idle_timeout or self.idle_timeout <= 0:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        for key in list(self._idle):
+            keep = []
+            for entry in self._idle[key]:
+                (expired if entry.last_used < cutoff else keep).append(entry)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self._counters["evicted"] += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_entries(entries: List[PooledClient]) -> None:
+        for entry in entries:
+            try:
+                entry.client.close()
+            except Exception as e:
+                logger.debug(f"Error closing Kusto client for {entry.key}: {e}")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a cluster whose circuit breaker is open."""
+
+    def __init__(self, cluster_url: str, retry_after: float, last_error: str = ""):
+        self.cluster_url = cluster_url
+        self.retry_after = retry_after
+        message = f"Circuit breaker open for {cluster_url}: failing fast for another {retry_after:.0f}s"
+        if last_error:
+            message += f" (last error: {last_error[:200]})"
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one cluster.
+
+    Failures whose classify_error_dynamically category is listed in
+    ERROR_HANDLING_CONFIG["circuit_breaker_categories"] count towards the
+    threshold; query mistakes (syntax, permissions, missing tables) do not.
+    After ``threshold`` consecutive failures the breaker opens and calls fail
+    fast for ``recovery_time`` seconds. Then a single probe call is let through
+    (half-open): success closes the breaker, failure re-opens it with the
+    recovery time doubled up to ``max_recovery_time``.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        cluster_url: str,
+        threshold: Optional[int] = None,
+        recovery_time: Optional[float] = None,
+        max_recovery_time: Optional[float] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.cluster_url = cluster_url
+        self.threshold = max(1, int(ERROR_HANDLING_CONFIG.get("circuit_breaker_threshold", 5) if threshold is None else threshold))
+        self.base_recovery_time = (
+            ERROR_HANDLING_CONFIG.get("circuit_breaker_recovery_time", 120.0) if recovery_time is None else recovery_time
+        )
+        self.max_recovery_time = max(self.base_recovery_time, (
+            ERROR_HANDLING_CONFIG.get("circuit_breaker_max_recovery_time", 900.0) if max_recovery_time is None else max_recovery_time
+        ))
+        self.enabled = ERROR_HANDLING_CONFIG.get("enable_circuit_breaker", True) if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._recovery_time = self.base_recovery_time
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._last_error = ""
+        self._counters = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the cluster should not be called right now."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            remaining = self._opened_at + self._recovery_time - time.monotonic()
+            if self._state == self.OPEN and remaining <= 0:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"Circuit breaker for {self.cluster_url} is half-open, sending a probe call")
+                return
+            self._counters["rejected"] += 1
+            raise CircuitOpenError(self.cluster_url, max(remaining, 0.0), self._last_error)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit breaker for {self.cluster_url} closed after a successful call")
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+            self._recovery_time = self.base_recovery_time
+
+    def record_failure(self, error: BaseException) -> bool:
+        """Count a failed call; returns True if it was a cluster-health failure."""
+        if isinstance(error, CircuitOpenError):
+            return False
+        if not _is_cluster_failure(error):
+            # A query mistake still proves the cluster answered
+            with self._lock:
+                self._failures = 0
+                if self._state == self.HALF_OPEN:
+                    self._state = self.CLOSED
+                    self._probe_in_flight = False
+                    self._recovery_time = self.base_recovery_time
+            return False
+
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            self._last_error = str(error)
+            if self._state == self.HALF_OPEN:
+                self._recovery_time = min(self._recovery_time * 2, self.max_recovery_time)
+                self._open_locked()
+            elif self._state == self.CLOSED and self._failures >= self.threshold:
+                self._open_locked()
+        return True
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Check the breaker before a call and record how the call went."""
+        self.before_call()
+        try:
+            yield
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.record_failure(e)
+            else:
+                self._release_probe()
+            raise
+        self.record_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "recovery_time": self._recovery_time,
+                **self._counters,
+            }
+            if self._state != self.CLOSED:
+                stats["retry_after"] = round(max(0.0, self._opened_at + self._recovery_time - time.monotonic()), 1)
+                stats["last_error"] = self._last_error[:200]
+            return stats
+
+    def _open_locked(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._counters["opened"] += 1
+        logger.warning(
+            f"Circuit breaker for {self.cluster_url} opened after {self._failures} failures; "
+            f"failing fast for {self._recovery_time:.0f}s"
+        )
+
+    def _release_probe(self) -> None:
+        """Let another caller probe if the probe call was cancelled."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+def _is_cluster_failure(error: BaseException) -> bool:
+    """Decide from the error category whether a failure says the cluster is unhealthy."""
+    from .execute_kql import classify_error_dynamically
+
+    status = getattr(getattr(error, "http_response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    category = classify_error_dynamically(str(error), status if isinstance(status, int) else None)["error_category"]
+    if isinstance(error, KustoNetworkError) and category == "unknown":
+        return True
+    return category in ERROR_HANDLING_CONFIG.get("circuit_breaker_categories", [])
+
+
+class CircuitBreakerRegistry:
+    """Per-cluster circuit breakers shared by query execution and schema discovery."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, cluster_url: str) -> CircuitBreaker:
+        key = normalize_cluster_url(cluster_url)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(key)
+            return breaker
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.get_stats() for key, breaker in breakers.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+_circuit_breakers = CircuitBreakerRegistry()
+
+
+def get_circuit_breaker(cluster_url: str) -> CircuitBreaker:
+    """Get the circuit breaker for a cluster."""
+    return _circuit_breakers.get(cluster_url)
+
+
+def get_circuit_breaker_stats() -> Dict[str, Any]:
+    """Return the state of every cluster's circuit breaker."""
+    return _circuit_breakers.get_stats()
+
+
+def reset_circuit_breakers() -> None:
+    """Forget all breaker state (used by tests and on shutdown)."""
+    _circuit_breakers.reset()
+
+
+# Global client pool shared by query execution and schema discovery
+_client_pool: Optional[KustoClientPool] = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> KustoClientPool:
+    """Get the process-wide Kusto client pool, creating it on first use."""
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = KustoClientPool()
+    return _client_pool
+
+
+def shutdown_client_pool() -> None:
+    """Close all pooled clients and reset the global pool."""
+    global _client_pool
+    with _client_pool_lock:
+        pool, _client_pool = _client_pool, None
+    if pool is not None:
+        pool.shutdown()
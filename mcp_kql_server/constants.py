@@ -213,7 +213,9 @@ FILE_PERMISSIONS = {
 # Limits and constraints
 LIMITS = {
     "max_concurrent_queries": 5,
+    "max_concurrent_queries_per_cluster": 3,
     "max_result_rows": 10000,
+    "max_batch_queries": 25,
     "max_visualization_rows": 1000,
     "max_column_description_length": 500,
     "max_table_description_length": 1000,
@@ -794,8 +796,87 @@ CONNECTION_CONFIG = {
     "enable_connection_pooling": True,
     "pool_max_size": 10,
     "pool_block": False,
-    "validate_connection_before_use": True,
-    "connection_validation_timeout": 5.0,
+    "pool_idle_timeout": 300.0,
+    "validate_connection_before_use": True,  # track cluster health in the background (never on the request path)
+    "connection_validation_timeout": 5.0,  # server timeout of the .show version health probe
+    "health_check_ttl": 300.0,  # a health record older than this is re-probed on next use
+    "health_check_failure_retry": 15.0,  # first re-probe delay after a failed probe, doubling up to the TTL
+}
+
+# Azure authentication configuration
+AUTH_CONFIG = {
+    "default_method": os.environ.get("KQL_AUTH_METHOD", "device"),  # see kql_auth.AUTH_METHODS
+    # AAD resource tokens are requested for. Empty (the default) uses each cluster's own URL,
+    # which works in every cloud and for local emulators; setting it shares one token across clusters.
+    "token_resource": os.environ.get("KQL_TOKEN_RESOURCE", ""),
+    "refresh_margin": 300.0,  # refresh tokens in the background this long before they expire
+    "min_token_lifetime": 30.0,  # tokens closer than this to expiry are refreshed before use
+}
+
+# Query result cache configuration
+RESULT_CACHE_CONFIG = {
+    "enabled": True,
+    "ttl_seconds": 300.0,
+    "max_bytes": 64 * 1024 * 1024,
+    "max_entry_bytes": 16 * 1024 * 1024,
+}
+
+# Paginated result store configuration
+RESULT_STORE_CONFIG = {
+    "enabled": True,
+    "page_size": 500,  # rows returned inline by execute_kql_query before paging kicks in
+    "max_page_size": 10000,
+    "ttl_seconds": 1800.0,
+    "max_bytes": 256 * 1024 * 1024,  # in-memory budget; least recently used results spill to disk
+    "max_disk_bytes": 2 * 1024 * 1024 * 1024,
+    "spill_rows": 200000,  # results past either threshold go straight to disk
+    "spill_bytes": 64 * 1024 * 1024,
+    "stale_spill_seconds": 86400.0,  # spill directories left behind by dead processes
+}
+
+# Formats execute_kql_query can write to a file instead of returning rows inline
+FILE_OUTPUT_FORMATS = ("arrow", "parquet")
+
+# KQL functions whose output changes between executions; queries using them are never cached
+NON_DETERMINISTIC_KQL_FUNCTIONS = frozenset({
+    "now",
+    "ago",
+    "rand",
+    "new_guid",
+    "current_principal",
+    "current_principal_details",
+    "current_principal_is_member_of",
+    "cursor_current",
+    "cursor_after",
+    "cursor_before_or_at",
+})
+
+# Post-execution learning pipeline configuration
+LEARNING_CONFIG = {
+    "enabled": True,
+    "queue_size": 256,  # pending learning events; new events are dropped once it is full
+    "workers": 2,
+    "max_queries_per_event": 5,  # distinct queries kept when events for the same tables are merged
+    "dedupe_seconds": 300.0,  # a query already learned for the same tables is skipped within this window
+}
+
+# Schema memory persistence configuration
+MEMORY_STORAGE_CONFIG = {
+    "backend": os.environ.get("KQL_MEMORY_BACKEND", "sqlite"),  # "sqlite" or "json"; see storage.register_storage_backend
+    "sqlite_filename": "unified_memory.db",  # created next to unified_memory.json
+    "busy_timeout": 5.0,  # seconds a writer waits for a lock held by another process
+    "flush_interval": 2.0,  # seconds changes may wait before the background writer saves them
+    "flush_max_dirty_sections": 64,  # save right away once this many sections are waiting
+    # Successful queries and learning events are appended to a journal and compacted later
+    "journal_filename": "memory_journal.jsonl",
+    "journal_fsync_interval": 1.0,  # seconds between fsyncs of the journal
+    "journal_compact_bytes": 1024 * 1024,  # compact into the main store once the journal is this large
+    "journal_compact_interval": 300.0,  # ... or once its oldest uncompacted event is this old
+    # Table data is loaded per (cluster, database) shard on first access and dropped when idle
+    "lazy_shards": True,
+    "shard_idle_seconds": 600.0,  # evict a loaded shard without unsaved changes after this long unused
+    "shard_sweep_interval": 60.0,  # seconds between checks for idle shards
+    "shard_memory_budget": 64 * 1024 * 1024,  # bytes of loaded shards before least recently used ones are evicted
 }
 
 # Error Handling Configuration
@@ -809,6 +890,9 @@ ERROR_HANDLING_CONFIG = {
     "enable_circuit_breaker": True,
     "circuit_breaker_threshold": 5,
     "circuit_breaker_recovery_time": 120.0,
+    "circuit_breaker_max_recovery_time": 900.0,  # recovery time doubles after each failed half-open probe
+    # classify_error_dynamically categories that mean the cluster itself is unhealthy
+    "circuit_breaker_categories": ["network", "service_availability", "server_error", "rate_limit"],
 }
 
 # Retryable Error Patterns - Network and connection errors
@@ -867,6 +951,14 @@ BACKGROUND_SCHEMA_CONFIG = {
         "schema_validation_failure": True,
         "context_gap_detected": True,
     },
+    # Tables whose discovery failed are not retried until the cool-down passes;
+    # it doubles with each further failure up to the maximum
+    "failed_discovery_cooldown": 60.0,
+    "max_failed_discovery_cooldown": 3600.0,
+    # Per-table discovery during refresh_schema runs this many tables at once per cluster
+    "refresh_concurrency_per_cluster": 8,
+    # An interrupted refresh resumes from its checkpoint if restarted within this time
+    "refresh_checkpoint_ttl": 86400.0,
 }
 
 # Types of operations that can be orchestrated via query chaining
@@ -0,0 +1,374 @@
+"""
+Schema Discovery Coordination Module
+
+This module decides when live schema discovery runs automatically. It shares
+one discovery per (cluster, database, table) between concurrent callers and
+keeps a negative cache so tables that never resolve (functions, external
+tables, typos) are not rediscovered after every query. It also runs the
+per-table part of database refreshes concurrently, with a checkpoint so an
+interrupted refresh resumes where it stopped.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .connection import normalize_cluster_url
+from .constants import BACKGROUND_SCHEMA_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DiscoveryKey = Tuple[str, str, str]
+
+# Async callback receiving (completed, total, message) as a refresh advances
+ProgressCallback = Callable[[int, int, str], Awaitable[None]]
+
+# Write the refresh checkpoint at most this often while tables complete
+_CHECKPOINT_INTERVAL = 2.0
+
+
+@dataclass
+class FailedDiscovery:
+    """Negative cache entry for a table whose discovery failed."""
+    failures: int
+    retry_at: float
+    error: str = ""
+
+
+def is_discovered_schema(schema: Optional[Dict[str, Any]]) -> bool:
+    """True for a real schema, False for empty, error or fallback results."""
+    if not schema or not isinstance(schema, dict) or not schema.get("columns"):
+        return False
+    return not schema.get("error") and schema.get("discovery_method") != "fallback_schema"
+
+
+class SchemaDiscoveryCoordinator:
+    """
+    Runs automatic schema discovery through one shared SchemaManager.
+
+    Tables already in memory are skipped. Concurrent requests for the same
+    table share one discovery run, including requests from other threads'
+    event loops (learning workers run their own). A failed discovery puts the table in a
+    negative cache for ``failed_discovery_cooldown`` seconds, doubling with
+    every further failure up to ``max_failed_discovery_cooldown``.
+    """
+
+    def __init__(
+        self,
+        schema_manager: Any = None,
+        cooldown: Optional[float] = None,
+        max_cooldown: Optional[float] = None,
+    ):
+        self._schema_manager = schema_manager
+        self.cooldown = BACKGROUND_SCHEMA_CONFIG.get("failed_discovery_cooldown", 60.0) if cooldown is None else cooldown
+        self.max_cooldown = (
+            BACKGROUND_SCHEMA_CONFIG.get("max_failed_discovery_cooldown", 3600.0) if max_cooldown is None else max_cooldown
+        )
+        self.refresh_concurrency = max(1, int(BACKGROUND_SCHEMA_CONFIG.get("refresh_concurrency_per_cluster", 8)))
+        self.checkpoint_ttl = BACKGROUND_SCHEMA_CONFIG.get("refresh_checkpoint_ttl", 86400.0)
+        self._lock = threading.Lock()
+        self._failed: Dict[DiscoveryKey, FailedDiscovery] = {}
+        # Thread-safe futures, so callers on any event loop can wait on a discovery
+        self._in_flight: Dict[DiscoveryKey, concurrent.futures.Future] = {}
+        # Semaphores are bound to their event loop, so limits are kept per loop
+        self._cluster_limits: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore] = {}
+        self._counters = {
+            "discovered": 0,
+            "already_known": 0,
+            "failed": 0,
+            "skipped_cooling_down": 0,
+            "coalesced": 0,
+            "refreshed": 0,
+            "resumed": 0,
+        }
+
+    @property
+    def schema_manager(self) -> Any:
+        if self._schema_manager is None:
+            from .utils import get_schema_manager
+            self._schema_manager = get_schema_manager()
+        return self._schema_manager
+
+    async def ensure_table(self, cluster: str, database: str, table: str) -> str:
+        """
+        Make sure a table's schema is in memory, discovering it if needed.
+
+        Returns one of "known", "discovered", "cooling_down" or "failed".
+        """
+        memory = self.schema_manager.memory_manager
+        schema = memory.get_schema(cluster, database, table, enable_fallback=False)
+        if schema and schema.get("columns"):
+            with self._lock:
+                self._counters["already_known"] += 1
+            return "known"
+
+        key = self._key(cluster, database, table)
+        with self._lock:
+            failed = self._failed.get(key)
+            if failed is not None and time.monotonic() < failed.retry_at:
+                self._counters["skipped_cooling_down"] += 1
+                logger.debug(f"Skipping schema discovery for {database}.{table}: failed {failed.failures} time(s), cooling down")
+                return "cooling_down"
+            flight = self._in_flight.get(key)
+            joined = flight is not None
+            if joined:
+                self._counters["coalesced"] += 1
+            else:
+                flight = self._in_flight[key] = concurrent.futures.Future()
+
+        if joined:
+            # Shield so a waiter's cancellation doesn't cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(flight))
+
+        try:
+            outcome = await self._discover(key, cluster, database, table)
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            # Waiters on other loops must not see the owner's cancellation as their own
+            flight.set_exception(e if isinstance(e, Exception) else RuntimeError(f"Discovery of {table} was cancelled"))
+            raise
+        with self._lock:
+            self._in_flight.pop(key, None)
+        flight.set_result(outcome)
+        return outcome
+
+    async def ensure_tables(self, cluster: str, database: str, tables: Iterable[str]) -> Dict[str, str]:
+        """Ensure each table's schema is known; one table's failure does not stop the rest."""
+        results = {}
+        for table in tables:
+            try:
+                results[table] = await self.ensure_table(cluster, database, table)
+            except Exception as e:
+                logger.warning(f"Auto schema discovery failed for {table}: {e}")
+                results[table] = "failed"
+        return results
+
+    async def refresh_tables(
+        self,
+        cluster: str,
+        database: str,
+        tables: List[str],
+        progress: Optional[ProgressCallback] = None,
+        completed_offset: int = 0,
+        total: Optional[int] = None,
+        schema_manager: Any = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Rediscover the schemas of many tables concurrently.
+
+        At most ``refresh_concurrency_per_cluster`` discoveries run at once per
+        cluster, recently used tables first. Progress is reported after every
+        table. Completed tables are checkpointed, so a refresh that is cancelled
+        or interrupted skips them when it is run again.
+
+        ``schema_manager`` defaults to the shared one.
+
+        Returns:
+            Dict with "refreshed", "failed" and "resumed" lists of per-table results.
+        """
+        schema_manager = schema_manager or self.schema_manager
+        memory = schema_manager.memory_manager
+        total = total if total is not None else completed_offset + len(tables)
+        checkpoint_path = self._checkpoint_path(memory, cluster, database)
+        done = self._load_checkpoint(checkpoint_path, tables)
+
+        results: Dict[str, List[Dict[str, Any]]] = {"refreshed": [], "failed": [], "resumed": []}
+        for table in tables:
+            if table in done:
+                schema = memory.get_schema(cluster, database, table, enable_fallback=False) or {}
+                results["resumed"].append({"table": table, "columns": len(schema.get("columns", {})), "method": "checkpoint"})
+        if results["resumed"]:
+            with self._lock:
+                self._counters["resumed"] += len(results["resumed"])
+            logger.info(f"Resuming schema refresh for {database}: {len(results['resumed'])} tables already done")
+
+        pending = self._prioritize(memory, cluster, database, [t for t in tables if t not in done])
+        limit = self._cluster_limit(cluster)
+        completed = completed_offset + len(results["resumed"])
+        last_saved = time.monotonic()
+
+        async def refresh_one(table: str) -> None:
+            nonlocal completed, last_saved
+            async with limit:
+                try:
+                    schema = await schema_manager.get_table_schema(cluster, database, table, force_refresh=True)
+                except Exception as e:
+                    schema = {"error": str(e)}
+            if is_discovered_schema(schema):
+                results["refreshed"].append(
+                    {"table": table, "columns": len(schema["columns"]), "method": schema.get("discovery_method")}
+                )
+                done.add(table)
+            else:
+                results["failed"].append({"table": table, "error": (schema or {}).get("error", "Unknown error")})
+
+            completed += 1
+            if time.monotonic() - last_saved >= _CHECKPOINT_INTERVAL:
+                last_saved = time.monotonic()
+                self._save_checkpoint(checkpoint_path, done)
+            if progress is not None:
+                try:
+                    await progress(completed, total, f"Refreshed {completed} of {total} tables in {database}")
+                except Exception as e:
+                    logger.debug(f"Could not report refresh progress: {e}")
+
+        try:
+            await asyncio.gather(*(refresh_one(table) for table in pending))
+        except BaseException:
+            # Keep what finished so the next refresh starts from here
+            self._save_checkpoint(checkpoint_path, done)
+            raise
+
+        self._clear_checkpoint(checkpoint_path)
+        with self._lock:
+            self._counters["refreshed"] += len(results["refreshed"])
+        return results
+
+    def forget_failures(self, cluster: Optional[str] = None, database: Optional[str] = None) -> int:
+        """Clear negative cache entries (all, or one cluster/database) so they are retried."""
+        with self._lock:
+            keys = [
+                key for key in self._failed
+                if (cluster is None or key[0] == normalize_cluster_url(cluster))
+                and (database is None or key[1] == database.lower())
+            ]
+            for key in keys:
+                del self._failed[key]
+            return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return discovery counters and the tables currently cooling down."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "cooling_down": {
+                    "/".join(key): {
+                        "failures": entry.failures,
+                        "retry_in_seconds": max(0, round(entry.retry_at - now)),
+                    }
+                    for key, entry in self._failed.items()
+                    if entry.retry_at > now
+                },
+                **self._counters,
+            }
+
+    async def _discover(self, key: DiscoveryKey, cluster: str, database: str, table: str) -> str:
+        logger.info(f"Auto-triggering schema discovery for {database}.{table}")
+        error = ""
+        try:
+            schema = await self.schema_manager.get_table_schema(cluster, database, table, force_refresh=True)
+        except Exception as e:
+            schema, error = None, str(e)
+
+        if is_discovered_schema(schema):
+            with self._lock:
+                self._failed.pop(key, None)
+                self._counters["discovered"] += 1
+            logger.info(f"Successfully auto-discovered schema for {table} with {len(schema['columns'])} columns")
+            return "discovered"
+
+        error = error or (schema or {}).get("error", "no columns found")
+        with self._lock:
+            previous = self._failed.get(key)
+            failures = previous.failures + 1 if previous else 1
+            delay = min(self.cooldown * (2 ** (failures - 1)), self.max_cooldown)
+            self._failed[key] = FailedDiscovery(failures, time.monotonic() + delay, error)
+            self._counters["failed"] += 1
+        logger.warning(f"Auto-discovery failed for {table} ({error}); next attempt in {delay:.0f}s")
+        return "failed"
+
+    @staticmethod
+    def _prioritize(memory: Any, cluster: str, database: str, tables: List[str]) -> List[str]:
+        """Recently used tables first, most recent first; the rest keep their order."""
+        try:
+            last_used = memory.get_table_last_used(cluster, database)
+        except Exception as e:
+            logger.debug(f"Could not read table usage for refresh priority: {e}")
+            return list(tables)
+        used = sorted((t for t in tables if t in last_used), key=lambda t: last_used[t], reverse=True)
+        return used + [t for t in tables if t not in last_used]
+
+    def _cluster_limit(self, cluster: str) -> asyncio.Semaphore:
+        key = (asyncio.get_running_loop(), normalize_cluster_url(cluster) if cluster else "")
+        with self._lock:
+            limit = self._cluster_limits.get(key)
+            if limit is None:
+                limit = self._cluster_limits[key] = asyncio.Semaphore(self.refresh_concurrency)
+            return limit
+
+    def _checkpoint_path(self, memory: Any, cluster: str, database: str) -> Optional[Path]:
+        try:
+            base = Path(memory.memory_path).parent
+        except Exception:
+            return None
+        cluster_key, database_key, _ = self._key(cluster, database, "")
+        digest = hashlib.sha1(f"{cluster_key}/{database_key}".encode("utf-8")).hexdigest()[:16]
+        return base / "refresh_checkpoints" / f"{digest}.json"
+
+    def _load_checkpoint(self, path: Optional[Path], tables: List[str]) -> set:
+        if path is None or not path.exists():
+            return set()
+        try:
+            checkpoint = json.loads(path.read_text(encoding="utf-8"))
+            if time.time() - checkpoint.get("updated_at", 0) > self.checkpoint_ttl:
+                return set()
+            return set(checkpoint.get("done", [])) & set(tables)
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable refresh checkpoint {path}: {e}")
+            return set()
+
+    def _save_checkpoint(self, path: Optional[Path], done: set) -> None:
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"updated_at": time.time(), "done": sorted(done)}), encoding="utf-8")
+            tmp.replace(path)
+        except Exception as e:
+            logger.debug(f"Could not save refresh checkpoint {path}: {e}")
+
+    @staticmethod
+    def _clear_checkpoint(path: Optional[Path]) -> None:
+        if path is not None:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"Could not remove refresh checkpoint {path}: {e}")
+
+    @staticmethod
+    def _key(cluster: str, database: str, table: str) -> DiscoveryKey:
+        return (normalize_cluster_url(cluster) if cluster else "", database.lower(), table.lower())
+
+
+# Global discovery coordinator
+_discovery_coordinator: Optional[SchemaDiscoveryCoordinator] = None
+_discovery_coordinator_lock = threading.Lock()
+
+
+def get_discovery_coordinator() -> SchemaDiscoveryCoordinator:
+    """Get the process-wide discovery coordinator, creating it on first use."""
+    global _discovery_coordinator
+    if _discovery_coordinator is None:
+        with _discovery_coordinator_lock:
+            if _discovery_coordinator is None:
+                _discovery_coordinator = SchemaDiscoveryCoordinator()
+    return _discovery_coordinator
+
+
+def reset_discovery_coordinator() -> None:
+    """Drop the global coordinator and its negative cache."""
+    global _discovery_coordinator
+    with _discovery_coordinator_lock:
+        _discovery_coordinator = None
@@ -14,9 +14,15 @@ import re
 from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
-from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+from azure.kusto.data import ClientRequestProperties, KustoClient, KustoConnectionStringBuilder
 from azure.kusto.data.exceptions import KustoServiceError
 
+from .async_client import build_request_properties, execute_kusto_async
+from .connection import CircuitOpenError, get_circuit_breaker, get_client_pool
+from .constants import DEFAULT_QUERY_TIMEOUT, LIMITS
+from .kql_auth import cluster_token_callback
+from .learning import LearningEvent, get_learning_pipeline
+from .results import ResultCacheMiss, dataframe_to_records, decode_result_table, get_result_cache, is_cacheable_query
 from .utils import extract_cluster_and_database_from_query, extract_tables_from_query, generate_query_description, QueryProcessor
 
 logger = logging.getLogger(__name__)
@@ -496,6 +502,118 @@ def validate_query(query: str) -> Tuple[str, str]:
         raise ValueError(f"Invalid query format: {e}")
 
 
+# Management commands that need no database run against this one
+DEFAULT_EXECUTION_DATABASE = "master"
+
+
+def resolve_execution_target(clean_query: str, cluster_uri: Optional[str], database: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the cluster and database a query is sent to.
+
+    The parameters win; a query with its own ``cluster()``/``database()``
+    fills in whichever of them is missing.
+    """
+    if "cluster(" in clean_query and "database(" in clean_query:
+        try:
+            extracted_cluster, extracted_database = extract_cluster_and_database_from_query(clean_query)
+            return cluster_uri or extracted_cluster, database or extracted_database
+        except Exception as extract_error:
+            logger.warning(f"Failed to extract cluster/database: {extract_error}")
+    return cluster_uri, database
+
+
+# Operators that already bound the number of rows a query returns
+_ROW_BOUNDING_OPERATORS = frozenset({"take", "limit", "top", "top-nested", "top-hitters", "sample", "sample-distinct", "count", "getschema"})
+
+# Operators that produce several result tables, which a trailing take cannot bound
+_MULTI_RESULT_OPERATORS = frozenset({"fork", "facet"})
+
+
+def _strip_comments(query: str) -> str:
+    """Drop ``//`` comments that are outside string literals."""
+    out, quote, i = [], None, 0
+    while i < len(query):
+        ch = query[i]
+        if quote:
+            if ch == "\\":
+                out.append(query[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif query.startswith("//", i):
+            end = query.find("\n", i)
+            if end == -1:
+                break
+            i = end
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _split_top_level(query: str, separator: str) -> List[str]:
+    """Split on a separator that is outside string literals and brackets."""
+    parts, depth, quote, start = [], 0, None, 0
+    i = 0
+    while i < len(query):
+        ch = query[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth = max(0, depth - 1)
+        elif ch == separator and depth == 0:
+            parts.append(query[start:i])
+            start = i + 1
+        i += 1
+    parts.append(query[start:])
+    return parts
+
+
+def apply_row_limit(query: str, max_rows: int) -> Tuple[str, bool]:
+    """
+    Append a ``take`` guardrail to a query that has no explicit row limit.
+
+    One row more than ``max_rows`` is requested so callers can tell whether the
+    result was cut off. The take goes before a trailing ``render``, and
+    management commands and queries already bounded by take/limit/top/sample/
+    count are returned unchanged, as are queries using fork/facet, which
+    return several tables. Comments are dropped from a guarded query so an
+    inline ``//`` comment cannot swallow the take.
+
+    Returns:
+        Tuple of (query to execute, whether the guardrail was applied)
+    """
+    if not query or max_rows <= 0 or query.lstrip().startswith("."):
+        return query, False
+
+    statements = _split_top_level(_strip_comments(query).strip().rstrip(";"), ";")
+    operators = _split_top_level(statements[-1], "|")
+    source = operators[0].strip().lower()
+    if not source or source.startswith(("print", "set ")):
+        return query, False
+
+    names = [(segment.strip().split(None, 1) or [""])[0].lower() for segment in operators[1:]]
+    if any(name in _ROW_BOUNDING_OPERATORS or name in _MULTI_RESULT_OPERATORS for name in names):
+        return query, False
+
+    guard = f"take {max_rows + 1}"
+    if names and names[-1] == "render":
+        statements[-1] = "|".join(operators[:-1]).rstrip() + f" | {guard} |" + operators[-1]
+    else:
+        statements[-1] = statements[-1].rstrip() + f" | {guard}"
+    return ";".join(statements).strip(), True
+
+
 def _normalize_cluster_uri(cluster_uri: str) -> str:
     """Normalize cluster URI for connection."""
     if not cluster_uri:
@@ -507,8 +625,8 @@ def _normalize_cluster_uri(cluster_uri: str) -> str:
 
 
 def _get_kusto_client(cluster_url: str) -> KustoClient:
-    """Create and authenticate a Kusto client."""
-    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_url)
+    """Create a Kusto client that takes tokens from the shared token cache."""
+    kcsb = KustoConnectionStringBuilder.with_token_provider(cluster_url, cluster_token_callback(cluster_url))
     return KustoClient(kcsb)
 
 def _parse_kusto_response(response) -> pd.DataFrame:
@@ -517,7 +635,11 @@ def _parse_kusto_response(response) -> pd.DataFrame:
         return pd.DataFrame()
 
     first_result = response.primary_results[0]
-    df = None
+
+    # Typed columns straight from the raw rows, without per-row dicts
+    df = decode_result_table(first_result)
+    if df is not None:
+        return df
 
     try:
         td = first_result.to_dict()
@@ -539,32 +661,38 @@ def _parse_kusto_response(response) -> pd.DataFrame:
             
     return df
 
-def _execute_kusto_query_sync(kql_query: str, cluster: str, database: str) -> pd.DataFrame:
+def _execute_kusto_query_sync(
+    kql_query: str,
+    cluster: str,
+    database: str,
+    properties: Optional[ClientRequestProperties] = None,
+) -> pd.DataFrame:
     """
     Core synchronous function to execute a KQL query against a Kusto cluster with SEM0100 retry logic.
+
+    ``properties`` carries the server timeout and client request id; without it
+    the query runs with DEFAULT_QUERY_TIMEOUT.
     """
+    if properties is None:
+        properties = build_request_properties(DEFAULT_QUERY_TIMEOUT)
     cluster_url = _normalize_cluster_uri(cluster)
     logger.info(f"Executing KQL on {cluster_url}/{database}: {kql_query[:150]}...")
     
-    client = _get_kusto_client(cluster_url)
-    try:
+    # The breaker fails fast while the cluster is known to be unhealthy
+    with get_circuit_breaker(cluster_url).guard(), get_client_pool().client(cluster_url, factory=_get_kusto_client) as client:
         is_mgmt_query = kql_query.strip().startswith('.')
         
         # First execution attempt
         try:
             if is_mgmt_query:
-                response = client.execute_mgmt(database, kql_query)
+                response = client.execute_mgmt(database, kql_query, properties)
             else:
-                response = client.execute(database, kql_query)
+                response = client.execute(database, kql_query, properties)
             
             df = _parse_kusto_response(response)
             logger.debug(f"Query returned {len(df)} rows.")
 
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(_post_execution_learning_bg(kql_query, cluster, database, df))
-            except RuntimeError:
-                logger.debug("No event loop running - skipping background learning task")
+            _schedule_post_execution_learning(kql_query, cluster, database, df)
                 
             return df
             
@@ -579,9 +707,9 @@ def _execute_kusto_query_sync(kql_query: str, cluster: str, database: str) -> pd
                 if bracketed_query != kql_query:
                     logger.debug(f"Retrying with bracketed identifiers: {bracketed_query[:150]}")
                     if is_mgmt_query:
-                        response = client.execute_mgmt(database, bracketed_query)
+                        response = client.execute_mgmt(database, bracketed_query, properties)
                     else:
-                        response = client.execute(database, bracketed_query)
+                        response = client.execute(database, bracketed_query, properties)
                     
                     df = _parse_kusto_response(response)
                     logger.info(f"SEM0100 retry successful - query returned {len(df)} rows")
@@ -591,10 +719,49 @@ def _execute_kusto_query_sync(kql_query: str, cluster: str, database: str) -> pd
             
             # Re-raise the original error if not retryable or retry failed
             raise
-            
-    finally:
-        if client:
-            client.close()
+
+
+async def _execute_kusto_query_async(
+    kql_query: str,
+    cluster: str,
+    database: str,
+    properties: Optional[ClientRequestProperties] = None,
+) -> pd.DataFrame:
+    """
+    Async counterpart of _execute_kusto_query_sync built on the native async transport.
+
+    Awaiting this coroutine holds no worker thread, and cancelling it aborts the
+    in-flight HTTP request (and asks the cluster to cancel the query).
+    """
+    if properties is None:
+        properties = build_request_properties(DEFAULT_QUERY_TIMEOUT)
+    cluster_url = _normalize_cluster_uri(cluster)
+    logger.info(f"Executing KQL (async) on {cluster_url}/{database}: {kql_query[:150]}...")
+    is_mgmt_query = kql_query.strip().startswith('.')
+
+    try:
+        response = await execute_kusto_async(
+            cluster_url, database, kql_query, is_mgmt=is_mgmt_query, properties=properties, max_retries=0
+        )
+    except KustoServiceError as e:
+        # Same SEM0100 auto-bracketing retry as the synchronous path
+        classification = classify_error_dynamically(str(e))
+        if not (classification['is_retryable'] and 'SEM0100' in str(e)):
+            raise
+        bracketed_query = bracket_suspect_identifiers(kql_query)
+        if bracketed_query == kql_query:
+            logger.warning("Auto-bracketing did not change the query, re-raising original error")
+            raise
+        logger.info(f"SEM0100 error detected, retrying with bracketed identifiers: {bracketed_query[:150]}")
+        response = await execute_kusto_async(
+            cluster_url, database, bracketed_query, is_mgmt=is_mgmt_query, properties=properties, max_retries=0
+        )
+        return _parse_kusto_response(response)
+
+    df = _parse_kusto_response(response)
+    logger.debug(f"Query returned {len(df)} rows.")
+    _schedule_post_execution_learning(kql_query, cluster, database, df)
+    return df
 
 
 def bracket_suspect_identifiers(query: str) -> str:
@@ -724,9 +891,29 @@ def validate_kql_query_advanced(query: str, cluster: str = None, database: str =
         }
 
 
-def kql_execute_tool(kql_query: str, cluster_uri: str = None, database: str = None) -> pd.DataFrame:
+def kql_execute_tool(
+    kql_query: str,
+    cluster_uri: str = None,
+    database: str = None,
+    cache_mode: str = "default",
+    row_limit: Optional[int] = None,
+    timeout_seconds: Optional[float] = None,
+    client_request_id: Optional[str] = None,
+) -> pd.DataFrame:
     """
     Enhanced KQL execution function with consolidated QueryProcessor pipeline.
+
+    ``cache_mode`` controls the result cache: "default" reads and writes it,
+    "bypass" skips it entirely, "refresh" re-executes and stores the fresh
+    result, and "only" raises ResultCacheMiss instead of executing.
+
+    ``row_limit`` caps queries without an explicit limit (defaults to
+    LIMITS["max_result_rows"]; 0 disables the guardrail). Results that hit
+    the cap carry ``attrs["truncated"]`` and ``attrs["row_limit"]``.
+
+    ``timeout_seconds`` is sent as the server timeout (defaults to
+    DEFAULT_QUERY_TIMEOUT), and ``client_request_id`` lets the caller cancel
+    the running query with ``.cancel query``.
     """
     try:
         # ENHANCED INPUT VALIDATION with detailed error messages
@@ -735,10 +922,34 @@ def kql_execute_tool(kql_query: str, cluster_uri: str = None, database: str = No
             raise ValueError("KQL query cannot be None or empty")
         
         original_query = kql_query
+        if row_limit is None:
+            row_limit = LIMITS.get("max_result_rows", 10000)
         
         # Get the QueryProcessor for consolidated processing
         processor = get_query_processor()
         
+        # RESULT CACHE LOOKUP before any processing or cluster round-trips
+        result_cache = get_result_cache()
+        cache_key = None
+        if cluster_uri and database and cache_mode != "bypass":
+            normalized_query = processor.clean(kql_query) if processor else clean_query_for_execution(kql_query)
+            if normalized_query and is_cacheable_query(normalized_query):
+                # Key on the guarded text so capped and uncapped runs are cached separately
+                cache_key = result_cache.make_key(cluster_uri, database, apply_row_limit(normalized_query, row_limit)[0])
+        
+        if cache_key is None:
+            result_cache.record_bypass()
+            if cache_mode == "only":
+                raise ResultCacheMiss("Query is not cacheable (management command, non-deterministic function or missing cluster/database)")
+        elif cache_mode != "refresh":
+            cached_df = result_cache.get(cache_key)
+            if cached_df is not None:
+                logger.info(f"Result cache hit for query on {cluster_uri}/{database}")
+                cached_df.attrs["cache_status"] = "hit"
+                return cached_df
+            if cache_mode == "only":
+                raise ResultCacheMiss("No cached result for this query")
+        
         if processor and cluster_uri and database:
             try:
                 # Use the QueryProcessor's consolidated pipeline
@@ -836,23 +1047,8 @@ def kql_execute_tool(kql_query: str, cluster_uri: str = None, database: str = No
                 else:
                     raise ValueError(f"Invalid KQL syntax and insufficient parameters for fallback: {validation_error}")
         
-        # Check if query already contains cluster/database specification
-        has_cluster_spec = "cluster(" in clean_query and "database(" in clean_query
-        
-        if has_cluster_spec:
-            # Query already has cluster/database - extract them and use the base query
-            try:
-                extracted_cluster, extracted_database = extract_cluster_and_database_from_query(clean_query)
-                cluster = cluster_uri or extracted_cluster
-                db = database or extracted_database
-            except Exception as extract_error:
-                logger.warning(f"Failed to extract cluster/database: {extract_error}")
-                cluster = cluster_uri
-                db = database
-        else:
-            # No cluster specification in query - use parameters
-            cluster = cluster_uri
-            db = database
+        # Parameters first, then any cluster/database specification in the query
+        cluster, db = resolve_execution_target(clean_query, cluster_uri, database)
         
         # ENHANCED PARAMETER VALIDATION with informative errors
         if not cluster:
@@ -876,19 +1072,37 @@ def kql_execute_tool(kql_query: str, cluster_uri: str = None, database: str = No
             logger.debug(f"Query normalized from: {original_query[:100]}... to: {clean_query[:100]}...")
         
         # Use "master" database for management commands that don't require specific database
-        db_for_execution = db if db else "master"
+        db_for_execution = db if db else DEFAULT_EXECUTION_DATABASE
+        
+        # ROW LIMIT GUARDRAIL so an unbounded query cannot pull millions of rows
+        clean_query, row_limit_applied = apply_row_limit(clean_query, row_limit)
+        if row_limit_applied:
+            logger.debug(f"Applied row limit guardrail of {row_limit} rows")
         
         # Execute with enhanced error handling that propagates KustoServiceError
         try:
-            return _execute_kusto_query_sync(clean_query, cluster, db_for_execution)
-        except KustoServiceError as e:
+            properties = build_request_properties(timeout_seconds or DEFAULT_QUERY_TIMEOUT, client_request_id)
+            df = _execute_kusto_query_sync(clean_query, cluster, db_for_execution, properties)
+        except (KustoServiceError, CircuitOpenError) as e:
             logger.error(f"Kusto service error during execution: {e}")
             raise  # Re-raise to be handled by the MCP tool
         except Exception as exec_error:
             logger.error(f"Generic query execution failed: {exec_error}")
             # For non-Kusto errors, return an empty DataFrame to avoid crashing
             return pd.DataFrame()
+        
+        if row_limit_applied and len(df) > row_limit:
+            logger.info(f"Result truncated to {row_limit} rows by the row limit guardrail")
+            df = df.iloc[:row_limit]
+            df.attrs["truncated"] = True
+            df.attrs["row_limit"] = row_limit
+        
+        if cache_key is not None and result_cache.put(cache_key, df):
+            logger.debug(f"Cached result ({len(df)} rows) for query on {cluster_uri}/{database}")
+        return df
             
+    except (ResultCacheMiss, CircuitOpenError):
+        raise
     except Exception as e:
         logger.error(f"kql_execute_tool failed pre-execution: {e}")
         logger.error(f"Original query was: {kql_query if 'kql_query' in locals() else 'Unknown'}")
@@ -897,96 +1111,60 @@ def kql_execute_tool(kql_query: str, cluster_uri: str = None, database: str = No
 
 
 
-async def _post_execution_learning_bg(query: str, cluster: str, database: str, df: pd.DataFrame):
+def _schedule_post_execution_learning(query: str, cluster: str, database: str, df: pd.DataFrame):
     """
-    Enhanced background learning task with automatic schema discovery triggering.
-    This runs asynchronously to avoid blocking query response.
+    Queue background learning for a successful query.
+
+    Only the query text, tables and the result's column names, types and row
+    count are queued; the DataFrame itself is not kept alive by learning.
     """
     try:
-        # Extract table names from the executed query using the enhanced parse_query_entities
-        from .utils import parse_query_entities
-        entities = parse_query_entities(query)
-        tables = entities.get("tables", [])
-        
-        # If no tables extracted, try fallback extraction
-        if not tables:
+        get_learning_pipeline().submit(LearningEvent.from_result(query, cluster, database, df))
+    except Exception as e:
+        logger.debug(f"Could not queue background learning: {e}")
+
+
+async def learn_from_execution(event: LearningEvent):
+    """
+    Learning pipeline handler: store the successful queries and trigger schema
+    discovery for the tables they use. Runs on a learning worker thread.
+    """
+    from .memory import get_memory_manager
+    memory_manager = get_memory_manager()
+
+    if not event.tables:
+        # Even without table extraction, store successful queries globally
+        for query in event.queries:
+            description = generate_query_description(query)
             try:
-                # Fallback: extract table names using simpler pattern matching
-                table_pattern = r'\b([A-Za-z_][A-Za-z0-9_]*)\s*\|'
-                fallback_tables = re.findall(table_pattern, query)
-                if fallback_tables:
-                    tables = fallback_tables[:1]  # Take first table found
-                    logger.debug(f"Fallback table extraction found: {tables}")
-                else:
-                    # Even without table extraction, store successful query globally
-                    logger.debug("No tables extracted but storing successful query globally")
-                    from .memory import get_memory_manager
-                    memory_manager = get_memory_manager()
-                    description = generate_query_description(query)
-                    try:
-                        # Store in global successful queries without table association
-                        memory_manager.add_global_successful_query(cluster, database, query, description)
-                        logger.debug(f"Stored global successful query: {description}")
-                    except Exception as e:
-                        logger.debug(f"Failed to store global successful query: {e}")
-                    return
-            except Exception as fallback_error:
-                logger.debug(f"Fallback table extraction failed: {fallback_error}")
-                return
-        
-        # Store successful query for each table involved
-        from .memory import get_memory_manager
-        memory_manager = get_memory_manager()
+                memory_manager.add_global_successful_query(event.cluster, event.database, query, description)
+                logger.debug(f"Stored global successful query: {description}")
+            except Exception as e:
+                logger.debug(f"Failed to store global successful query: {e}")
+        return
+
+    # Store successful queries for each table involved
+    for query in event.queries:
         description = generate_query_description(query)
-        
-        for table in tables:
+        for table in event.tables:
             try:
-                # Add successful query to table-specific memory
-                memory_manager.add_successful_query(cluster, database, table, query, description)
+                memory_manager.add_successful_query(event.cluster, event.database, table, query, description)
                 logger.debug(f"Stored successful query for {table}: {description}")
             except Exception as e:
                 logger.debug(f"Failed to store successful query for {table}: {e}")
-        
-        # ENHANCED: Force schema discovery for all tables involved in the query
-        await _ensure_schema_discovered(cluster, database, tables)
-                
-    except Exception as e:
-        logger.debug(f"Background learning task failed: {e}")
+
+    # Force schema discovery for all tables involved in the queries
+    await _ensure_schema_discovered(event.cluster, event.database, list(event.tables))
 
 
 async def _ensure_schema_discovered(cluster_uri: str, database: str, tables: List[str]):
     """
-    Force schema discovery if not in memory.
-    This is the implementation recommended in the analysis.
+    Discover schemas missing from memory through the shared discovery coordinator,
+    which dedupes concurrent discoveries and cools down tables that keep failing.
     """
-    from .memory import get_memory_manager
-    from .utils import SchemaManager
-    
-    memory = get_memory_manager()
-    schema_manager = SchemaManager(memory)
-    
-    for table in tables:
-        try:
-            # Check if schema exists in memory
-            schema = memory.get_schema(cluster_uri, database, table, enable_fallback=False)
-            
-            if not schema or not schema.get("columns"):
-                # Trigger live discovery with force refresh
-                logger.info(f"Auto-triggering schema discovery for {database}.{table}")
-                discovered_schema = await schema_manager.get_table_schema(
-                    cluster_uri, database, table, force_refresh=True
-                )
-                
-                if discovered_schema and discovered_schema.get("columns"):
-                    logger.info(f"Successfully auto-discovered schema for {table} with {len(discovered_schema['columns'])} columns")
-                else:
-                    logger.warning(f"Auto-discovery failed for {table} - no columns found")
-            else:
-                logger.debug(f"Schema already exists for {table}, skipping auto-discovery")
-                
-        except Exception as e:
-            logger.warning(f"Auto schema discovery failed for {table}: {e}")
-            # Continue with other tables even if one fails
+    from .discovery import get_discovery_coordinator
+
+    return await get_discovery_coordinator().ensure_tables(cluster_uri, database, tables)
 
 def get_knowledge_corpus():
     """Backward-compatible wrapper to memory.get_knowledge_corpus"""
@@ -1043,34 +1221,13 @@ async def execute_kql_query(
         if not cluster or not database:
             raise ValueError("Query must include cluster and database specification")
         
-        # Execute using the core sync function wrapped in asyncio.to_thread
-        df = await asyncio.to_thread(_execute_kusto_query_sync, query, cluster, database)
+        # Execute on the native async transport (no worker thread per request)
+        df = await _execute_kusto_query_async(query, cluster, database)
         
         # Return list format for test compatibility with proper serialization
         if hasattr(df, 'to_dict'):
             # Convert DataFrame to serializable records
-            records = []
-            try:
-                for _, row in df.iterrows():
-                    record = {}
-                    for col, value in row.items():
-                        if pd.isna(value):
-                            record[col] = None
-                        elif hasattr(value, 'isoformat'):  # Timestamp objects
-                            record[col] = value.isoformat()
-                        elif hasattr(value, 'strftime'):  # datetime objects
-                            record[col] = value.strftime('%Y-%m-%d %H:%M:%S')
-                        elif isinstance(value, type):  # type objects
-                            record[col] = value.__name__
-                        elif hasattr(value, 'item'):  # numpy types
-                            record[col] = value.item()
-                        else:
-                            record[col] = value
-                    records.append(record)
-            except Exception as e:
-                logger.warning(f"DataFrame serialization failed: {e}")
-                # Fallback to string conversion
-                records = df.astype(str).to_dict("records")
+            records = dataframe_to_records(df)
             
             if visualize and records:
                 # Add simple visualization marker for tests
@@ -0,0 +1,201 @@
+"""
+Cluster Health Module
+
+This module keeps a per-cluster health record that is refreshed in the
+background. Request paths only read the cached record and, when it is stale,
+ask for a probe; they never wait on a connectivity check themselves.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from .connection import get_client_pool, normalize_cluster_url
+from .constants import CONNECTION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Callable that raises if the cluster cannot be reached
+HealthProbe = Callable[[str], None]
+
+
+@dataclass
+class ClusterHealth:
+    """Last known health of one cluster."""
+    cluster_url: str
+    healthy: Optional[bool] = None  # None until the first probe or call completes
+    checked_at: float = 0.0
+    latency_ms: Optional[float] = None
+    error: str = ""
+    consecutive_failures: int = 0
+    probes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "age_seconds": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+            "latency_ms": self.latency_ms,
+            "error": self.error[:200] if self.error else None,
+            "consecutive_failures": self.consecutive_failures,
+            "probes": self.probes,
+        }
+
+
+def probe_cluster(cluster_url: str) -> None:
+    """Run ``.show version`` on a pooled client, bounded by a server timeout."""
+    from .async_client import build_request_properties
+
+    properties = build_request_properties(CONNECTION_CONFIG.get("connection_validation_timeout", 5.0))
+    with get_client_pool().client(cluster_url) as client:
+        response = client.execute_mgmt("NetDefaultDB", ".show version", properties)
+        if not response or not response.primary_results:
+            raise RuntimeError("Health probe returned no results")
+
+
+class ClusterHealthMonitor:
+    """
+    Background health checker with a TTL'd record per cluster.
+
+    ``check()`` is cheap and non-blocking: it returns the cached record and
+    schedules a probe on a background worker when the record is older than
+    ``ttl_seconds``, or when the last probe failed and the failure back-off
+    (``failure_retry`` doubling up to the TTL) has passed. Real calls can report
+    their outcome with ``record_success``/``record_failure`` so a busy cluster
+    is rarely probed at all.
+    """
+
+    def __init__(
+        self,
+        probe: Optional[HealthProbe] = None,
+        ttl_seconds: Optional[float] = None,
+        failure_retry: Optional[float] = None,
+        max_workers: int = 2,
+    ):
+        self._probe = probe or probe_cluster
+        self.ttl_seconds = CONNECTION_CONFIG.get("health_check_ttl", 300.0) if ttl_seconds is None else ttl_seconds
+        self.failure_retry = (
+            CONNECTION_CONFIG.get("health_check_failure_retry", 15.0) if failure_retry is None else failure_retry
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kql-health")
+        self._lock = threading.Lock()
+        self._records: Dict[str, ClusterHealth] = {}
+        self._pending: set = set()
+        self._closed = False
+
+    def check(self, cluster_url: str) -> ClusterHealth:
+        """Return the cached health record, scheduling a background probe if it is due."""
+        key = normalize_cluster_url(cluster_url)
+        with self._lock:
+            record = self._records.setdefault(key, ClusterHealth(key))
+            due = self._probe_due_locked(record)
+            if due:
+                self._pending.add(key)
+            snapshot = ClusterHealth(**vars(record))
+        if due:
+            try:
+                self._pool.submit(self._run_probe, key)
+            except RuntimeError:
+                with self._lock:
+                    self._pending.discard(key)
+        return snapshot
+
+    def record_success(self, cluster_url: str, latency_ms: Optional[float] = None) -> None:
+        """Mark a cluster healthy after a successful real call."""
+        key = normalize_cluster_url(cluster_url)
+        with self._lock:
+            record = self._records.setdefault(key, ClusterHealth(key))
+            self._mark_locked(record, True, latency_ms, "")
+
+    def record_failure(self, cluster_url: str, error: BaseException) -> None:
+        """Mark a cluster unhealthy; the next ``check`` re-probes after the back-off."""
+        key = normalize_cluster_url(cluster_url)
+        with self._lock:
+            record = self._records.setdefault(key, ClusterHealth(key))
+            self._mark_locked(record, False, None, str(error))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return every cluster's health record."""
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "probes_pending": len(self._pending),
+                "clusters": {key: record.to_dict() for key, record in self._records.items()},
+            }
+
+    def shutdown(self) -> None:
+        """Stop the probe workers; in-flight probes are abandoned."""
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _probe_due_locked(self, record: ClusterHealth) -> bool:
+        if self._closed or record.cluster_url in self._pending:
+            return False
+        if record.healthy is None and not record.checked_at:
+            return True
+        age = time.monotonic() - record.checked_at
+        if record.healthy:
+            return age >= self.ttl_seconds
+        backoff = self.failure_retry * (2 ** max(0, record.consecutive_failures - 1))
+        return age >= min(backoff, self.ttl_seconds)
+
+    def _run_probe(self, key: str) -> None:
+        started = time.monotonic()
+        error = None
+        try:
+            self._probe(key)
+        except Exception as e:
+            error = e
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+
+        with self._lock:
+            self._pending.discard(key)
+            record = self._records.setdefault(key, ClusterHealth(key))
+            record.probes += 1
+            self._mark_locked(record, error is None, latency_ms if error is None else None, str(error or ""))
+        if error is None:
+            logger.debug(f"Health probe for {key} passed in {latency_ms}ms")
+        else:
+            logger.warning(f"Health probe for {key} failed: {error}")
+
+    @staticmethod
+    def _mark_locked(record: ClusterHealth, healthy: bool, latency_ms: Optional[float], error: str) -> None:
+        record.healthy = healthy
+        record.checked_at = time.monotonic()
+        record.error = error
+        if healthy:
+            record.consecutive_failures = 0
+            if latency_ms is not None:
+                record.latency_ms = latency_ms
+        else:
+            record.consecutive_failures += 1
+
+
+# Global health monitor shared by schema discovery and query execution
+_health_monitor: Optional[ClusterHealthMonitor] = None
+_health_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> ClusterHealthMonitor:
+    """Get the process-wide cluster health monitor, creating it on first use."""
+    global _health_monitor
+    if _health_monitor is None:
+        with _health_monitor_lock:
+            if _health_monitor is None:
+                _health_monitor = ClusterHealthMonitor()
+    return _health_monitor
+
+
+def shutdown_health_monitor() -> None:
+    """Stop the background health checker and reset the global monitor."""
+    global _health_monitor
+    with _health_monitor_lock:
+        monitor, _health_monitor = _health_monitor, None
+    if monitor is not None:
+        monitor.shutdown()
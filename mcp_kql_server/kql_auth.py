@@ -1,46 +1,352 @@
 """
 KQL Authentication Module
 
-This module handles Azure CLI authentication for KQL cluster access.
-Provides cached authentication checking and device code flow authentication.
+This module handles Azure authentication for KQL cluster access.
+Provides cached authentication checking, device code flow authentication and
+an in-process token cache shared by every Kusto client.
 
 Author: Arjun Trivedi
 Email: arjuntrivedi42@yahoo.com
 """
 
+import asyncio
+import json
 import subprocess
 import platform
 import os
 import logging
+import threading
+import time
+from datetime import datetime
 from functools import lru_cache
+from urllib.parse import urlparse
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional
+
+from azure.core.credentials import AccessToken
+
+from .constants import AUTH_CONFIG
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Public-cloud Kusto resource, used for the startup check of non-CLI credentials when tokens are per cluster
+DEFAULT_TOKEN_RESOURCE = "https://kusto.kusto.windows.net"
+
+
+def _azure_cli_credential():
+    from azure.identity import AzureCliCredential
+    return AzureCliCredential()
+
+
+def _default_credential():
+    from azure.identity import DefaultAzureCredential
+    return DefaultAzureCredential()
+
+
+def _managed_identity_credential():
+    from azure.identity import ManagedIdentityCredential
+    return ManagedIdentityCredential(client_id=os.environ.get("AZURE_CLIENT_ID"))
+
+
+def _environment_credential():
+    from azure.identity import EnvironmentCredential
+    return EnvironmentCredential()
+
+
+def _interactive_credential():
+    from azure.identity import InteractiveBrowserCredential
+    return InteractiveBrowserCredential()
+
+
+# Credential factories keyed by credential name; register_credential() adds more
+_CREDENTIAL_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "azure_cli": _azure_cli_credential,
+    "default": _default_credential,
+    "managed_identity": _managed_identity_credential,
+    "environment": _environment_credential,
+    "interactive": _interactive_credential,
+}
+
+# auth_method values accepted by the tools, mapped to the credential they use.
+# "device" logs in with `az login --use-device-code` at startup and then reads
+# tokens from the Azure CLI, so it shares the CLI credential.
+AUTH_METHODS: Dict[str, str] = {
+    "device": "azure_cli",
+    "cli": "azure_cli",
+    "azure_cli": "azure_cli",
+    "default": "default",
+    "managed_identity": "managed_identity",
+    "environment": "environment",
+    "interactive": "interactive",
+}
+
+
+def register_credential(name: str, factory: Callable[[], Any], aliases: tuple = ()) -> None:
+    """Register an azure-identity style credential factory under an auth_method name."""
+    _CREDENTIAL_FACTORIES[name] = factory
+    for method in (name, *aliases):
+        AUTH_METHODS[method] = name
+
+
+def token_scope(cluster_url: str) -> str:
+    """
+    AAD scope requested for a cluster.
+
+    Defaults to the cluster's own origin, the audience the cluster accepts in
+    any cloud; AUTH_CONFIG["token_resource"] overrides it for every cluster.
+    """
+    resource = AUTH_CONFIG.get("token_resource")
+    if not resource:
+        resource = cluster_url.strip()
+        if not resource.startswith(("https://", "http://")):
+            resource = f"https://{resource}"
+        parsed = urlparse(resource)
+        if parsed.netloc:
+            # Drop any database path or query from the cluster URL
+            resource = f"{parsed.scheme}://{parsed.netloc}"
+    return f"{resource.rstrip('/')}/.default"
+
+
+class AzureTokenProvider:
+    """
+    In-memory cache of access tokens per AAD scope, backed by one credential.
+
+    Tokens are fetched once and reused by every client. A token entering the
+    last ``refresh_margin`` seconds of its lifetime is still handed out while a
+    single background refresh replaces it, so requests only wait on the
+    credential when no usable token is cached.
+    """
+
+    def __init__(
+        self,
+        credential_factory: Callable[[], Any],
+        name: str = "",
+        refresh_margin: Optional[float] = None,
+        min_lifetime: Optional[float] = None,
+    ):
+        self.name = name
+        self._credential_factory = credential_factory
+        self._credential = None
+        self.refresh_margin = AUTH_CONFIG.get("refresh_margin", 300.0) if refresh_margin is None else refresh_margin
+        self.min_lifetime = AUTH_CONFIG.get("min_token_lifetime", 30.0) if min_lifetime is None else min_lifetime
+        self._lock = threading.Lock()
+        self._scope_locks: Dict[str, threading.Lock] = {}
+        self._tokens: Dict[str, AccessToken] = {}
+        self._refreshing: set = set()
+        self._counters = {"hits": 0, "fetches": 0, "background_refreshes": 0, "failures": 0}
+
+    @property
+    def credential(self) -> Any:
+        with self._lock:
+            if self._credential is None:
+                self._credential = self._credential_factory()
+            return self._credential
+
+    def get_token(self, scope: str) -> str:
+        """Return a bearer token for ``scope``, fetching it only when none is usable."""
+        token = self._cached(scope)
+        if token is not None:
+            return token
+
+        with self._scope_lock(scope):
+            # Another caller may have fetched it while we waited
+            token = self._cached(scope)
+            if token is not None:
+                return token
+            return self._fetch(scope).token
+
+    async def __call__(self, scope: str) -> str:
+        """Async form used by AsyncKustoClient; credential calls stay off the event loop."""
+        token = self._cached(scope)
+        if token is not None:
+            return token
+        return await asyncio.to_thread(self.get_token, scope)
+
+    def seed(self, scope: str, token: str, expires_on: float) -> None:
+        """Store a token obtained elsewhere, e.g. by the startup Azure CLI check."""
+        with self._lock:
+            self._tokens[scope] = AccessToken(token, int(expires_on))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "credential": self.name,
+                "scopes": {scope: {"expires_in_seconds": int(token.expires_on - now)}
+                           for scope, token in self._tokens.items()},
+                **self._counters,
+            }
+
+    def _cached(self, scope: str) -> Optional[str]:
+        with self._lock:
+            token = self._tokens.get(scope)
+            if token is None:
+                return None
+            remaining = token.expires_on - time.time()
+            if remaining <= self.min_lifetime:
+                return None
+            self._counters["hits"] += 1
+            refresh = remaining <= self.refresh_margin and scope not in self._refreshing
+            if refresh:
+                self._refreshing.add(scope)
+        if refresh:
+            threading.Thread(target=self._background_refresh, args=(scope,), name="kql-token-refresh", daemon=True).start()
+        return token.token
+
+    def _scope_lock(self, scope: str) -> threading.Lock:
+        with self._lock:
+            return self._scope_locks.setdefault(scope, threading.Lock())
+
+    def _fetch(self, scope: str) -> AccessToken:
+        try:
+            token = self.credential.get_token(scope)
+        except Exception:
+            with self._lock:
+                self._counters["failures"] += 1
+            raise
+        with self._lock:
+            self._tokens[scope] = token
+            self._counters["fetches"] += 1
+        logger.debug("Fetched %s token for %s", self.name or "Azure", scope)
+        return token
+
+    def _background_refresh(self, scope: str) -> None:
+        try:
+            with self._scope_lock(scope):
+                self._fetch(scope)
+            with self._lock:
+                self._counters["background_refreshes"] += 1
+        except Exception as e:
+            # The current token stays in use until it is too close to expiry
+            logger.warning("Background token refresh for %s failed: %s", scope, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(scope)
+
+
+# Shared token providers, one per credential, and the auth method in effect
+_token_providers: Dict[str, AzureTokenProvider] = {}
+_token_providers_lock = threading.Lock()
+_auth_method: Optional[str] = None
+
+
+def get_auth_method() -> str:
+    """Return the auth method in effect (AUTH_CONFIG["default_method"] until changed)."""
+    return _auth_method or AUTH_CONFIG.get("default_method", "device")
+
+
+def set_auth_method(auth_method: str) -> str:
+    """
+    Select the credential used for new tokens by every client.
+
+    The choice is process-wide, so it is made at startup (KQL_AUTH_METHOD)
+    and never from a tool call.
+
+    Raises:
+        ValueError: If the method is not one of AUTH_METHODS.
+    """
+    global _auth_method
+    method = (auth_method or "").strip().lower()
+    if method not in AUTH_METHODS:
+        raise ValueError(f"Unknown auth_method '{auth_method}'. Supported: {', '.join(sorted(AUTH_METHODS))}")
+    if method != get_auth_method():
+        logger.info("Switching authentication method to %s", method)
+    _auth_method = method
+    return method
+
+
+def get_token_provider(auth_method: Optional[str] = None) -> AzureTokenProvider:
+    """Get the shared token provider for an auth method (the current one by default)."""
+    method = auth_method or get_auth_method()
+    credential_name = AUTH_METHODS.get(method)
+    if credential_name is None:
+        raise ValueError(f"Unknown auth_method '{method}'. Supported: {', '.join(sorted(AUTH_METHODS))}")
+    provider = _token_providers.get(credential_name)
+    if provider is None:
+        with _token_providers_lock:
+            provider = _token_providers.get(credential_name)
+            if provider is None:
+                provider = AzureTokenProvider(_CREDENTIAL_FACTORIES[credential_name], name=credential_name)
+                _token_providers[credential_name] = provider
+    return provider
+
+
+def cluster_token_callback(cluster_url: str) -> Callable[[], str]:
+    """
+    Parameterless token callback for KustoConnectionStringBuilder.with_token_provider.
+
+    The provider is resolved on every call, so pooled clients follow
+    set_auth_method() without being rebuilt.
+    """
+    scope = token_scope(cluster_url)
+    return lambda: get_token_provider().get_token(scope)
+
+
+def reset_token_providers() -> None:
+    """Drop every cached token and credential and restore the configured auth method."""
+    global _auth_method
+    with _token_providers_lock:
+        _token_providers.clear()
+        _auth_method = None
+
+
+def _parse_cli_token(output: str) -> Optional[AccessToken]:
+    """Parse `az account get-access-token --output json` into an AccessToken."""
+    try:
+        payload = json.loads(output)
+        token = payload["accessToken"]
+        if "expires_on" in payload:
+            expires_on = float(payload["expires_on"])
+        else:
+            # Older CLI versions only report a local timestamp
+            expires_on = datetime.strptime(payload["expiresOn"], "%Y-%m-%d %H:%M:%S.%f").timestamp()
+        return AccessToken(token, int(expires_on))
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
 @lru_cache(maxsize=1)
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
 def kql_auth():
     """
-    Check if user is authenticated with Azure CLI.
-    
+    Check if user is authenticated with the configured credential.
+
+    For Azure CLI based methods this is a single `az account get-access-token`
+    call. When AUTH_CONFIG["token_resource"] is set, the token is requested
+    for it and seeds the shared token cache; otherwise tokens are per cluster
+    and the CLI's default resource is only used to check the login.
+
     Returns:
         dict: Authentication status and message
     """
+    method = get_auth_method()
+    resource = AUTH_CONFIG.get("token_resource")
+    if AUTH_METHODS.get(method) != "azure_cli":
+        logger.info("Checking %s authentication...", method)
+        try:
+            get_token_provider(method).get_token(token_scope(resource or DEFAULT_TOKEN_RESOURCE))
+            logger.info("Acquired a token with %s credentials.", method)
+            return {"authenticated": True, "message": "User is authenticated."}
+        except Exception as e:
+            logger.warning("User is not authenticated: %s", str(e))
+            return {"authenticated": False, "message": f"User is not authenticated: {e}"}
+
     logger.info("Checking Azure CLI authentication...")
     az_command = "az.cmd" if platform.system() == "Windows" else "az"
+    command = [az_command, "account", "get-access-token", "--output", "json"]
+    if resource:
+        command += ["--resource", resource.rstrip("/")]
     
     try:
-        env = os.environ.copy()
-        subprocess.run(
-            [az_command, "config", "set", "core.login_experience_v2=off"],
-            env=env, capture_output=True, text=True, check=True
-        )
-        subprocess.run(
-            [az_command, "account", "get-access-token"],
-            capture_output=True, text=True, check=True
-        )
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        token = _parse_cli_token(result.stdout) if resource else None
+        if token is not None:
+            get_token_provider(method).seed(token_scope(resource), token.token, token.expires_on)
         logger.info("User is authenticated with Azure CLI.")
         return {"authenticated": True, "message": "User is authenticated."}
     except subprocess.CalledProcessError as e:
@@ -97,6 +403,11 @@ def authenticate():
     if auth_status["authenticated"]:
         logger.info("Already authenticated to Azure.")
         return auth_status
+
+    if AUTH_METHODS.get(get_auth_method()) != "azure_cli":
+        # Device code login only helps the Azure CLI credential
+        logger.error("Authentication failed: %s", auth_status["message"])
+        return auth_status
     
     logger.info("Not authenticated. Initiating Azure login...")
     auth_status = trigger_az_cli_auth()
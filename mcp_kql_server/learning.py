@@ -0,0 +1,275 @@
+"""
+Learning Pipeline Module
+
+This module feeds successful query executions to the memory and schema
+discovery layers without holding up the query. Events carry only execution
+metadata (query text, tables, column names and types, row count), never the
+result rows, and are processed by a fixed set of worker threads from a
+bounded queue.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .constants import LEARNING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Processes one event; may be a plain function or a coroutine function
+LearningHandler = Callable[["LearningEvent"], Union[None, Awaitable[None]]]
+
+# Upper bound on remembered (tables, query) pairs used for deduplication
+_MAX_RECENT = 4096
+
+
+def extract_learning_tables(query: str) -> List[str]:
+    """Tables referenced by a query, falling back to the first ``Name |`` pattern."""
+    from .utils import parse_query_entities
+
+    try:
+        tables = parse_query_entities(query).get("tables", [])
+    except Exception as e:
+        logger.debug(f"Table extraction failed for learning: {e}")
+        tables = []
+    if not tables:
+        tables = re.findall(r'\b([A-Za-z_][A-Za-z0-9_]*)\s*\|', query)[:1]
+    return list(dict.fromkeys(tables))
+
+
+@dataclass
+class LearningEvent:
+    """Metadata of one successful execution; the result rows are never kept."""
+    cluster: str
+    database: str
+    queries: List[str]
+    tables: Tuple[str, ...] = ()
+    columns: Tuple[Tuple[str, str], ...] = ()
+    row_count: int = 0
+    occurrences: int = 1
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def query(self) -> str:
+        return self.queries[0]
+
+    @property
+    def key(self) -> Tuple[str, str, Tuple[str, ...]]:
+        # Events for the same tables merge; table-less queries merge per query text
+        return (self.cluster.lower(), self.database.lower(), self.tables or (self.query,))
+
+    @classmethod
+    def from_result(cls, query: str, cluster: str, database: str, df: Any = None) -> "LearningEvent":
+        """Build an event from a result frame, keeping only its shape."""
+        columns: Tuple[Tuple[str, str], ...] = ()
+        row_count = 0
+        if df is not None:
+            columns = tuple((str(name), str(dtype)) for name, dtype in df.dtypes.items())
+            row_count = len(df)
+        return cls(
+            cluster=cluster,
+            database=database,
+            queries=[query],
+            tables=tuple(extract_learning_tables(query)),
+            columns=columns,
+            row_count=row_count,
+        )
+
+
+class LearningPipeline:
+    """
+    Bounded queue of learning events served by a fixed pool of worker threads.
+
+    ``submit`` never blocks. An event for tables that already have an event
+    waiting is merged into it (up to ``max_queries_per_event`` distinct
+    queries), a query learned for the same tables within ``dedupe_seconds`` is
+    skipped, and an event arriving while the queue is full is dropped. Each
+    worker runs coroutine handlers on its own event loop.
+    """
+
+    def __init__(
+        self,
+        handler: LearningHandler,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_queries_per_event: Optional[int] = None,
+        dedupe_seconds: Optional[float] = None,
+    ):
+        self._handler = handler
+        self.queue_size = max(1, int(LEARNING_CONFIG.get("queue_size", 256) if queue_size is None else queue_size))
+        self.workers = max(1, int(LEARNING_CONFIG.get("workers", 2) if workers is None else workers))
+        self.max_queries_per_event = (
+            LEARNING_CONFIG.get("max_queries_per_event", 5) if max_queries_per_event is None else max_queries_per_event
+        )
+        self.dedupe_seconds = LEARNING_CONFIG.get("dedupe_seconds", 300.0) if dedupe_seconds is None else dedupe_seconds
+
+        self._queue: "queue.Queue[Tuple[str, str, Tuple[str, ...]]]" = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, Tuple[str, ...]], LearningEvent] = {}
+        self._recent: "OrderedDict[Tuple[Any, str], float]" = OrderedDict()
+        self._closed = False
+        self._counters = {
+            "submitted": 0,
+            "merged": 0,
+            "deduplicated": 0,
+            "dropped": 0,
+            "processed": 0,
+            "failed": 0,
+        }
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"kql-learning-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, event: LearningEvent) -> bool:
+        """Queue an event without blocking; returns False if it was skipped or dropped."""
+        key = event.key
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return False
+            self._counters["submitted"] += 1
+
+            event.queries = [q for q in event.queries if not self._recently_learned_locked(key, q, now)]
+            if not event.queries:
+                self._counters["deduplicated"] += 1
+                return False
+
+            pending = self._pending.get(key)
+            if pending is not None:
+                for q in event.queries:
+                    if q not in pending.queries and len(pending.queries) < self.max_queries_per_event:
+                        pending.queries.append(q)
+                pending.occurrences += event.occurrences
+                pending.columns = event.columns or pending.columns
+                pending.row_count = event.row_count
+                self._counters["merged"] += 1
+                return True
+
+            try:
+                self._queue.put_nowait(key)
+            except queue.Full:
+                self._counters["dropped"] += 1
+                logger.debug(f"Learning queue full, dropped event for {event.tables or event.query[:80]}")
+                return False
+            self._pending[key] = event
+            return True
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued event has been processed."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0:
+                return True
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue depth and event counters."""
+        with self._lock:
+            return {
+                "queued": len(self._pending),
+                "queue_size": self.queue_size,
+                "workers": self.workers,
+                **self._counters,
+            }
+
+    def shutdown(self, wait: bool = False, timeout: float = 5.0) -> None:
+        """Stop accepting events and discard anything still queued."""
+        with self._lock:
+            self._closed = True
+            dropped = len(self._pending)
+            self._pending.clear()
+        if dropped:
+            logger.debug(f"Discarded {dropped} pending learning events on shutdown")
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
+
+    def _recently_learned_locked(self, key: Any, query: str, now: float) -> bool:
+        learned_at = self._recent.get((key, query))
+        return learned_at is not None and now - learned_at < self.dedupe_seconds
+
+    def _remember_locked(self, event: LearningEvent) -> None:
+        now = time.monotonic()
+        for q in event.queries:
+            self._recent[(event.key, q)] = now
+            self._recent.move_to_end((event.key, q))
+        while len(self._recent) > _MAX_RECENT:
+            self._recent.popitem(last=False)
+
+    def _worker(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    key = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._closed:
+                        break
+                    continue
+                try:
+                    with self._lock:
+                        event = self._pending.pop(key, None)
+                    if event is not None:
+                        self._process(loop, event)
+                finally:
+                    self._queue.task_done()
+        finally:
+            try:
+                from .async_client import close_async_clients
+                loop.run_until_complete(close_async_clients())
+            except Exception as e:
+                logger.debug(f"Error closing learning worker clients: {e}")
+            loop.close()
+
+    def _process(self, loop: asyncio.AbstractEventLoop, event: LearningEvent) -> None:
+        try:
+            result = self._handler(event)
+            if asyncio.iscoroutine(result):
+                loop.run_until_complete(result)
+        except Exception as e:
+            with self._lock:
+                self._counters["failed"] += 1
+            logger.debug(f"Learning from execution failed: {e}")
+            return
+        with self._lock:
+            self._counters["processed"] += 1
+            self._remember_locked(event)
+
+
+# Global learning pipeline fed by query execution
+_learning_pipeline: Optional[LearningPipeline] = None
+_learning_pipeline_lock = threading.Lock()
+
+
+def get_learning_pipeline() -> LearningPipeline:
+    """Get the process-wide learning pipeline, creating it on first use."""
+    global _learning_pipeline
+    if _learning_pipeline is None:
+        with _learning_pipeline_lock:
+            if _learning_pipeline is None:
+                # Imported lazily: execute_kql submits to this module
+                from .execute_kql import learn_from_execution
+                _learning_pipeline = LearningPipeline(learn_from_execution)
+    return _learning_pipeline
+
+
+def shutdown_learning_pipeline() -> None:
+    """Stop the learning workers and reset the global pipeline."""
+    global _learning_pipeline
+    with _learning_pipeline_lock:
+        pipeline, _learning_pipeline = _learning_pipeline, None
+    if pipeline is not None:
+        pipeline.shutdown()
@@ -6,22 +6,48 @@ Author: Arjun Trivedi
 Email: arjuntrivedi42@yahoo.com
 """
 
+import asyncio
 import json
 import logging
 import re
+import time
 from datetime import datetime
 from typing import Dict, Optional, List, Any
 
 import pandas as pd
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
 
 from .constants import (
+    FILE_OUTPUT_FORMATS,
+    LIMITS,
+    RESULT_STORE_CONFIG,
     SERVER_NAME
 )
-from .execute_kql import kql_execute_tool
-from .memory import get_memory_manager
-from .utils import bracket_if_needed, SchemaManager, ErrorHandler, QueryProcessor
-from .kql_auth import authenticate_kusto
+from .async_client import new_request_id, schedule_cancel_query
+from .concurrency import get_query_executor, get_single_flight, shutdown_query_executor
+from .connection import (
+    CircuitOpenError,
+    get_circuit_breaker_stats,
+    get_client_pool,
+    normalize_cluster_url,
+    shutdown_client_pool,
+)
+from .discovery import get_discovery_coordinator
+from .execute_kql import DEFAULT_EXECUTION_DATABASE, kql_execute_tool, resolve_execution_target
+from .health import get_health_monitor, shutdown_health_monitor
+from .learning import get_learning_pipeline, shutdown_learning_pipeline
+from .memory import get_memory_manager, shutdown_memory_manager
+from .results import (
+    CACHE_MODES,
+    ResultCacheMiss,
+    ResultNotFound,
+    dataframe_to_records,
+    get_result_cache,
+    get_result_store,
+    shutdown_result_store,
+)
+from .utils import bracket_if_needed, get_schema_manager, ErrorHandler, QueryProcessor
+from .kql_auth import authenticate_kusto, get_auth_method, get_token_provider
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +55,7 @@ mcp = FastMCP(name=SERVER_NAME)
 
 # Global manager instances
 memory_manager = get_memory_manager()
-schema_manager = SchemaManager(memory_manager)
+schema_manager = get_schema_manager()
 query_processor = QueryProcessor(memory_manager)
 
 # Global kusto manager - will be set at startup
@@ -41,11 +67,16 @@ async def execute_kql_query(
     query: str,
     cluster_url: str,
     database: str,
-    auth_method: str = "device",
+    auth_method: Optional[str] = None,
     output_format: str = "json",
     generate_query: bool = False,
     table_name: Optional[str] = None,
-    use_live_schema: bool = True
+    use_live_schema: bool = True,
+    cache: str = "default",
+    page_size: Optional[int] = None,
+    enforce_row_limit: bool = True,
+    timeout_seconds: Optional[int] = None,
+    ctx: Optional[Context] = None
 ) -> str:
     """
     Execute a KQL query with optional query generation from natural language.
@@ -54,11 +85,23 @@ async def execute_kql_query(
         query: KQL query to execute, or natural language description if generate_query=True.
         cluster_url: Kusto cluster URL.
         database: Database name.
-        auth_method: Authentication method (ignored, uses startup auth).
-        output_format: Output format (json, csv, table).
+        auth_method: Authentication method (ignored; the server's credential is chosen at
+            startup with KQL_AUTH_METHOD and shared by every session).
+        output_format: Output format (json, csv, table, arrow, parquet). arrow/parquet write the
+            result to a file on the server and return its path instead of inline rows.
         generate_query: If True, treat 'query' as natural language and generate KQL.
         table_name: Target table name for query generation (optional).
         use_live_schema: Whether to use live schema discovery for query generation.
+        cache: Result cache mode: "default" (read and write), "bypass" (always execute,
+            don't store), "refresh" (execute and overwrite), "only" (never execute).
+        page_size: Rows returned inline for JSON output. Larger results are kept on the
+            server and the response carries a result_id/next_cursor for fetch_result_page.
+            Defaults to the configured page size; 0 returns every row inline.
+        enforce_row_limit: Cap queries without an explicit take/limit/top at the server's row limit
+            (the response reports truncated=true when the cap was hit). Set False to opt out.
+        timeout_seconds: Server-side timeout for the query (defaults to the server's query timeout).
+            Cancelling the tool call also cancels the query on the cluster.
+        ctx: MCP request context (injected by FastMCP), used for fair scheduling between sessions.
 
     Returns:
         JSON string with query results or generated query.
@@ -76,6 +119,23 @@ async def execute_kql_query(
                 ]
             })
 
+        if auth_method and auth_method.strip().lower() != get_auth_method():
+            logger.debug(f"Ignoring auth_method '{auth_method}'; the server uses '{get_auth_method()}'")
+
+        if cache not in CACHE_MODES:
+            return json.dumps({
+                "success": False,
+                "error": f"Invalid cache mode '{cache}'",
+                "suggestions": [f"Use one of: {', '.join(CACHE_MODES)}"]
+            })
+
+        if timeout_seconds is not None and timeout_seconds <= 0:
+            return json.dumps({
+                "success": False,
+                "error": f"Invalid timeout_seconds '{timeout_seconds}'",
+                "suggestions": ["Pass a positive number of seconds, or omit it to use the default timeout"]
+            })
+
         # Generate KQL query if requested
         if generate_query:
             generated_result = await ErrorHandler.safe_execute(
@@ -100,77 +160,51 @@ async def execute_kql_query(
             if output_format == "generation_only":
                 return ErrorHandler.safe_json_dumps(generated_result, indent=2)
 
-        # Execute query
-        df = kql_execute_tool(kql_query=query, cluster_uri=cluster_url, database=database)
+        try:
+            df = await _run_query(query, cluster_url, database, cache, enforce_row_limit, timeout_seconds, ctx)
+        except ResultCacheMiss as e:
+            return json.dumps(_cache_miss_result(e), indent=2)
+        except CircuitOpenError as e:
+            return json.dumps(_circuit_open_result(e), indent=2)
 
         if df is None or df.empty:
             logger.warning(f"Query returned empty result for: {query[:100]}...")
-            result = {
-                "success": False,
-                "error": "Query returned no results",
-                "row_count": 0,
-                "suggestions": ["Check your query syntax and logic", "Verify table names and filters"]
-            }
-            return json.dumps(result, indent=2)
-
-        # Check if validation info was attached during execution
-        validation_info = {}
-        if hasattr(df, '_validation_result'):
-            validation_info = {
-                "warnings": getattr(df._validation_result, 'warnings', []),
-                "suggestions": getattr(df._validation_result, 'suggestions', []),
-                "tables_used": list(getattr(df._validation_result, 'tables_used', set())),
-                "columns_used": {
-                    table: list(cols)
-                    for table, cols in getattr(df._validation_result, 'columns_used', {}).items()
-                }
-            }
+            return json.dumps(_empty_result(), indent=2)
+
+        truncation = _truncation_info(df)
 
         # Return results
         if output_format == "csv":
             return df.to_csv(index=False)
         elif output_format == "table":
             return df.to_string(index=False)
-        else:
-            # Convert DataFrame to serializable format with proper type handling
-            def convert_dataframe_to_serializable(df):
-                """Convert DataFrame to JSON-serializable format."""
-                try:
-                    # Convert to records and handle timestamps/types properly
-                    records = []
-                    for _, row in df.iterrows():
-                        record = {}
-                        for col, value in row.items():
-                            if pd.isna(value):
-                                record[col] = None
-                            elif hasattr(value, 'isoformat'):  # Timestamp objects
-                                record[col] = value.isoformat()
-                            elif hasattr(value, 'strftime'):  # datetime objects
-                                record[col] = value.strftime('%Y-%m-%d %H:%M:%S')
-                            elif isinstance(value, type):  # type objects
-                                record[col] = value.__name__
-                            elif hasattr(value, 'item'):  # numpy types
-                                record[col] = value.item()
-                            else:
-                                record[col] = value
-                        records.append(record)
-                    return records
-                except Exception as e:
-                    logger.warning(f"DataFrame conversion failed: {e}")
-                    # Fallback: convert to string representation
-                    return df.astype(str).to_dict("records")
-            
-            result = {
+        elif output_format in FILE_OUTPUT_FORMATS:
+            try:
+                entry = await asyncio.to_thread(
+                    get_result_store().export,
+                    df,
+                    output_format,
+                    {"query": query, "cluster_url": cluster_url, "database": database, **truncation},
+                )
+            except ImportError as e:
+                return json.dumps({
+                    "success": False,
+                    "error": str(e),
+                    "suggestions": ["Install pyarrow, or use output_format='json' with paging"]
+                }, indent=2)
+            return ErrorHandler.safe_json_dumps({
                 "success": True,
-                "row_count": len(df),
-                "columns": df.columns.tolist(),
-                "data": convert_dataframe_to_serializable(df),
-            }
-            
-            # Add validation info if available
-            if validation_info and any(validation_info.values()):
-                result["validation"] = validation_info
-            
+                "format": output_format,
+                "path": str(entry.path),
+                "file_bytes": entry.disk_bytes,
+                "row_count": entry.rows,
+                "columns": entry.columns,
+                "result_id": entry.result_id,
+                "expires_in_seconds": get_result_store().ttl_seconds,
+                **truncation,
+            }, indent=2)
+        else:
+            result = await _build_json_result(df, query, cluster_url, database, page_size)
             return ErrorHandler.safe_json_dumps(result, indent=2)
 
     except Exception as e:
@@ -178,6 +212,377 @@ async def execute_kql_query(
         error_result = ErrorHandler.handle_kusto_error(e)
         return ErrorHandler.safe_json_dumps(error_result, indent=2)
 
+@mcp.tool()
+async def execute_kql_batch(
+    queries: List[Dict[str, Any]],
+    cluster_url: Optional[str] = None,
+    database: Optional[str] = None,
+    cache: str = "default",
+    page_size: Optional[int] = None,
+    enforce_row_limit: bool = True,
+    timeout_seconds: Optional[int] = None,
+    ctx: Optional[Context] = None
+) -> str:
+    """
+    Execute several independent KQL queries concurrently and return every result in one response.
+
+    Args:
+        queries: Items of the form {"query": ..., "cluster_url": ..., "database": ..., "id": ...}.
+            cluster_url and database default to the batch-level values; id is an optional label.
+        cluster_url: Default Kusto cluster URL for items that do not set one.
+        database: Default database for items that do not set one.
+        cache: Result cache mode applied to every item (see execute_kql_query).
+        page_size: Rows returned inline per item; larger results get a result_id for fetch_result_page.
+        enforce_row_limit: Cap items without an explicit limit at the server's row limit.
+        timeout_seconds: Server-side timeout for each query.
+        ctx: MCP request context (injected by FastMCP), used for scheduling and progress notifications.
+
+    Returns:
+        JSON string with one result per item, in input order. A failing item does not fail the batch.
+    """
+    try:
+        global kusto_manager_global
+        if not kusto_manager_global or not kusto_manager_global.get("authenticated"):
+            return json.dumps({
+                "success": False,
+                "error": "Authentication required",
+                "suggestions": [
+                    "Ensure Azure CLI is installed and authenticated",
+                    "Run 'az login' to authenticate",
+                    "Check your Azure permissions"
+                ]
+            })
+
+        max_items = LIMITS.get("max_batch_queries", 25)
+        if not queries or len(queries) > max_items:
+            return json.dumps({
+                "success": False,
+                "error": f"A batch must contain between 1 and {max_items} queries, got {len(queries or [])}",
+                "suggestions": ["Split the work into several batches"]
+            })
+        if cache not in CACHE_MODES:
+            return json.dumps({
+                "success": False,
+                "error": f"Invalid cache mode '{cache}'",
+                "suggestions": [f"Use one of: {', '.join(CACHE_MODES)}"]
+            })
+        if timeout_seconds is not None and timeout_seconds <= 0:
+            return json.dumps({
+                "success": False,
+                "error": f"Invalid timeout_seconds '{timeout_seconds}'",
+                "suggestions": ["Pass a positive number of seconds, or omit it to use the default timeout"]
+            })
+
+        started = time.monotonic()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        runnable = []
+        for index, item in enumerate(queries):
+            item = item if isinstance(item, dict) else {"query": item}
+            query = item.get("query")
+            item_cluster = item.get("cluster_url") or cluster_url
+            item_database = item.get("database") or database
+            if not isinstance(query, str) or not query.strip() or not item_cluster or not item_database:
+                results[index] = {
+                    "success": False,
+                    "error": "Each item needs a query plus a cluster_url and database (on the item or the batch)",
+                }
+            else:
+                runnable.append((index, query, item_cluster, item_database))
+
+        # Look each referenced table's schema up once, so items don't each discover it
+        await _warm_batch_schemas(runnable)
+
+        completed = 0
+
+        async def run_item(index: int, query: str, item_cluster: str, item_database: str) -> None:
+            nonlocal completed
+            try:
+                df = await _run_query(query, item_cluster, item_database, cache, enforce_row_limit, timeout_seconds, ctx)
+                if df is None or df.empty:
+                    result = _empty_result()
+                else:
+                    result = await _build_json_result(df, query, item_cluster, item_database, page_size)
+            except ResultCacheMiss as e:
+                result = _cache_miss_result(e)
+            except CircuitOpenError as e:
+                result = _circuit_open_result(e)
+            except Exception as e:
+                result = ErrorHandler.handle_kusto_error(e)
+            results[index] = result
+
+            completed += 1
+            if ctx is not None:
+                try:
+                    await ctx.report_progress(completed, len(runnable), f"Completed {completed} of {len(runnable)} queries")
+                except Exception as e:
+                    logger.debug(f"Could not report batch progress: {e}")
+
+        await asyncio.gather(*(run_item(*item) for item in runnable))
+
+        for index, item in enumerate(queries):
+            if isinstance(item, dict) and item.get("id") is not None:
+                results[index] = {"id": item["id"], **results[index]}
+
+        succeeded = sum(1 for result in results if result.get("success"))
+        return ErrorHandler.safe_json_dumps({
+            "success": succeeded == len(results),
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "results": results,
+        }, indent=2)
+
+    except Exception as e:
+        error_result = ErrorHandler.handle_kusto_error(e)
+        return ErrorHandler.safe_json_dumps(error_result, indent=2)
+
+
+async def _warm_batch_schemas(items: List[tuple]) -> None:
+    """Discover schemas missing from memory once per (cluster, database, table) before a batch runs."""
+    missing = set()
+    for _, query, item_cluster, item_database in items:
+        try:
+            tables = query_processor.parse(query_processor.clean(query)).get("tables", [])
+        except Exception:
+            continue
+        for table in tables:
+            schema = memory_manager.get_schema(item_cluster, item_database, table, enable_fallback=False)
+            if not (schema and schema.get("columns")):
+                missing.add((normalize_cluster_url(item_cluster), item_database, table))
+
+    if missing:
+        logger.debug(f"Warming {len(missing)} table schemas for batch")
+        # Through the coordinator, so tables cooling down after a failed discovery are skipped
+        coordinator = get_discovery_coordinator()
+        await asyncio.gather(
+            *(coordinator.ensure_table(cluster, db, table) for cluster, db, table in missing),
+            return_exceptions=True,
+        )
+
+
+@mcp.tool()
+async def fetch_result_page(
+    result_id: str,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    output_format: str = "json"
+) -> str:
+    """
+    Fetch the next page of a large result returned by execute_kql_query, without re-running the query.
+
+    Args:
+        result_id: The result_id returned by execute_kql_query.
+        cursor: The next_cursor from the previous page (omit for the first page).
+        page_size: Rows to return (defaults to the configured page size).
+        output_format: Output format (json, csv, table).
+
+    Returns:
+        JSON string with the page rows and the cursor for the following page.
+    """
+    try:
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            return json.dumps({"success": False, "error": f"Invalid cursor '{cursor}'"})
+
+        limit = _resolve_page_size(page_size) or RESULT_STORE_CONFIG.get("max_page_size", 10000)
+        page, entry = await asyncio.to_thread(get_result_store().get_page, result_id, offset, limit)
+
+        if output_format == "csv":
+            return page.to_csv(index=False)
+        elif output_format == "table":
+            return page.to_string(index=False)
+
+        next_offset = offset + len(page)
+        result = {
+            "success": True,
+            "result_id": result_id,
+            "row_count": len(page),
+            "total_rows": entry.rows,
+            "offset": offset,
+            "columns": entry.columns,
+            "data": dataframe_to_records(page),
+            "next_cursor": str(next_offset) if next_offset < entry.rows else None,
+            "has_more": next_offset < entry.rows,
+        }
+        if entry.metadata.get("truncated"):
+            result["truncated"] = True
+            result["row_limit"] = entry.metadata.get("row_limit")
+        return ErrorHandler.safe_json_dumps(result, indent=2)
+
+    except ResultNotFound as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e),
+            "suggestions": ["Re-run the query with execute_kql_query to get a new result_id"]
+        }, indent=2)
+    except Exception as e:
+        logger.error(f"Failed to fetch result page: {e}")
+        return json.dumps({"success": False, "error": str(e)}, indent=2)
+
+
+async def _run_query(
+    query: str,
+    cluster_url: str,
+    database: str,
+    cache: str,
+    enforce_row_limit: bool,
+    timeout_seconds: Optional[int],
+    ctx: Optional[Context],
+) -> pd.DataFrame:
+    """
+    Execute a query off the event loop so other tool calls keep being served.
+
+    Identical queries already in flight share that execution. If the shared
+    execution is abandoned mid-query, the cluster is told to cancel it by request id.
+    """
+    row_limit = None if enforce_row_limit else 0
+    request_id = new_request_id()
+    clean_query = query_processor.clean(query)
+    flight_key = (normalize_cluster_url(cluster_url), database, clean_query, cache, row_limit, timeout_seconds)
+    # Cancel where kql_execute_tool sends the query, which may be a database named in the query or "master"
+    cancel_cluster, db = resolve_execution_target(clean_query, cluster_url, database)
+    db_for_execution = db or DEFAULT_EXECUTION_DATABASE
+    return await get_single_flight("query").do(
+        flight_key,
+        lambda: get_query_executor().run(
+            kql_execute_tool,
+            kql_query=query,
+            cluster_uri=cluster_url,
+            database=database,
+            cache_mode=cache,
+            row_limit=row_limit,
+            timeout_seconds=timeout_seconds,
+            client_request_id=request_id,
+            cluster=cluster_url,
+            session_id=_get_session_key(ctx),
+            on_cancel=lambda: schedule_cancel_query(cancel_cluster, db_for_execution, request_id),
+        ),
+    )
+
+
+async def _build_json_result(
+    df: pd.DataFrame, query: str, cluster_url: str, database: str, page_size: Optional[int]
+) -> Dict[str, Any]:
+    """Build the JSON response for a result, keeping rows past the first page in the result store."""
+    truncation = _truncation_info(df)
+    limit = _resolve_page_size(page_size)
+    page = df
+    paging = {}
+    if limit and len(df) > limit:
+        page = df.iloc[:limit]
+        # Keep the full result server-side; storing may spill to disk, so stay off the loop
+        result_id = await asyncio.to_thread(
+            get_result_store().put,
+            df,
+            {"query": query, "cluster_url": cluster_url, "database": database, **truncation},
+        )
+        paging = {
+            "total_rows": len(df),
+            "result_id": result_id,
+            "next_cursor": str(limit) if result_id else None,
+            "has_more": True,
+        }
+        if not result_id:
+            paging["warning"] = "Result is too large to keep for paging; only the first page is returned"
+
+    result = {
+        "success": True,
+        "row_count": len(page),
+        "columns": df.columns.tolist(),
+        "data": dataframe_to_records(page),
+        **paging,
+        **truncation,
+    }
+    if df.attrs.get("cache_status") == "hit":
+        result["cached"] = True
+
+    # Add validation info if it was attached during execution
+    if hasattr(df, '_validation_result'):
+        validation_info = {
+            "warnings": getattr(df._validation_result, 'warnings', []),
+            "suggestions": getattr(df._validation_result, 'suggestions', []),
+            "tables_used": list(getattr(df._validation_result, 'tables_used', set())),
+            "columns_used": {
+                table: list(cols)
+                for table, cols in getattr(df._validation_result, 'columns_used', {}).items()
+            }
+        }
+        if any(validation_info.values()):
+            result["validation"] = validation_info
+
+    return result
+
+
+def _truncation_info(df: pd.DataFrame) -> Dict[str, Any]:
+    """Response fields describing a result capped by the row limit guardrail."""
+    if not df.attrs.get("truncated"):
+        return {}
+    return {
+        "truncated": True,
+        "row_limit": df.attrs.get("row_limit"),
+        "truncation_note": "Result was capped by the row limit; add take/summarize or pass enforce_row_limit=false",
+    }
+
+
+def _empty_result() -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": "Query returned no results",
+        "row_count": 0,
+        "suggestions": ["Check your query syntax and logic", "Verify table names and filters"]
+    }
+
+
+def _cache_miss_result(error: ResultCacheMiss) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": str(error),
+        "cache": "miss",
+        "suggestions": ["Run the query with cache='default' to execute it against the cluster"]
+    }
+
+
+def _circuit_open_result(error: CircuitOpenError) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": str(error),
+        "error_type": "circuit_open",
+        "retry_after_seconds": round(error.retry_after, 1),
+        "suggestions": [
+            "The cluster failed repeatedly and is being given time to recover",
+            "Retry after the indicated delay or check the cluster's health",
+        ]
+    }
+
+
+def _resolve_page_size(page_size: Optional[int]) -> int:
+    """Clamp a requested page size; 0 disables paging."""
+    if page_size is None:
+        page_size = RESULT_STORE_CONFIG.get("page_size", 500)
+    if page_size <= 0 or not RESULT_STORE_CONFIG.get("enabled", True):
+        return 0
+    return min(page_size, RESULT_STORE_CONFIG.get("max_page_size", 10000))
+
+
+def _get_session_key(ctx: Optional[Context]) -> str:
+    """Identify the calling MCP session for scheduling purposes."""
+    if ctx is None:
+        return "default"
+    for attr in ("session_id", "client_id"):
+        try:
+            value = getattr(ctx, attr)
+        except Exception:
+            # Context properties raise when no MCP request is active
+            continue
+        if value:
+            return str(value)
+    return "default"
+
+
 async def _generate_kql_from_natural_language(
     natural_language_query: str,
     cluster_url: str,
@@ -248,7 +653,8 @@ async def schema_memory(
     table_name: str = None,
     natural_language_query: str = None,
     session_id: str = "default",
-    include_visualizations: bool = True
+    include_visualizations: bool = True,
+    ctx: Optional[Context] = None
 ) -> str:
     """
     Comprehensive schema memory and analysis operations.
@@ -270,6 +676,7 @@ async def schema_memory(
         natural_language_query: Natural language query for context operations
         session_id: Session ID for report generation
         include_visualizations: Include visualizations in reports
+        ctx: MCP request context (injected by FastMCP), used for refresh_schema progress notifications
     
     Returns:
         JSON string with operation results
@@ -300,7 +707,7 @@ async def schema_memory(
         elif operation == "get_stats":
             return await _schema_get_stats_operation()
         elif operation == "refresh_schema":
-            return await _schema_refresh_operation(cluster_url, database)
+            return await _schema_refresh_operation(cluster_url, database, ctx)
         else:
             return json.dumps({
                 "success": False,
@@ -640,6 +1047,16 @@ async def _schema_get_stats_operation() -> str:
     """Get memory statistics."""
     try:
         stats = memory_manager.get_memory_stats()
+        stats["connection_pool"] = get_client_pool().get_stats()
+        stats["query_executor"] = get_query_executor().get_stats()
+        stats["result_cache"] = get_result_cache().get_stats()
+        stats["result_store"] = get_result_store().get_stats()
+        stats["circuit_breakers"] = get_circuit_breaker_stats()
+        stats["cluster_health"] = get_health_monitor().get_stats()
+        stats["auth_tokens"] = get_token_provider().get_stats()
+        stats["learning"] = get_learning_pipeline().get_stats()
+        stats["schema_discovery"] = get_discovery_coordinator().get_stats()
+        stats["coalescing"] = {name: get_single_flight(name).get_stats() for name in ("query", "schema")}
         return json.dumps({
             "success": True,
             "stats": stats
@@ -650,8 +1067,8 @@ async def _schema_get_stats_operation() -> str:
             "error": str(e)
         })
 
-async def _schema_refresh_operation(cluster_url: str, database: str) -> str:
-    """Proactively refresh schema for a database."""
+async def _schema_refresh_operation(cluster_url: str, database: str, ctx: Optional[Context] = None) -> str:
+    """Proactively refresh schema for a database, reporting progress through the MCP context."""
     try:
         if not cluster_url or not database:
             return json.dumps({
@@ -659,67 +1076,20 @@ async def _schema_refresh_operation(cluster_url: str, database: str) -> str:
                 "error": "cluster_url and database are required for refresh_schema operation"
             })
         
-        # Step 1: List all tables in the database
-        from .utils import discover_tables_in_database
-        tables = await discover_tables_in_database(cluster_url, database)
-        
+        # One bulk schema command for the whole database; only tables whose fingerprint changed are rebuilt
+        progress = ctx.report_progress if ctx is not None else None
+        result = await schema_manager.refresh_database_schema(cluster_url, database, progress=progress)
+        tables = result["tables"]
+        refreshed_tables = result["refreshed"]
+        failed_tables = result["failed"]
+
         if not tables:
             return json.dumps({
                 "success": False,
                 "error": f"No tables found in database {database}"
             })
         
-        # Step 2: Refresh schema for each table
-        refreshed_tables = []
-        failed_tables = []
-        
-        for table_name in tables:
-            try:
-                logger.info(f"Refreshing schema for {database}.{table_name}")
-                schema_info = await schema_manager.get_table_schema(
-                    cluster_url, database, table_name, force_refresh=True
-                )
-                
-                if schema_info and not schema_info.get("error"):
-                    refreshed_tables.append({
-                        "table": table_name,
-                        "columns": len(schema_info.get("columns", {})),
-                        "last_updated": schema_info.get("last_updated", "unknown")
-                    })
-                    logger.debug(f"Successfully refreshed schema for {table_name}")
-                else:
-                    failed_tables.append({
-                        "table": table_name,
-                        "error": schema_info.get("error", "Unknown error")
-                    })
-                    logger.warning(f"Failed to refresh schema for {table_name}: {schema_info.get('error')}")
-                    
-            except Exception as table_error:
-                failed_tables.append({
-                    "table": table_name,
-                    "error": str(table_error)
-                })
-                logger.error(f"Exception refreshing schema for {table_name}: {table_error}")
-        
-        # Step 3: Update memory with discovery timestamp
-        try:
-            from .utils import normalize_name
-            cluster_key = normalize_name(cluster_url)
-            
-            # Update the discovery metadata
-            if cluster_key in memory_manager.memories:
-                if database in memory_manager.memories[cluster_key].get("databases", {}):
-                    memory_manager.memories[cluster_key]["databases"][database]["last_schema_refresh"] = datetime.now().isoformat()
-                    memory_manager.memories[cluster_key]["databases"][database]["total_tables"] = len(refreshed_tables)
-            
-            # Save the updated memory
-            memory_manager.save_memory()
-            logger.info(f"Updated memory with refresh metadata for {database}")
-            
-        except Exception as memory_error:
-            logger.warning(f"Failed to update memory metadata: {memory_error}")
-        
-        # Step 4: Return comprehensive results
+        # Return comprehensive results
         return json.dumps({
             "success": True,
             "message": f"Schema refresh completed for database {database}",
@@ -727,8 +1097,16 @@ async def _schema_refresh_operation(cluster_url: str, database: str) -> str:
                 "total_tables": len(tables),
                 "successfully_refreshed": len(refreshed_tables),
                 "failed_tables": len(failed_tables),
+                "added_tables": len(result["added"]),
+                "changed_tables": len(result["changed"]),
+                "dropped_tables": len(result["dropped"]),
+                "unchanged_tables": len(result["unchanged"]),
+                "discovery_method": result["method"],
                 "refresh_timestamp": datetime.now().isoformat()
             },
+            "added": result["added"],
+            "changed": result["changed"],
+            "dropped": result["dropped"],
             "refreshed_tables": refreshed_tables,
             "failed_tables": failed_tables if failed_tables else None
         }, indent=2)
@@ -762,6 +1140,14 @@ def main():
         mcp.run()
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
+    finally:
+        # Stop queued queries, then close pooled Kusto clients so their HTTP sessions are released cleanly
+        shutdown_query_executor()
+        shutdown_learning_pipeline()
+        shutdown_health_monitor()
+        shutdown_client_pool()
+        shutdown_result_store()
+        shutdown_memory_manager()
 
 if __name__ == "__main__":
     main()
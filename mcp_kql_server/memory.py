@@ -11,17 +11,30 @@ Author: Arjun Trivedi
 Email: arjuntrivedi42@yahoo.com
 """
 
+import hashlib
 import json
 import logging
 import os
 import re
 import threading
+import time
 from datetime import datetime
 from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union, Set, Tuple
 from dataclasses import dataclass
 
+from .constants import MEMORY_STORAGE_CONFIG
+from .storage import (
+    ALL_SECTIONS,
+    DirtyKey,
+    MemoryJournal,
+    MemoryWriter,
+    entry_size,
+    open_memory_storage,
+    register_for_shutdown,
+)
+
 # FastMCP imports removed - using programmatic description generation instead
 
 logger = logging.getLogger(__name__)
@@ -42,6 +55,71 @@ _memory_lock = threading.RLock()
 
 # FastMCP initialization removed - using programmatic description generation
 
+
+def _extract_schema_columns(schema_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Normalize the column shapes accepted by store_schema into an ordered list of dicts."""
+    # Handle both legacy columns list, dict-based columns mapping, and new column_types format
+    incoming_columns = []
+    cols_obj = schema_data.get("columns")
+    # Case A: legacy list of columns (strings or dicts)
+    if isinstance(cols_obj, list):
+        for col in cols_obj:
+            if isinstance(col, str):
+                incoming_columns.append({"name": col, "type": "unknown", "description": "", "tags": [], "sample_values": []})
+            elif isinstance(col, dict):
+                col_name = col.get("name") or col.get("column") or ""
+                if col_name:
+                    incoming_columns.append({
+                        "name": col_name,
+                        "type": col.get("type") or col.get("datatype") or "unknown",
+                        "description": col.get("description") or col.get("desc") or "",
+                        "tags": col.get("tags") or [],
+                        "sample_values": col.get("sample_values") or col.get("examples") or []
+                    })
+    # Case B: dict mapping of column_name -> metadata (common new shape)
+    elif isinstance(cols_obj, dict):
+        for col_name, info in cols_obj.items():
+            if isinstance(info, dict):
+                incoming_columns.append({
+                    "name": col_name,
+                    "type": info.get("data_type") or info.get("type") or info.get("ColumnType") or "unknown",
+                    "description": info.get("description") or info.get("desc") or "",
+                    "tags": info.get("tags") or info.get("column_tags") or [],
+                    "sample_values": list(info.get("sample_values") or info.get("examples") or [])
+                })
+            else:
+                # simple value mapping - treat as unknown type with provided value ignored
+                incoming_columns.append({
+                    "name": col_name,
+                    "type": "unknown",
+                    "description": "",
+                    "tags": [],
+                    "sample_values": []
+                })
+    # Case C: older 'column_types' mapping
+    elif isinstance(schema_data.get("column_types"), dict):
+        for col_name, info in schema_data.get("column_types", {}).items():
+            incoming_columns.append({
+                "name": col_name,
+                "type": info.get("data_type") or info.get("type") or "unknown",
+                "description": info.get("description", "") or "",
+                "tags": info.get("tags") or [],
+                "sample_values": list(info.get("sample_values") or [])
+            })
+    return incoming_columns
+
+
+def schema_fingerprint(schema_data: Dict[str, Any]) -> str:
+    """
+    Content hash of a table schema: its ordered column names and types.
+
+    Descriptions, tags and samples are left out, so re-discovering an
+    unchanged table always yields the same fingerprint.
+    """
+    columns = [[col["name"], str(col["type"]).lower()] for col in _extract_schema_columns(schema_data)]
+    return hashlib.sha256(json.dumps(columns, separators=(",", ":")).encode("utf-8")).hexdigest()[:16]
+
+
 # Enhanced AI-Friendly Special Tokens with XML-style structure
 SPECIAL_TOKENS = {
     "CLUSTER_START": "<CLUSTER>",
@@ -210,8 +288,37 @@ class MemoryManager:
         """Initialize memory manager with AI-friendly token system and thread safety."""
         self.memory_path = self._get_memory_path(custom_memory_path)
         self.memory_path.parent.mkdir(parents=True, exist_ok=True)
+        self.storage = open_memory_storage(self.memory_path)
+        # Corpus sections changed since the last save, in the order they changed (see storage.py)
+        self._dirty: Dict[DirtyKey, None] = {}
+        # Sections of the save being written outside _memory_lock; their shards must stay loaded
+        self._saving: Dict[DirtyKey, None] = {}
+        # One writer thread saves dirty sections behind the callers
+        self._writer = MemoryWriter(self._flush_dirty)
+        # Queries and learning events go to the journal; their sections are saved when it is compacted
+        self._journal = MemoryJournal(self.memory_path.parent / MEMORY_STORAGE_CONFIG.get("journal_filename", "memory_journal.jsonl"))
+        self._journaled: Dict[DirtyKey, None] = {}
+        self._journal_started = time.monotonic()
+        self._journal_replayed = False
+        # Sequence number of the last journaled event; each compacted snapshot stores it as
+        # corpus["journal_seq"] so replay can skip events that are already in the store
+        self._journal_seq = 0
+        # (cluster, database) shards whose tables are still on disk, and last access of loaded ones
+        self._unloaded_shards: Set[Tuple[str, str]] = set()
+        self._shard_access: Dict[Tuple[str, str], float] = {}
+        self._last_shard_sweep = time.monotonic()
+        self._lazy_shards = bool(MEMORY_STORAGE_CONFIG.get("lazy_shards", True)) and self.storage.supports_shards
+        # Serialized bytes per section (plus ("shard", cluster, database) for tables still on disk),
+        # with running totals per database, cluster and corpus; changed sections are re-measured lazily
+        self._section_sizes: Dict[DirtyKey, int] = {}
+        self._database_bytes: Dict[Tuple[str, str], int] = {}
+        self._cluster_bytes: Dict[str, int] = {}
+        self._corpus_bytes = 0
+        self._stale_sizes: Dict[DirtyKey, None] = {ALL_SECTIONS: None}
+        self._unsized_shards: Set[Tuple[str, str]] = set()
+        register_for_shutdown(self)
         self.corpus = self._load_or_create_corpus()
-        self._save_scheduled = False
+        self._replay_journal()
         self._memory_size_limit = 500 * 1024  # 500KB limit per cluster
         self._compression_enabled = True
 
@@ -235,15 +342,24 @@ class MemoryManager:
         return memory_path
 
     def _load_or_create_corpus(self) -> Dict[str, Any]:
-        """Load existing corpus or create a new one if loading fails or file doesn't exist."""
-        if self.memory_path.exists():
-            try:
-                with open(self.memory_path, "r", encoding="utf-8") as f:
-                    corpus = json.load(f)
-                    logger.info(f"Loaded memory from {self.memory_path}")
-                    return self._ensure_corpus_structure(corpus)
-            except Exception as e:
-                logger.error(f"Failed to load memory from {self.memory_path}: {e}. A new corpus will be created.")
+        """Load existing corpus or create a new one if loading fails or nothing is stored yet."""
+        try:
+            corpus = self.storage.load(lazy=self._lazy_shards)
+            if corpus is not None:
+                logger.info(f"Loaded memory from {self.storage.path}")
+                if getattr(self.storage, "migrated", False):
+                    # Persist the normalized structure of a freshly migrated corpus
+                    self._mark_dirty(ALL_SECTIONS)
+                corpus = self._ensure_corpus_structure(corpus)
+                if self.storage.lazy_loaded:
+                    self._unloaded_shards = {
+                        (cluster_uri, database)
+                        for cluster_uri, cluster_data in corpus["clusters"].items()
+                        for database in (cluster_data.get("databases") or {})
+                    }
+                return corpus
+        except Exception as e:
+            logger.error(f"Failed to load memory from {self.storage.path}: {e}. A new corpus will be created.")
         
         # This block runs if the file doesn't exist or if loading failed.
         logger.info("Creating new schema memory corpus.")
@@ -251,9 +367,10 @@ class MemoryManager:
         # Temporarily assign to self.corpus so save_corpus() can access it.
         # The final assignment happens in __init__ after this function returns.
         self.corpus = corpus
+        self._mark_dirty(ALL_SECTIONS)
         try:
             self.save_corpus()
-            logger.info(f"Successfully created and saved new corpus at {self.memory_path}")
+            logger.info(f"Successfully created and saved new corpus at {self.storage.path}")
         except Exception as e:
             # Log error but proceed, as the corpus is in memory.
             logger.error(f"Failed to perform initial save of new corpus: {e}")
@@ -369,11 +486,8 @@ class MemoryManager:
             Schema dictionary with fallback strategies applied if needed
         """
         try:
-            normalized_cluster = self._normalize_cluster_uri(cluster_uri)
-
-            # Navigate the new structure
-            cluster_data = self.corpus.get("clusters", {}).get(normalized_cluster, {})
-            db_data = cluster_data.get("databases", {}).get(database, {})
+            # Navigate the new structure, loading the database's shard on first access
+            db_data = self._get_database_data(cluster_uri, database)
             table_data = db_data.get("tables", {}).get(table, {})
 
             # Extract schema from the new structure
@@ -388,7 +502,7 @@ class MemoryManager:
 
             # Apply fallback strategies if enabled and no valid schema found
             if enable_fallback:
-                return self._apply_schema_fallback_strategies(normalized_cluster, database, table)
+                return self._apply_schema_fallback_strategies(cluster_uri, database, table)
 
             return schema_data
 
@@ -429,225 +543,16 @@ class MemoryManager:
                     schema_keys,
                     bool(samples),
                 )
-                normalized_cluster = self._normalize_cluster_uri(cluster_uri)
-                
-                # Apply dynamic compression before storing
-                if self._compression_enabled:
-                    schema_data = self._compress_schema_data(schema_data)
-                
-                # Minimal pre-filter: only skip obviously invalid data, avoid rejecting valid schemas
-                try:
-                    # Only skip if ALL columns are literally "Error" (case-insensitive) - very conservative check
-                    cols_check: List[str] = []
-                    if isinstance(schema_data, dict):
-                        if isinstance(schema_data.get("columns"), list) and schema_data.get("columns"):
-                            cols_check = [
-                                c if isinstance(c, str) else (c.get("name") or c.get("column") or "")
-                                for c in schema_data.get("columns", [])
-                            ]
-                        elif isinstance(schema_data.get("column_types"), dict) and schema_data.get("column_types"):
-                            cols_check = list(schema_data.get("column_types").keys())
-                    
-                    # Only skip if EXACTLY one column named exactly "Error" with no other data
-                    if (cols_check and len(cols_check) == 1 and
-                        str(cols_check[0]).strip().lower() == "error" and
-                        not any(schema_data.get(k) for k in ["table_name", "discovered_at", "cluster", "database"])):
-                        logger.debug(f"Skipping schema store for {cluster_uri}/{database}/{table}: detected single 'Error' column with no metadata")
-                        return
-
-                    # Very conservative sample checking - only skip obvious error messages in samples
-                    if isinstance(samples, dict):
-                        error_sample_count = 0
-                        total_samples = 0
-                        for v in samples.values():
-                            if v is not None:
-                                total_samples += 1
-                                try:
-                                    if isinstance(v, str) and re.search(
-                                        r"^(kusto service error|semantic error|failed to execute kql):",
-                                        str(v).strip(),
-                                        flags=re.IGNORECASE,
-                                    ):
-                                        error_sample_count += 1
-                                except Exception:
-                                    continue
-                        # Only skip if ALL samples are error messages (and we have samples)
-                        if total_samples > 0 and error_sample_count == total_samples:
-                            logger.debug(f"Skipping schema store for {cluster_uri}/{database}/{table}: all samples are error messages")
-                            return
-                except Exception as _preerr:
-                    logger.debug(f"Schema store pre-filter check failed: {_preerr}")
-                
-                # Ensure cluster structure
-                if normalized_cluster not in self.corpus["clusters"]:
-                    self.corpus["clusters"][normalized_cluster] = {
-                        "meta": {
-                            "token": f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized_cluster)}{SPECIAL_TOKENS['CLUSTER_END']}",
-                            "description": f"Cluster {normalized_cluster}",
-                            "last_accessed": datetime.now().isoformat()
-                        },
-                        "databases": {}
-                    }
-                
-                cluster_data = self.corpus["clusters"][normalized_cluster]
-                
-                # Ensure database structure
-                if database not in cluster_data["databases"]:
-                    cluster_data["databases"][database] = {
-                        "meta": {
-                            "token": f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}",
-                            "description": f"Database {database}",
-                            "table_count": 0
-                        },
-                        "tables": {}
-                    }
-                
-                db_data = cluster_data["databases"][database]
-                
-                # Process columns from schema_data
-                columns = {}
-                column_tokens = []
-                
-                # Handle both legacy columns list, dict-based columns mapping, and new column_types format
-                incoming_columns = []
-                cols_obj = schema_data.get("columns")
-                # Case A: legacy list of columns (strings or dicts)
-                if isinstance(cols_obj, list):
-                    for col in cols_obj:
-                        if isinstance(col, str):
-                            incoming_columns.append({"name": col, "type": "unknown", "description": "", "tags": [], "sample_values": []})
-                        elif isinstance(col, dict):
-                            col_name = col.get("name") or col.get("column") or ""
-                            if col_name:
-                                incoming_columns.append({
-                                    "name": col_name,
-                                    "type": col.get("type") or col.get("datatype") or "unknown",
-                                    "description": col.get("description") or col.get("desc") or "",
-                                    "tags": col.get("tags") or [],
-                                    "sample_values": col.get("sample_values") or col.get("examples") or []
-                                })
-                # Case B: dict mapping of column_name -> metadata (common new shape)
-                elif isinstance(cols_obj, dict):
-                    for col_name, info in cols_obj.items():
-                        if isinstance(info, dict):
-                            incoming_columns.append({
-                                "name": col_name,
-                                "type": info.get("data_type") or info.get("type") or info.get("ColumnType") or "unknown",
-                                "description": info.get("description") or info.get("desc") or "",
-                                "tags": info.get("tags") or info.get("column_tags") or [],
-                                "sample_values": list(info.get("sample_values") or info.get("examples") or [])
-                            })
-                        else:
-                            # simple value mapping - treat as unknown type with provided value ignored
-                            incoming_columns.append({
-                                "name": col_name,
-                                "type": "unknown",
-                                "description": "",
-                                "tags": [],
-                                "sample_values": []
-                            })
-                # Case C: older 'column_types' mapping
-                elif isinstance(schema_data.get("column_types"), dict):
-                    for col_name, info in schema_data.get("column_types", {}).items():
-                        incoming_columns.append({
-                            "name": col_name,
-                            "type": info.get("data_type") or info.get("type") or "unknown",
-                            "description": info.get("description", "") or "",
-                            "tags": info.get("tags") or [],
-                            "sample_values": list(info.get("sample_values") or [])
-                        })
-                
-                # Process each column and create enhanced tokens
-                for col_data in incoming_columns:
-                    col_name = col_data["name"]
-                    col_type = col_data["type"]
-                    col_description = col_data["description"] or self._generate_ai_description(col_name, col_type, table)
-                    col_tags = col_data["tags"]
-                    col_samples = col_data["sample_values"][:3]  # Limit to 3 samples
-                    
-                    # Merge samples if provided
-                    if samples and isinstance(samples, dict) and col_name in samples:
-                        val = samples.get(col_name)
-                        if val is not None:
-                            sv = str(val)
-                            if not re.search(r"Kusto service error:|Semantic error:|Failed to execute KQL", sv, flags=re.IGNORECASE):
-                                if sv not in col_samples:
-                                    col_samples.insert(0, sv)
-                    
-                                        # Generate column token (ensure all samples are strings)
-                    sample_strs = [str(s) for s in col_samples[:2]]
-                    col_token = (
-                        f"{SPECIAL_TOKENS['COLUMN_START']}{col_name}"
-                        f"{SPECIAL_TOKENS['TYPE_START']}{col_type}{SPECIAL_TOKENS['TYPE_END']}"
-                        f"{SPECIAL_TOKENS['DESCRIPTION_START']}{col_description}{SPECIAL_TOKENS['DESCRIPTION_END']}"
-                        f"{SPECIAL_TOKENS['TAGS_START']}{','.join(col_tags)}{SPECIAL_TOKENS['TAGS_END']}"
-                        f"{SPECIAL_TOKENS['SAMPLES_START']}{','.join(sample_strs)}{SPECIAL_TOKENS['SAMPLES_END']}"
-                        f"{SPECIAL_TOKENS['COLUMN_END']}"
-                    )
-                    
-                    columns[col_name] = {
-                        "token": col_token,
-                        "data_type": col_type,
-                        "description": col_description,
-                        "tags": col_tags,
-                        "sample_values": col_samples
-                    }
-                    column_tokens.append(col_token)
-                
-                # Create table AI token
-                table_token = (
-                    f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized_cluster)}{SPECIAL_TOKENS['CLUSTER_END']}"
-                    f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}"
-                    f"{SPECIAL_TOKENS['TABLE_START']}{table}{SPECIAL_TOKENS['TABLE_END']}"
-                    f"{SPECIAL_TOKENS['SUMMARY_START']}{self._generate_table_summary(table, columns)}{SPECIAL_TOKENS['SUMMARY_END']}"
-                    f"{''.join(column_tokens[:10])}"  # Limit to 10 columns
-                )
-                
-                # Check if table already exists to preserve successful_queries
-                existing_table = db_data["tables"].get(table, {})
-                existing_queries = existing_table.get("successful_queries", [])
-                
-                # Overwrite schema to ensure it's always up-to-date, but preserve successful queries.
-                db_data["tables"][table] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['TABLE_START']}{table}{SPECIAL_TOKENS['TABLE_END']}",
-                        "summary": f"{SPECIAL_TOKENS['SUMMARY_START']}{self._generate_table_summary(table, columns)}{SPECIAL_TOKENS['SUMMARY_END']}",
-                        "discovered_at": datetime.now().isoformat(),
-                        "last_updated": datetime.now().isoformat()
-                    },
-                    "schema": {
-                        "columns": columns,
-                        "ai_token": table_token
-                    },
-                    "successful_queries": existing_queries  # Preserve existing queries
-                }
-                
-                # Update table count and table list for database-level queries (merge with existing)
-                try:
-                    existing_list = db_data["meta"].get("table_list", []) or []
-                except Exception:
-                    existing_list = []
-                merged_list = list(dict.fromkeys(existing_list + list(db_data["tables"].keys())))
-                db_data["meta"]["table_count"] = len(db_data["tables"])
-                try:
-                    db_data["meta"]["table_list"] = merged_list
-                except Exception:
-                    # Fallback if tables structure is unexpected
-                    db_data["meta"].setdefault("table_list", merged_list)
+                normalized_cluster = self._apply_schema_locked(cluster_uri, database, table, schema_data, samples)
+                if normalized_cluster is None:
+                    return
                 
                 # Check memory limits and apply compression if needed
                 if self._should_compress_cluster_data(normalized_cluster):
                     self._compress_cluster_data(normalized_cluster)
                 
-                # Schedule save (background) and perform an immediate save to ensure persistence.
-                # The background save batches multiple updates, but an immediate save here prevents
-                # a race where the process exits or another instance overwrites the file before
-                # the background thread runs.
+                # The background writer persists the table; pending changes are flushed at exit
                 self._schedule_save()
-                try:
-                    self.save_corpus()
-                except Exception as e:
-                    logger.debug(f"Immediate save failed (will rely on scheduled save): {e}")
                 
                 # Clear cached get_schema results
                 try:
@@ -663,6 +568,196 @@ class MemoryManager:
         finally:
             self._lock.release()
 
+    def _apply_schema_locked(
+        self, cluster_uri: str, database: str, table: str, schema_data: Dict[str, Any], samples: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Write one table schema into the corpus without saving it.
+
+        The caller holds _memory_lock. Returns the normalized cluster URI, or
+        None when the schema was rejected as an error result.
+        """
+        normalized_cluster = self._normalize_cluster_uri(cluster_uri)
+        
+        # Apply dynamic compression before storing
+        if self._compression_enabled:
+            schema_data = self._compress_schema_data(schema_data)
+        
+        # Minimal pre-filter: only skip obviously invalid data, avoid rejecting valid schemas
+        try:
+            # Only skip if ALL columns are literally "Error" (case-insensitive) - very conservative check
+            cols_check: List[str] = []
+            if isinstance(schema_data, dict):
+                if isinstance(schema_data.get("columns"), list) and schema_data.get("columns"):
+                    cols_check = [
+                        c if isinstance(c, str) else (c.get("name") or c.get("column") or "")
+                        for c in schema_data.get("columns", [])
+                    ]
+                elif isinstance(schema_data.get("column_types"), dict) and schema_data.get("column_types"):
+                    cols_check = list(schema_data.get("column_types").keys())
+            
+            # Only skip if EXACTLY one column named exactly "Error" with no other data
+            if (cols_check and len(cols_check) == 1 and
+                str(cols_check[0]).strip().lower() == "error" and
+                not any(schema_data.get(k) for k in ["table_name", "discovered_at", "cluster", "database"])):
+                logger.debug(f"Skipping schema store for {cluster_uri}/{database}/{table}: detected single 'Error' column with no metadata")
+                return None
+
+            # Very conservative sample checking - only skip obvious error messages in samples
+            if isinstance(samples, dict):
+                error_sample_count = 0
+                total_samples = 0
+                for v in samples.values():
+                    if v is not None:
+                        total_samples += 1
+                        try:
+                            if isinstance(v, str) and re.search(
+                                r"^(kusto service error|semantic error|failed to execute kql):",
+                                str(v).strip(),
+                                flags=re.IGNORECASE,
+                            ):
+                                error_sample_count += 1
+                        except Exception:
+                            continue
+                # Only skip if ALL samples are error messages (and we have samples)
+                if total_samples > 0 and error_sample_count == total_samples:
+                    logger.debug(f"Skipping schema store for {cluster_uri}/{database}/{table}: all samples are error messages")
+                    return None
+        except Exception as _preerr:
+            logger.debug(f"Schema store pre-filter check failed: {_preerr}")
+        
+        # Ensure cluster and database structure, with the database's stored tables loaded
+        db_data = self._ensure_database_locked(normalized_cluster, database)
+        
+        # Process columns from schema_data
+        columns = {}
+        column_tokens = []
+        
+        incoming_columns = _extract_schema_columns(schema_data)
+        
+        # Process each column and create enhanced tokens
+        for col_data in incoming_columns:
+            col_name = col_data["name"]
+            col_type = col_data["type"]
+            col_description = col_data["description"] or self._generate_ai_description(col_name, col_type, table)
+            col_tags = col_data["tags"]
+            col_samples = col_data["sample_values"][:3]  # Limit to 3 samples
+            
+            # Merge samples if provided
+            if samples and isinstance(samples, dict) and col_name in samples:
+                val = samples.get(col_name)
+                if val is not None:
+                    sv = str(val)
+                    if not re.search(r"Kusto service error:|Semantic error:|Failed to execute KQL", sv, flags=re.IGNORECASE):
+                        if sv not in col_samples:
+                            col_samples.insert(0, sv)
+            
+                                # Generate column token (ensure all samples are strings)
+            sample_strs = [str(s) for s in col_samples[:2]]
+            col_token = (
+                f"{SPECIAL_TOKENS['COLUMN_START']}{col_name}"
+                f"{SPECIAL_TOKENS['TYPE_START']}{col_type}{SPECIAL_TOKENS['TYPE_END']}"
+                f"{SPECIAL_TOKENS['DESCRIPTION_START']}{col_description}{SPECIAL_TOKENS['DESCRIPTION_END']}"
+                f"{SPECIAL_TOKENS['TAGS_START']}{','.join(col_tags)}{SPECIAL_TOKENS['TAGS_END']}"
+                f"{SPECIAL_TOKENS['SAMPLES_START']}{','.join(sample_strs)}{SPECIAL_TOKENS['SAMPLES_END']}"
+                f"{SPECIAL_TOKENS['COLUMN_END']}"
+            )
+            
+            columns[col_name] = {
+                "token": col_token,
+                "data_type": col_type,
+                "description": col_description,
+                "tags": col_tags,
+                "sample_values": col_samples
+            }
+            column_tokens.append(col_token)
+        
+        # Create table AI token
+        table_token = (
+            f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized_cluster)}{SPECIAL_TOKENS['CLUSTER_END']}"
+            f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}"
+            f"{SPECIAL_TOKENS['TABLE_START']}{table}{SPECIAL_TOKENS['TABLE_END']}"
+            f"{SPECIAL_TOKENS['SUMMARY_START']}{self._generate_table_summary(table, columns)}{SPECIAL_TOKENS['SUMMARY_END']}"
+            f"{''.join(column_tokens[:10])}"  # Limit to 10 columns
+        )
+        
+        # Check if table already exists to preserve successful_queries
+        existing_table = db_data["tables"].get(table, {})
+        existing_queries = existing_table.get("successful_queries", [])
+        
+        # Overwrite schema to ensure it's always up-to-date, but preserve successful queries.
+        db_data["tables"][table] = {
+            "meta": {
+                "token": f"{SPECIAL_TOKENS['TABLE_START']}{table}{SPECIAL_TOKENS['TABLE_END']}",
+                "summary": f"{SPECIAL_TOKENS['SUMMARY_START']}{self._generate_table_summary(table, columns)}{SPECIAL_TOKENS['SUMMARY_END']}",
+                "discovered_at": datetime.now().isoformat(),
+                "last_updated": datetime.now().isoformat(),
+                "schema_hash": schema_fingerprint(schema_data)
+            },
+            "schema": {
+                "columns": columns,
+                "ai_token": table_token
+            },
+            "successful_queries": existing_queries  # Preserve existing queries
+        }
+        
+        # Update table count and table list for database-level queries (merge with existing)
+        try:
+            existing_list = db_data["meta"].get("table_list", []) or []
+        except Exception:
+            existing_list = []
+        merged_list = list(dict.fromkeys(existing_list + list(db_data["tables"].keys())))
+        db_data["meta"]["table_count"] = len(db_data["tables"])
+        try:
+            db_data["meta"]["table_list"] = merged_list
+        except Exception:
+            # Fallback if tables structure is unexpected
+            db_data["meta"].setdefault("table_list", merged_list)
+
+        self._mark_table_dirty(normalized_cluster, database, table)
+        return normalized_cluster
+
+    def store_schemas_bulk(self, cluster_uri: str, database: str, schemas: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Store the schemas of many tables in one database with a single save.
+
+        Args:
+            cluster_uri: Cluster the tables belong to
+            database: Database the tables belong to
+            schemas: Mapping of table name -> schema object (as passed to store_schema)
+
+        Returns:
+            Names of the tables that were stored; rejected schemas are skipped.
+        """
+        stored: List[str] = []
+        normalized_cluster = None
+        with _memory_lock:
+            for table, schema_data in schemas.items():
+                try:
+                    result = self._apply_schema_locked(cluster_uri, database, table, schema_data)
+                except Exception as e:
+                    logger.warning(f"Failed to store schema for {cluster_uri}/{database}/{table}: {e}")
+                    continue
+                if result is not None:
+                    normalized_cluster = result
+                    stored.append(table)
+
+            if normalized_cluster is None:
+                return stored
+
+            if self._should_compress_cluster_data(normalized_cluster):
+                self._compress_cluster_data(normalized_cluster)
+
+            self._schedule_save()
+
+            try:
+                MemoryManager.get_schema.cache_clear()
+            except Exception:
+                pass
+
+        logger.info(f"Stored {len(stored)} table schemas for {normalized_cluster}/{database} in one batch")
+        return stored
+
     def get_database_schema(self, cluster: str, database: str) -> Dict[str, Any]:
         """Gets a database schema (list of tables) from the corpus using new structure."""
         try:
@@ -673,10 +768,10 @@ class MemoryManager:
             meta = db_data.get("meta", {})
             tables = meta.get("table_list", [])
             
-            # Fallback: if meta.table_list is empty, derive from stored table entries
+            # Fallback: if meta.table_list is empty, derive from stored table entries (loads the shard)
             if not tables:
                 try:
-                    tables = list(db_data.get("tables", {}).keys())
+                    tables = list(self._get_database_data(normalized_cluster, database).get("tables", {}).keys())
                 except Exception:
                     tables = []
             
@@ -746,48 +841,142 @@ class MemoryManager:
             cluster_data["databases"][database]["meta"]["last_discovered"] = datetime.now().isoformat()
             cluster_data["databases"][database]["meta"]["discovery_method"] = "live_schema_discovery"
             cluster_data["databases"][database]["meta"]["schema_version"] = "3.0"
+            self._mark_dirty(("cluster", normalized_cluster), ("database", normalized_cluster, database))
             
-            # Schedule background save and perform immediate save to persist DB-level schema changes.
+            # Schedule background save of the DB-level schema changes
             self._schedule_save()
-            try:
-                self.save_corpus()
-            except Exception as e:
-                logger.debug(f"Immediate DB schema save failed (will rely on scheduled save): {e}")
             logger.info(f"Stored enhanced database schema for {cluster}/{database}: {len(table_list)} tables")
             
         except Exception as e:
             logger.error(f"Failed to store database schema: {e}")
  
+    def get_table_last_used(self, cluster_uri: str, database: str) -> Dict[str, str]:
+        """Timestamp of the latest successful query per table of a database."""
+        db_data = self._get_database_data(cluster_uri, database)
+        last_used = {}
+        for table, table_data in db_data.get("tables", {}).items():
+            timestamps = [q.get("timestamp", "") for q in table_data.get("successful_queries", []) if isinstance(q, dict)]
+            if any(timestamps):
+                last_used[table] = max(timestamps)
+        return last_used
+
+    def get_schema_hashes(self, cluster_uri: str, database: str) -> Dict[str, Optional[str]]:
+        """
+        Stored schema fingerprint per table of a database.
+
+        Tables stored before fingerprints existed map to None, so the next
+        refresh rebuilds them once.
+        """
+        with _memory_lock:
+            db_data = self._get_database_data(cluster_uri, database)
+            return {
+                table: (table_data.get("meta", {}) or {}).get("schema_hash")
+                for table, table_data in db_data.get("tables", {}).items()
+                if isinstance(table_data, dict)
+            }
+
+    def remove_tables(self, cluster_uri: str, database: str, tables: List[str]) -> List[str]:
+        """
+        Remove tables that no longer exist from a database, with a single save.
+
+        Returns:
+            Names of the tables that were removed.
+        """
+        normalized = self._normalize_cluster_uri(cluster_uri)
+        removed: List[str] = []
+        with _memory_lock:
+            db_data = self._load_shard_locked(normalized, database)
+            if not db_data:
+                return removed
+            for table in tables:
+                if db_data.get("tables", {}).pop(table, None) is not None:
+                    removed.append(table)
+            meta = db_data.setdefault("meta", {})
+            table_list = [t for t in meta.get("table_list", []) or [] if t not in tables]
+            if removed or len(table_list) != len(meta.get("table_list", []) or []):
+                meta["table_list"] = table_list
+                meta["table_count"] = len(db_data.get("tables", {}))
+                self._mark_dirty(("database", normalized, database), *(("table", normalized, database, t) for t in removed))
+                self._schedule_save()
+                try:
+                    MemoryManager.get_schema.cache_clear()
+                except Exception:
+                    pass
+
+        if removed:
+            logger.info(f"Removed {len(removed)} dropped tables from {normalized}/{database}")
+        return removed
+
     def add_successful_query(self, cluster_uri: str, database: str, table: str, kql: str, description: str):
         """Add a successful KQL query to the specific table in memory."""
         try:
-            normalized = self._normalize_cluster_uri(cluster_uri)
-            
-            # Ensure cluster exists
-            if normalized not in self.corpus["clusters"]:
-                self.corpus["clusters"][normalized] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized)}{SPECIAL_TOKENS['CLUSTER_END']}",
-                        "description": f"Cluster {normalized}",
-                        "last_accessed": datetime.now().isoformat()
-                    },
-                    "databases": {}
-                }
-            
-            cluster_data = self.corpus["clusters"][normalized]
-            
-            # Ensure database exists
-            if database not in cluster_data["databases"]:
-                cluster_data["databases"][database] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}",
-                        "description": f"Database {database}",
-                        "table_count": 0
-                    },
-                    "tables": {}
-                }
-            
-            db_data = cluster_data["databases"][database]
+            query_entry = {
+                "query": kql,
+                "description": description,
+                "timestamp": datetime.now().isoformat(),
+                "token": f"{SPECIAL_TOKENS['QUERY_START']}{self._generate_query_token(kql)}{SPECIAL_TOKENS['QUERY_END']}"
+            }
+            self._record_event({
+                "op": "table_query",
+                "cluster": self._normalize_cluster_uri(cluster_uri),
+                "database": database,
+                "table": table,
+                "entry": query_entry,
+            })
+        except Exception as e:
+            logger.warning(f"Failed to add successful query: {e}")
+
+    def add_global_successful_query(self, cluster_uri: str, database: str, kql: str, description: str):
+        """Add a successful KQL query to global storage when table association is not available."""
+        try:
+            query_entry = {
+                "query": kql,
+                "description": description,
+                "database": database,
+                "timestamp": datetime.now().isoformat(),
+                "token": f"{SPECIAL_TOKENS['QUERY_START']}{self._generate_query_token(kql)}{SPECIAL_TOKENS['QUERY_END']}"
+            }
+            self._record_event({
+                "op": "global_query",
+                "cluster": self._normalize_cluster_uri(cluster_uri),
+                "database": database,
+                "entry": query_entry,
+            })
+            logger.debug(f"Added global successful query for {database}: {description}")
+        except Exception as e:
+            logger.warning(f"Failed to add global successful query: {e}")
+
+    def _record_event(self, event: Dict[str, Any]):
+        """
+        Apply a high-frequency event to the corpus and append it to the journal.
+
+        The journal line is the only I/O; the touched sections are written to
+        the main store when the writer compacts the journal.
+        """
+        with _memory_lock:
+            sections = self._apply_event(event)
+            if not sections:
+                return
+            self._journal_seq += 1
+            self._journal.append({**event, "seq": self._journal_seq})
+            if not self._journaled:
+                self._journal_started = time.monotonic()
+            self._journaled.update(dict.fromkeys(sections))
+            self._stale_sizes.update(dict.fromkeys(sections))
+            due = (
+                self._journal.size >= MEMORY_STORAGE_CONFIG.get("journal_compact_bytes", 1024 * 1024)
+                or time.monotonic() - self._journal_started >= MEMORY_STORAGE_CONFIG.get("journal_compact_interval", 300.0)
+            )
+        if due:
+            self._writer.notify(self._writer.max_dirty_sections)
+
+    def _apply_event(self, event: Dict[str, Any]) -> List[DirtyKey]:
+        """Apply a journaled event to the corpus; returns the sections it touched."""
+        op = event.get("op")
+        entry = event.get("entry") or {}
+        if op == "table_query":
+            cluster, database, table = event["cluster"], event["database"], event["table"]
+            db_data = self._ensure_database_locked(cluster, database)
             
             # Ensure table exists
             if table not in db_data["tables"]:
@@ -795,8 +984,8 @@ class MemoryManager:
                     "meta": {
                         "token": f"{SPECIAL_TOKENS['TABLE_START']}{table}{SPECIAL_TOKENS['TABLE_END']}",
                         "summary": f"{SPECIAL_TOKENS['SUMMARY_START']}{self._generate_table_summary(table, {})}{SPECIAL_TOKENS['SUMMARY_END']}",
-                        "discovered_at": datetime.now().isoformat(),
-                        "last_updated": datetime.now().isoformat()
+                        "discovered_at": entry.get("timestamp"),
+                        "last_updated": entry.get("timestamp")
                     },
                     "schema": {
                         "columns": {},
@@ -806,85 +995,185 @@ class MemoryManager:
                 }
             
             table_data = db_data["tables"][table]
-            
-            # Add the successful query
-            query_entry = {
-                "query": kql,
-                "description": description,
-                "timestamp": datetime.now().isoformat(),
-                "token": f"{SPECIAL_TOKENS['QUERY_START']}{self._generate_query_token(kql)}{SPECIAL_TOKENS['QUERY_END']}"
-            }
-            
-            # Add to successful_queries list
-            table_data.setdefault("successful_queries", []).append(query_entry)
+            queries = table_data.setdefault("successful_queries", [])
+            queries.append(entry)
             
             # Limit to last 10 queries to prevent memory bloat
-            if len(table_data["successful_queries"]) > 10:
-                table_data["successful_queries"] = table_data["successful_queries"][-10:]
+            if len(queries) > 10:
+                table_data["successful_queries"] = queries[-10:]
             
             # Update table's last_updated timestamp
-            table_data["meta"]["last_updated"] = datetime.now().isoformat()
-            
-            # Schedule save
-            self._schedule_save()
-            
-        except Exception as e:
-            logger.warning(f"Failed to add successful query: {e}")
+            table_data["meta"]["last_updated"] = entry.get("timestamp")
+            return [("cluster", cluster), ("database", cluster, database), ("table", cluster, database, table)]
 
-    def add_global_successful_query(self, cluster_uri: str, database: str, kql: str, description: str):
-        """Add a successful KQL query to global storage when table association is not available."""
-        try:
-            normalized = self._normalize_cluster_uri(cluster_uri)
-            
-            # Ensure cluster exists
-            if normalized not in self.corpus["clusters"]:
-                self.corpus["clusters"][normalized] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized)}{SPECIAL_TOKENS['CLUSTER_END']}",
-                        "description": f"Cluster {normalized}",
-                        "last_accessed": datetime.now().isoformat()
-                    },
-                    "databases": {}
-                }
-            
-            cluster_data = self.corpus["clusters"][normalized]
-            
-            # Ensure database exists
-            if database not in cluster_data["databases"]:
-                cluster_data["databases"][database] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}",
-                        "description": f"Database {database}",
-                        "table_count": 0
-                    },
-                    "tables": {}
-                }
+        if op == "global_query":
+            cluster, database = event["cluster"], event["database"]
+            self._ensure_database_locked(cluster, database)
+            cluster_data = self.corpus["clusters"][cluster]
             
             # Add to cluster-level successful queries (global storage)
-            if "successful_queries" not in cluster_data:
-                cluster_data["successful_queries"] = []
-            
-            query_entry = {
-                "query": kql,
-                "description": description,
-                "database": database,
-                "timestamp": datetime.now().isoformat(),
-                "token": f"{SPECIAL_TOKENS['QUERY_START']}{self._generate_query_token(kql)}{SPECIAL_TOKENS['QUERY_END']}"
-            }
-            
-            cluster_data["successful_queries"].append(query_entry)
+            queries = cluster_data.setdefault("successful_queries", [])
+            queries.append(entry)
             
             # Limit to last 20 global queries to prevent memory bloat
-            if len(cluster_data["successful_queries"]) > 20:
-                cluster_data["successful_queries"] = cluster_data["successful_queries"][-20:]
-            
-            # Schedule save
-            self._schedule_save()
-            
-            logger.debug(f"Added global successful query for {database}: {description}")
-            
-        except Exception as e:
-            logger.warning(f"Failed to add global successful query: {e}")
+            if len(queries) > 20:
+                cluster_data["successful_queries"] = queries[-20:]
+            return [("cluster", cluster), ("database", cluster, database)]
+
+        if op == "session_learning":
+            return self._apply_session_learning(event["session_id"], entry)
+
+        if op == "cluster_learning":
+            cluster = event["cluster"]
+            cluster_data = self._ensure_cluster_locked(cluster)
+            learning_results = cluster_data.setdefault("learning_results", [])
+            learning_results.append(entry)
+            # Keep only the most recent 50 learning results to prevent memory bloat
+            if len(learning_results) > 50:
+                cluster_data["learning_results"] = learning_results[-50:]
+            return [("cluster", cluster)]
+
+        logger.warning(f"Ignoring unknown memory journal event {op!r}")
+        return []
+
+    def _ensure_cluster_locked(self, normalized_cluster: str) -> Dict[str, Any]:
+        """Return a cluster entry, creating it if needed."""
+        if normalized_cluster not in self.corpus["clusters"]:
+            self.corpus["clusters"][normalized_cluster] = {
+                "meta": {
+                    "token": f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized_cluster)}{SPECIAL_TOKENS['CLUSTER_END']}",
+                    "description": f"Cluster {normalized_cluster}",
+                    "last_accessed": datetime.now().isoformat()
+                },
+                "databases": {}
+            }
+        return self.corpus["clusters"][normalized_cluster]
+
+    def _ensure_database_locked(self, normalized_cluster: str, database: str) -> Dict[str, Any]:
+        """Return a database entry, creating it and its cluster if needed."""
+        cluster_data = self._ensure_cluster_locked(normalized_cluster)
+        if database not in cluster_data["databases"]:
+            cluster_data["databases"][database] = {
+                "meta": {
+                    "token": f"{SPECIAL_TOKENS['DATABASE_START']}{database}{SPECIAL_TOKENS['DATABASE_END']}",
+                    "description": f"Database {database}",
+                    "table_count": 0
+                },
+                "tables": {}
+            }
+        return self._load_shard_locked(normalized_cluster, database)
+
+    def _load_shard_locked(self, normalized_cluster: str, database: str) -> Dict[str, Any]:
+        """
+        Return a database entry with its tables loaded, or {} when it is unknown.
+
+        The caller holds _memory_lock. The tables of a lazily loaded database
+        (its shard) are read from storage on first access.
+        """
+        db_data = self.corpus.get("clusters", {}).get(normalized_cluster, {}).get("databases", {}).get(database)
+        if not isinstance(db_data, dict):
+            return {}
+        key = (normalized_cluster, database)
+        if key in self._unloaded_shards:
+            tables = self.storage.load_shard(normalized_cluster, database)
+            # Anything written while the shard was on disk is newer than the stored rows
+            tables.update(db_data.get("tables") or {})
+            db_data["tables"] = tables
+            self._unloaded_shards.discard(key)
+            # Measure the loaded tables in place of the stored size of the shard
+            self._unsized_shards.discard(key)
+            self._set_section_size_locked(("shard", normalized_cluster, database), 0)
+            self._stale_sizes.update(dict.fromkeys(("table", normalized_cluster, database, t) for t in tables))
+            logger.debug(f"Loaded memory shard {normalized_cluster}/{database} with {len(tables)} tables")
+        if self._lazy_shards:
+            self._shard_access[key] = time.monotonic()
+        return db_data
+
+    def _get_database_data(self, cluster_uri: str, database: str) -> Dict[str, Any]:
+        """Database entry with its tables loaded, or {} when the database is unknown."""
+        normalized_cluster = self._normalize_cluster_uri(cluster_uri)
+        key = (normalized_cluster, database)
+        with _memory_lock:
+            loading = key in self._unloaded_shards
+            db_data = self._load_shard_locked(normalized_cluster, database)
+            # A newly loaded shard may push the loaded data over shard_memory_budget
+            self._evict_idle_shards_locked(force=loading, keep=key)
+            return db_data
+
+    def _evict_idle_shards_locked(self, force: bool = False, keep: Optional[Tuple[str, str]] = None) -> int:
+        """
+        Drop the tables of idle shards from RAM.
+
+        A shard is evicted once unused for ``shard_idle_seconds``, and least
+        recently used shards are evicted while the loaded shards exceed
+        ``shard_memory_budget`` bytes. The caller holds _memory_lock. Shards
+        with unsaved or journaled changes stay loaded; they become evictable
+        after the next flush. Returns the number of shards evicted.
+        """
+        now = time.monotonic()
+        if not self._lazy_shards or ALL_SECTIONS in self._dirty or ALL_SECTIONS in self._saving:
+            return 0
+        if not force and now - self._last_shard_sweep < MEMORY_STORAGE_CONFIG.get("shard_sweep_interval", 60.0):
+            return 0
+        self._last_shard_sweep = now
+
+        # Evicted tables keep their measured sizes, so measure pending changes while they are loaded
+        self._refresh_sizes_locked()
+        idle = MEMORY_STORAGE_CONFIG.get("shard_idle_seconds", 600.0)
+        budget = MEMORY_STORAGE_CONFIG.get("shard_memory_budget", 64 * 1024 * 1024)
+        pending = {
+            (key[1], key[2]) for key in (*self._dirty, *self._journaled, *self._saving) if key[0] in ("database", "table")
+        }
+        loaded_bytes = sum(self._database_bytes.get(key, 0) for key in self._shard_access)
+        evicted = 0
+        for key, last_access in sorted(self._shard_access.items(), key=lambda item: item[1]):
+            if now - last_access < idle and loaded_bytes <= budget:
+                break
+            if key == keep or key in pending:
+                continue
+            del self._shard_access[key]
+            loaded_bytes -= self._database_bytes.get(key, 0)
+            db_data = self.corpus.get("clusters", {}).get(key[0], {}).get("databases", {}).get(key[1])
+            if isinstance(db_data, dict):
+                db_data["tables"] = {}
+                self._unloaded_shards.add(key)
+                evicted += 1
+
+        if evicted:
+            # Cached schemas would keep the evicted tables alive
+            MemoryManager.get_schema.cache_clear()
+            logger.debug(f"Evicted {evicted} idle memory shards")
+        return evicted
+
+    def _replay_journal(self):
+        """
+        Re-apply events logged after the last compaction and schedule their compaction.
+
+        Events numbered at or below the snapshot's ``journal_seq`` were saved
+        before a crash kept the journal from being truncated, and are skipped.
+        """
+        replayed = 0
+        with _memory_lock:
+            saved_seq = self._journal_seq = self.corpus.get("journal_seq", 0)
+            for event in self._journal.replay():
+                seq = event.get("seq", 0)
+                if seq and seq <= saved_seq:
+                    continue
+                self._journal_seq = max(self._journal_seq, seq)
+                try:
+                    sections = self._apply_event(event)
+                except Exception as e:
+                    logger.warning(f"Skipping memory journal event that failed to replay: {e}")
+                    continue
+                self._journaled.update(dict.fromkeys(sections))
+                self._stale_sizes.update(dict.fromkeys(sections))
+                replayed += 1
+            self._journal_started = time.monotonic()
+            self._journal_replayed = True
+        if replayed:
+            logger.info(f"Replayed {replayed} events from {self._journal.path}")
+        if self._journal.size:
+            self._writer.notify(self._writer.max_dirty_sections)
 
     async def validate_query(
         self,
@@ -1023,13 +1312,11 @@ class MemoryManager:
             Schema dictionary or None
         """
         try:
-            # Use the new memory structure to get schema
-            normalized_cluster = self._normalize_cluster_uri(cluster_uri)
-            cluster_data = self.corpus.get("clusters", {}).get(normalized_cluster, {})
-            db_data = cluster_data.get("databases", {}).get(database, {})
+            # Use the new memory structure to get schema, loading the database's shard on first access
+            db_data = self._get_database_data(cluster_uri, database)
             
             if not db_data:
-                logger.debug(f"No database data found for {database} in {normalized_cluster}")
+                logger.debug(f"No database data found for {database} in {cluster_uri}")
                 return None
             
             # Build schema structure from tables
@@ -1634,11 +1921,8 @@ class MemoryManager:
         - Historical schema data that might still be valid
         """
         try:
-            normalized_cluster = self._normalize_cluster_uri(cluster_uri)
-            
             # Check for any partial schema data in the corpus
-            cluster_data = self.corpus.get("clusters", {}).get(normalized_cluster, {})
-            db_data = cluster_data.get("databases", {}).get(database, {})
+            db_data = self._get_database_data(cluster_uri, database)
             table_data = db_data.get("tables", {}).get(table, {})
             
             # Look for any existing schema fragments
@@ -1685,7 +1969,7 @@ class MemoryManager:
             all_queries = []
             
             # Get queries from table-specific successful_queries
-            db_data = cluster_data.get("databases", {}).get(database, {})
+            db_data = self._get_database_data(normalized_cluster, database)
             table_data = db_data.get("tables", {}).get(table, {})
             if table_data:
                 all_queries.extend(table_data.get("successful_queries", []))
@@ -1733,7 +2017,7 @@ class MemoryManager:
             
             # Get schema using | getschema
             schema_query = f"{table} | getschema"
-            schema_df = kql_execute_tool(schema_query, cluster_uri, database)
+            schema_df = kql_execute_tool(schema_query, cluster_uri, database, cache_mode="bypass")
             
             if schema_df is not None and not schema_df.empty:
                 columns = {}
@@ -1750,7 +2034,7 @@ class MemoryManager:
                 
                 # Get sample data using | take 2
                 sample_query = f"{table} | take 2"
-                sample_df = kql_execute_tool(sample_query, cluster_uri, database)
+                sample_df = kql_execute_tool(sample_query, cluster_uri, database, cache_mode="bypass")
                 
                 if sample_df is not None and not sample_df.empty:
                     for col_name in columns.keys():
@@ -1996,12 +2280,7 @@ class MemoryManager:
     def get_successful_queries(self, cluster_uri: str, database: str, table: str) -> List[Dict[str, Any]]:
         """Get successful queries for a specific table."""
         try:
-            normalized = self._normalize_cluster_uri(cluster_uri)
-            return (self.corpus
-                    .get("clusters", {})
-                    .get(normalized, {})
-                    .get("databases", {})
-                    .get(database, {})
+            return (self._get_database_data(cluster_uri, database)
                     .get("tables", {})
                     .get(table, {})
                     .get("successful_queries", []))
@@ -2084,84 +2363,71 @@ class MemoryManager:
     def _store_session_learning(self, session_id: str, learning_entry: Dict[str, Any]):
         """Store learning entry in session-based structure."""
         try:
-            # Ensure sessions section exists
-            if "sessions" not in self.corpus:
-                self.corpus["sessions"] = {}
-            
-            # Ensure session exists
-            if session_id not in self.corpus["sessions"]:
-                self.corpus["sessions"][session_id] = {
-                    "created_at": datetime.now().isoformat(),
-                    "last_updated": datetime.now().isoformat(),
-                    "query_count": 0,
-                    "learning_entries": [],
-                    "session_insights": {
-                        "total_rows_processed": 0,
-                        "unique_tables": set(),
-                        "unique_clusters": set(),
-                        "query_types": set()
-                    }
-                }
-            
-            session_data = self.corpus["sessions"][session_id]
-            
-            # Add learning entry
-            session_data["learning_entries"].append(learning_entry)
-            session_data["query_count"] += 1
-            session_data["last_updated"] = datetime.now().isoformat()
-            
-            # Update session insights
-            insights = session_data["session_insights"]
-            insights["total_rows_processed"] += learning_entry.get("result_metadata", {}).get("row_count", 0)
-            insights["unique_tables"].update(learning_entry.get("learning_insights", {}).get("tables_involved", []))
-            insights["unique_clusters"].add(learning_entry.get("learning_insights", {}).get("cluster", ""))
-            insights["query_types"].add(learning_entry.get("execution_type", ""))
-            
-            # Convert sets to lists for JSON serialization
-            insights["unique_tables"] = list(insights["unique_tables"])
-            insights["unique_clusters"] = list(insights["unique_clusters"])
-            insights["query_types"] = list(insights["query_types"])
-            
-            # Limit session entries to prevent memory bloat
-            if len(session_data["learning_entries"]) > 100:
-                session_data["learning_entries"] = session_data["learning_entries"][-100:]
-            
-            # Schedule save
-            self._schedule_save()
-            
+            self._record_event({"op": "session_learning", "session_id": session_id, "entry": learning_entry})
         except Exception as e:
             logger.error(f"Failed to store session learning: {e}")
 
+    def _apply_session_learning(self, session_id: str, learning_entry: Dict[str, Any]) -> List[DirtyKey]:
+        """Add a learning entry to its session; returns the touched sections."""
+        timestamp = learning_entry.get("timestamp") or datetime.now().isoformat()
+
+        # Ensure sessions section exists
+        if "sessions" not in self.corpus:
+            self.corpus["sessions"] = {}
+        
+        # Ensure session exists
+        if session_id not in self.corpus["sessions"]:
+            self.corpus["sessions"][session_id] = {
+                "created_at": timestamp,
+                "last_updated": timestamp,
+                "query_count": 0,
+                "learning_entries": [],
+                "session_insights": {
+                    "total_rows_processed": 0,
+                    "unique_tables": set(),
+                    "unique_clusters": set(),
+                    "query_types": set()
+                }
+            }
+        
+        session_data = self.corpus["sessions"][session_id]
+        
+        # Add learning entry
+        session_data["learning_entries"].append(learning_entry)
+        session_data["query_count"] += 1
+        session_data["last_updated"] = timestamp
+        
+        # Update session insights
+        insights = session_data["session_insights"]
+        insights["total_rows_processed"] += learning_entry.get("result_metadata", {}).get("row_count", 0)
+        insights["unique_tables"] = set(insights["unique_tables"])
+        insights["unique_clusters"] = set(insights["unique_clusters"])
+        insights["query_types"] = set(insights["query_types"])
+        insights["unique_tables"].update(learning_entry.get("learning_insights", {}).get("tables_involved", []))
+        insights["unique_clusters"].add(learning_entry.get("learning_insights", {}).get("cluster", ""))
+        insights["query_types"].add(learning_entry.get("execution_type", ""))
+        
+        # Convert sets to lists for JSON serialization
+        insights["unique_tables"] = list(insights["unique_tables"])
+        insights["unique_clusters"] = list(insights["unique_clusters"])
+        insights["query_types"] = list(insights["query_types"])
+        
+        # Limit session entries to prevent memory bloat
+        if len(session_data["learning_entries"]) > 100:
+            session_data["learning_entries"] = session_data["learning_entries"][-100:]
+        return [("session", session_id)]
+
     def _store_cluster_learning(self, cluster_uri: str, learning_entry: Dict[str, Any]):
         """Store learning entry in cluster-level structure for backward compatibility."""
         try:
-            normalized_cluster = self._normalize_cluster_uri(cluster_uri)
-            
-            # Ensure cluster structure exists
-            if normalized_cluster not in self.corpus["clusters"]:
-                self.corpus["clusters"][normalized_cluster] = {
-                    "meta": {
-                        "token": f"{SPECIAL_TOKENS['CLUSTER_START']}{self._extract_cluster_name(normalized_cluster)}{SPECIAL_TOKENS['CLUSTER_END']}",
-                        "description": f"Cluster {normalized_cluster}",
-                        "last_accessed": datetime.now().isoformat()
-                    },
-                    "databases": {}
-                }
-            
-            cluster_data = self.corpus["clusters"][normalized_cluster]
-            
-            # Ensure learning_results section exists
-            if "learning_results" not in cluster_data:
-                cluster_data["learning_results"] = []
-            
             # Add to learning results only if the query returned rows
             row_count = learning_entry.get("result_metadata", {}).get("row_count", 0)
             if row_count and row_count > 0:
-                cluster_data["learning_results"].append(learning_entry)
-                # Keep only the most recent 50 learning results to prevent memory bloat
-                if len(cluster_data["learning_results"]) > 50:
-                    cluster_data["learning_results"] = cluster_data["learning_results"][-50:]
-            
+                self._record_event({
+                    "op": "cluster_learning",
+                    "cluster": self._normalize_cluster_uri(cluster_uri),
+                    "entry": learning_entry,
+                })
         except Exception as e:
             logger.error(f"Failed to store cluster learning: {e}")
 
@@ -2446,22 +2712,22 @@ class MemoryManager:
         """Get enhanced AI context tokens for tables with intelligent relevance scoring."""
         try:
             # Ensure schemas are discovered before getting context
-            from .utils import SchemaManager
-            schema_manager = SchemaManager(self)
+            from .discovery import get_discovery_coordinator
+            coordinator = get_discovery_coordinator()
             
             for table in tables:
                 schema = self.get_schema(cluster_uri, database, table, enable_fallback=False)
                 if not schema or not schema.get("columns"):
-                    # Force schema discovery if missing
+                    # Discover missing schemas; repeated failures are cooled down by the coordinator
                     try:
                         import asyncio
                         loop = asyncio.get_event_loop()
                         if loop.is_running():
                             # Create task if loop is running
-                            asyncio.create_task(schema_manager.get_table_schema(cluster_uri, database, table, force_refresh=True))
+                            asyncio.create_task(coordinator.ensure_table(cluster_uri, database, table))
                         else:
                             # Run synchronously if no loop
-                            asyncio.run(schema_manager.get_table_schema(cluster_uri, database, table, force_refresh=True))
+                            asyncio.run(coordinator.ensure_table(cluster_uri, database, table))
                         logger.debug(f"Auto-discovered schema for AI context: {table}")
                     except Exception as discovery_error:
                         logger.debug(f"Schema auto-discovery failed for {table}: {discovery_error}")
@@ -2490,12 +2756,10 @@ class MemoryManager:
     def _get_all_schemas_for_tables(self, cluster_uri: str, database: str, tables: List[str]) -> Dict[str, Dict]:
         """Get all schemas for specified tables."""
         all_schemas = {}
-        normalized_cluster = self._normalize_cluster_uri(cluster_uri)
+        db_data = self._get_database_data(cluster_uri, database)
         
         for table in tables:
             # Get table data from new structure
-            cluster_data = self.corpus.get("clusters", {}).get(normalized_cluster, {})
-            db_data = cluster_data.get("databases", {}).get(database, {})
             table_data = db_data.get("tables", {}).get(table, {})
             schema_data = table_data.get("schema", {})
             
@@ -2623,26 +2887,8 @@ class MemoryManager:
         return cluster_uri
 
     def _schedule_save(self):
-        """Schedule background save."""
-        if not self._save_scheduled:
-            self._save_scheduled = True
-            import threading
-
-            threading.Thread(target=self._background_save, daemon=True).start()
-
-    def _background_save(self):
-        """Perform background save."""
-        try:
-            import time
-
-            time.sleep(2.0)  # Wait to batch changes
-
-            self._save_scheduled = False
-            self.save_corpus()
-
-        except Exception as e:
-            logger.error(f"Background save failed: {e}")
-            self._save_scheduled = False
+        """Hand the dirty sections to the background writer."""
+        self._writer.notify(len(self._dirty))
 
     def _compress_schema_data(self, schema_data: Dict[str, Any]) -> Dict[str, Any]:
         """Apply dynamic compression to schema data to reduce memory usage."""
@@ -2673,14 +2919,100 @@ class MemoryManager:
     def _should_compress_cluster_data(self, cluster_uri: str) -> bool:
         """Check if cluster data exceeds memory limits and needs compression."""
         try:
-            cluster_data = self.corpus.get("clusters", {}).get(cluster_uri, {})
-            cluster_json = json.dumps(cluster_data)
-            cluster_size = len(cluster_json.encode('utf-8'))
-            
-            return cluster_size > self._memory_size_limit
+            with _memory_lock:
+                return self._cluster_size_locked(cluster_uri) > self._memory_size_limit
         except Exception:
             return False
 
+    def _cluster_size_locked(self, cluster_uri: str) -> int:
+        """Serialized bytes of a cluster, including its shards on disk, from the byte counters."""
+        self._refresh_sizes_locked()
+        self._size_shards_locked(cluster_uri)
+        return self._cluster_bytes.get(cluster_uri, 0)
+
+    def _corpus_size_locked(self) -> int:
+        """Serialized bytes of the whole corpus, including shards on disk, from the byte counters."""
+        self._refresh_sizes_locked()
+        self._size_shards_locked()
+        return self._corpus_bytes
+
+    def _section_entry_locked(self, key: DirtyKey) -> Any:
+        """The corpus entry a section names, without its child sections; None when it is gone."""
+        kind = key[0]
+        clusters = self.corpus.get("clusters", {})
+        if kind == "corpus":
+            return {k: v for k, v in self.corpus.items() if k not in ("clusters", "sessions")}
+        if kind == "cluster":
+            cluster_data = clusters.get(key[1])
+            return {k: v for k, v in cluster_data.items() if k != "databases"} if isinstance(cluster_data, dict) else None
+        if kind == "database":
+            db_data = clusters.get(key[1], {}).get("databases", {}).get(key[2])
+            return {k: v for k, v in db_data.items() if k != "tables"} if isinstance(db_data, dict) else None
+        if kind == "table":
+            return clusters.get(key[1], {}).get("databases", {}).get(key[2], {}).get("tables", {}).get(key[3])
+        if kind == "session":
+            return (self.corpus.get("sessions") or {}).get(key[1])
+        return None
+
+    def _set_section_size_locked(self, key: DirtyKey, size: int):
+        """Record the size of a section and apply the difference to its database, cluster and corpus totals."""
+        delta = size - self._section_sizes.pop(key, 0)
+        if size:
+            self._section_sizes[key] = size
+        if not delta:
+            return
+        self._corpus_bytes += delta
+        if key[0] in ("cluster", "database", "table", "shard"):
+            total = self._cluster_bytes.get(key[1], 0) + delta
+            if total:
+                self._cluster_bytes[key[1]] = total
+            else:
+                self._cluster_bytes.pop(key[1], None)
+        if key[0] in ("database", "table", "shard"):
+            db_key = (key[1], key[2])
+            total = self._database_bytes.get(db_key, 0) + delta
+            if total:
+                self._database_bytes[db_key] = total
+            else:
+                self._database_bytes.pop(db_key, None)
+
+    def _refresh_sizes_locked(self):
+        """
+        Re-measure the sections changed since the last refresh; the caller holds _memory_lock.
+
+        Each changed section is serialized on its own, so keeping the
+        counters current costs the size of what changed, not of the cluster.
+        """
+        stale, self._stale_sizes = self._stale_sizes, {}
+        if ALL_SECTIONS in stale:
+            self._section_sizes, self._database_bytes, self._cluster_bytes, self._corpus_bytes = {}, {}, {}, 0
+            self._unsized_shards = set(self._unloaded_shards)
+            stale = {("corpus",): None}
+            for uri, cluster_data in self.corpus.get("clusters", {}).items():
+                stale[("cluster", uri)] = None
+                for database, db_data in ((cluster_data or {}).get("databases") or {}).items():
+                    stale[("database", uri, database)] = None
+                    if (uri, database) not in self._unloaded_shards:
+                        stale.update(dict.fromkeys(("table", uri, database, t) for t in (db_data or {}).get("tables") or {}))
+            stale.update(dict.fromkeys(("session", sid) for sid in self.corpus.get("sessions") or {}))
+
+        for key in stale:
+            if key[0] == "table" and (key[1], key[2]) in self._unloaded_shards:
+                # Sizes of evicted tables were measured before eviction and have not changed
+                continue
+            entry = self._section_entry_locked(key)
+            self._set_section_size_locked(key, entry_size(entry) if entry is not None else 0)
+
+    def _size_shards_locked(self, cluster_uri: Optional[str] = None):
+        """Ask the storage backend for the size of shards that were never loaded, once per shard."""
+        unsized = [key for key in self._unsized_shards if cluster_uri is None or key[0] == cluster_uri]
+        if not unsized:
+            return
+        summary = self.storage.shard_summary(cluster_uri)
+        for key in unsized:
+            self._set_section_size_locked(("shard", *key), summary.get(key, {}).get("bytes", 0))
+            self._unsized_shards.discard(key)
+
     def _compress_cluster_data(self, cluster_uri: str):
         """Apply compression to cluster data to reduce memory usage."""
         try:
@@ -2696,35 +3028,102 @@ class MemoryManager:
                         if isinstance(queries, list) and len(queries) > 5:
                             # Keep only 5 most recent queries
                             table_data["successful_queries"] = queries[-5:]
+                            self._mark_dirty(("table", cluster_uri, db_name, table_name))
             
             # Remove old learning results
             if "learning_results" in cluster_data:
                 learning_results = cluster_data["learning_results"]
                 if isinstance(learning_results, list) and len(learning_results) > 25:
                     cluster_data["learning_results"] = learning_results[-25:]
+                    self._mark_dirty(("cluster", cluster_uri))
             
             logger.debug(f"Applied compression to cluster {cluster_uri}")
             
         except Exception as e:
             logger.warning(f"Failed to compress cluster data for {cluster_uri}: {e}")
 
-    def save_corpus(self):
-        """Save corpus to disk with thread safety."""
+    def _mark_dirty(self, *sections: DirtyKey):
+        """Record corpus sections changed since the last save."""
+        with _memory_lock:
+            self._dirty.update(dict.fromkeys(sections))
+            self._stale_sizes.update(dict.fromkeys(sections))
+
+    def _mark_table_dirty(self, cluster_uri: str, database: str, table: str):
+        """Mark a table together with its database and cluster entries."""
+        self._mark_dirty(("cluster", cluster_uri), ("database", cluster_uri, database), ("table", cluster_uri, database, table))
+
+    def save_corpus(self) -> int:
+        """Save the changed corpus sections now; returns the number of bytes written."""
+        return self._writer.flush()
+
+    def flush(self) -> int:
+        """Flush pending changes (also called on SIGTERM/SIGHUP)."""
+        return self._writer.flush()
+
+    def close(self):
+        """Stop the background writer after a final flush and compaction, then release storage."""
+        self._writer.shutdown()
+        self._journal.close()
+        self.storage.close()
+
+    def _flush_dirty(self) -> int:
+        """
+        Write the dirty sections through the storage backend; runs on the writer.
+
+        The sections are serialized under _memory_lock and written after it is
+        released, so callers never wait on the disk. Every save also compacts
+        the journal: the sections of journaled events are written with the
+        rest and those events are then dropped from the journal, so the main
+        store never holds events that are still in the journal.
+        """
         with _memory_lock:
+            # Until the journal has been replayed its events are not in the corpus yet
+            compact = self._journal_replayed and (bool(self._journaled) or self._journal.size > 0)
+            if not self._dirty and not compact:
+                return 0
+            journaled = self._journaled if compact else {}
+            dirty = {**self._dirty, **journaled}
+            self._dirty = {}
+            if compact:
+                self._journaled = {}
             try:
+                if ALL_SECTIONS in dirty:
+                    # A full rewrite replaces every row, so shards still on disk must be loaded first
+                    for cluster_uri, database in list(self._unloaded_shards):
+                        self._load_shard_locked(cluster_uri, database)
                 self.corpus["last_updated"] = datetime.now().isoformat()
-                self.memory_path.parent.mkdir(parents=True, exist_ok=True)
-
-                # Atomic save
-                temp_path = self.memory_path.with_suffix(".tmp")
-                with open(temp_path, "w", encoding="utf-8") as f:
-                    json.dump(self.corpus, f, indent=2, ensure_ascii=False, default=str)
+                if compact:
+                    # Every event journaled so far is in this snapshot
+                    self.corpus["journal_seq"] = self._journal_seq
+                dirty[("corpus",)] = None
+                snapshot = self.storage.snapshot(self.corpus, None if ALL_SECTIONS in dirty else list(dirty))
+            except BaseException:
+                self._restore_dirty_locked(dirty, journaled)
+                raise
+            # Events journaled while the snapshot is written stay in the journal
+            journal_size = self._journal.size
+            self._saving = dirty
 
-                temp_path.replace(self.memory_path)
-                logger.debug(f"Saved unified memory to {self.memory_path}")
+        try:
+            written = self.storage.write(snapshot)
+        except BaseException:
+            with _memory_lock:
+                self._saving = {}
+                self._restore_dirty_locked(dirty, journaled)
+            raise
 
-            except Exception as e:
-                logger.error(f"Failed to save memory: {e}")
+        with _memory_lock:
+            self._saving = {}
+            if compact:
+                self._journal.truncate(journal_size)
+            self._evict_idle_shards_locked()
+        logger.debug(f"Saved unified memory to {self.storage.path}")
+        return written
+
+    def _restore_dirty_locked(self, dirty: Dict[DirtyKey, None], journaled: Dict[DirtyKey, None]) -> None:
+        """Keep the sections of a failed save dirty so the next flush retries them."""
+        self._dirty = {**{k: None for k in dirty if k not in journaled}, **self._dirty}
+        self._journaled = {**journaled, **self._journaled}
 
     def get_memory_stats(self) -> Dict[str, Any]:
         """
@@ -2748,26 +3147,16 @@ class MemoryManager:
                     
                 # Count successful queries at cluster level
                 total_queries += len(cluster_data.get("successful_queries", []))
-                
-                # Count schemas and tables
-                dbs = cluster_data.get("databases", {})
-                for db_data in dbs.values():
-                    if not isinstance(db_data, dict):
-                        continue
-                        
-                    tables = db_data.get("tables", {})
-                    total_tables += len(tables)
-                    
-                    for table_data in tables.values():
-                        if isinstance(table_data, dict) and table_data.get("schema", {}).get("columns"):
-                            total_schemas += 1
-                        # Count table-level successful queries
-                        total_queries += len(table_data.get("successful_queries", []))
+            
+            # Count schemas, tables and table-level queries without loading idle shards
+            for counts in self._database_counts().values():
+                total_tables += counts["tables"]
+                total_schemas += counts["schemas"]
+                total_queries += counts["queries"]
 
-            # Calculate memory size
-            import json
-            corpus_json = json.dumps(corpus, default=str)
-            memory_size_kb = len(corpus_json.encode('utf-8')) / 1024
+            # Memory size from the byte counters, without serializing the corpus
+            with _memory_lock:
+                memory_size_kb = self._corpus_size_locked() / 1024
 
             return {
                 "clusters_count": clusters_count,
@@ -2775,6 +3164,11 @@ class MemoryManager:
                 "total_queries": total_queries,
                 "total_tables": total_tables,
                 "memory_size_kb": round(memory_size_kb, 2),
+                "storage_backend": self.storage.name,
+                "shards_loaded": len(self._shard_access) if self._lazy_shards else None,
+                "shards_on_disk": len(self._unloaded_shards),
+                "writer": self._writer.get_stats(),
+                "journal_bytes": self._journal.size,
                 "last_updated": corpus.get("last_updated"),
                 "version": corpus.get("version", "3.0")
             }
@@ -2788,10 +3182,49 @@ class MemoryManager:
                 "total_queries": 0
             }
 
+    def _database_counts(self) -> Dict[Tuple[str, str], Dict[str, int]]:
+        """
+        Table, schema and successful query counts per (cluster, database).
+
+        Loaded shards are counted in memory; shards still on disk are counted
+        by the storage backend, where every stored table has a schema.
+        """
+        counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+        with _memory_lock:
+            unloaded = set(self._unloaded_shards)
+            for cluster_uri, cluster_data in self.corpus.get("clusters", {}).items():
+                if not isinstance(cluster_data, dict):
+                    continue
+                for database, db_data in (cluster_data.get("databases") or {}).items():
+                    if not isinstance(db_data, dict) or (cluster_uri, database) in unloaded:
+                        continue
+                    tables = db_data.get("tables", {}) or {}
+                    counts[(cluster_uri, database)] = {
+                        "tables": len(tables),
+                        "schemas": sum(
+                            1 for table_data in tables.values()
+                            if isinstance(table_data, dict) and table_data.get("schema", {}).get("columns")
+                        ),
+                        "queries": sum(
+                            len(table_data.get("successful_queries", []))
+                            for table_data in tables.values() if isinstance(table_data, dict)
+                        ),
+                    }
+        if unloaded:
+            summary = self.storage.shard_summary()
+            for key in unloaded:
+                stored = summary.get(key, {"tables": 0, "queries": 0})
+                counts[key] = {"tables": stored["tables"], "schemas": stored["tables"], "queries": stored["queries"]}
+        return counts
+
     def clear_memory(self) -> bool:
         """Clear all memory."""
         try:
-            self.corpus = self._create_empty_corpus()
+            with _memory_lock:
+                self.corpus = self._create_empty_corpus()
+                self._unloaded_shards = set()
+                self._shard_access = {}
+                self._mark_dirty(ALL_SECTIONS)
             self.save_corpus()
             logger.info("Memory cleared")
             return True
@@ -2813,6 +3246,14 @@ def get_memory_manager() -> MemoryManager:
     return _memory_manager
 
 
+def shutdown_memory_manager() -> None:
+    """Flush pending memory changes, stop the writer and reset the global instance."""
+    global _memory_manager
+    manager, _memory_manager = _memory_manager, None
+    if manager is not None:
+        manager.close()
+
+
 def get_knowledge_corpus():
     """Compatibility adapter expected by legacy tests: return an object with memory_manager."""
     class KnowledgeCorpus:
@@ -2848,12 +3289,10 @@ def get_table_ai_token(cluster_uri: str, database: str, table: str) -> Optional[
     """Get AI token for a specific table."""
     try:
         memory = get_memory_manager()
-        normalized_cluster = memory._normalize_cluster_uri(cluster_uri)
 
         # Prefer token from stored table entry
-        cluster_data = memory.corpus.get("clusters", {}).get(normalized_cluster, {})
         try:
-            return cluster_data.get("databases", {}).get(database, {}).get("tables", {}).get(table, {}).get("ai_token")
+            return memory._get_database_data(cluster_uri, database).get("tables", {}).get(table, {}).get("ai_token")
         except Exception:
             return None
     except Exception as e:
@@ -2933,7 +3372,7 @@ def get_telemetry_collector():
 
 async def kql_schema_memory_tool(natural_language_query: str = None, session_id: str = None):
     """Enhanced schema memory tool with forced discovery when missing."""
-    from .utils import parse_query_entities, SchemaManager
+    from .utils import parse_query_entities, get_schema_manager
     
     entities = parse_query_entities(natural_language_query or "")
     cluster, database = entities["cluster"], entities["database"]
@@ -2948,7 +3387,7 @@ async def kql_schema_memory_tool(natural_language_query: str = None, session_id:
     if any(keyword in (natural_language_query or "").lower()
            for keyword in ["list tables", "show tables", "what tables"]):
         try:
-            schema_manager = SchemaManager()
+            schema_manager = get_schema_manager()
             db_schema = await schema_manager.get_database_schema(cluster, database)
             
             # Force discovery even without tables - use db schema
@@ -2970,7 +3409,7 @@ async def kql_schema_memory_tool(natural_language_query: str = None, session_id:
     # Force schema discovery if missing, even on tool call
     if not schema or not schema.get("columns"):
         try:
-            schema_manager = SchemaManager()
+            schema_manager = get_schema_manager()
             schema = await schema_manager.get_table_schema(cluster, database, table, force_refresh=True)
             if schema:
                 # Always store post-discovery to ensure persistence
@@ -3011,16 +3450,7 @@ def get_memory_stats() -> Dict[str, int]:
         clusters = corpus.get("clusters", {}) if isinstance(corpus, dict) else {}
         clusters_count = len(clusters)
 
-        total_schemas = 0
-        for cluster_data in clusters.values():
-            if not isinstance(cluster_data, dict):
-                continue
-            dbs = cluster_data.get("databases", {}) or {}
-            for db_data in dbs.values():
-                if not isinstance(db_data, dict):
-                    continue
-                tables = db_data.get("tables", {}) or {}
-                total_schemas += len(tables)
+        total_schemas = sum(counts["tables"] for counts in mm._database_counts().values())
 
         # Determine total stored successful queries across clusters.
         # The legacy 'query_execution_history' was removed. Derive the total
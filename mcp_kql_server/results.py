@@ -0,0 +1,951 @@
+"""
+Query Result Management Module
+
+This module holds the in-process result cache that sits in front of query
+execution, so agents re-issuing the same KQL are answered from memory instead
+of going back to the cluster, the paginated result store that keeps large
+results server-side (spilling to memory-mapped Arrow files, or pickle when
+pyarrow is not installed, past its memory budget), the decoder that
+turns Kusto result tables into typed DataFrames, and the column-wise serializer
+used to turn results into JSON-ready records.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import json
+import logging
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+from pandas.core.dtypes.cast import find_common_type
+
+from .connection import normalize_cluster_url
+from .constants import (
+    FILE_OUTPUT_FORMATS,
+    NON_DETERMINISTIC_KQL_FUNCTIONS,
+    RESULT_CACHE_CONFIG,
+    RESULT_STORE_CONFIG,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Optional: install mcp-kql-server[arrow]; spills fall back to pickle
+    pa = None
+    pa_ipc = None
+    pa_parquet = None
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+# Values accepted by the execute_kql_query tool's ``cache`` parameter
+CACHE_MODES = ("default", "bypass", "refresh", "only")
+
+_NON_DETERMINISTIC_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(NON_DETERMINISTIC_KQL_FUNCTIONS)) + r")\s*\(",
+    re.IGNORECASE,
+)
+_MANAGEMENT_STATEMENT_RE = re.compile(r"(?:^|;)\s*\.")
+
+
+class ResultCacheMiss(LookupError):
+    """Raised when ``cache="only"`` is requested and no cached result exists."""
+
+
+class ResultNotFound(LookupError):
+    """Raised when a result id is unknown or its stored result has expired."""
+
+
+def is_cacheable_query(query: str) -> bool:
+    """Management commands and non-deterministic queries must always hit the cluster."""
+    if not query or _MANAGEMENT_STATEMENT_RE.search(query):
+        return False
+    return not _NON_DETERMINISTIC_RE.search(query)
+
+
+def dataframe_nbytes(df: pd.DataFrame) -> int:
+    """Approximate in-memory size of a DataFrame, including object payloads."""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+@dataclass
+class CachedResult:
+    """A cached query result and its accounting."""
+    df: pd.DataFrame
+    nbytes: int
+    expires_at: float
+    hits: int = 0
+
+
+class ResultCache:
+    """
+    Thread-safe TTL + LRU cache of query results bounded by total bytes.
+
+    Keys are (normalized cluster, database, normalized query text). Entries
+    expire after ``ttl_seconds``; when the byte budget is exceeded the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_entry_bytes: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.ttl_seconds = RESULT_CACHE_CONFIG.get("ttl_seconds", 300.0) if ttl_seconds is None else ttl_seconds
+        self.max_bytes = RESULT_CACHE_CONFIG.get("max_bytes", 64 * 1024 * 1024) if max_bytes is None else max_bytes
+        self.max_entry_bytes = (
+            RESULT_CACHE_CONFIG.get("max_entry_bytes", self.max_bytes) if max_entry_bytes is None else max_entry_bytes
+        )
+        self.enabled = RESULT_CACHE_CONFIG.get("enabled", True) if enabled is None else enabled
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "rejected_too_large": 0,
+        }
+
+    @staticmethod
+    def make_key(cluster: str, database: str, normalized_query: str) -> CacheKey:
+        """Build a cache key; the query must already be normalized by QueryProcessor.clean."""
+        return (normalize_cluster_url(cluster), database or "", normalized_query.strip())
+
+    def get(self, key: CacheKey) -> Optional[pd.DataFrame]:
+        """Return a cached result, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove_locked(key)
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._counters["hits"] += 1
+            # Shallow copy so callers adding columns or attrs don't alter the cached frame
+            return entry.df.copy(deep=False)
+
+    def put(self, key: CacheKey, df: pd.DataFrame) -> bool:
+        """Store a result; returns False if the cache is disabled or the result is too large."""
+        if not self.enabled or df is None:
+            return False
+        nbytes = dataframe_nbytes(df)
+        with self._lock:
+            if nbytes > self.max_entry_bytes or nbytes > self.max_bytes:
+                self._counters["rejected_too_large"] += 1
+                return False
+            if key in self._entries:
+                self._remove_locked(key)
+            while self._entries and self._bytes + nbytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._counters["evictions"] += 1
+            self._entries[key] = CachedResult(df=df, nbytes=nbytes, expires_at=time.monotonic() + self.ttl_seconds)
+            self._bytes += nbytes
+            self._counters["stores"] += 1
+            return True
+
+    def record_bypass(self) -> None:
+        """Count a lookup that skipped the cache (management, non-deterministic or opted out)."""
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def invalidate(self, cluster: Optional[str] = None, database: Optional[str] = None) -> int:
+        """Drop cached entries, optionally limited to one cluster and/or database."""
+        cluster_key = normalize_cluster_url(cluster) if cluster else None
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (cluster_key is None or key[0] == cluster_key) and (database is None or key[1] == database)
+            ]
+            for key in keys:
+                self._remove_locked(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                **self._counters,
+            }
+
+    def _remove_locked(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+
+# Kusto scalar types; v1 management responses use .NET names for some of them
+_KUSTO_TYPE_ALIASES = {
+    "boolean": "bool",
+    "date": "datetime",
+    "time": "timespan",
+    "double": "real",
+    "int64": "long",
+    "int32": "int",
+    "uuid": "guid",
+    "uniqueid": "guid",
+    "object": "dynamic",
+}
+
+# [-][d.]hh:mm:ss[.fffffff]
+_TIMESPAN_RE = re.compile(r"^(-?)(?:(\d+)\.)?(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?$")
+
+
+def _kusto_type(column: Any) -> str:
+    column_type = str(getattr(column, "column_type", "") or "").lower()
+    if column_type.startswith("system."):
+        column_type = column_type[len("system."):]
+    return _KUSTO_TYPE_ALIASES.get(column_type, column_type)
+
+
+def _object_column(values: List[Any]) -> pd.Series:
+    # Series keeps list/dict cells intact where np.array would try to nest them
+    return pd.Series(values, dtype=object)
+
+
+def _decode_timespans(values: List[Any]) -> np.ndarray:
+    """Parse Kusto timespans ("[-][d.]hh:mm:ss[.fffffff]" or ticks) into timedelta64[ns]."""
+    nanos = np.empty(len(values), dtype="int64")
+    nat = np.iinfo(np.int64).min
+    match = _TIMESPAN_RE.match
+    for i, value in enumerate(values):
+        if value is None:
+            nanos[i] = nat
+        elif isinstance(value, (int, float)):
+            # Numeric timespans are 100ns ticks
+            nanos[i] = round(value * 100)
+        else:
+            parts = match(value)
+            if parts is None:
+                raise ValueError(f"Timespan value '{value}' cannot be decoded")
+            sign, days, hours, minutes, seconds, fraction = parts.groups()
+            total = ((int(days or 0) * 24 + int(hours)) * 60 + int(minutes)) * 60 + int(seconds)
+            total = total * 10**9 + (int(fraction[:9].ljust(9, "0")) if fraction else 0)
+            nanos[i] = -total if sign else total
+    return nanos.view("timedelta64[ns]")
+
+
+def _typed_value(value: Any, kusto_type: str) -> Any:
+    """Convert one cell of a column that failed bulk decoding; values that do not parse are kept as sent."""
+    if value is None:
+        return None
+    try:
+        if kusto_type == "datetime":
+            return pd.to_datetime(value, utc=True, format="ISO8601")
+        if kusto_type == "timespan":
+            return pd.Timedelta(_decode_timespans([value])[0])
+        if kusto_type == "decimal":
+            return Decimal(value)
+    except (TypeError, ValueError, ArithmeticError):
+        pass
+    return value
+
+
+def _decode_column(values: List[Any], kusto_type: str) -> Any:
+    """Build one typed column from raw JSON cell values."""
+    has_nulls = any(value is None for value in values)
+    if kusto_type in ("long", "int"):
+        if has_nulls:
+            return pd.array(values, dtype="Int64" if kusto_type == "long" else "Int32")
+        return np.array(values, dtype=np.int64 if kusto_type == "long" else np.int32)
+    if kusto_type == "real":
+        # None becomes NaN; "NaN"/"Infinity" strings parse as floats
+        return np.array(values, dtype=np.float64)
+    if kusto_type == "bool":
+        if has_nulls:
+            return pd.array(values, dtype="boolean")
+        return np.array(values, dtype=bool)
+    if kusto_type == "datetime":
+        return pd.to_datetime(values, utc=True, format="ISO8601").array
+    if kusto_type == "timespan":
+        return _decode_timespans(values)
+    if kusto_type == "decimal":
+        return _object_column([Decimal(value) if value is not None else None for value in values])
+    # string, guid, dynamic and anything unknown keep their JSON values
+    return _object_column(values)
+
+
+def decode_result_table(table: Any) -> Optional[pd.DataFrame]:
+    """
+    Build a DataFrame straight from a Kusto result table's raw rows.
+
+    Each column is gathered from the raw JSON rows and converted once, with a
+    dtype chosen from its Kusto type (long -> int64/Int64, real -> float64,
+    bool -> bool/boolean, datetime -> datetime64[ns, UTC], timespan ->
+    timedelta64[ns]). This skips the per-row dicts of ``to_dict()`` and keeps
+    Kusto's 100ns precision. Returns None for objects that are not SDK tables.
+    """
+    raw_rows = getattr(table, "raw_rows", None)
+    columns = getattr(table, "columns", None)
+    if not isinstance(raw_rows, list) or not isinstance(columns, list):
+        return None
+
+    names = [column.column_name for column in columns]
+    data = {}
+    for index, column in enumerate(columns):
+        values = [row[index] for row in raw_rows]
+        kusto_type = _kusto_type(column)
+        try:
+            data[index] = _decode_column(values, kusto_type)
+        except (TypeError, ValueError, ArithmeticError) as e:
+            logger.debug(f"Falling back to per-value conversion for column {column.column_name} ({kusto_type}): {e}")
+            data[index] = _object_column([_typed_value(value, kusto_type) for value in values])
+
+    df = pd.DataFrame(data, index=pd.RangeIndex(len(raw_rows)))
+    df.columns = names
+    return df
+
+
+def _serialize_value(value: Any) -> Any:
+    """Convert a single cell; the branch order defines the record format."""
+    if pd.isna(value):
+        return None
+    elif hasattr(value, 'isoformat'):  # Timestamp, Timedelta, date and time objects
+        return value.isoformat()
+    elif hasattr(value, 'strftime'):  # other datetime-like objects
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(value, type):  # type objects
+        return value.__name__
+    elif hasattr(value, 'item'):  # numpy scalars
+        return value.item()
+    return value
+
+
+def _serialize_objects(values: np.ndarray) -> List[Any]:
+    """Cell-by-cell conversion for object (dynamic) and unusual extension columns."""
+    out = []
+    append = out.append
+    for value in values:
+        value_type = type(value)
+        # Types that pass through every branch of _serialize_value unchanged
+        if value_type is str or value_type is dict or value_type is int or value_type is bool:
+            append(value)
+        elif value_type is float:
+            append(None if value != value else value)
+        elif value is None:
+            append(None)
+        else:
+            append(_serialize_value(value))
+    return out
+
+
+def _with_nulls(values: np.ndarray, mask: np.ndarray) -> List[Any]:
+    """Turn an array into a list with None wherever ``mask`` is set."""
+    if mask.any():
+        values = values.astype(object)
+        values[mask] = None
+    return values.tolist()
+
+
+def _serialize_datetimes(col: pd.Series) -> List[Any]:
+    """ISO 8601 strings matching Timestamp.isoformat(), built with numpy."""
+    tz = getattr(col.dt, "tz", None)
+    suffix = ""
+    if tz is not None:
+        if str(tz) != "UTC":
+            # Per-row offsets (DST); rare for Kusto results, which are UTC
+            return _serialize_objects(col.array.astype(object))
+        col = col.dt.tz_localize(None)
+        suffix = "+00:00"
+
+    values = col.to_numpy()
+    mask = np.isnat(values)
+    # isoformat() only prints as much sub-second precision as the value needs
+    text = np.datetime_as_string(values, unit="s")
+    fractional = (values != values.astype("datetime64[s]")) & ~mask
+    if fractional.any():
+        sub = values[fractional]
+        sub_text = np.datetime_as_string(sub, unit="us")
+        nanos = sub != sub.astype("datetime64[us]")
+        if nanos.any():
+            nanos_text = np.datetime_as_string(sub[nanos], unit="ns")
+            sub_text = sub_text.astype(np.promote_types(sub_text.dtype, nanos_text.dtype))
+            sub_text[nanos] = nanos_text
+        text = text.astype(np.promote_types(text.dtype, sub_text.dtype))
+        text[fractional] = sub_text
+    if suffix:
+        text = np.char.add(text, suffix)
+    return _with_nulls(text, mask)
+
+
+def _serialize_timedeltas(col: pd.Series) -> List[Any]:
+    """ISO 8601 durations matching Timedelta.isoformat(), built from integer components."""
+    values = col.to_numpy().astype("timedelta64[ns]")
+    mask = np.isnat(values)
+    nanos = np.where(mask, 0, values.view("int64"))
+    # Floor division keeps the Timedelta.components convention for negatives (-1.5s -> P-1DT23H59M58.5S)
+    days, rest = np.divmod(nanos, 86_400 * 10**9)
+    hours, rest = np.divmod(rest, 3_600 * 10**9)
+    minutes, rest = np.divmod(rest, 60 * 10**9)
+    seconds, fraction = np.divmod(rest, 10**9)
+
+    out = [
+        f"P{d}DT{h}H{m}M{s}.{f:09d}".rstrip("0") + "S" if f else f"P{d}DT{h}H{m}M{s}S"
+        for d, h, m, s, f in zip(days.tolist(), hours.tolist(), minutes.tolist(), seconds.tolist(), fraction.tolist())
+    ]
+    if mask.any():
+        for i in np.flatnonzero(mask).tolist():
+            out[i] = None
+    return out
+
+
+def _serialize_column(col: pd.Series, row_dtype: Any) -> List[Any]:
+    """Convert one column in bulk according to its dtype."""
+    dtype = col.dtype
+    if row_dtype is not None:
+        # All-numeric frames are read row-wise as one common dtype (int + float -> float)
+        values = col.to_numpy(dtype=row_dtype)
+        return _with_nulls(values, np.isnan(values)) if values.dtype.kind in "fc" else values.tolist()
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in "iub":
+            return col.to_numpy().tolist()
+        if dtype.kind in "fc":
+            values = col.to_numpy()
+            return _with_nulls(values, np.isnan(values))
+        if dtype.kind == "M":
+            return _serialize_datetimes(col)
+        if dtype.kind == "m":
+            return _serialize_timedeltas(col)
+        if dtype.kind == "O":
+            values = col.to_numpy()
+            if infer_dtype(values, skipna=True) in ("string", "empty"):
+                return _with_nulls(values, pd.isna(values))
+            return _serialize_objects(values)
+    elif isinstance(dtype, pd.DatetimeTZDtype):
+        return _serialize_datetimes(col)
+    elif isinstance(dtype, pd.StringDtype):
+        values = col.to_numpy(dtype=object)
+        return _with_nulls(values, col.isna().to_numpy())
+    return _serialize_objects(np.asarray(col.array, dtype=object))
+
+
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a DataFrame into JSON-serializable records, one column at a time.
+
+    Produces the same records as converting every cell of ``df.iterrows()``
+    (NaN/NaT -> None, timestamps and timedeltas -> ISO 8601, numpy scalars ->
+    Python scalars) but works on whole columns. If any cell cannot be
+    converted, every value falls back to its string form.
+    """
+    if len(df.columns) == 0:
+        return [{} for _ in range(len(df))]
+    try:
+        # iterrows() reads rows through df.values, which upcasts mixed numeric columns
+        common = find_common_type(list(df.dtypes))
+        row_dtype = common if isinstance(common, np.dtype) and common.kind in "iufcb" else None
+        columns = [_serialize_column(df.iloc[:, i], row_dtype) for i in range(len(df.columns))]
+        labels = df.columns.tolist()
+        return [dict(zip(labels, row)) for row in zip(*columns)]
+    except Exception as e:
+        logger.warning(f"DataFrame conversion failed: {e}")
+        # Fallback: convert to string representation
+        return df.astype(str).to_dict("records")
+
+
+@dataclass
+class StoredResult:
+    """A result kept for paging, held in memory or spilled to disk."""
+    result_id: str
+    rows: int
+    columns: List[str]
+    nbytes: int
+    expires_at: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    df: Optional[pd.DataFrame] = None
+    path: Optional[Path] = None
+    disk_bytes: int = 0
+    file_format: Optional[str] = None
+    view: Any = None  # memory-mapped Arrow table over ``path``, or the frame read back from a pickle
+    spilling: bool = False  # a spill file is being written outside the store lock
+
+
+class ResultStore:
+    """
+    Server-side store of query results that are returned page by page.
+
+    Results stay in memory up to ``max_bytes``; past that the least recently
+    used results (and any single result over ``spill_rows``/``spill_bytes``)
+    are written to a per-process spill directory under the KQL_MCP data
+    directory. Spills use the Arrow IPC format when pyarrow is installed, so
+    pages are sliced from a memory-mapped view instead of loading the whole
+    result; pickled spills are read back once and count against ``max_bytes``
+    until the budget needs the room again. Spill files are written outside
+    the store lock and swapped in afterwards, so paging other results never
+    waits on disk writes. Results expire ``ttl_seconds`` after their last
+    access, and spilled files are removed on eviction, expiry and shutdown.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+        spill_root: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        spill_rows: Optional[int] = None,
+        spill_bytes: Optional[int] = None,
+    ):
+        self.ttl_seconds = RESULT_STORE_CONFIG.get("ttl_seconds", 1800.0) if ttl_seconds is None else ttl_seconds
+        self.max_bytes = RESULT_STORE_CONFIG.get("max_bytes", 256 * 1024 * 1024) if max_bytes is None else max_bytes
+        self.max_disk_bytes = (
+            RESULT_STORE_CONFIG.get("max_disk_bytes", 2 * 1024 * 1024 * 1024) if max_disk_bytes is None else max_disk_bytes
+        )
+        self.enabled = RESULT_STORE_CONFIG.get("enabled", True) if enabled is None else enabled
+        self.spill_rows = RESULT_STORE_CONFIG.get("spill_rows", 200000) if spill_rows is None else spill_rows
+        self.spill_bytes = RESULT_STORE_CONFIG.get("spill_bytes", 64 * 1024 * 1024) if spill_bytes is None else spill_bytes
+        self._spill_root = Path(spill_root) if spill_root else None
+        self._spill_dir: Optional[Path] = None
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._counters = {
+            "stored": 0,
+            "spilled": 0,
+            "evicted": 0,
+            "expired": 0,
+            "rejected_too_large": 0,
+            "exported": 0,
+            "pages_served": 0,
+            "disk_reads": 0,
+        }
+
+    def put(self, df: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Store a result and return its id, or None if it cannot be kept."""
+        if not self.enabled or df is None:
+            return None
+        nbytes = dataframe_nbytes(df)
+        if nbytes > self.max_bytes and nbytes > self.max_disk_bytes:
+            with self._lock:
+                self._counters["rejected_too_large"] += 1
+            return None
+
+        entry = StoredResult(
+            result_id=uuid.uuid4().hex,
+            rows=len(df),
+            columns=[str(column) for column in df.columns],
+            nbytes=nbytes,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            metadata=dict(metadata or {}),
+            df=df,
+        )
+        with self._lock:
+            self._expire_locked()
+            self._entries[entry.result_id] = entry
+            self._memory_bytes += nbytes
+            self._counters["stored"] += 1
+            to_spill = []
+            if nbytes > min(self.max_bytes, self.spill_bytes) or entry.rows > self.spill_rows:
+                # Too large to hold comfortably: write it out instead of displacing others
+                entry.spilling = True
+                to_spill.append(entry)
+            to_spill.extend(self._enforce_budgets_locked())
+        self._spill(to_spill)
+
+        with self._lock:
+            if entry.result_id not in self._entries:
+                return None
+        return entry.result_id
+
+    def export(self, df: pd.DataFrame, file_format: str, metadata: Optional[Dict[str, Any]] = None) -> StoredResult:
+        """
+        Write a result to an Arrow IPC or Parquet file in the spill directory.
+
+        The file is tracked like a spilled result, so it can be paged with
+        ``get_page`` and is removed on expiry, eviction and shutdown.
+
+        Raises:
+            ValueError: If the format is not supported.
+            ImportError: If pyarrow is not installed.
+        """
+        if file_format not in FILE_OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported file format '{file_format}', expected one of {FILE_OUTPUT_FORMATS}")
+        if pa is None:
+            raise ImportError(f"Writing {file_format} files requires pyarrow (pip install 'mcp-kql-server[arrow]')")
+
+        entry = StoredResult(
+            result_id=uuid.uuid4().hex,
+            rows=len(df),
+            columns=[str(column) for column in df.columns],
+            nbytes=dataframe_nbytes(df),
+            expires_at=time.monotonic() + self.ttl_seconds,
+            metadata=dict(metadata or {}),
+        )
+        with self._lock:
+            path = self._get_spill_dir() / f"{entry.result_id}.{file_format}"
+        # Encoding can take a while for large results; keep it outside the lock
+        _write_result_file(df, path, file_format)
+
+        with self._lock:
+            self._expire_locked()
+            entry.path = path
+            entry.file_format = file_format
+            entry.disk_bytes = path.stat().st_size
+            self._entries[entry.result_id] = entry
+            self._disk_bytes += entry.disk_bytes
+            self._counters["exported"] += 1
+            to_spill = self._enforce_budgets_locked()
+        self._spill(to_spill)
+
+        with self._lock:
+            if entry.result_id not in self._entries:
+                raise ResultNotFound(f"Exported result '{entry.result_id}' exceeds the disk budget")
+        return entry
+
+    def get_page(self, result_id: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[pd.DataFrame, StoredResult]:
+        """Return rows ``[offset, offset + limit)`` of a stored result and its entry."""
+        with self._lock:
+            self._expire_locked()
+            entry = self._entries.get(result_id)
+            if entry is None:
+                raise ResultNotFound(f"Result '{result_id}' was not found or has expired")
+            self._entries.move_to_end(result_id)
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+            df = entry.df if entry.df is not None else self._load_locked(entry)
+            self._counters["pages_served"] += 1
+
+        offset = min(offset, entry.rows)
+        end = entry.rows if limit is None else min(offset + limit, entry.rows)
+        if isinstance(df, pd.DataFrame):
+            return df.iloc[offset:end], entry
+        # Memory-mapped Arrow table: only the requested slice is materialized
+        return _decode_json_columns(df.slice(offset, end - offset)), entry
+
+    def delete(self, result_id: str) -> bool:
+        """Forget a stored result."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return False
+            self._remove_locked(entry)
+            return True
+
+    def clear(self) -> None:
+        """Remove every stored result and its spill file."""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._remove_locked(entry)
+
+    def shutdown(self) -> None:
+        """Clear the store and delete this process's spill directory."""
+        with self._lock:
+            self.clear()
+            spill_dir, self._spill_dir = self._spill_dir, None
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return occupancy of memory and disk tiers and lifetime counters."""
+        with self._lock:
+            on_disk = sum(1 for entry in self._entries.values() if entry.df is None)
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "in_memory": len(self._entries) - on_disk,
+                "on_disk": on_disk,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "spill_format": "arrow" if pa is not None else "pickle",
+                **self._counters,
+            }
+
+    def _expire_locked(self) -> None:
+        now = time.monotonic()
+        for entry in [e for e in self._entries.values() if e.expires_at <= now]:
+            self._remove_locked(entry)
+            self._counters["expired"] += 1
+
+    def _enforce_budgets_locked(self) -> List[StoredResult]:
+        """
+        Bring the store back within its budgets, least recently used first.
+
+        Frames read back from pickled spills are dropped and disk is trimmed
+        here; results that still have to be written out are marked and
+        returned for ``_spill`` to write once the lock is released.
+        """
+        to_spill = []
+        pending = sum(entry.nbytes for entry in self._entries.values() if entry.spilling)
+        for entry in list(self._entries.values()):
+            if self._memory_bytes - pending <= self.max_bytes:
+                break
+            if isinstance(entry.view, pd.DataFrame):
+                self._drop_view_locked(entry)
+            elif entry.df is not None and not entry.spilling:
+                entry.spilling = True
+                pending += entry.nbytes
+                to_spill.append(entry)
+        self._trim_disk_locked()
+        return to_spill
+
+    def _trim_disk_locked(self) -> None:
+        for entry in list(self._entries.values()):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if entry.df is None:
+                self._remove_locked(entry)
+                self._counters["evicted"] += 1
+
+    def _spill(self, entries: List[StoredResult]) -> None:
+        """Write results marked by ``_enforce_budgets_locked`` to disk, then swap them in under the lock."""
+        if not entries:
+            return
+        with self._lock:
+            spill_dir = self._get_spill_dir()
+        for entry in entries:
+            try:
+                path, file_format = _write_spill_file(entry.df, spill_dir / entry.result_id)
+            except Exception as e:
+                logger.warning(f"Could not spill result {entry.result_id} to disk, dropping it: {e}")
+                with self._lock:
+                    entry.spilling = False
+                    if entry.result_id in self._entries:
+                        self._remove_locked(entry)
+                        self._counters["evicted"] += 1
+                continue
+
+            disk_bytes = path.stat().st_size
+            with self._lock:
+                entry.spilling = False
+                if entry.result_id not in self._entries or entry.df is None:
+                    # Deleted or expired while the file was being written
+                    path.unlink(missing_ok=True)
+                    continue
+                self._memory_bytes -= entry.nbytes
+                entry.df = None
+                entry.path = path
+                entry.file_format = file_format
+                entry.disk_bytes = disk_bytes
+                self._disk_bytes += disk_bytes
+                self._counters["spilled"] += 1
+                self._trim_disk_locked()
+            logger.debug(f"Spilled result {entry.result_id} ({entry.rows} rows) to {path}")
+
+    def _load_locked(self, entry: StoredResult) -> Any:
+        """Return a spilled result: a memory-mapped Arrow table, or a DataFrame read from pickle."""
+        if entry.view is not None:
+            return entry.view
+        try:
+            if entry.file_format == "pickle":
+                data = pd.read_pickle(entry.path)
+                # Keep it for the following pages; it counts as memory until the budget needs it back
+                self._memory_bytes += entry.nbytes
+            else:
+                data = _open_result_file(entry.path, entry.file_format)
+        except Exception as e:
+            self._remove_locked(entry)
+            raise ResultNotFound(f"Spilled result '{entry.result_id}' could not be read: {e}") from e
+        entry.view = data
+        self._counters["disk_reads"] += 1
+        return data
+
+    def _drop_view_locked(self, entry: StoredResult) -> None:
+        if isinstance(entry.view, pd.DataFrame):
+            self._memory_bytes -= entry.nbytes
+        entry.view = None
+
+    def _remove_locked(self, entry: StoredResult) -> None:
+        if self._entries.pop(entry.result_id, None) is None:
+            return
+        if entry.df is not None:
+            self._memory_bytes -= entry.nbytes
+            entry.df = None
+        self._drop_view_locked(entry)
+        if entry.path is not None:
+            self._disk_bytes -= entry.disk_bytes
+            try:
+                entry.path.unlink()
+            except OSError:
+                pass
+            entry.path = None
+
+    def _get_spill_dir(self) -> Path:
+        """Create this process's spill directory, clearing ones abandoned by dead processes."""
+        if self._spill_dir is not None:
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            return self._spill_dir
+
+        root = self._spill_root
+        if root is None:
+            from .memory import get_memory_manager
+            root = get_memory_manager().memory_path.parent / "results"
+        root.mkdir(parents=True, exist_ok=True)
+
+        stale_before = time.time() - RESULT_STORE_CONFIG.get("stale_spill_seconds", 86400.0)
+        for candidate in root.glob("store-*"):
+            try:
+                if candidate.is_dir() and candidate.stat().st_mtime < stale_before:
+                    shutil.rmtree(candidate, ignore_errors=True)
+                    logger.info(f"Removed stale result spill directory {candidate}")
+            except OSError:
+                continue
+
+        self._spill_dir = Path(tempfile.mkdtemp(prefix="store-", dir=root))
+        return self._spill_dir
+
+
+def _is_dynamic_column(col: pd.Series) -> bool:
+    """Object columns holding anything but strings (Kusto dynamic values, mixed types)."""
+    return col.dtype == object and infer_dtype(col, skipna=True) not in ("string", "empty")
+
+
+def _arrow_round_trips(df: pd.DataFrame) -> bool:
+    """Whether Arrow gives back exactly this DataFrame: string column labels and no dynamic columns."""
+    return all(isinstance(label, str) for label in df.columns) and not any(
+        _is_dynamic_column(df.iloc[:, i]) for i in range(len(df.columns))
+    )
+
+
+# Arrow schema metadata key listing the positions of columns written as JSON text
+_JSON_COLUMNS_KEY = b"mcp_kql_server.json_columns"
+
+
+def _json_text(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _json_value(text: Any) -> Any:
+    return json.loads(text) if isinstance(text, str) else None
+
+
+def _decode_json_columns(table: Any) -> pd.DataFrame:
+    """Convert an Arrow table to pandas, turning the columns written as JSON text back into values."""
+    df = table.to_pandas()
+    json_columns = json.loads((table.schema.metadata or {}).get(_JSON_COLUMNS_KEY, b"[]"))
+    for i in json_columns:
+        df.isetitem(i, df.iloc[:, i].astype(object).map(_json_value).astype(object))
+    return df
+
+
+def _write_spill_file(df: pd.DataFrame, stem: Path) -> Tuple[Path, str]:
+    """Write a spilled result next to ``stem`` as Arrow IPC when it round-trips exactly, else as pickle."""
+    # Dynamic columns would come back from Arrow with inferred struct/double types
+    if pa is not None and _arrow_round_trips(df):
+        path = stem.with_suffix(".arrow")
+        try:
+            _write_result_file(df, path, "arrow")
+            return path, "arrow"
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logger.debug(f"Result {stem.name} is not Arrow-compatible, spilling as pickle: {e}")
+            path.unlink(missing_ok=True)
+    path = stem.with_suffix(".pkl")
+    df.to_pickle(path)
+    return path, "pickle"
+
+
+def _write_result_file(df: pd.DataFrame, path: Path, file_format: str) -> None:
+    """
+    Write a DataFrame as an uncompressed Arrow IPC file or a Parquet file.
+
+    Dynamic columns are written as JSON text: Arrow would otherwise infer one
+    struct or numeric type for values that do not share one. Their positions
+    are kept in the schema metadata so ``get_page`` can decode them again.
+    """
+    dynamic = [i for i in range(len(df.columns)) if _is_dynamic_column(df.iloc[:, i])]
+    if dynamic:
+        df = df.copy()
+        for i in dynamic:
+            df.isetitem(i, df.iloc[:, i].map(_json_text).astype(object))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if dynamic:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), _JSON_COLUMNS_KEY: json.dumps(dynamic)})
+    if file_format == "parquet":
+        pa_parquet.write_table(table, str(path))
+        return
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _open_result_file(path: Path, file_format: str) -> Any:
+    """Open a result file as an Arrow table backed by a memory map."""
+    if file_format == "parquet":
+        return pa_parquet.read_table(str(path), memory_map=True)
+    return pa_ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+# Global result cache shared by all tool calls
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache, creating it on first use."""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
+
+
+# Global result store backing paginated results
+_result_store: Optional[ResultStore] = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """Get the process-wide result store, creating it on first use."""
+    global _result_store
+    if _result_store is None:
+        with _result_store_lock:
+            if _result_store is None:
+                _result_store = ResultStore()
+    return _result_store
+
+
+def shutdown_result_store() -> None:
+    """Delete stored results and spill files and reset the global store."""
+    global _result_store
+    with _result_store_lock:
+        store, _result_store = _result_store, None
+    if store is not None:
+        store.shutdown()
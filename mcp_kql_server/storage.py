@@ -0,0 +1,828 @@
+"""
+Schema Memory Storage Module
+
+This module persists the schema memory corpus kept by ``MemoryManager``.
+The corpus itself stays an in-memory dict; a storage backend loads it at
+startup and writes back the sections that changed.
+
+Two backends ship with the server:
+- ``sqlite`` (default): a WAL-mode SQLite database with one row per cluster,
+  database, table schema, successful query, session and session entry.
+  Saves upsert only the sections marked dirty. An existing
+  ``unified_memory.json`` is migrated into it on first use.
+- ``json``: the single ``unified_memory.json`` file, rewritten on every save.
+
+Saves run behind callers on one ``MemoryWriter`` thread per manager, which
+coalesces bursts of changes into a single write and flushes at interpreter
+exit, which SIGTERM/SIGHUP trigger with a normal exit. A save is split in two: ``snapshot`` serializes
+the dirty sections while the manager holds its lock, and ``write`` persists
+them after the lock is released.
+
+High-frequency events (successful queries and learning entries) are not
+saved through the backend one by one. They are appended to a JSON-lines
+``MemoryJournal``, replayed on startup, and compacted into the main store
+by the writer.
+
+Backends that support shards (SQLite) can load lazily: startup reads only
+the corpus, cluster and database rows, which act as the index, and the
+tables of one database (a shard) are read with ``load_shard`` when the
+manager first needs them.
+
+Dirty sections are tuples naming a part of the corpus:
+    ("corpus",)                           top-level fields
+    ("cluster", cluster)                  cluster meta, global queries and learning results
+    ("database", cluster, database)       database meta
+    ("table", cluster, database, table)   table schema and its successful queries
+    ("session", session_id)               session summary and learning entries
+A section that no longer exists in the corpus is deleted from storage.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import atexit
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import sqlite3
+except ImportError:  # Python builds without the sqlite3 module
+    sqlite3 = None
+
+from .constants import MEMORY_STORAGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DirtyKey = Tuple[str, ...]
+
+# Marks the whole corpus dirty: the next save rewrites everything
+ALL_SECTIONS: DirtyKey = ("all",)
+
+# Cluster-level (global) successful queries are stored without a database and table
+_GLOBAL = ""
+
+# A SQL statement and the parameter rows it is run with
+_Op = Tuple[str, List[Tuple[Any, ...]]]
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def entry_size(value: Any) -> int:
+    """Serialized size in bytes of a corpus entry, encoded as the backends write it."""
+    return _size(_dumps(value))
+
+
+class MemoryStorage:
+    """Interface of a schema memory persistence backend."""
+
+    name = "base"
+    path: Path
+    # Whether load(lazy=True) can defer table data to load_shard()
+    supports_shards = False
+    # Set by load(): True when the tables of every database were left to load_shard()
+    lazy_loaded = False
+
+    def load(self, lazy: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored corpus, or None when nothing has been stored yet.
+
+        With ``lazy`` a backend that supports shards leaves the ``tables`` of
+        every database empty and sets ``lazy_loaded``.
+        """
+        raise NotImplementedError
+
+    def load_shard(self, cluster_uri: str, database: str) -> Dict[str, Any]:
+        """Return the tables (with their successful queries) of one database."""
+        raise NotImplementedError
+
+    def shard_summary(self, cluster_uri: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, int]]:
+        """
+        Stored ``tables``, successful ``queries`` and table data ``bytes`` per
+        (cluster, database), optionally for one cluster only.
+        """
+        raise NotImplementedError
+
+    def save(self, corpus: Dict[str, Any], dirty: Optional[Iterable[DirtyKey]] = None) -> int:
+        """
+        Persist the corpus and return the number of bytes written.
+
+        ``dirty`` names the sections that changed; None writes everything.
+        """
+        return self.write(self.snapshot(corpus, dirty))
+
+    def snapshot(self, corpus: Dict[str, Any], dirty: Optional[Iterable[DirtyKey]] = None) -> Any:
+        """
+        Serialize what ``save`` would write, without writing it.
+
+        The snapshot shares nothing with the corpus, so it can be passed to
+        ``write`` after the caller has released the lock guarding the corpus.
+        """
+        raise NotImplementedError
+
+    def write(self, snapshot: Any) -> int:
+        """Persist a ``snapshot`` and return the number of bytes written."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources held by the backend."""
+
+
+class JsonFileStorage(MemoryStorage):
+    """The whole corpus in one JSON file, replaced atomically on every save."""
+
+    name = "json"
+
+    def __init__(self, memory_path: Path):
+        self.path = Path(memory_path)
+
+    def load(self, lazy: bool = False) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def snapshot(self, corpus: Dict[str, Any], dirty: Optional[Iterable[DirtyKey]] = None) -> str:
+        return json.dumps(corpus, indent=2, ensure_ascii=False, default=str)
+
+    def write(self, snapshot: str) -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Atomic save
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(self.path)
+        return _size(snapshot)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corpus_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clusters (
+    cluster_uri TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS databases (
+    cluster_uri TEXT NOT NULL,
+    database_name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (cluster_uri, database_name)
+);
+CREATE TABLE IF NOT EXISTS table_schemas (
+    cluster_uri TEXT NOT NULL,
+    database_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (cluster_uri, database_name, table_name)
+);
+CREATE TABLE IF NOT EXISTS successful_queries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cluster_uri TEXT NOT NULL,
+    database_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_successful_queries_table
+    ON successful_queries (cluster_uri, database_name, table_name);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_session_entries_session ON session_entries (session_id);
+"""
+
+
+class SQLiteStorage(MemoryStorage):
+    """
+    Corpus rows in a WAL-mode SQLite database.
+
+    Every cluster, database, table schema, successful query, session and
+    session entry is its own row, keyed by primary keys, so a save touches
+    only the rows of the dirty sections inside one transaction.
+    """
+
+    name = "sqlite"
+    supports_shards = True
+
+    def __init__(self, path: Path, legacy_json_path: Optional[Path] = None, busy_timeout: Optional[float] = None):
+        if sqlite3 is None:
+            raise RuntimeError("The sqlite3 module is not available in this Python build")
+        self.path = Path(path)
+        self.legacy_json_path = Path(legacy_json_path) if legacy_json_path else None
+        self.busy_timeout = busy_timeout if busy_timeout is not None else MEMORY_STORAGE_CONFIG.get("busy_timeout", 5.0)
+        self.migrated = False
+        self._conn: Optional["sqlite3.Connection"] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> "sqlite3.Connection":
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SQLITE_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def load(self, lazy: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connection()
+            self.lazy_loaded = False
+            if conn.execute("SELECT 1 FROM corpus_meta LIMIT 1").fetchone() is None:
+                return self._migrate_legacy_json()
+
+            corpus: Dict[str, Any] = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM corpus_meta")}
+            clusters: Dict[str, Any] = {}
+            for cluster_uri, data in conn.execute("SELECT cluster_uri, data FROM clusters ORDER BY rowid"):
+                cluster = json.loads(data)
+                cluster["databases"] = {}
+                clusters[cluster_uri] = cluster
+
+            for cluster_uri, database, data in conn.execute(
+                "SELECT cluster_uri, database_name, data FROM databases ORDER BY rowid"
+            ):
+                db_data = json.loads(data)
+                db_data["tables"] = {}
+                clusters.setdefault(cluster_uri, {"meta": {}, "databases": {}})["databases"][database] = db_data
+
+            if lazy:
+                # Table schemas and their queries stay on disk until load_shard()
+                query_rows = conn.execute(
+                    "SELECT cluster_uri, database_name, table_name, data FROM successful_queries "
+                    "WHERE database_name = ? AND table_name = ? ORDER BY id",
+                    (_GLOBAL, _GLOBAL),
+                )
+            else:
+                for cluster_uri, database, table, data in conn.execute(
+                    "SELECT cluster_uri, database_name, table_name, data FROM table_schemas ORDER BY rowid"
+                ):
+                    table_data = json.loads(data)
+                    table_data["successful_queries"] = []
+                    db_data = clusters.get(cluster_uri, {}).get("databases", {}).get(database)
+                    if db_data is not None:
+                        db_data["tables"][table] = table_data
+                query_rows = conn.execute(
+                    "SELECT cluster_uri, database_name, table_name, data FROM successful_queries ORDER BY id"
+                )
+
+            for cluster_uri, database, table, data in query_rows:
+                cluster = clusters.get(cluster_uri)
+                if cluster is None:
+                    continue
+                if database == _GLOBAL and table == _GLOBAL:
+                    cluster.setdefault("successful_queries", []).append(json.loads(data))
+                    continue
+                table_data = cluster["databases"].get(database, {}).get("tables", {}).get(table)
+                if table_data is not None:
+                    table_data["successful_queries"].append(json.loads(data))
+
+            sessions: Dict[str, Any] = {}
+            for session_id, data in conn.execute("SELECT session_id, data FROM sessions ORDER BY rowid"):
+                session = json.loads(data)
+                session["learning_entries"] = []
+                sessions[session_id] = session
+            for session_id, data in conn.execute("SELECT session_id, data FROM session_entries ORDER BY id"):
+                if session_id in sessions:
+                    sessions[session_id]["learning_entries"].append(json.loads(data))
+
+            corpus["clusters"] = clusters
+            if sessions:
+                corpus["sessions"] = sessions
+            self.lazy_loaded = lazy
+            return corpus
+
+    def load_shard(self, cluster_uri: str, database: str) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connection()
+            tables: Dict[str, Any] = {}
+            for table, data in conn.execute(
+                "SELECT table_name, data FROM table_schemas WHERE cluster_uri = ? AND database_name = ? ORDER BY rowid",
+                (cluster_uri, database),
+            ):
+                table_data = json.loads(data)
+                table_data["successful_queries"] = []
+                tables[table] = table_data
+            for table, data in conn.execute(
+                "SELECT table_name, data FROM successful_queries WHERE cluster_uri = ? AND database_name = ? ORDER BY id",
+                (cluster_uri, database),
+            ):
+                if table in tables:
+                    tables[table]["successful_queries"].append(json.loads(data))
+            return tables
+
+    def shard_summary(self, cluster_uri: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, int]]:
+        with self._lock:
+            conn = self._connection()
+            where, params = ("WHERE cluster_uri = ?", (cluster_uri,)) if cluster_uri is not None else ("", ())
+            summary: Dict[Tuple[str, str], Dict[str, int]] = {}
+            for cluster, database, count, size in conn.execute(
+                "SELECT cluster_uri, database_name, COUNT(*), SUM(LENGTH(CAST(data AS BLOB))) "
+                f"FROM table_schemas {where} GROUP BY cluster_uri, database_name",
+                params,
+            ):
+                summary[(cluster, database)] = {"tables": count, "queries": 0, "bytes": size or 0}
+            for cluster, database, count, size in conn.execute(
+                "SELECT cluster_uri, database_name, COUNT(*), SUM(LENGTH(CAST(data AS BLOB))) "
+                f"FROM successful_queries {where + ' AND' if where else 'WHERE'} table_name != ? "
+                "GROUP BY cluster_uri, database_name",
+                (*params, _GLOBAL),
+            ):
+                entry = summary.setdefault((cluster, database), {"tables": 0, "queries": 0, "bytes": 0})
+                entry["queries"] = count
+                entry["bytes"] += size or 0
+            return summary
+
+    def _migrate_legacy_json(self) -> Optional[Dict[str, Any]]:
+        """Import unified_memory.json once; the file is kept as ``.migrated``."""
+        legacy = self.legacy_json_path
+        if legacy is None or not legacy.exists():
+            return None
+
+        corpus = JsonFileStorage(legacy).load()
+        if not isinstance(corpus, dict):
+            return None
+        written = self.save(corpus)
+        legacy.replace(legacy.with_name(legacy.name + ".migrated"))
+        self.migrated = True
+        logger.info(f"Migrated schema memory from {legacy} to {self.path} ({written} bytes)")
+        return corpus
+
+    def snapshot(self, corpus: Dict[str, Any], dirty: Optional[Iterable[DirtyKey]] = None) -> Tuple[List[_Op], int]:
+        """The statements that upsert the dirty sections' rows, and the bytes they write."""
+        ops: List[_Op] = []
+        dirty = None if dirty is None else list(dirty)
+        if dirty is None or ALL_SECTIONS in dirty:
+            written = self._write_all(ops, corpus)
+        else:
+            written = sum(self._write_section(ops, corpus, key) for key in dirty)
+        return ops, written
+
+    def write(self, snapshot: Tuple[List[_Op], int]) -> int:
+        ops, written = snapshot
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in ops:
+                    conn.executemany(sql, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return written
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    # Fold the WAL into the database file so the data survives without it
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except Exception as e:
+                    logger.debug(f"WAL checkpoint on close failed: {e}")
+                self._conn.close()
+                self._conn = None
+
+    def _write_all(self, ops: List[_Op], corpus: Dict[str, Any]) -> int:
+        for table in ("corpus_meta", "clusters", "databases", "table_schemas", "successful_queries", "sessions", "session_entries"):
+            ops.append((f"DELETE FROM {table}", [()]))
+
+        written = self._write_corpus_meta(ops, corpus)
+        for cluster_uri, cluster in corpus.get("clusters", {}).items():
+            written += self._write_cluster(ops, corpus, cluster_uri)
+            for database, db_data in (cluster.get("databases") or {}).items():
+                written += self._write_database(ops, corpus, cluster_uri, database)
+                for table in (db_data.get("tables") or {}):
+                    written += self._write_table(ops, corpus, cluster_uri, database, table)
+        for session_id in corpus.get("sessions", {}) or {}:
+            written += self._write_session(ops, corpus, session_id)
+        return written
+
+    def _write_section(self, ops: List[_Op], corpus: Dict[str, Any], key: DirtyKey) -> int:
+        kind = key[0]
+        if kind == "corpus":
+            return self._write_corpus_meta(ops, corpus)
+        if kind == "cluster":
+            return self._write_cluster(ops, corpus, key[1])
+        if kind == "database":
+            return self._write_database(ops, corpus, key[1], key[2])
+        if kind == "table":
+            return self._write_table(ops, corpus, key[1], key[2], key[3])
+        if kind == "session":
+            return self._write_session(ops, corpus, key[1])
+        raise ValueError(f"Unknown memory section {key!r}")
+
+    @staticmethod
+    def _write_corpus_meta(ops: List[_Op], corpus: Dict[str, Any]) -> int:
+        rows = [(key, _dumps(value)) for key, value in corpus.items() if key not in ("clusters", "sessions")]
+        ops.append(("DELETE FROM corpus_meta", [()]))
+        ops.append(("INSERT INTO corpus_meta (key, value) VALUES (?, ?)", rows))
+        return sum(_size(value) for _, value in rows)
+
+    @staticmethod
+    def _insert_queries(ops: List[_Op], cluster_uri: str, database: str, table: str, queries: List[Any]) -> int:
+        rows = [(cluster_uri, database, table, _dumps(query)) for query in queries]
+        ops.append((
+            "DELETE FROM successful_queries WHERE cluster_uri = ? AND database_name = ? AND table_name = ?",
+            [(cluster_uri, database, table)],
+        ))
+        ops.append((
+            "INSERT INTO successful_queries (cluster_uri, database_name, table_name, data) VALUES (?, ?, ?, ?)", rows
+        ))
+        return sum(_size(row[3]) for row in rows)
+
+    def _write_cluster(self, ops: List[_Op], corpus: Dict[str, Any], cluster_uri: str) -> int:
+        cluster = corpus.get("clusters", {}).get(cluster_uri)
+        if not isinstance(cluster, dict):
+            for table in ("clusters", "databases", "table_schemas", "successful_queries"):
+                ops.append((f"DELETE FROM {table} WHERE cluster_uri = ?", [(cluster_uri,)]))
+            return 0
+
+        data = _dumps({k: v for k, v in cluster.items() if k not in ("databases", "successful_queries")})
+        ops.append((
+            "INSERT INTO clusters (cluster_uri, data) VALUES (?, ?) "
+            "ON CONFLICT (cluster_uri) DO UPDATE SET data = excluded.data",
+            [(cluster_uri, data)],
+        ))
+        return _size(data) + self._insert_queries(ops, cluster_uri, _GLOBAL, _GLOBAL, cluster.get("successful_queries") or [])
+
+    @staticmethod
+    def _write_database(ops: List[_Op], corpus: Dict[str, Any], cluster_uri: str, database: str) -> int:
+        db_data = corpus.get("clusters", {}).get(cluster_uri, {}).get("databases", {}).get(database)
+        if not isinstance(db_data, dict):
+            for table in ("databases", "table_schemas", "successful_queries"):
+                ops.append((f"DELETE FROM {table} WHERE cluster_uri = ? AND database_name = ?", [(cluster_uri, database)]))
+            return 0
+
+        data = _dumps({k: v for k, v in db_data.items() if k != "tables"})
+        ops.append((
+            "INSERT INTO databases (cluster_uri, database_name, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (cluster_uri, database_name) DO UPDATE SET data = excluded.data",
+            [(cluster_uri, database, data)],
+        ))
+        return _size(data)
+
+    def _write_table(self, ops: List[_Op], corpus: Dict[str, Any], cluster_uri: str, database: str, table: str) -> int:
+        db_data = corpus.get("clusters", {}).get(cluster_uri, {}).get("databases", {}).get(database, {})
+        table_data = (db_data.get("tables") or {}).get(table) if isinstance(db_data, dict) else None
+        if not isinstance(table_data, dict):
+            for sql_table in ("table_schemas", "successful_queries"):
+                ops.append((
+                    f"DELETE FROM {sql_table} WHERE cluster_uri = ? AND database_name = ? AND table_name = ?",
+                    [(cluster_uri, database, table)],
+                ))
+            return 0
+
+        data = _dumps({k: v for k, v in table_data.items() if k != "successful_queries"})
+        ops.append((
+            "INSERT INTO table_schemas (cluster_uri, database_name, table_name, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (cluster_uri, database_name, table_name) DO UPDATE SET data = excluded.data",
+            [(cluster_uri, database, table, data)],
+        ))
+        return _size(data) + self._insert_queries(ops, cluster_uri, database, table, table_data.get("successful_queries") or [])
+
+    @staticmethod
+    def _write_session(ops: List[_Op], corpus: Dict[str, Any], session_id: str) -> int:
+        session = (corpus.get("sessions") or {}).get(session_id)
+        ops.append(("DELETE FROM session_entries WHERE session_id = ?", [(session_id,)]))
+        if not isinstance(session, dict):
+            ops.append(("DELETE FROM sessions WHERE session_id = ?", [(session_id,)]))
+            return 0
+
+        data = _dumps({k: v for k, v in session.items() if k != "learning_entries"})
+        ops.append((
+            "INSERT INTO sessions (session_id, data) VALUES (?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data",
+            [(session_id, data)],
+        ))
+        rows = [(session_id, _dumps(entry)) for entry in session.get("learning_entries") or []]
+        ops.append(("INSERT INTO session_entries (session_id, data) VALUES (?, ?)", rows))
+        return _size(data) + sum(_size(row[1]) for row in rows)
+
+
+class MemoryWriter:
+    """
+    One long-lived thread that saves memory changes behind the callers.
+
+    ``notify`` never writes. The thread saves once the oldest unsaved change
+    is ``flush_interval`` seconds old, or right away once
+    ``flush_max_dirty_sections`` sections are waiting, so a burst of updates
+    becomes one write. ``flush`` saves synchronously on the calling thread.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[], int],
+        flush_interval: Optional[float] = None,
+        max_dirty_sections: Optional[int] = None,
+    ):
+        self._flush = flush
+        self.flush_interval = MEMORY_STORAGE_CONFIG.get("flush_interval", 2.0) if flush_interval is None else flush_interval
+        self.max_dirty_sections = (
+            MEMORY_STORAGE_CONFIG.get("flush_max_dirty_sections", 64) if max_dirty_sections is None else max_dirty_sections
+        )
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending_since: Optional[float] = None
+        self._urgent = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {
+            "flushes": 0,
+            "errors": 0,
+            "bytes_written": 0,
+            "last_flush_bytes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def notify(self, dirty_sections: int = 1) -> None:
+        """Record that changes are waiting; ``dirty_sections`` is how many."""
+        with self._cond:
+            if self._closed:
+                return
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if dirty_sections >= self.max_dirty_sections:
+                self._urgent = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kql-memory-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self) -> int:
+        """Save waiting changes now; returns the number of bytes written."""
+        with self._cond:
+            self._pending_since = None
+            self._urgent = False
+        return self._flush_once()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return flush counts, latency and bytes written."""
+        with self._cond:
+            stats = dict(self._counters)
+            stats["pending"] = self._pending_since is not None
+        total_ms = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = round(total_ms / stats["flushes"], 3) if stats["flushes"] else 0.0
+        stats["last_flush_ms"] = round(stats["last_flush_ms"], 3)
+        stats["max_flush_ms"] = round(stats["max_flush_ms"], 3)
+        return stats
+
+    def shutdown(self, flush: bool = True, timeout: float = 5.0) -> None:
+        """Stop the thread, then save whatever is still waiting."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        if flush:
+            self._flush_once()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._pending_since is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._pending_since + self.flush_interval - time.monotonic()
+                    if self._urgent or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                self._pending_since = None
+                self._urgent = False
+            self._flush_once()
+
+    def _flush_once(self) -> int:
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                written = self._flush() or 0
+            except Exception as e:
+                logger.error(f"Failed to save memory: {e}")
+                with self._cond:
+                    self._counters["errors"] += 1
+                    # The sections are still dirty; try again after another interval
+                    if not self._closed and self._pending_since is None:
+                        self._pending_since = time.monotonic()
+                        self._cond.notify()
+                return 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if written:
+            with self._cond:
+                self._counters["flushes"] += 1
+                self._counters["bytes_written"] += written
+                self._counters["last_flush_bytes"] = written
+                self._counters["last_flush_ms"] = elapsed_ms
+                self._counters["max_flush_ms"] = max(self._counters["max_flush_ms"], elapsed_ms)
+                self._counters["total_flush_ms"] += elapsed_ms
+            logger.debug(f"Flushed {written} bytes of schema memory in {elapsed_ms:.1f}ms")
+        return written
+
+
+class MemoryJournal:
+    """
+    Append-only JSON-lines log of memory events.
+
+    ``append`` writes one line and hands it to the OS; the file is fsynced at
+    most every ``fsync_interval`` seconds and on close. After the events
+    have been compacted into the main store, ``truncate`` empties the log.
+    """
+
+    def __init__(self, path: Path, fsync_interval: Optional[float] = None):
+        self.path = Path(path)
+        self.fsync_interval = (
+            MEMORY_STORAGE_CONFIG.get("journal_fsync_interval", 1.0) if fsync_interval is None else fsync_interval
+        )
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self._size = self.path.stat().st_size if self.path.exists() else 0
+
+    @property
+    def size(self) -> int:
+        """Bytes currently in the journal."""
+        return self._size
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Append one event; returns the number of bytes written."""
+        line = _dumps(record) + "\n"
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+            written = _size(line)
+            self._size += written
+            return written
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """Yield the logged events in order; a torn last line is skipped."""
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable memory journal line {number} in {self.path}")
+
+    def truncate(self, upto: Optional[int] = None) -> None:
+        """
+        Drop events once they are safely in the main store.
+
+        ``upto`` is the journal ``size`` when those events were saved; lines
+        appended after it are kept. None empties the journal.
+        """
+        with self._lock:
+            if upto is not None and upto <= 0:
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if upto is not None and upto < self._size:
+                with open(self.path, "rb") as f:
+                    f.seek(upto)
+                    rest = f.read()
+                temp_path = self.path.with_suffix(".tmp")
+                with open(temp_path, "wb") as f:
+                    f.write(rest)
+                    f.flush()
+                    os.fsync(f.fileno())
+                temp_path.replace(self.path)
+                self._size = len(rest)
+                return
+            if self.path.exists():
+                with open(self.path, "w", encoding="utf-8") as f:
+                    os.fsync(f.fileno())
+            self._size = 0
+
+    def close(self) -> None:
+        """Fsync and close the journal file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+# Objects with flush() and close() saved when the process stops
+_shutdown_targets: "weakref.WeakSet[Any]" = weakref.WeakSet()
+_shutdown_hooks_installed = False
+_shutdown_hooks_lock = threading.Lock()
+
+
+def register_for_shutdown(target: Any) -> None:
+    """
+    Close (and so flush) ``target`` at interpreter exit.
+
+    SIGTERM/SIGHUP are turned into a normal exit so that hook runs; the
+    handlers themselves never flush, because the interrupted code may hold
+    the memory, writer or journal locks. Signal handlers can only be
+    installed from the main thread; when registered from another thread
+    the atexit hook still applies.
+    """
+    global _shutdown_hooks_installed
+    _shutdown_targets.add(target)
+    with _shutdown_hooks_lock:
+        if _shutdown_hooks_installed:
+            return
+        _shutdown_hooks_installed = True
+    atexit.register(_close_shutdown_targets)
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for name in ("SIGTERM", "SIGHUP"):
+        signum = getattr(signal, name, None)
+        if signum is None:
+            continue
+        try:
+            previous = signal.getsignal(signum)
+            signal.signal(signum, _make_signal_handler(previous))
+        except (ValueError, OSError) as e:
+            logger.debug(f"Could not install {name} handler for memory flush: {e}")
+
+
+def _make_signal_handler(previous: Any) -> Callable[[int, Any], None]:
+    def handler(signum: int, frame: Any) -> None:
+        signal.signal(signum, previous if previous is not None else signal.SIG_DFL)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # Unwind the main thread (releasing its locks) so atexit flushes and closes the targets
+            raise SystemExit(128 + signum)
+
+    return handler
+
+
+def _close_shutdown_targets() -> None:
+    for target in list(_shutdown_targets):
+        try:
+            target.close()
+        except Exception as e:
+            logger.debug(f"Closing memory storage at exit failed: {e}")
+
+
+def _open_sqlite(memory_path: Path) -> MemoryStorage:
+    return SQLiteStorage(memory_path.parent / MEMORY_STORAGE_CONFIG.get("sqlite_filename", "unified_memory.db"), legacy_json_path=memory_path)
+
+
+# Backend name -> factory taking the unified_memory.json path
+_STORAGE_BACKENDS: Dict[str, Callable[[Path], MemoryStorage]] = {
+    "json": JsonFileStorage,
+    "sqlite": _open_sqlite,
+}
+
+
+def register_storage_backend(name: str, factory: Callable[[Path], MemoryStorage]) -> None:
+    """Register (or replace) a memory storage backend under a name."""
+    _STORAGE_BACKENDS[name.lower()] = factory
+
+
+def open_memory_storage(memory_path: Path, backend: Optional[str] = None) -> MemoryStorage:
+    """
+    Open the configured storage backend for a memory path.
+
+    Args:
+        memory_path: Path of unified_memory.json; other backends store next to it
+        backend: Backend name; defaults to MEMORY_STORAGE_CONFIG["backend"]
+    """
+    name = (backend or MEMORY_STORAGE_CONFIG.get("backend") or "sqlite").lower()
+    if name == "sqlite" and sqlite3 is None:
+        logger.warning("sqlite3 is not available; falling back to the JSON memory backend")
+        name = "json"
+    factory = _STORAGE_BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown memory storage backend '{name}'. Available: {', '.join(sorted(_STORAGE_BACKENDS))}")
+    return factory(Path(memory_path))
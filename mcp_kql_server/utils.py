@@ -24,13 +24,16 @@ import re
 import logging
 import json
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from .constants import KQL_RESERVED_WORDS, get_dynamic_table_analyzer, get_dynamic_column_analyzer
 
 # Set up logger at module level
 logger = logging.getLogger(__name__)
 
+# One "Name:type" pair of a .show database cslschema row; names may be ['quoted']
+_CSL_SCHEMA_COLUMN = re.compile(r"(\['(?:[^']|'')*'\]|[^:,]+):([^,]+)")
+
 
 class QueryProcessor:
     """
@@ -1438,142 +1441,44 @@ class SchemaManager:
 
     async def _execute_kusto_async(self, query: str, cluster: str, database: str, is_mgmt: bool = False) -> List[Dict]:
         """
-        Enhanced async wrapper for executing Kusto queries with comprehensive error handling,
-        retry logic, connection validation, and graceful degradation.
+        Execute a Kusto query or management command on the async transport and
+        return the primary result rows as dictionaries.
+
+        Retries are awaited inside execute_kusto_async, so cancelling the calling
+        task aborts both the in-flight request and any pending retry.
         """
-        import asyncio
-        import re
-        import time
-        from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
-        from .constants import (
-            CONNECTION_CONFIG,
-            RETRYABLE_ERROR_PATTERNS, NON_RETRYABLE_ERROR_PATTERNS
-        )
-        
-        loop = asyncio.get_running_loop()
-        
-        # Configuration from constants
-        max_retries = CONNECTION_CONFIG.get("max_retries", 5)
-        retry_delay = CONNECTION_CONFIG.get("retry_delay", 2.0)
-        backoff_factor = CONNECTION_CONFIG.get("retry_backoff_factor", 2.0)
-        max_retry_delay = CONNECTION_CONFIG.get("max_retry_delay", 60.0)
-        
-        def _is_retryable_error(error_str: str) -> bool:
-            """Check if error matches retryable patterns."""
-            # Check non-retryable patterns first (these take precedence)
-            for pattern in NON_RETRYABLE_ERROR_PATTERNS:
-                if re.search(pattern, error_str, re.IGNORECASE):
-                    return False
-            
-            # Check retryable patterns
-            for pattern in RETRYABLE_ERROR_PATTERNS:
-                if re.search(pattern, error_str, re.IGNORECASE):
-                    return True
-                    
-            return False
-        
-        def _validate_connection(cluster_url: str) -> bool:
-            """
-            Enhanced connection validation with comprehensive authentication and connectivity checks.
-            
-            Performs:
-            1. Authentication validation with Azure CLI
-            2. Network connectivity test
-            3. Cluster accessibility verification
-            4. Permission validation
-            """
-            try:
-                validation_timeout = CONNECTION_CONFIG.get("connection_validation_timeout", 5.0)
-                
-                # Step 1: Validate Azure CLI authentication
-                auth_valid = self._validate_azure_authentication(cluster_url)
-                if not auth_valid:
-                    logger.warning(f"Azure CLI authentication validation failed for {cluster_url}")
-                    return False
-                
-                # Step 2: Test basic connectivity
-                connectivity_valid = self._test_network_connectivity(cluster_url, validation_timeout)
-                if not connectivity_valid:
-                    logger.warning(f"Network connectivity test failed for {cluster_url}")
-                    return False
-                
-                # Step 3: Test cluster access with actual query
-                access_valid = self._test_cluster_access(cluster_url, validation_timeout)
-                if not access_valid:
-                    logger.warning(f"Cluster access test failed for {cluster_url}")
-                    return False
-                
-                logger.info(f"Connection validation passed for {cluster_url}")
-                return True
-                        
-            except Exception as e:
-                logger.error(f"Connection validation failed for {cluster_url}: {e}")
-                return False
-        
-        def _sync_execute():
-            """Execute Kusto query with retry logic and error handling."""
-            cluster_url = f"https://{cluster}" if not cluster.startswith("https://") else cluster
-            
-            # Pre-validate connection if enabled
-            if CONNECTION_CONFIG.get("validate_connection_before_use", True):
-                if not _validate_connection(cluster_url):
-                    logger.warning(f"Connection validation failed for {cluster_url}, proceeding anyway...")
-            
-            last_exception = None
-            current_delay = retry_delay
-            
-            for attempt in range(max_retries + 1):  # +1 for initial attempt
-                try:
-                    # Create connection with timeout configuration
-                    kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_url)
-                    
-                    with KustoClient(kcsb) as client:
-                        # Execute query/management command
-                        if is_mgmt:
-                            response = client.execute_mgmt(database, query)
-                        else:
-                            response = client.execute(database, query)
-                        
-                        # Extract results
-                        if response.primary_results:
-                            data = response.primary_results[0].to_dict()["data"]
-                            logger.debug(f"Successfully executed query on attempt {attempt + 1}")
-                            return data
-                        else:
-                            logger.warning(f"Query returned no results: {query}")
-                            return []
-                            
-                except Exception as e:
-                    last_exception = e
-                    error_str = str(e)
-                    
-                    # Log the attempt
-                    logger.warning(f"Kusto execution attempt {attempt + 1}/{max_retries + 1} failed: {error_str}")
-                    
-                    # Check if this is the final attempt
-                    if attempt >= max_retries:
-                        logger.error(f"All retry attempts exhausted for query: {query}")
-                        break
-                    
-                    # Check if error is retryable
-                    if not _is_retryable_error(error_str):
-                        logger.error(f"Non-retryable error encountered: {error_str}")
-                        break
-                    
-                    # Wait before retry with exponential backoff
-                    logger.info(f"Retrying in {current_delay:.1f}s due to retryable error...")
-                    time.sleep(current_delay)
-                    current_delay = min(current_delay * backoff_factor, max_retry_delay)
-            
-            # All retries failed - propagate the last exception
-            if last_exception:
-                error_msg = f"Kusto execution failed after {max_retries + 1} attempts: {str(last_exception)}"
-                logger.error(error_msg)
-                raise Exception(error_msg) from last_exception
-            else:
-                raise Exception("Kusto execution failed for unknown reasons")
+        from .async_client import build_request_properties, execute_kusto_async
+        from .connection import CircuitOpenError, _is_cluster_failure
+        from .constants import CONNECTION_CONFIG
+        from .health import get_health_monitor
+
+        cluster_url = f"https://{cluster}" if not cluster.startswith("https://") else cluster
 
-        return await loop.run_in_executor(None, _sync_execute)
+        # Consult the cached health record; a stale record is re-probed in the background
+        monitor = get_health_monitor() if CONNECTION_CONFIG.get("validate_connection_before_use", True) else None
+        if monitor is not None:
+            health = monitor.check(cluster_url)
+            if health.healthy is False:
+                logger.warning(f"Cluster {cluster_url} was unhealthy at last check ({health.error}), proceeding anyway...")
+
+        try:
+            properties = build_request_properties(CONNECTION_CONFIG.get("read_timeout", 300.0))
+            response = await execute_kusto_async(cluster_url, database, query, is_mgmt=is_mgmt, properties=properties)
+        except Exception as e:
+            # Same test as the circuit breaker: a query mistake says nothing about cluster health
+            if monitor is not None and not isinstance(e, CircuitOpenError) and _is_cluster_failure(e):
+                monitor.record_failure(cluster_url, e)
+            error_msg = f"Kusto execution failed: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+        if monitor is not None:
+            monitor.record_success(cluster_url)
+
+        # Extract results
+        if response.primary_results:
+            return response.primary_results[0].to_dict()["data"]
+        logger.warning(f"Query returned no results: {query}")
+        return []
 
     def _validate_azure_authentication(self, cluster_url: str) -> bool:
         """
@@ -1583,79 +1488,6 @@ class SchemaManager:
         logger.debug(f"Skipping redundant authentication validation for {cluster_url} - already validated at startup")
         return True
 
-    def _test_network_connectivity(self, cluster_url: str, timeout: float) -> bool:
-        """Test basic network connectivity to the cluster."""
-        try:
-            import socket
-            from urllib.parse import urlparse
-            
-            parsed_url = urlparse(cluster_url)
-            hostname = parsed_url.hostname
-            port = parsed_url.port or 443  # Default HTTPS port for Kusto
-            
-            # Test TCP connectivity
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            
-            result = sock.connect_ex((hostname, port))
-            sock.close()
-            
-            if result == 0:
-                logger.debug(f"Network connectivity test passed for {hostname}:{port}")
-                return True
-            else:
-                logger.warning(f"Network connectivity test failed for {hostname}:{port}")
-                return False
-                
-        except Exception as e:
-            logger.warning(f"Network connectivity test error: {e}")
-            return False
-
-    def _test_cluster_access(self, cluster_url: str, timeout: float) -> bool:
-        """Test actual cluster access with a minimal query."""
-        try:
-            from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
-            kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_url)
-            
-            with KustoClient(kcsb) as client:
-                # Use a lightweight query that should work on any cluster
-                test_query = ".show version"
-                
-                # Set timeout for the operation
-                import signal
-                
-                def timeout_handler(signum, frame):
-                    raise TimeoutError("Cluster access test timeout")
-                
-                # Apply timeout (only on Unix-like systems)
-                if hasattr(signal, 'SIGALRM'):
-                    signal.signal(signal.SIGALRM, timeout_handler)
-                    signal.alarm(int(timeout))
-                
-                try:
-                    response = client.execute_mgmt("NetDefaultDB", test_query)
-                    
-                    if hasattr(signal, 'SIGALRM'):
-                        signal.alarm(0)  # Cancel timeout
-                    
-                    success = response is not None and response.primary_results
-                    if success:
-                        logger.debug("Cluster access test passed")
-                    else:
-                        logger.warning("Cluster access test failed: no valid response")
-                    
-                    return success
-                    
-                except Exception as query_error:
-                    if hasattr(signal, 'SIGALRM'):
-                        signal.alarm(0)  # Cancel timeout
-                    logger.warning(f"Cluster access query failed: {query_error}")
-                    return False
-                    
-        except Exception as e:
-            logger.warning(f"Cluster access test error: {e}")
-            return False
-
     async def discover_schema_for_table(self, client, table_name: str) -> Dict:
         """
         Discovers detailed schema information for a specific table.
@@ -1772,7 +1604,19 @@ class SchemaManager:
         """
         Gets a table schema using multiple discovery strategies with proper column metadata handling.
         This function is now the single source of truth for live schema discovery.
+
+        Concurrent lookups of the same table share one discovery run.
         """
+        from .concurrency import get_single_flight
+        from .connection import normalize_cluster_url
+
+        key = (normalize_cluster_url(cluster) if cluster else "", database, table, force_refresh)
+        return await get_single_flight("schema").do(
+            key, lambda: self._discover_table_schema(cluster, database, table, force_refresh)
+        )
+
+    async def _discover_table_schema(self, cluster: str, database: str, table: str, force_refresh: bool = False) -> Dict[str, Any]:
+        """Run the schema discovery strategies for one table."""
         try:
             logger.debug(f"Performing enhanced schema discovery for {database}.{table}")
             
@@ -1787,18 +1631,7 @@ class SchemaManager:
                     schema_json = json.loads(schema_json_str)
 
                     # Enhanced transformation with proper column metadata
-                    columns = {}
-                    for col in schema_json.get('Schema', {}).get('OrderedColumns', []):
-                        col_name = col['Name']
-                        col_type = col['CslType']
-                        columns[col_name] = {
-                            'data_type': col_type,
-                            'description': self._generate_column_description(table, col_name, col_type, []),
-                            'tags': self._generate_column_tags(col_name, col_type),
-                            'sample_values': [],
-                            'ordinal': col.get('Ordinal', 0),
-                            'column_type': col_type
-                        }
+                    columns = self._build_json_columns(table, schema_json.get('Schema', {}).get('OrderedColumns', []))
                     
                     if columns:
                         logger.info(f"Strategy 1 successful: JSON schema discovery for {table}")
@@ -1881,9 +1714,9 @@ class SchemaManager:
             # Return fallback schema to prevent crashes
             return self._create_fallback_schema(cluster, database, table, str(e))
 
-    def _create_enhanced_schema_object(self, cluster: str, database: str, table: str, columns: dict, method: str) -> Dict[str, Any]:
-        """Create enhanced schema object with proper metadata."""
-        schema_obj = {
+    def _build_enhanced_schema_object(self, cluster: str, database: str, table: str, columns: dict, method: str) -> Dict[str, Any]:
+        """Build an enhanced schema object with proper metadata, without storing it."""
+        return {
             "table_name": table,
             "columns": columns,
             "discovered_at": datetime.now().isoformat(),
@@ -1893,6 +1726,26 @@ class SchemaManager:
             "discovery_method": f"enhanced_{method}",
             "schema_version": "3.1"
         }
+
+    def _build_json_columns(self, table: str, ordered_columns: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Column metadata from the OrderedColumns of a JSON schema."""
+        columns = {}
+        for i, col in enumerate(ordered_columns):
+            col_name = col['Name']
+            col_type = col.get('CslType') or str(col.get('Type', 'string')).replace('System.', '').lower()
+            columns[col_name] = {
+                'data_type': col_type,
+                'description': self._generate_column_description(table, col_name, col_type, []),
+                'tags': self._generate_column_tags(col_name, col_type),
+                'sample_values': [],
+                'ordinal': col.get('Ordinal', i),
+                'column_type': col_type
+            }
+        return columns
+
+    def _create_enhanced_schema_object(self, cluster: str, database: str, table: str, columns: dict, method: str) -> Dict[str, Any]:
+        """Create enhanced schema object with proper metadata."""
+        schema_obj = self._build_enhanced_schema_object(cluster, database, table, columns, method)
         
         # Store the freshly discovered schema
         self.memory_manager.store_schema(cluster, database, table, schema_obj)
@@ -2404,6 +2257,189 @@ class SchemaManager:
         
         return tags
 
+    async def discover_database_schemas(self, cluster: str, database: str) -> Dict[str, Any]:
+        """
+        Fetch the schema of every table in a database with one management command.
+
+        Uses ``.show database schema as json`` and falls back to
+        ``.show database cslschema``. Nothing is stored here.
+
+        Returns:
+            Dict with "schemas" (table -> schema object), "failed" (tables whose
+            schema could not be parsed) and "method".
+        """
+        try:
+            rows = await self._execute_kusto_async(".show database schema as json", cluster, database, is_mgmt=True)
+            schemas, failed = self._parse_database_schema_json(rows, cluster, database)
+            method = "database_schema_json"
+        except Exception as json_error:
+            logger.debug(f"JSON database schema discovery failed for {database}: {json_error}")
+            rows = await self._execute_kusto_async(".show database cslschema", cluster, database, is_mgmt=True)
+            schemas, failed = self._parse_database_cslschema(rows, cluster, database)
+            method = "database_cslschema"
+
+        logger.info(f"Bulk schema discovery for {database} parsed {len(schemas)} tables ({len(failed)} failed) using {method}")
+        return {"schemas": schemas, "failed": failed, "method": method}
+
+    def _parse_database_schema_json(self, rows: List[Dict], cluster: str, database: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Parse the single-row result of ``.show database schema as json``."""
+        if not rows:
+            raise ValueError("Empty database schema response")
+        payload = json.loads(rows[0][next(iter(rows[0]))])
+        databases = payload.get("Databases", {})
+        db_entry = databases.get(database) or next(
+            (entry for name, entry in databases.items() if name.lower() == database.lower()), None
+        )
+        if db_entry is None:
+            if len(databases) != 1:
+                raise ValueError(f"Database {database} not found in schema response")
+            db_entry = next(iter(databases.values()))
+
+        # Materialized views are queried like tables, so they are learned too
+        entries = {**db_entry.get("Tables", {}), **db_entry.get("MaterializedViews", {})}
+        schemas, failed = {}, []
+        for table, entry in entries.items():
+            try:
+                columns = self._build_json_columns(table, entry.get("OrderedColumns", []))
+            except Exception as e:
+                logger.debug(f"Could not parse bulk schema for {table}: {e}")
+                columns = None
+            if columns:
+                schemas[table] = self._build_enhanced_schema_object(cluster, database, table, columns, "database_schema_json")
+            else:
+                failed.append(table)
+        return schemas, failed
+
+    def _parse_database_cslschema(self, rows: List[Dict], cluster: str, database: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Parse ``.show database cslschema`` rows ("Col:type,Col2:type" per table)."""
+        schemas, failed = {}, []
+        for row in rows:
+            table = row.get("TableName")
+            if not table:
+                continue
+            columns = {}
+            for i, match in enumerate(_CSL_SCHEMA_COLUMN.finditer(row.get("Schema") or "")):
+                col_name = match.group(1).strip()
+                if col_name.startswith("['") and col_name.endswith("']"):
+                    col_name = col_name[2:-2].replace("''", "'")
+                col_type = match.group(2).strip()
+                columns[col_name] = {
+                    'data_type': col_type,
+                    'description': self._generate_column_description(table, col_name, col_type, []),
+                    'tags': self._generate_column_tags(col_name, col_type),
+                    'sample_values': [],
+                    'ordinal': i,
+                    'column_type': col_type
+                }
+            if columns:
+                schemas[table] = self._build_enhanced_schema_object(cluster, database, table, columns, "database_cslschema")
+            else:
+                failed.append(table)
+        return schemas, failed
+
+    async def refresh_database_schema(self, cluster: str, database: str, progress=None) -> Dict[str, Any]:
+        """
+        Incrementally refresh the table schemas of a database.
+
+        One bulk command lists every schema. Each is fingerprinted (ordered
+        column names and types) and compared against the fingerprint stored
+        with the table, so only changed and new tables are rebuilt, in a
+        single save; tables missing from the listing are removed. Tables the
+        bulk command cannot describe (or all tables, if it fails) go through
+        per-table discovery, which runs concurrently and resumes from a
+        checkpoint after an interruption.
+
+        Args:
+            cluster: Cluster URI
+            database: Database name
+            progress: Optional async callback receiving (completed, total, message)
+
+        Returns:
+            Dict with "tables", "refreshed", "failed", "method" and the
+            "added", "changed", "dropped" and "unchanged" table names.
+        """
+        from .discovery import get_discovery_coordinator
+        from .memory import schema_fingerprint
+
+        try:
+            bulk = await self.discover_database_schemas(cluster, database)
+        except Exception as bulk_error:
+            logger.warning(f"Bulk schema discovery failed for {database}, discovering tables one by one: {bulk_error}")
+            tables_data = await self._execute_kusto_async(".show tables", cluster, database, is_mgmt=True)
+            bulk = {"schemas": {}, "failed": [row['TableName'] for row in tables_data], "method": "per_table"}
+
+        previous = self.memory_manager.get_schema_hashes(cluster, database)
+        listed = list(bulk["schemas"]) + bulk["failed"]
+        modified = {
+            table: schema for table, schema in bulk["schemas"].items()
+            if previous.get(table) != schema_fingerprint(schema)
+        }
+        unchanged = [table for table in bulk["schemas"] if table not in modified]
+
+        stored = self.memory_manager.store_schemas_bulk(cluster, database, modified) if modified else []
+        refreshed = [
+            {"table": table, "columns": len(bulk["schemas"][table]["columns"]), "method": bulk["method"]}
+            for table in stored
+        ]
+
+        # Only the JSON schema also lists materialized views, so only it can tell what was dropped
+        dropped: List[str] = []
+        if bulk["method"] == "database_schema_json":
+            gone = [table for table in previous if table not in bulk["schemas"] and table not in bulk["failed"]]
+            if gone:
+                dropped = self.memory_manager.remove_tables(cluster, database, gone)
+
+        remaining = bulk["failed"] + [t for t in modified if t not in stored]
+        total = len(listed)
+        completed = len(unchanged) + len(stored)
+        if progress is not None and completed:
+            try:
+                await progress(completed, total, f"{len(stored)} table schemas changed, {len(unchanged)} unchanged")
+            except Exception as e:
+                logger.debug(f"Could not report refresh progress: {e}")
+
+        coordinator = get_discovery_coordinator()
+        per_table = await coordinator.refresh_tables(
+            cluster, database, remaining, progress=progress, completed_offset=completed, total=total, schema_manager=self
+        )
+        refreshed += per_table["resumed"] + per_table["refreshed"]
+        failed = per_table["failed"]
+
+        # Tables discovered one by one can only be classified after the fact
+        current = self.memory_manager.get_schema_hashes(cluster, database)
+        added, changed = [], []
+        for entry in refreshed:
+            table = entry["table"]
+            if table not in previous:
+                added.append(table)
+            elif previous[table] != current.get(table):
+                changed.append(table)
+            else:
+                unchanged.append(table)
+
+        tables = [table for table in listed if table not in dropped]
+        known = set(self.memory_manager.get_database_schema(cluster, database).get("tables", []))
+        if any(table not in known for table in tables):
+            self.memory_manager.store_database_schema(cluster, database, {"tables": tables})
+        self.track_schema_usage(database, bulk["method"], not failed)
+
+        # A refreshed database gets a fresh chance for tables that failed before
+        coordinator.forget_failures(cluster, database)
+        logger.info(
+            f"Schema refresh for {database}: {len(added)} added, {len(changed)} changed, "
+            f"{len(dropped)} dropped, {len(unchanged)} unchanged"
+        )
+        return {
+            "tables": tables,
+            "refreshed": refreshed,
+            "failed": failed,
+            "method": bulk["method"],
+            "added": added,
+            "changed": changed,
+            "dropped": dropped,
+            "unchanged": unchanged,
+        }
+
     async def get_database_schema(self, cluster: str, database: str, validate_auth: bool = False) -> Dict[str, Any]:
         """
         Gets a database schema (list of tables) with optimized caching and minimal live discovery.
@@ -2427,9 +2463,7 @@ class SchemaManager:
                 logger.debug(f"Cached database schema for {database} exists but is empty, checking memory for table data")
                 
                 # Check if we have individual table schemas cached even if database schema is empty
-                normalized_cluster = self.memory_manager._normalize_cluster_uri(cluster)
-                cluster_data = self.memory_manager.corpus.get("clusters", {}).get(normalized_cluster, {})
-                db_data = cluster_data.get("databases", {}).get(database, {})
+                db_data = self.memory_manager._get_database_data(cluster, database)
                 table_schemas = db_data.get("tables", {})
                 
                 if table_schemas:
@@ -2493,7 +2527,7 @@ class SchemaManager:
         4. Connection stability
         """
         try:
-            from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+            from .connection import get_client_pool
             logger.info(f"Validating authentication for {cluster_url}/{database}")
             
             # Step 1: Basic authentication validation
@@ -2503,9 +2537,7 @@ class SchemaManager:
             
             # Step 2: Test database-specific access
             try:
-                kcsb = KustoConnectionStringBuilder.with_az_cli_authentication(cluster_url)
-                
-                with KustoClient(kcsb) as client:
+                with get_client_pool().client(cluster_url) as client:
                     # Test database access with a minimal query
                     test_query = ".show database schema"
                     response = client.execute_mgmt(database, test_query)
@@ -2529,9 +2561,7 @@ class SchemaManager:
         """Get fallback database schema from memory or derived sources."""
         try:
             # Try to get any available schema from memory
-            normalized_cluster = self.memory_manager._normalize_cluster_uri(cluster)
-            cluster_data = self.memory_manager.corpus.get("clusters", {}).get(normalized_cluster, {})
-            db_data = cluster_data.get("databases", {}).get(database, {})
+            db_data = self.memory_manager._get_database_data(cluster, database)
             
             if db_data and "tables" in db_data:
                 tables = list(db_data.get("tables", {}).keys())
@@ -2764,6 +2794,18 @@ class SchemaManager:
             logger.debug(f"Schema usage tracking failed: {e}")
 
 
+# Global schema manager instance
+_schema_manager = None
+
+
+def get_schema_manager() -> SchemaManager:
+    """Get the global SchemaManager, so discovery caches are shared by every caller."""
+    global _schema_manager
+    if _schema_manager is None:
+        _schema_manager = SchemaManager()
+    return _schema_manager
+
+
 # Consolidated Schema Discovery Interface
 class SchemaDiscovery(SchemaManager):
     """
@@ -0,0 +1,311 @@
+"""
+Unit tests for the async_client module.
+
+The tests run the async transport against a local HTTP stand-in that speaks
+the Kusto v2 query and v1 management REST response formats.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+from azure.kusto.data.exceptions import KustoNetworkError, KustoServiceError
+
+from mcp_kql_server import async_client
+from mcp_kql_server.async_client import (
+    AsyncKustoClient,
+    build_request_properties,
+    execute_kusto_async,
+    get_async_client,
+    is_retryable_error,
+)
+from mcp_kql_server.connection import CircuitOpenError, get_circuit_breaker, reset_circuit_breakers
+from mcp_kql_server.constants import CONNECTION_CONFIG
+
+
+def v2_response(columns, rows):
+    """Build a Kusto v2 query response with a single primary result."""
+    return [
+        {"FrameType": "DataSetHeader", "IsProgressive": False, "Version": "v2.0"},
+        {
+            "FrameType": "DataTable",
+            "TableId": 0,
+            "TableKind": "QueryProperties",
+            "TableName": "@ExtendedProperties",
+            "Columns": [
+                {"ColumnName": "TableId", "ColumnType": "int"},
+                {"ColumnName": "Key", "ColumnType": "string"},
+                {"ColumnName": "Value", "ColumnType": "dynamic"},
+            ],
+            "Rows": [],
+        },
+        {
+            "FrameType": "DataTable",
+            "TableId": 1,
+            "TableKind": "PrimaryResult",
+            "TableName": "PrimaryResult",
+            "Columns": [{"ColumnName": name, "ColumnType": ctype} for name, ctype in columns],
+            "Rows": rows,
+        },
+        {"FrameType": "DataSetCompletion", "HasErrors": False, "Cancelled": False},
+    ]
+
+
+def v1_response(columns, rows):
+    """Build a Kusto v1 management response."""
+    return {
+        "Tables": [{
+            "TableName": "Table_0",
+            "Columns": [{"ColumnName": name, "DataType": "String", "ColumnType": ctype} for name, ctype in columns],
+            "Rows": rows,
+        }]
+    }
+
+
+class KustoStandIn:
+    """A tiny threaded HTTP server mimicking the Kusto REST endpoints."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures_before_success = 0
+        self.query_delay = 0.0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stand_in.requests.append((self.path, dict(self.headers), body))
+
+                if stand_in.failures_before_success > 0:
+                    stand_in.failures_before_success -= 1
+                    self._send(503, {"error": {"code": "ServiceNotAvailable", "message": "ServiceNotAvailable", "@message": "ServiceNotAvailable"}})
+                    return
+
+                if self.path == "/v1/rest/mgmt":
+                    self._send(200, v1_response([("TableName", "string")], [["StormEvents"]]))
+                elif body["csl"].startswith("BadTable"):
+                    self._send(400, {"error": {"code": "General_BadRequest", "message": "Request is invalid",
+                                               "@message": "Semantic error: 'BadTable' could not be resolved"}})
+                else:
+                    time.sleep(stand_in.query_delay)
+                    self._send(200, v2_response(
+                        [("State", "string"), ("Count", "long")],
+                        [["TEXAS", 10], ["KANSAS", 3]],
+                    ))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.block_on_close = False
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def fake_token_provider(scope):
+    """Token provider that never talks to Azure."""
+    return f"token-for:{scope}"
+
+
+class TestAsyncKustoClient(unittest.TestCase):
+    """Test cases for the asyncio Kusto transport."""
+
+    def setUp(self):
+        """Start the stand-in server."""
+        self.stand_in = KustoStandIn().__enter__()
+
+    def tearDown(self):
+        """Stop the stand-in server."""
+        self.stand_in.__exit__(None, None, None)
+
+    async def _run(self, coro_factory):
+        client = AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)
+        try:
+            return await coro_factory(client)
+        finally:
+            await client.close()
+
+    def test_query_returns_sdk_response(self):
+        """v2 query responses are parsed into SDK primary results."""
+        response = asyncio.run(self._run(lambda c: c.execute("Samples", "StormEvents | summarize count() by State")))
+        data = response.primary_results[0].to_dict()["data"]
+        self.assertEqual(data, [{"State": "TEXAS", "Count": 10}, {"State": "KANSAS", "Count": 3}])
+
+        path, headers, body = self.stand_in.requests[0]
+        self.assertEqual(path, "/v2/rest/query")
+        self.assertEqual(body["db"], "Samples")
+        self.assertTrue(headers["Authorization"].startswith("Bearer token-for:"))
+        self.assertIn("x-ms-client-request-id", {k.lower() for k in headers})
+
+    def test_management_commands_use_v1_endpoint(self):
+        """Dot-commands are routed to the management endpoint."""
+        response = asyncio.run(self._run(lambda c: c.execute("Samples", ".show tables")))
+        self.assertEqual(response.primary_results[0].to_dict()["data"], [{"TableName": "StormEvents"}])
+        self.assertEqual(self.stand_in.requests[0][0], "/v1/rest/mgmt")
+
+    def test_service_errors_raise_kusto_errors(self):
+        """Error payloads surface as KustoServiceError and are not retried."""
+        with self.assertRaises(KustoServiceError) as context:
+            asyncio.run(self._run(lambda c: c.execute_query("Samples", "BadTable | take 1")))
+        self.assertIn("Semantic error", str(context.exception))
+        self.assertFalse(is_retryable_error(context.exception))
+
+    def test_retries_are_awaited(self):
+        """Transient 5xx responses are retried with asyncio.sleep backoff."""
+        self.stand_in.failures_before_success = 2
+        sleeps = []
+        real_sleep = asyncio.sleep
+
+        async def recording_sleep(delay):
+            sleeps.append(delay)
+            await real_sleep(0)
+
+        async def main():
+            with patch("mcp_kql_server.async_client.get_async_client",
+                       return_value=AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)), \
+                    patch("mcp_kql_server.async_client.asyncio.sleep", side_effect=recording_sleep):
+                return await execute_kusto_async(self.stand_in.url, "Samples", "StormEvents | take 2")
+
+        response = asyncio.run(main())
+        self.assertEqual(len(response.primary_results[0].to_dict()["data"]), 2)
+        self.assertEqual(len(self.stand_in.requests), 3)
+        self.assertEqual(sleeps, [CONNECTION_CONFIG["retry_delay"], CONNECTION_CONFIG["retry_delay"] * CONNECTION_CONFIG["retry_backoff_factor"]])
+
+    def test_open_circuit_stops_retries(self):
+        """Once other calls open the cluster's breaker, remaining retries fail fast."""
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+        self.stand_in.failures_before_success = 10
+        breaker = get_circuit_breaker(self.stand_in.url)
+        breaker.threshold = 2
+
+        async def concurrent_failures(delay):
+            for _ in range(breaker.threshold):
+                breaker.record_failure(ConnectionError("cluster unreachable"))
+
+        async def main():
+            with patch("mcp_kql_server.async_client.get_async_client",
+                       return_value=AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)), \
+                    patch("mcp_kql_server.async_client.asyncio.sleep", side_effect=concurrent_failures):
+                return await execute_kusto_async(self.stand_in.url, "Samples", "StormEvents | take 2")
+
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(main())
+        self.assertEqual(len(self.stand_in.requests), 1)
+        self.assertEqual(breaker.state, "open")
+
+    def test_retries_record_one_breaker_failure(self):
+        """A call that exhausts its retries counts once toward opening the breaker."""
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+        self.stand_in.failures_before_success = 10
+        breaker = get_circuit_breaker(self.stand_in.url)
+        breaker.threshold = 2
+
+        async def main():
+            with patch("mcp_kql_server.async_client.get_async_client",
+                       return_value=AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)), \
+                    patch("mcp_kql_server.async_client.asyncio.sleep", new=AsyncMock()):
+                return await execute_kusto_async(self.stand_in.url, "Samples", "StormEvents | take 2", max_retries=3)
+
+        with self.assertRaises(Exception) as context:
+            asyncio.run(main())
+        self.assertNotIsInstance(context.exception, CircuitOpenError)
+        self.assertEqual(len(self.stand_in.requests), 4)
+        self.assertEqual(breaker.get_stats()["failures"], 1)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_cancellation_aborts_request_and_cancels_on_server(self):
+        """Cancelling the caller stops waiting and issues .cancel query for the request."""
+        self.stand_in.query_delay = 2.0
+
+        async def main():
+            client = AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)
+            task = asyncio.ensure_future(client.execute_query("Samples", "StormEvents | take 2"))
+            await asyncio.sleep(0.2)
+            started = time.monotonic()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            elapsed = time.monotonic() - started
+            # Give the best-effort server-side cancel a moment to go out
+            for _ in range(50):
+                if any(path == "/v1/rest/mgmt" for path, _, _ in self.stand_in.requests):
+                    break
+                await asyncio.sleep(0.02)
+            await client.close()
+            return elapsed
+
+        elapsed = asyncio.run(main())
+        self.assertLess(elapsed, 1.0)
+        query_id = self.stand_in.requests[0][1]["x-ms-client-request-id"]
+        cancel_bodies = [body["csl"] for path, _, body in self.stand_in.requests if path == "/v1/rest/mgmt"]
+        self.assertEqual(cancel_bodies, [f'.cancel query "{query_id}"'])
+
+    def test_server_timeout_is_sent_and_bounds_the_request(self):
+        """servertimeout goes to the cluster and also sets the client-side deadline."""
+        self.stand_in.query_delay = 2.0
+        properties = build_request_properties(0.3, request_id="KQLMCP.execute;test")
+
+        started = time.monotonic()
+        with patch.object(async_client, "CLIENT_SERVER_DELTA", 0.0):
+            with self.assertRaises(KustoNetworkError):
+                asyncio.run(self._run(lambda c: c.execute_query("Samples", "StormEvents", properties)))
+        self.assertLess(time.monotonic() - started, 1.5)
+
+        _, headers, body = self.stand_in.requests[0]
+        self.assertEqual(json.loads(body["properties"])["Options"]["servertimeout"], "0:00:00.300000")
+        self.assertEqual(headers["x-ms-client-request-id"], "KQLMCP.execute;test")
+
+    def test_schema_manager_uses_async_transport(self):
+        """SchemaManager._execute_kusto_async returns row dictionaries from the transport."""
+        from mcp_kql_server.utils import SchemaManager
+
+        async def main():
+            client = AsyncKustoClient(self.stand_in.url, token_provider=fake_token_provider)
+            with patch("mcp_kql_server.async_client.get_async_client", return_value=client), \
+                    patch.dict(CONNECTION_CONFIG, {"validate_connection_before_use": False}):
+                rows = await SchemaManager()._execute_kusto_async(".show tables", self.stand_in.url, "Samples", is_mgmt=True)
+            await client.close()
+            return rows
+
+        self.assertEqual(asyncio.run(main()), [{"TableName": "StormEvents"}])
+
+    def test_clients_are_shared_per_loop(self):
+        """The registry hands out one client per cluster on a given loop."""
+        async def main():
+            return get_async_client("help.kusto.windows.net"), get_async_client("https://help.kusto.windows.net/")
+
+        first, second = asyncio.run(main())
+        self.assertIs(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+"""
+Unit tests for the concurrency module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from mcp_kql_server.concurrency import (
+    QueryExecutor,
+    SingleFlight,
+    get_dispatch_loop,
+    get_query_executor,
+    get_single_flight,
+    shutdown_query_executor,
+)
+
+
+class TestQueryExecutor(unittest.TestCase):
+    """Test cases for the bounded, fair query executor."""
+
+    def setUp(self):
+        """Set up an executor with small limits."""
+        self.executor = QueryExecutor(max_workers=2, per_cluster_limit=2)
+
+    def tearDown(self):
+        """Shut the executor down."""
+        self.executor.shutdown(wait=True)
+
+    def test_runs_off_loop_and_returns_result(self):
+        """Work runs on a worker thread and the result is awaited."""
+        main_thread = threading.get_ident()
+
+        async def main():
+            return await self.executor.run(lambda x: (x * 2, threading.get_ident()), 21, cluster="c1")
+
+        value, thread_id = asyncio.run(main())
+        self.assertEqual(value, 42)
+        self.assertNotEqual(thread_id, main_thread)
+        self.assertEqual(self.executor.get_stats()["completed"], 1)
+
+    def test_event_loop_stays_responsive(self):
+        """A slow job does not block other coroutines on the loop."""
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(self.executor.run(time.sleep, 0.2, cluster="c1"), ticker())
+
+        asyncio.run(main())
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.2)
+
+    def test_worker_limit_is_enforced(self):
+        """No more than max_workers jobs run concurrently."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def job():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+        async def main():
+            await asyncio.gather(*(self.executor.run(job, cluster=f"c{i}") for i in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(max(peak), 2)
+
+    def test_per_cluster_limit_lets_other_clusters_through(self):
+        """A saturated cluster does not hold back queries for another cluster."""
+        executor = QueryExecutor(max_workers=3, per_cluster_limit=1)
+        order = []
+        release = threading.Event()
+
+        def slow(name):
+            order.append(name)
+            release.wait(2)
+
+        def fast(name):
+            order.append(name)
+            release.set()
+
+        async def main():
+            await asyncio.gather(
+                executor.run(slow, "busy-1", cluster="busy"),
+                executor.run(slow, "busy-2", cluster="busy"),
+                executor.run(fast, "other", cluster="other"),
+            )
+
+        asyncio.run(main())
+        executor.shutdown(wait=True)
+        self.assertEqual(order[:2], ["busy-1", "other"])
+
+    def test_sessions_are_served_round_robin(self):
+        """A session with many queued jobs does not starve a second session."""
+        executor = QueryExecutor(max_workers=1, per_cluster_limit=1)
+        order = []
+
+        async def main():
+            tasks = [executor.run(order.append, f"a{i}", cluster="c1", session_id="a") for i in range(3)]
+            tasks.append(executor.run(order.append, "b0", cluster="c1", session_id="b"))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        executor.shutdown(wait=True)
+        self.assertLess(order.index("b0"), order.index("a2"))
+
+    def test_errors_propagate_to_caller(self):
+        """Exceptions raised by a job reach the awaiting coroutine."""
+        def boom():
+            raise ValueError("bad query")
+
+        async def main():
+            await self.executor.run(boom, cluster="c1")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+        self.assertEqual(self.executor.get_stats()["failed"], 1)
+
+    def test_cancelled_queued_job_never_runs(self):
+        """Cancelling a waiting caller removes its job from the queue."""
+        executor = QueryExecutor(max_workers=1)
+        ran = []
+        release = threading.Event()
+
+        async def main():
+            blocker = asyncio.ensure_future(executor.run(release.wait, 2, cluster="c1"))
+            queued = asyncio.ensure_future(executor.run(ran.append, "queued", cluster="c1"))
+            await asyncio.sleep(0.05)
+            self.assertEqual(executor.get_stats()["queue_depth"], 1)
+            queued.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            await blocker
+
+        asyncio.run(main())
+        executor.shutdown(wait=True)
+        self.assertEqual(ran, [])
+        self.assertEqual(executor.get_stats()["cancelled"], 1)
+
+    def test_cancelling_running_job_calls_cancel_hook(self):
+        """A running job's cancel hook fires so the blocking call can be aborted and its slot freed."""
+        executor = QueryExecutor(max_workers=1)
+        aborted = threading.Event()
+        hooks = []
+
+        async def main():
+            running = asyncio.ensure_future(executor.run(aborted.wait, 5, cluster="c1", on_cancel=aborted.set))
+            queued = asyncio.ensure_future(executor.run(time.sleep, 0, cluster="c1", on_cancel=lambda: hooks.append("queued")))
+            await asyncio.sleep(0.05)
+            queued.cancel()
+            running.cancel()
+            await asyncio.sleep(0)
+            started = time.monotonic()
+            # The slot is free again as soon as the aborted call returns
+            await executor.run(time.sleep, 0, cluster="c1")
+            return time.monotonic() - started
+
+        elapsed = asyncio.run(main())
+        executor.shutdown(wait=True)
+        self.assertTrue(aborted.is_set())
+        self.assertEqual(hooks, [])
+        self.assertLess(elapsed, 1.0)
+        # The aborted call returning is not also counted as completed
+        stats = executor.get_stats()
+        self.assertEqual((stats["cancelled"], stats["completed"], stats["failed"]), (2, 1, 0))
+
+    def test_dispatch_loop_is_visible_to_worker(self):
+        """Jobs can find the loop that dispatched them."""
+        async def main():
+            loop = asyncio.get_running_loop()
+            seen = await self.executor.run(get_dispatch_loop, cluster="c1")
+            return loop, seen
+
+        loop, seen = asyncio.run(main())
+        self.assertIs(loop, seen)
+        self.assertIsNone(get_dispatch_loop())
+
+    def test_global_executor_lifecycle(self):
+        """The lazy global executor is rebuilt after shutdown."""
+        executor = get_query_executor()
+        self.assertIs(executor, get_query_executor())
+        shutdown_query_executor()
+        self.assertIsNot(executor, get_query_executor())
+        shutdown_query_executor()
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for coalescing identical in-flight calls."""
+
+    def setUp(self):
+        """Set up a coalescer and a call counter."""
+        self.flight = SingleFlight("test")
+        self.calls = 0
+
+    async def _slow(self, value, delay=0.05):
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return value
+
+    def test_concurrent_identical_calls_share_one_execution(self):
+        """Waiters on the same key get the single call's result."""
+        async def main():
+            return await asyncio.gather(*(self.flight.do("k", lambda: self._slow("rows")) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["rows"] * 5)
+        self.assertEqual(self.calls, 1)
+        stats = self.flight.get_stats()
+        self.assertEqual((stats["executed"], stats["coalesced"], stats["in_flight"]), (1, 4, 0))
+
+    def test_different_keys_and_later_calls_execute_separately(self):
+        """Only overlapping calls for the same key are coalesced."""
+        async def main():
+            await asyncio.gather(self.flight.do("a", lambda: self._slow(1)), self.flight.do("b", lambda: self._slow(2)))
+            await self.flight.do("a", lambda: self._slow(1))
+
+        asyncio.run(main())
+        self.assertEqual(self.calls, 3)
+
+    def test_errors_reach_every_waiter_and_are_not_cached(self):
+        """A failure is raised to all waiters and the next call retries."""
+        async def failing():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("Semantic error")
+
+        async def main():
+            results = await asyncio.gather(*(self.flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+            retry = await self.flight.do("k", lambda: self._slow("ok", 0))
+            return results, retry
+
+        results, retry = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(retry, "ok")
+        self.assertEqual(self.calls, 2)
+
+    def test_cancelling_one_waiter_keeps_the_shared_call(self):
+        """A cancelled waiter leaves; the others still get the result."""
+        async def main():
+            first = asyncio.ensure_future(self.flight.do("k", lambda: self._slow("rows")))
+            second = asyncio.ensure_future(self.flight.do("k", lambda: self._slow("rows")))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            return await second
+
+        self.assertEqual(asyncio.run(main()), "rows")
+        self.assertEqual(self.flight.get_stats()["abandoned"], 0)
+
+    def test_last_waiter_cancelling_cancels_the_call(self):
+        """When every waiter is gone the shared call is cancelled."""
+        finished = []
+
+        async def work():
+            await asyncio.sleep(1)
+            finished.append(True)
+
+        async def main():
+            waiter = asyncio.ensure_future(self.flight.do("k", work))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0.01)
+            return await self.flight.do("k", lambda: self._slow("fresh", 0))
+
+        self.assertEqual(asyncio.run(main()), "fresh")
+        self.assertEqual(finished, [])
+        self.assertEqual(self.flight.get_stats()["abandoned"], 1)
+
+    def test_schema_lookups_are_deduplicated(self):
+        """Concurrent get_table_schema calls for one table run discovery once."""
+        from unittest.mock import patch
+
+        from mcp_kql_server.utils import SchemaManager
+
+        manager = SchemaManager()
+
+        async def discover(cluster, database, table, force_refresh=False):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return {"table_name": table, "columns": {"State": {"data_type": "string"}}}
+
+        async def main():
+            with patch.object(manager, "_discover_table_schema", side_effect=discover):
+                return await asyncio.gather(
+                    manager.get_table_schema("help.kusto.windows.net", "Samples", "StormEvents"),
+                    manager.get_table_schema("https://help.kusto.windows.net/", "Samples", "StormEvents"),
+                    manager.get_table_schema("help.kusto.windows.net", "Samples", "PopulationData"),
+                )
+
+        results = asyncio.run(main())
+        self.assertEqual(self.calls, 2)
+        self.assertIs(results[0], results[1])
+        self.assertGreaterEqual(get_single_flight("schema").get_stats()["coalesced"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
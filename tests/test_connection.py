@@ -0,0 +1,203 @@
+"""
+Unit tests for the connection module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from azure.kusto.data.exceptions import KustoNetworkError, KustoServiceError
+
+from mcp_kql_server.connection import (
+    CircuitBreaker,
+    CircuitOpenError,
+    KustoClientPool,
+    get_circuit_breaker,
+    get_circuit_breaker_stats,
+    get_client_pool,
+    normalize_cluster_url,
+    reset_circuit_breakers,
+    shutdown_client_pool,
+)
+
+
+class TestKustoClientPool(unittest.TestCase):
+    """Test cases for the pooled Kusto client registry."""
+
+    def setUp(self):
+        """Set up a pool backed by a mock client factory."""
+        self.factory = MagicMock(side_effect=lambda url: MagicMock(name=f"client:{url}"))
+        self.pool = KustoClientPool(client_factory=self.factory, max_size=2, block=False, idle_timeout=300)
+
+    def tearDown(self):
+        """Shut the pool down."""
+        self.pool.shutdown()
+
+    def test_normalize_cluster_url(self):
+        """Cluster URLs with and without scheme share one key."""
+        self.assertEqual(normalize_cluster_url("help.kusto.windows.net/"), "https://help.kusto.windows.net")
+        self.assertEqual(normalize_cluster_url("https://help.kusto.windows.net"), "https://help.kusto.windows.net")
+        with self.assertRaises(ValueError):
+            normalize_cluster_url("")
+
+    def test_client_is_reused_across_calls(self):
+        """A released client is handed out again instead of building a new one."""
+        with self.pool.client("help.kusto.windows.net") as first:
+            pass
+        with self.pool.client("https://help.kusto.windows.net/") as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(self.factory.call_count, 1)
+        first.close.assert_not_called()
+        self.assertEqual(self.pool.get_stats()["reused"], 1)
+
+    def test_overflow_clients_are_closed_when_not_blocking(self):
+        """Leases beyond pool_max_size get temporary clients that are closed after use."""
+        leases = [self.pool.acquire("c1") for _ in range(3)]
+        overflow = leases[2]
+        self.assertFalse(overflow.pooled)
+        for lease in leases:
+            self.pool.release(lease)
+        overflow.client.close.assert_called_once()
+        self.assertEqual(self.pool.get_stats()["clusters"]["https://c1"]["idle"], 2)
+
+    def test_blocking_pool_waits_for_release(self):
+        """With pool_block the next caller waits for a released client."""
+        pool = KustoClientPool(client_factory=self.factory, max_size=1, block=True, acquire_timeout=5)
+        lease = pool.acquire("c1")
+        acquired = []
+
+        def worker():
+            acquired.append(pool.acquire("c1"))
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        pool.release(lease)
+        thread.join(timeout=2)
+        self.assertIs(acquired[0].client, lease.client)
+        pool.shutdown()
+
+    def test_blocking_pool_times_out(self):
+        """Waiting for a client honors the acquire timeout."""
+        pool = KustoClientPool(client_factory=self.factory, max_size=1, block=True, acquire_timeout=0.05)
+        pool.acquire("c1")
+        with self.assertRaises(TimeoutError):
+            pool.acquire("c1")
+
+    def test_transport_errors_discard_client(self):
+        """Non-service errors drop the client; service errors keep it."""
+        with self.assertRaises(KustoServiceError):
+            with self.pool.client("c1") as client:
+                raise KustoServiceError("Semantic error")
+        client.close.assert_not_called()
+
+        with self.assertRaises(ConnectionError):
+            with self.pool.client("c1") as client:
+                raise ConnectionError("reset by peer")
+        client.close.assert_called_once()
+
+        with self.assertRaises(KustoNetworkError):
+            with self.pool.client("c1") as client:
+                raise KustoNetworkError("https://c1/v2/rest/query")
+        client.close.assert_called_once()
+        self.assertEqual(self.pool.get_stats()["discarded"], 2)
+
+    def test_idle_clients_are_evicted(self):
+        """Clients idle past the timeout are closed."""
+        pool = KustoClientPool(client_factory=self.factory, idle_timeout=0.01)
+        with pool.client("c1") as client:
+            pass
+        time.sleep(0.02)
+        self.assertEqual(pool.evict_idle(), 1)
+        client.close.assert_called_once()
+
+    def test_pooling_disabled_closes_every_client(self):
+        """Disabling pooling restores one client per call."""
+        pool = KustoClientPool(client_factory=self.factory, enabled=False)
+        with pool.client("c1") as first:
+            pass
+        with pool.client("c1") as second:
+            pass
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        second.close.assert_called_once()
+
+    def test_shutdown_closes_idle_clients(self):
+        """Shutdown closes idle clients and rejects new leases."""
+        with self.pool.client("c1") as client:
+            pass
+        self.pool.shutdown()
+        client.close.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire("c1")
+
+    def test_global_pool_is_recreated_after_shutdown(self):
+        """The lazy global pool is rebuilt after shutdown."""
+        pool = get_client_pool()
+        self.assertIs(pool, get_client_pool())
+        shutdown_client_pool()
+        self.assertIsNot(pool, get_client_pool())
+        shutdown_client_pool()
+
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the per-cluster circuit breaker."""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker("https://c1.kusto.windows.net", threshold=2, recovery_time=0.05,
+                                      max_recovery_time=0.15, enabled=True)
+
+    def _fail(self, error):
+        with self.assertRaises(type(error)):
+            with self.breaker.guard():
+                raise error
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        """Consecutive cluster failures open the breaker; query mistakes do not count."""
+        self._fail(ValueError("Semantic error: column 'x' failed to resolve"))
+        self._fail(ValueError("Semantic error: column 'x' failed to resolve"))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self._fail(ConnectionError("Connection refused"))
+        self._fail(ValueError("Service unavailable"))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.get_stats()["rejected"], 1)
+
+    def test_half_open_probe_closes_or_reopens_with_longer_recovery(self):
+        """After recovery one probe goes through; failure doubles the recovery time."""
+        self._fail(ConnectionError("Connection reset"))
+        self._fail(ConnectionError("Connection reset"))
+        time.sleep(0.06)
+
+        self.breaker.before_call()  # the probe
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()  # concurrent callers still fail fast
+        self.breaker.record_failure(ConnectionError("Connection reset"))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertAlmostEqual(self.breaker.get_stats()["recovery_time"], 0.1)
+
+        time.sleep(0.11)
+        with self.breaker.guard():
+            pass
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertAlmostEqual(self.breaker.get_stats()["recovery_time"], 0.05)
+
+    def test_breakers_are_shared_per_cluster(self):
+        """Query execution and schema discovery resolve to the same breaker."""
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+        self.assertIs(get_circuit_breaker("c1.kusto.windows.net"), get_circuit_breaker("https://c1.kusto.windows.net/"))
+        self.assertEqual(get_circuit_breaker_stats()["https://c1.kusto.windows.net"]["state"], "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
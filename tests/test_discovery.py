@@ -0,0 +1,202 @@
+"""
+Unit tests for the discovery module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from mcp_kql_server.discovery import SchemaDiscoveryCoordinator, get_discovery_coordinator, reset_discovery_coordinator
+
+
+class FakeSchemaManager:
+    """Schema manager stand-in that records discoveries."""
+
+    def __init__(self, known=None):
+        self.memory_manager = MagicMock()
+        self.memory_manager.get_schema.side_effect = lambda c, d, t, enable_fallback=False: (known or {}).get(t)
+        self.calls = []
+        self.results = {}
+
+    async def get_table_schema(self, cluster, database, table, force_refresh=False):
+        self.calls.append(table)
+        await asyncio.sleep(0.02)
+        return self.results.get(table, {"columns": {"Data": {}}, "discovery_method": "fallback_schema", "error": "nope"})
+
+
+class TestSchemaDiscoveryCoordinator(unittest.TestCase):
+    """Test cases for deduplicated, negatively cached schema discovery."""
+
+    def setUp(self):
+        """Set up a coordinator around a fake schema manager."""
+        self.manager = FakeSchemaManager(known={"Known": {"columns": {"A": {}}}})
+        self.manager.results["StormEvents"] = {"columns": {"State": {}}, "discovery_method": "enhanced_json_schema"}
+        self.coordinator = SchemaDiscoveryCoordinator(self.manager, cooldown=0.05, max_cooldown=0.2)
+
+    def test_concurrent_discoveries_are_shared(self):
+        """Concurrent requests for one table run one discovery; known tables are skipped."""
+        async def main():
+            return await asyncio.gather(
+                *(self.coordinator.ensure_table("help", "Samples", "StormEvents") for _ in range(5)),
+                self.coordinator.ensure_table("https://help.kusto.windows.net", "Samples", "Known"),
+            )
+
+        results = asyncio.run(main())
+        self.assertEqual(results, ["discovered"] * 5 + ["known"])
+        self.assertEqual(self.manager.calls, ["StormEvents"])
+
+    def test_discoveries_are_shared_across_event_loops(self):
+        """A discovery started on one thread's loop is awaited by callers on other loops."""
+        release = threading.Event()
+        discover = self.manager.get_table_schema
+
+        async def slow_discovery(cluster, database, table, force_refresh=False):
+            while not release.is_set():
+                await asyncio.sleep(0.005)
+            return await discover(cluster, database, table, force_refresh)
+
+        self.manager.get_table_schema = slow_discovery
+        results = []
+
+        def worker():
+            results.append(asyncio.run(self.coordinator.ensure_table("help", "Samples", "StormEvents")))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while self.coordinator.get_stats()["coalesced"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results, ["discovered"] * 3)
+        self.assertEqual(self.manager.calls, ["StormEvents"])
+        self.assertEqual(self.coordinator._in_flight, {})
+
+    def test_failed_tables_cool_down_exponentially(self):
+        """A table that fails is skipped until its cool-down passes, which then doubles."""
+        def ensure():
+            return asyncio.run(self.coordinator.ensure_table("help", "Samples", "MyFunction"))
+
+        self.assertEqual(ensure(), "failed")
+        self.assertEqual(ensure(), "cooling_down")
+        time.sleep(0.06)
+        self.assertEqual(ensure(), "failed")
+        # Second failure doubles the cool-down to 0.1s
+        time.sleep(0.06)
+        self.assertEqual(ensure(), "cooling_down")
+        self.assertEqual(self.manager.calls, ["MyFunction", "MyFunction"])
+
+        stats = self.coordinator.get_stats()
+        self.assertEqual(stats["failed"], 2)
+        self.assertEqual(stats["cooling_down"]["https://help/samples/myfunction"]["failures"], 2)
+
+        # Once it resolves, the negative entry is cleared
+        self.manager.results["MyFunction"] = {"columns": {"X": {}}, "discovery_method": "enhanced_getschema"}
+        self.assertEqual(self.coordinator.forget_failures("help"), 1)
+        self.assertEqual(ensure(), "discovered")
+        self.assertEqual(self.coordinator.get_stats()["cooling_down"], {})
+
+    def test_global_coordinator(self):
+        """The global coordinator is shared until reset."""
+        coordinator = get_discovery_coordinator()
+        self.assertIs(coordinator, get_discovery_coordinator())
+        reset_discovery_coordinator()
+        self.assertIsNot(coordinator, get_discovery_coordinator())
+        reset_discovery_coordinator()
+
+
+
+class TestConcurrentRefresh(unittest.TestCase):
+    """Test cases for concurrent, resumable per-table refresh."""
+
+    def setUp(self):
+        """Set up a coordinator whose fake manager tracks concurrency."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = FakeSchemaManager()
+        self.manager.memory_manager.memory_path = Path(self.tmp.name) / "memory.json"
+        self.manager.memory_manager.get_table_last_used.return_value = {
+            "T7": "2026-01-02T00:00:00", "T5": "2026-01-01T00:00:00",
+        }
+        self.tables = [f"T{i}" for i in range(8)]
+        for table in self.tables:
+            self.manager.results[table] = {"columns": {"A": {}}, "discovery_method": "enhanced_getschema"}
+        self.coordinator = SchemaDiscoveryCoordinator(self.manager)
+
+        self.running = 0
+        self.peak = 0
+        self.finished = 0
+        original = self.manager.get_table_schema
+
+        async def tracked(cluster, database, table, force_refresh=False):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            try:
+                schema = await original(cluster, database, table, force_refresh)
+                self.finished += 1
+                return schema
+            finally:
+                self.running -= 1
+
+        self.manager.get_table_schema = tracked
+
+    def tearDown(self):
+        """Remove checkpoints."""
+        self.tmp.cleanup()
+
+    def test_refresh_is_bounded_prioritized_and_reports_progress(self):
+        """Discoveries run up to the per-cluster limit, recently used tables first."""
+        self.coordinator.refresh_concurrency = 3
+        updates = []
+
+        async def progress(completed, total, message):
+            updates.append((completed, total))
+
+        result = asyncio.run(self.coordinator.refresh_tables(
+            "help", "Samples", self.tables, progress=progress, completed_offset=2, total=10
+        ))
+
+        self.assertEqual(len(result["refreshed"]), 8)
+        self.assertEqual(self.peak, 3)
+        self.assertEqual(self.manager.calls[:2], ["T7", "T5"])
+        self.assertEqual(updates, [(n, 10) for n in range(3, 11)])
+
+    def test_interrupted_refresh_resumes_from_checkpoint(self):
+        """Tables finished before a cancellation are skipped by the next run."""
+        self.coordinator.refresh_concurrency = 2
+
+        async def interrupted():
+            task = asyncio.create_task(self.coordinator.refresh_tables("help", "Samples", self.tables))
+            while len(self.manager.calls) < 5:
+                await asyncio.sleep(0.005)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(interrupted())
+        finished = self.finished
+        self.assertLess(finished, 8)
+        self.manager.calls.clear()
+
+        result = asyncio.run(self.coordinator.refresh_tables("help", "Samples", self.tables))
+        self.assertEqual(len(result["resumed"]), finished)
+        self.assertEqual(len(result["refreshed"]) + len(result["resumed"]), 8)
+        self.assertEqual(len(self.manager.calls), 8 - finished)
+
+        # A completed refresh clears its checkpoint
+        self.assertEqual(list((Path(self.tmp.name) / "refresh_checkpoints").glob("*.json")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
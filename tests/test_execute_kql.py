@@ -6,17 +6,21 @@ Email: arjuntrivedi42@yahoo.com
 """
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import asyncio
 
+import pandas as pd
 from azure.kusto.data.exceptions import KustoServiceError
 
+from mcp_kql_server.connection import shutdown_client_pool
 from mcp_kql_server.constants import TEST_CONFIG
 from mcp_kql_server.execute_kql import (
+    apply_row_limit,
     clean_query_for_execution,
     execute_kql_query,
     extract_cluster_and_database_from_query,
     extract_tables_from_query,
+    kql_execute_tool,
     validate_kql_query_syntax,
     validate_query,
 )
@@ -30,6 +34,12 @@ class TestExecuteKQL(unittest.TestCase):
         self.valid_query = f"cluster('{TEST_CONFIG['mock_cluster_uri']}').database('{TEST_CONFIG['mock_database']}').{TEST_CONFIG['mock_table']} | take 10"
         self.test_cluster_uri = TEST_CONFIG["mock_cluster_uri"]
         self.test_database = TEST_CONFIG["mock_database"]
+        # Pooled clients would otherwise leak mocked clients between tests
+        shutdown_client_pool()
+
+    def tearDown(self):
+        """Release pooled clients created during the test."""
+        shutdown_client_pool()
 
     def test_validate_query_success(self):
         """Test successful query validation."""
@@ -83,17 +93,12 @@ class TestExecuteKQL(unittest.TestCase):
         self.assertEqual(cluster_uri, self.test_cluster_uri)
         self.assertEqual(database, "your-database")
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_execute_kql_query_success(
-        self, mock_get_corpus, mock_connection_builder, mock_kusto_client
+        self, mock_get_corpus, mock_execute_async
     ):
         """Test successful KQL query execution."""
-        # Mock Kusto client
-        mock_client_instance = MagicMock()
-        mock_kusto_client.return_value = mock_client_instance
-
         # Mock query response
         mock_response = MagicMock()
         mock_response.primary_results = [MagicMock()]
@@ -104,7 +109,7 @@ class TestExecuteKQL(unittest.TestCase):
         mock_response.primary_results[0].columns = [mock_column]
         mock_response.primary_results[0].__iter__ = lambda x: iter([["test_value"]])
 
-        mock_client_instance.execute.return_value = mock_response
+        mock_execute_async.return_value = mock_response
 
         # Mock knowledge corpus
         mock_corpus_instance = MagicMock()
@@ -122,17 +127,12 @@ class TestExecuteKQL(unittest.TestCase):
         self.assertIn("TestColumn", result[0])
         self.assertEqual(result[0]["TestColumn"], "test_value")
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_execute_kql_query_with_visualization(
-        self, mock_get_corpus, mock_connection_builder, mock_kusto_client
+        self, mock_get_corpus, mock_execute_async
     ):
         """Test KQL query execution with visualization."""
-        # Mock Kusto client
-        mock_client_instance = MagicMock()
-        mock_kusto_client.return_value = mock_client_instance
-
         # Mock query response
         mock_response = MagicMock()
         mock_response.primary_results = [MagicMock()]
@@ -143,7 +143,7 @@ class TestExecuteKQL(unittest.TestCase):
         mock_response.primary_results[0].columns = [mock_column]
         mock_response.primary_results[0].__iter__ = lambda x: iter([["test_value"]])
 
-        mock_client_instance.execute.return_value = mock_response
+        mock_execute_async.return_value = mock_response
 
         # Mock knowledge corpus
         mock_corpus_instance = MagicMock()
@@ -163,32 +163,24 @@ class TestExecuteKQL(unittest.TestCase):
         has_visualization = any("visualization" in row for row in result)
         self.assertTrue(has_visualization)
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     def test_execute_kql_query_kusto_error(
-        self, mock_connection_builder, mock_kusto_client
+        self, mock_execute_async
     ):
         """Test KQL query execution with Kusto service error."""
-        # Mock Kusto client to raise error
-        mock_client_instance = MagicMock()
-        mock_kusto_client.return_value = mock_client_instance
-        mock_client_instance.execute.side_effect = KustoServiceError("Test Kusto error")
+        # Mock Kusto transport to raise error
+        mock_execute_async.side_effect = KustoServiceError("Test Kusto error")
 
         # Execute query and expect exception
         with self.assertRaises(KustoServiceError):
             asyncio.run(execute_kql_query(self.valid_query, use_schema_context=False))
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_execute_kql_query_with_schema_context(
-        self, mock_get_corpus, mock_connection_builder, mock_kusto_client
+        self, mock_get_corpus, mock_execute_async
     ):
         """Test KQL query execution with schema context."""
-        # Mock Kusto client
-        mock_client_instance = MagicMock()
-        mock_kusto_client.return_value = mock_client_instance
-
         # Mock query response
         mock_response = MagicMock()
         mock_response.primary_results = [MagicMock()]
@@ -199,7 +191,7 @@ class TestExecuteKQL(unittest.TestCase):
         mock_response.primary_results[0].columns = [mock_column]
         mock_response.primary_results[0].__iter__ = lambda x: iter([["test_value"]])
 
-        mock_client_instance.execute.return_value = mock_response
+        mock_execute_async.return_value = mock_response
 
         # Mock knowledge corpus with context
         mock_corpus_instance = MagicMock()
@@ -222,21 +214,16 @@ class TestExecuteKQL(unittest.TestCase):
         # Verify results
         self.assertIsInstance(result, list)
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_execute_kql_query_empty_results(
-        self, mock_get_corpus, mock_connection_builder, mock_kusto_client
+        self, mock_get_corpus, mock_execute_async
     ):
         """Test KQL query execution with empty results."""
-        # Mock Kusto client
-        mock_client_instance = MagicMock()
-        mock_kusto_client.return_value = mock_client_instance
-
         # Mock empty response
         mock_response = MagicMock()
         mock_response.primary_results = []
-        mock_client_instance.execute.return_value = mock_response
+        mock_execute_async.return_value = mock_response
 
         # Mock knowledge corpus
         mock_corpus_instance = MagicMock()
@@ -257,16 +244,12 @@ class TestExecuteKQL(unittest.TestCase):
         with self.assertRaises(ValueError):
             asyncio.run(execute_kql_query(invalid_query, use_schema_context=False))
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_execute_kql_query_routes_management_commands(
-        self, mock_get_corpus, mock_conn_builder, mock_client_cls
+        self, mock_get_corpus, mock_execute_async
     ):
         """Multi-statement script should route dot-commands to execute_mgmt."""
-        mock_client = MagicMock()
-        mock_client_cls.return_value = mock_client
-
         # Data query primary result
         data_resp = MagicMock()
         data_resp.primary_results = [MagicMock()]
@@ -274,7 +257,6 @@ class TestExecuteKQL(unittest.TestCase):
         mock_col.column_name = "C1"
         data_resp.primary_results[0].columns = [mock_col]
         data_resp.primary_results[0].__iter__ = lambda x: iter([["v1"]])
-        mock_client.execute.return_value = data_resp
 
         # Mgmt query primary result
         mgmt_resp = MagicMock()
@@ -283,7 +265,7 @@ class TestExecuteKQL(unittest.TestCase):
         mgmt_col.column_name = "TableName"
         mgmt_resp.primary_results[0].columns = [mgmt_col]
         mgmt_resp.primary_results[0].__iter__ = lambda x: iter([["T1"]])
-        mock_client.execute_mgmt.return_value = mgmt_resp
+        mock_execute_async.side_effect = lambda cluster, db, query, is_mgmt=False, **kwargs: mgmt_resp if is_mgmt else data_resp
 
         mock_corpus = MagicMock()
         mock_get_corpus.return_value = mock_corpus
@@ -304,16 +286,12 @@ class TestExecuteKQL(unittest.TestCase):
         self.assertEqual(cu, self.test_cluster_uri)
         self.assertEqual(db, self.test_database)
 
-    @patch("mcp_kql_server.execute_kql.KustoClient")
-    @patch("mcp_kql_server.execute_kql.KustoConnectionStringBuilder")
+    @patch("mcp_kql_server.execute_kql.execute_kusto_async", new_callable=AsyncMock)
     @patch("mcp_kql_server.execute_kql.get_knowledge_corpus")
     def test_normalize_legacy_iplocation_to_geo_info(
-        self, mock_get_corpus, mock_conn_builder, mock_client_cls
+        self, mock_get_corpus, mock_execute_async
     ):
         """Ensure iplocation() handling in queries."""
-        mock_client = MagicMock()
-        mock_client_cls.return_value = mock_client
-
         # Mock response
         mock_response = MagicMock()
         mock_response.primary_results = [MagicMock()]
@@ -321,7 +299,7 @@ class TestExecuteKQL(unittest.TestCase):
         mock_col.column_name = "c"
         mock_response.primary_results[0].columns = [mock_col]
         mock_response.primary_results[0].__iter__ = lambda x: iter([[1]])
-        mock_client.execute.return_value = mock_response
+        mock_execute_async.return_value = mock_response
 
         # Mock knowledge corpus
         mock_corpus = MagicMock()
@@ -335,10 +313,10 @@ class TestExecuteKQL(unittest.TestCase):
         self.assertIsInstance(result, list)
 
         # Verify execute was called
-        self.assertTrue(mock_client.execute.called)
-        args, kwargs = mock_client.execute.call_args
-        self.assertEqual(args[0], self.test_database)
-        executed_query = args[1]
+        self.assertTrue(mock_execute_async.called)
+        args, kwargs = mock_execute_async.call_args
+        self.assertEqual(args[1], self.test_database)
+        executed_query = args[2]
 
         # Note: The current implementation may not normalize iplocation by default
         # This test ensures the query executes without error
@@ -380,5 +358,75 @@ class TestExecuteKQL(unittest.TestCase):
         self.assertEqual(cleaned, "TestTable | take 10")
 
 
+class TestRowLimitGuardrail(unittest.TestCase):
+    """Test cases for the row limit guardrail."""
+
+    def test_unbounded_query_gets_take(self):
+        """Queries without a limit are capped one row past the limit."""
+        self.assertEqual(apply_row_limit("T | where x == 1", 10), ("T | where x == 1 | take 11", True))
+        self.assertEqual(
+            apply_row_limit('let n = 1; T | where s == "a;b|c" | render timechart', 10),
+            ('let n = 1; T | where s == "a;b|c" | take 11 | render timechart', True),
+        )
+
+    def test_bounded_and_management_queries_are_unchanged(self):
+        """Explicit limits, management commands and a disabled limit are left alone."""
+        for query in ("T | take 5", "T | top 3 by x", "T | count", ".show tables", "print 1"):
+            self.assertEqual(apply_row_limit(query, 10), (query, False))
+        self.assertEqual(apply_row_limit("T", 0), ("T", False))
+        # A take inside a subquery does not bound the outer result
+        self.assertTrue(apply_row_limit("T | join (U | take 3) on k", 10)[1])
+
+    def test_inline_comments_cannot_swallow_the_take(self):
+        """A trailing // comment is dropped instead of commenting out the guardrail."""
+        self.assertEqual(
+            apply_row_limit("StormEvents | where State == 'TEXAS' // only texas", 10),
+            ("StormEvents | where State == 'TEXAS' | take 11", True),
+        )
+        self.assertEqual(
+            apply_row_limit('T | where url == "http://x" // take 5 in a comment\n| project url', 10),
+            ('T | where url == "http://x" \n| project url | take 11', True),
+        )
+
+    def test_multi_result_queries_are_unchanged(self):
+        """fork and facet return several tables, so no take is appended."""
+        for query in ("T | fork (take 3) (take 4)", "T | facet by State"):
+            self.assertEqual(apply_row_limit(query, 100), (query, False))
+
+    @patch("mcp_kql_server.execute_kql.get_query_processor", return_value=None)
+    def test_truncated_results_are_flagged(self, _processor):
+        """kql_execute_tool trims the extra row and records the truncation."""
+        with patch("mcp_kql_server.execute_kql._execute_kusto_query_sync",
+                   return_value=pd.DataFrame({"n": range(11)})) as execute:
+            df = kql_execute_tool("T | where n >= 0", cluster_uri="help.kusto.windows.net",
+                                  database="Samples", cache_mode="bypass", row_limit=10)
+            self.assertEqual(execute.call_args[0][0], "T | where n >= 0 | take 11")
+            self.assertEqual(len(df), 10)
+            self.assertEqual((df.attrs["truncated"], df.attrs["row_limit"]), (True, 10))
+
+            df = kql_execute_tool("T | where n >= 0", cluster_uri="help.kusto.windows.net",
+                                  database="Samples", cache_mode="bypass", row_limit=0)
+            self.assertEqual(execute.call_args[0][0], "T | where n >= 0")
+            self.assertNotIn("truncated", df.attrs)
+
+
+class TestQueryTimeouts(unittest.TestCase):
+    """Test cases for server timeouts on executed queries."""
+
+    @patch("mcp_kql_server.execute_kql.get_query_processor", return_value=None)
+    def test_timeout_and_request_id_reach_the_client(self, _processor):
+        """kql_execute_tool sends servertimeout and the caller's request id."""
+        with patch("mcp_kql_server.execute_kql._execute_kusto_query_sync",
+                   return_value=pd.DataFrame({"n": [1]})) as execute:
+            kql_execute_tool("T | count", cluster_uri="help.kusto.windows.net", database="Samples",
+                             cache_mode="bypass", timeout_seconds=30, client_request_id="KQLMCP.execute;abc")
+            properties = execute.call_args[0][3]
+            self.assertEqual(properties.get_option("servertimeout", None).total_seconds(), 30)
+            self.assertEqual(properties.client_request_id, "KQLMCP.execute;abc")
+
+            kql_execute_tool("T | count", cluster_uri="help.kusto.windows.net", database="Samples", cache_mode="bypass")
+            self.assertEqual(execute.call_args[0][3].get_option("servertimeout", None).total_seconds(), 600)
+
+
 if __name__ == "__main__":
     unittest.main()
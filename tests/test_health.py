@@ -0,0 +1,129 @@
+"""
+Unit tests for the health module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from azure.kusto.data.exceptions import KustoNetworkError, KustoServiceError
+
+from mcp_kql_server.health import (
+    ClusterHealthMonitor,
+    get_health_monitor,
+    shutdown_health_monitor,
+)
+
+
+class TestClusterHealthMonitor(unittest.TestCase):
+    """Test cases for the background cluster health checker."""
+
+    def setUp(self):
+        """Set up a monitor with a controllable probe."""
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+        def probe(cluster_url):
+            self.calls.append(cluster_url)
+            self.release.wait(5)
+            if self.fail:
+                raise ConnectionError("unreachable")
+
+        self.monitor = ClusterHealthMonitor(probe=probe, ttl_seconds=60, failure_retry=0.05)
+
+    def tearDown(self):
+        """Stop the monitor."""
+        self.release.set()
+        self.monitor.shutdown()
+
+    def _wait_for_probe(self, url="https://help.kusto.windows.net"):
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            if self.monitor.get_stats()["probes_pending"] == 0 and self.monitor.check(url).probes:
+                return
+            time.sleep(0.01)
+
+    def test_check_does_not_block_on_probe(self):
+        """A slow probe runs in the background while check() returns the cached record."""
+        self.release.clear()
+        started = time.monotonic()
+        record = self.monitor.check("help.kusto.windows.net")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertIsNone(record.healthy)
+
+        # Repeated checks while the probe is pending do not schedule more probes
+        self.monitor.check("https://help.kusto.windows.net/")
+        self.release.set()
+        self._wait_for_probe()
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(self.monitor.check("help.kusto.windows.net").healthy)
+
+    def test_fresh_record_is_not_reprobed(self):
+        """A healthy record within its TTL never triggers a probe."""
+        self.monitor.record_success("help.kusto.windows.net", latency_ms=12.0)
+        for _ in range(5):
+            self.assertTrue(self.monitor.check("help.kusto.windows.net").healthy)
+        self.assertEqual(self.calls, [])
+
+    def test_failed_probe_is_retried_after_backoff(self):
+        """An unhealthy cluster is probed again only once the failure back-off has passed."""
+        self.fail = True
+        self.monitor.check("help.kusto.windows.net")
+        self._wait_for_probe()
+        record = self.monitor.check("help.kusto.windows.net")
+        self.assertFalse(record.healthy)
+        self.assertIn("unreachable", record.error)
+        self.assertEqual(len(self.calls), 1)
+
+        time.sleep(0.1)
+        self.fail = False
+        self.monitor.check("help.kusto.windows.net")
+        deadline = time.monotonic() + 2
+        while not self.monitor.check("help.kusto.windows.net").healthy and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.monitor.check("help.kusto.windows.net").consecutive_failures, 0)
+
+    def test_only_cluster_failures_mark_a_cluster_unhealthy(self):
+        """Schema queries that fail on a query mistake leave the cluster's health alone."""
+        from mcp_kql_server.utils import SchemaManager
+
+        # Hold the background probe so only the schema query updates the record
+        self.release.clear()
+
+        def run(error):
+            with patch("mcp_kql_server.health.get_health_monitor", return_value=self.monitor), \
+                    patch("mcp_kql_server.async_client.execute_kusto_async", AsyncMock(side_effect=error)):
+                with self.assertRaises(Exception):
+                    asyncio.run(SchemaManager()._execute_kusto_async("T | getschema", "help.kusto.windows.net", "Samples"))
+            return self.monitor.get_stats()["clusters"]["https://help.kusto.windows.net"]
+
+        self.assertIsNone(run(KustoServiceError("Semantic error: 'T' could not be resolved"))["healthy"])
+        cluster = run(KustoNetworkError("https://help.kusto.windows.net", "Connection reset"))
+        self.assertFalse(cluster["healthy"])
+        self.assertEqual(cluster["consecutive_failures"], 1)
+
+    def test_stats_and_global_monitor(self):
+        """Stats list every cluster, and the global monitor is a resettable singleton."""
+        self.monitor.record_failure("help.kusto.windows.net", RuntimeError("boom"))
+        stats = self.monitor.get_stats()
+        cluster = stats["clusters"]["https://help.kusto.windows.net"]
+        self.assertFalse(cluster["healthy"])
+        self.assertEqual(cluster["consecutive_failures"], 1)
+
+        monitor = get_health_monitor()
+        self.assertIs(monitor, get_health_monitor())
+        shutdown_health_monitor()
+        self.assertIsNot(monitor, get_health_monitor())
+        shutdown_health_monitor()
+
+
+if __name__ == "__main__":
+    unittest.main()
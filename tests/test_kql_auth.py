@@ -5,11 +5,30 @@ Author: Arjun Trivedi
 Email: arjuntrivedi42@yahoo.com
 """
 
+import asyncio
+import json
 import subprocess
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
-from mcp_kql_server.kql_auth import authenticate, kql_auth, trigger_az_cli_auth
+from azure.core.credentials import AccessToken
+
+from mcp_kql_server.constants import AUTH_CONFIG
+from mcp_kql_server.kql_auth import (
+    AzureTokenProvider,
+    authenticate,
+    cluster_token_callback,
+    get_auth_method,
+    get_token_provider,
+    kql_auth,
+    register_credential,
+    reset_token_providers,
+    set_auth_method,
+    token_scope,
+    trigger_az_cli_auth,
+)
 
 
 class TestKQLAuth(unittest.TestCase):
@@ -18,6 +37,42 @@ class TestKQLAuth(unittest.TestCase):
     def setUp(self):
         """Clear cache before each test."""
         kql_auth.cache_clear()
+        reset_token_providers()
+
+    def tearDown(self):
+        """Drop tokens seeded by the checks."""
+        reset_token_providers()
+
+    @patch.dict("mcp_kql_server.kql_auth.AUTH_CONFIG", {"token_resource": "https://kusto.kusto.windows.net"})
+    @patch("mcp_kql_server.kql_auth.subprocess.run")
+    def test_kql_auth_seeds_token_cache(self, mock_run):
+        """With a shared token resource, the startup token is reused by every client."""
+        mock_run.return_value = MagicMock(
+            returncode=0,
+            stdout=json.dumps({"accessToken": "cli-token", "expires_on": int(time.time()) + 3600}),
+        )
+
+        self.assertTrue(kql_auth()["authenticated"])
+
+        mock_run.assert_called_once()
+        self.assertIn("get-access-token", mock_run.call_args.args[0])
+        self.assertIn("https://kusto.kusto.windows.net", mock_run.call_args.args[0])
+        token = cluster_token_callback("help.kusto.windows.net")()
+        self.assertEqual(token, "cli-token")
+
+    @patch("mcp_kql_server.kql_auth.subprocess.run")
+    def test_tokens_are_per_cluster_by_default(self, mock_run):
+        """Without a shared resource each cluster's own URL is the audience, in any cloud."""
+        mock_run.return_value = MagicMock(returncode=0, stdout="{}", stderr="")
+
+        self.assertTrue(kql_auth()["authenticated"])
+        self.assertNotIn("--resource", mock_run.call_args.args[0])
+        self.assertEqual(
+            token_scope("https://mycluster.kusto.usgovcloudapi.net/MyDatabase"),
+            "https://mycluster.kusto.usgovcloudapi.net/.default",
+        )
+        self.assertEqual(token_scope("http://localhost:8080"), "http://localhost:8080/.default")
+        self.assertEqual(token_scope("help.kusto.windows.net"), "https://help.kusto.windows.net/.default")
 
     @patch("mcp_kql_server.kql_auth.subprocess.run")
     def test_kql_auth_success(self, mock_run):
@@ -33,13 +88,10 @@ class TestKQLAuth(unittest.TestCase):
     @patch("mcp_kql_server.kql_auth.subprocess.run")
     def test_kql_auth_failure(self, mock_run):
         """Test failed authentication check."""
-        # Mock first call success, second call failure
-        mock_run.side_effect = [
-            MagicMock(returncode=0),  # for 'az config'
-            subprocess.CalledProcessError(
-                1, "az", stderr="Authentication failed"
-            ),  # for 'az account'
-        ]
+        # Mock 'az account get-access-token' failure
+        mock_run.side_effect = subprocess.CalledProcessError(
+            1, "az", stderr="Authentication failed"
+        )
 
         result = kql_auth()
 
@@ -173,5 +225,80 @@ class TestKQLAuth(unittest.TestCase):
         self.assertEqual("az", first_call_args[0])
 
 
+
+class FakeCredential:
+    """azure-identity style credential that counts token requests."""
+
+    def __init__(self, lifetime=3600):
+        self.lifetime = lifetime
+        self.calls = []
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls.append(scopes[0])
+        return AccessToken(f"token-{len(self.calls)}", int(time.time() + self.lifetime))
+
+
+class TestAzureTokenProvider(unittest.TestCase):
+    """Test cases for the in-process token cache."""
+
+    def setUp(self):
+        """Reset the shared providers."""
+        reset_token_providers()
+
+    def tearDown(self):
+        """Reset the shared providers."""
+        reset_token_providers()
+
+    def test_tokens_are_cached_per_scope(self):
+        """Each scope is fetched once, also under concurrent callers."""
+        credential = FakeCredential()
+        provider = AzureTokenProvider(lambda: credential, refresh_margin=60)
+
+        threads = [threading.Thread(target=provider.get_token, args=("https://a/.default",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        provider.get_token("https://b/.default")
+        self.assertEqual(asyncio.run(provider("https://a/.default")), "token-1")
+
+        self.assertEqual(credential.calls, ["https://a/.default", "https://b/.default"])
+        self.assertEqual(provider.get_stats()["fetches"], 2)
+
+    def test_expiring_token_is_refreshed_in_background(self):
+        """A token inside the refresh margin is still served while a new one is fetched."""
+        credential = FakeCredential(lifetime=120)
+        provider = AzureTokenProvider(lambda: credential, refresh_margin=300, min_lifetime=30)
+
+        self.assertEqual(provider.get_token("scope"), "token-1")
+        # Still usable, so it is returned at once and refreshed behind the caller
+        self.assertEqual(provider.get_token("scope"), "token-1")
+        deadline = time.monotonic() + 2
+        while provider.get_stats()["background_refreshes"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(credential.calls), 2)
+
+        # A token too close to expiry is replaced before use
+        provider.seed("scope", "stale", time.time() + 5)
+        self.assertEqual(provider.get_token("scope"), "token-3")
+
+    def test_auth_method_selects_credential(self):
+        """auth_method picks the registered credential used by every client."""
+        credential = FakeCredential()
+        register_credential("fake", lambda: credential, aliases=("fake_alias",))
+
+        self.assertEqual(set_auth_method("FAKE_ALIAS"), "fake_alias")
+        self.assertEqual(get_auth_method(), "fake_alias")
+        self.assertEqual(cluster_token_callback("https://help.kusto.windows.net/")(), "token-1")
+        self.assertEqual(credential.calls, [token_scope("help.kusto.windows.net")])
+        self.assertIs(get_token_provider(), get_token_provider("fake"))
+
+        with self.assertRaises(ValueError):
+            set_auth_method("carrier_pigeon")
+
+        reset_token_providers()
+        self.assertEqual(get_auth_method(), AUTH_CONFIG["default_method"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+"""
+Unit tests for the learning module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from mcp_kql_server.learning import LearningEvent, LearningPipeline
+
+
+class TestLearningPipeline(unittest.TestCase):
+    """Test cases for the bounded background learning pipeline."""
+
+    def setUp(self):
+        """Set up a pipeline whose handler can be held."""
+        self.events = []
+        self.release = threading.Event()
+        self.release.set()
+
+        async def handler(event):
+            self.release.wait(5)
+            self.events.append(event)
+
+        self.pipeline = LearningPipeline(handler, queue_size=2, workers=1, dedupe_seconds=60)
+
+    def tearDown(self):
+        """Stop the workers."""
+        self.release.set()
+        self.pipeline.shutdown(wait=True)
+
+    def _event(self, query, table="StormEvents"):
+        return LearningEvent(cluster="help", database="Samples", queries=[query], tables=(table,))
+
+    def test_event_keeps_metadata_not_rows(self):
+        """Events built from a result carry its shape and tables, not the frame."""
+        df = pd.DataFrame({"State": ["TEXAS", "OHIO"], "Count": [3, 4]})
+        with patch("mcp_kql_server.utils.parse_query_entities", return_value={"tables": ["StormEvents"]}):
+            event = LearningEvent.from_result("StormEvents | count", "help", "Samples", df)
+
+        self.assertEqual(event.tables, ("StormEvents",))
+        self.assertEqual([name for name, _ in event.columns], ["State", "Count"])
+        self.assertEqual(dict(event.columns)["Count"], "int64")
+        self.assertEqual(event.row_count, 2)
+        self.assertFalse(any(isinstance(value, pd.DataFrame) for value in vars(event).values()))
+
+    def test_events_for_same_table_are_merged(self):
+        """Queued events for the same tables merge; a learned query is not learned again."""
+        self.release.clear()
+        self.assertTrue(self.pipeline.submit(self._event("T | take 1", table="Blocker")))
+        self.assertTrue(self.pipeline.submit(self._event("StormEvents | take 1")))
+        self.assertTrue(self.pipeline.submit(self._event("StormEvents | count")))
+        self.assertTrue(self.pipeline.submit(self._event("StormEvents | take 1")))
+        self.release.set()
+        self.assertTrue(self.pipeline.wait_idle())
+
+        storm = [e for e in self.events if e.tables == ("StormEvents",)]
+        self.assertEqual(len(storm), 1)
+        self.assertEqual(storm[0].queries, ["StormEvents | take 1", "StormEvents | count"])
+        self.assertEqual(storm[0].occurrences, 3)
+
+        self.assertFalse(self.pipeline.submit(self._event("StormEvents | count")))
+        stats = self.pipeline.get_stats()
+        self.assertEqual(stats["merged"], 2)
+        self.assertEqual(stats["deduplicated"], 1)
+        self.assertEqual(stats["processed"], 2)
+
+    def test_events_are_dropped_when_queue_is_full(self):
+        """Submitting never blocks; overflow is counted and dropped."""
+        self.release.clear()
+        self.pipeline.submit(self._event("A | take 1", table="A"))
+        # Wait for the worker to pick up the first event so the queue holds the next two
+        while self.pipeline.get_stats()["queued"]:
+            time.sleep(0.01)
+        accepted = [self.pipeline.submit(self._event(f"{t} | take 1", table=t)) for t in ("B", "C", "D")]
+        self.assertEqual(accepted, [True, True, False])
+        self.release.set()
+        self.assertTrue(self.pipeline.wait_idle())
+
+        stats = self.pipeline.get_stats()
+        self.assertEqual(stats["dropped"], 1)
+        self.assertEqual(stats["processed"], 3)
+
+    def test_handler_failure_is_counted(self):
+        """A failing handler does not stop the worker."""
+        calls = []
+
+        def handler(event):
+            calls.append(event)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        pipeline = LearningPipeline(handler, workers=1)
+        try:
+            pipeline.submit(self._event("A | take 1", table="A"))
+            pipeline.submit(self._event("B | take 1", table="B"))
+            self.assertTrue(pipeline.wait_idle())
+            stats = pipeline.get_stats()
+            self.assertEqual((stats["failed"], stats["processed"]), (1, 1))
+        finally:
+            pipeline.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -154,6 +154,230 @@ class TestMCPServerFunctions(unittest.TestCase):
         # Note: clear_schema_cache is available via SchemaManager, not directly on memory manager
         self.assertTrue(hasattr(manager, 'corpus') or hasattr(manager, 'memory_path'))
 
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_execute_tool_runs_query_off_event_loop(self):
+        """The execute tool hands kql_execute_tool to the worker pool."""
+        import asyncio
+        import threading
+
+        import pandas as pd
+
+        from mcp_kql_server.mcp_server import execute_kql_query
+
+        loop_thread = threading.get_ident()
+        seen = {}
+
+        def fake_execute(kql_query, cluster_uri, database, **kwargs):
+            seen["thread"] = threading.get_ident()
+            return pd.DataFrame({"c": [1, 2]})
+
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', side_effect=fake_execute):
+            output = asyncio.run(execute_kql_query.fn(
+                query="T | take 2", cluster_url=self.test_cluster_uri, database=self.test_database
+            ))
+
+        result = json.loads(output)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["row_count"], 2)
+        self.assertNotEqual(seen["thread"], loop_thread)
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_auth_method_argument_does_not_switch_credential(self):
+        """A caller's auth_method cannot change the credential shared by every session."""
+        import asyncio
+
+        import pandas as pd
+
+        from mcp_kql_server.kql_auth import get_auth_method
+        from mcp_kql_server.mcp_server import execute_kql_query
+
+        method = get_auth_method()
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', return_value=pd.DataFrame({"c": [1]})):
+            output = asyncio.run(execute_kql_query.fn(
+                query="T | take 1", cluster_url=self.test_cluster_uri, database=self.test_database,
+                auth_method="interactive", cache="bypass"
+            ))
+
+        self.assertTrue(json.loads(output)["success"])
+        self.assertEqual(get_auth_method(), method)
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_identical_concurrent_queries_share_one_execution(self):
+        """Concurrent identical execute calls are coalesced into one Kusto call."""
+        import asyncio
+        import time
+
+        import pandas as pd
+
+        from mcp_kql_server.mcp_server import execute_kql_query
+
+        calls = []
+
+        def fake_execute(kql_query, cluster_uri, database, **kwargs):
+            calls.append(kql_query)
+            time.sleep(0.1)
+            return pd.DataFrame({"c": [1]})
+
+        async def main():
+            return await asyncio.gather(*(
+                execute_kql_query.fn(query=q, cluster_url=self.test_cluster_uri, database=self.test_database)
+                for q in ("T | count", "T | count", "  T | count  ")
+            ))
+
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', side_effect=fake_execute):
+            outputs = asyncio.run(main())
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(json.loads(output)["success"] for output in outputs))
+
+    def _cancel_running_query(self, query, database):
+        """Start an execute call, cancel it mid-query, and return the cancel mock and the executor kwargs."""
+        import asyncio
+        import threading
+
+        from mcp_kql_server.mcp_server import execute_kql_query
+
+        started, release = threading.Event(), threading.Event()
+        seen = {}
+
+        def fake_execute(kql_query, cluster_uri, database, **kwargs):
+            seen.update(kwargs)
+            started.set()
+            release.wait(5)
+
+        async def main():
+            task = asyncio.ensure_future(execute_kql_query.fn(
+                query=query, cluster_url=self.test_cluster_uri, database=database, timeout_seconds=30
+            ))
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', side_effect=fake_execute), \
+                patch('mcp_kql_server.mcp_server.schedule_cancel_query', side_effect=lambda *a: release.set()) as cancel:
+            asyncio.run(main())
+        return cancel, seen
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_cancelled_call_cancels_query_on_cluster(self):
+        """Cancelling a running execute call sends .cancel query for its request id."""
+        cancel, seen = self._cancel_running_query("T | where x > 1", self.test_database)
+
+        self.assertEqual(seen["timeout_seconds"], 30)
+        cancel.assert_called_once_with(self.test_cluster_uri, self.test_database, seen["client_request_id"])
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_cancel_goes_to_the_database_the_query_runs_in(self):
+        """Without a database parameter the cancel targets the query's database, or master."""
+        cancel, seen = self._cancel_running_query(".show databases", "")
+        cancel.assert_called_once_with(self.test_cluster_uri, "master", seen["client_request_id"])
+
+        query = "cluster('help.kusto.windows.net').database('Other').StormEvents | take 5"
+        cancel, seen = self._cancel_running_query(query, "")
+        cancel.assert_called_once_with(self.test_cluster_uri, "Other", seen["client_request_id"])
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_batch_runs_items_concurrently_and_isolates_failures(self):
+        """Batch items run in parallel, duplicates share one execution and failures stay per item."""
+        import asyncio
+        import time
+        from unittest.mock import AsyncMock
+
+        import pandas as pd
+
+        from mcp_kql_server import mcp_server
+
+        calls = []
+
+        def fake_execute(kql_query, cluster_uri, database, **kwargs):
+            calls.append(kql_query)
+            if kql_query.startswith("Bad"):
+                raise ValueError("Semantic error: 'Bad' could not be resolved")
+            time.sleep(0.2)
+            return pd.DataFrame({"q": [kql_query]})
+
+        queries = [
+            {"id": "a", "query": "StormEvents | count"},
+            {"id": "b", "query": "Covid19 | count"},
+            {"id": "c", "query": "Bad | count"},
+            {"id": "d", "query": "StormEvents | count"},
+            {"id": "e", "query": "   "},
+        ]
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', side_effect=fake_execute), \
+                patch('mcp_kql_server.mcp_server.get_discovery_coordinator') as coordinator:
+            warm = coordinator.return_value.ensure_table = AsyncMock(return_value="failed")
+            started = time.monotonic()
+            result = json.loads(asyncio.run(mcp_server.execute_kql_batch.fn(
+                queries=queries, cluster_url=self.test_cluster_uri, database=self.test_database
+            )))
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.35)
+        self.assertEqual(sorted(calls), ["Bad | count", "Covid19 | count", "StormEvents | count"])
+        self.assertEqual([r["id"] for r in result["results"]], ["a", "b", "c", "d", "e"])
+        self.assertEqual([r["success"] for r in result["results"]], [True, True, False, True, False])
+        self.assertEqual((result["succeeded"], result["failed"]), (3, 2))
+        self.assertEqual(warm.await_count, 3)
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_large_result_is_paged_through_result_store(self):
+        """Results over the page size return a cursor that fetch_result_page follows without re-running."""
+        import asyncio
+
+        import pandas as pd
+
+        from mcp_kql_server.mcp_server import execute_kql_query, fetch_result_page
+
+        calls = []
+
+        def fake_execute(kql_query, cluster_uri, database, **kwargs):
+            calls.append(kql_query)
+            return pd.DataFrame({"n": list(range(25))})
+
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', side_effect=fake_execute):
+            first = json.loads(asyncio.run(execute_kql_query.fn(
+                query="T | take 25", cluster_url=self.test_cluster_uri, database=self.test_database, page_size=10
+            )))
+
+        self.assertEqual(first["row_count"], 10)
+        self.assertEqual(first["total_rows"], 25)
+        self.assertTrue(first["has_more"])
+
+        rows = [record["n"] for record in first["data"]]
+        cursor = first["next_cursor"]
+        while cursor:
+            page = json.loads(asyncio.run(fetch_result_page.fn(first["result_id"], cursor=cursor, page_size=10)))
+            rows.extend(record["n"] for record in page["data"])
+            cursor = page["next_cursor"]
+
+        self.assertEqual(rows, list(range(25)))
+        self.assertFalse(page["has_more"])
+        self.assertEqual(len(calls), 1)
+
+        missing = json.loads(asyncio.run(fetch_result_page.fn("does-not-exist")))
+        self.assertFalse(missing["success"])
+
+    @patch('mcp_kql_server.mcp_server.kusto_manager_global', {'authenticated': True})
+    def test_file_output_format_without_pyarrow_reports_error(self):
+        """output_format='arrow' fails with guidance when pyarrow is unavailable."""
+        import asyncio
+
+        import pandas as pd
+
+        from mcp_kql_server import results
+        from mcp_kql_server.mcp_server import execute_kql_query
+
+        with patch('mcp_kql_server.mcp_server.kql_execute_tool', return_value=pd.DataFrame({"n": [1]})), \
+                patch.object(results, "pa", None):
+            result = json.loads(asyncio.run(execute_kql_query.fn(
+                query="T | take 1", cluster_url=self.test_cluster_uri, database=self.test_database,
+                output_format="arrow"
+            )))
+
+        self.assertFalse(result["success"])
+        self.assertIn("pyarrow", result["error"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,531 @@
+"""
+Unit tests for the results module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import datetime
+import json
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from azure.kusto.data._models import KustoResultTable
+
+from mcp_kql_server import results as results_module
+from mcp_kql_server.execute_kql import _parse_kusto_response, kql_execute_tool
+from mcp_kql_server.results import (
+    ResultCache,
+    ResultCacheMiss,
+    ResultNotFound,
+    ResultStore,
+    dataframe_nbytes,
+    dataframe_to_records,
+    decode_result_table,
+    get_result_cache,
+    is_cacheable_query,
+)
+
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the TTL/LRU result cache."""
+
+    def setUp(self):
+        """Set up a small cache."""
+        self.df = pd.DataFrame({"State": ["TEXAS", "KANSAS"], "Count": [10, 3]})
+        self.size = dataframe_nbytes(self.df)
+        self.cache = ResultCache(ttl_seconds=60, max_bytes=self.size * 2)
+
+    def test_hit_returns_copy_of_stored_result(self):
+        """A stored result is served back without sharing attrs with the cache."""
+        key = self.cache.make_key("help.kusto.windows.net", "Samples", "StormEvents | take 2")
+        self.assertIsNone(self.cache.get(key))
+        self.assertTrue(self.cache.put(key, self.df))
+
+        cached = self.cache.get(("https://help.kusto.windows.net", "Samples", "StormEvents | take 2"))
+        pd.testing.assert_frame_equal(cached, self.df)
+        cached.attrs["cache_status"] = "hit"
+        self.assertNotIn("cache_status", self.df.attrs)
+
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_entries_expire_after_ttl(self):
+        """Entries older than the TTL are dropped on lookup."""
+        cache = ResultCache(ttl_seconds=0.01)
+        key = cache.make_key("c1", "db", "T")
+        cache.put(key, self.df)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.get_stats()["expirations"], 1)
+        self.assertEqual(cache.get_stats()["bytes"], 0)
+
+    def test_least_recently_used_entries_are_evicted_by_bytes(self):
+        """The byte budget evicts the least recently used entry first."""
+        keys = [self.cache.make_key("c1", "db", f"T{i}") for i in range(3)]
+        self.cache.put(keys[0], self.df)
+        self.cache.put(keys[1], self.df)
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], self.df)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertLessEqual(self.cache.get_stats()["bytes"], self.cache.max_bytes)
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+
+    def test_oversized_results_are_not_stored(self):
+        """Results larger than the per-entry limit skip the cache."""
+        cache = ResultCache(max_entry_bytes=self.size - 1)
+        self.assertFalse(cache.put(cache.make_key("c1", "db", "T"), self.df))
+        self.assertEqual(cache.get_stats()["rejected_too_large"], 1)
+
+    def test_invalidate_by_cluster_and_database(self):
+        """Invalidation can be scoped to a cluster and database."""
+        self.cache.put(self.cache.make_key("c1", "db1", "T"), self.df)
+        self.cache.put(self.cache.make_key("c1", "db2", "T"), self.df)
+        self.assertEqual(self.cache.invalidate("https://c1/", "db1"), 1)
+        self.assertEqual(self.cache.get_stats()["entries"], 1)
+
+    def test_cacheability(self):
+        """Management commands and non-deterministic functions are never cached."""
+        self.assertTrue(is_cacheable_query("StormEvents | summarize count() by State"))
+        self.assertFalse(is_cacheable_query(".show tables"))
+        self.assertFalse(is_cacheable_query("let x = 1;\n.show tables"))
+        self.assertFalse(is_cacheable_query("StormEvents | where StartTime > ago(1d)"))
+        self.assertFalse(is_cacheable_query("print Now = NOW ()"))
+        self.assertFalse(is_cacheable_query("T | extend id = new_guid()"))
+        self.assertTrue(is_cacheable_query("T | project nowhere, agony"))
+
+
+class TestKqlExecuteToolCaching(unittest.TestCase):
+    """Test cases for the result cache in front of kql_execute_tool."""
+
+    def setUp(self):
+        """Start every test from an empty global cache."""
+        get_result_cache().clear()
+        self.df = pd.DataFrame({"Count": [1]})
+        patcher = patch("mcp_kql_server.execute_kql._execute_kusto_query_sync", return_value=self.df)
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Keep the schema-aware pipeline (and its own discovery queries) out of the call counts
+        processor_patcher = patch("mcp_kql_server.execute_kql.get_query_processor", return_value=None)
+        processor_patcher.start()
+        self.addCleanup(processor_patcher.stop)
+        self.addCleanup(get_result_cache().clear)
+
+    def _run(self, query="StormEvents | count", cache_mode="default"):
+        return kql_execute_tool(query, cluster_uri="help.kusto.windows.net", database="Samples", cache_mode=cache_mode)
+
+    def test_repeated_query_is_served_from_cache(self):
+        """The second identical query does not reach the cluster."""
+        self._run()
+        cached = self._run("  StormEvents | count  ")
+        self.assertEqual(self.execute.call_count, 1)
+        self.assertEqual(cached.attrs.get("cache_status"), "hit")
+
+    def test_cache_modes(self):
+        """bypass and refresh always execute; only never does."""
+        with self.assertRaises(ResultCacheMiss):
+            self._run(cache_mode="only")
+        self.assertEqual(self.execute.call_count, 0)
+
+        self._run(cache_mode="bypass")
+        self.assertEqual(get_result_cache().get_stats()["entries"], 0)
+
+        self._run(cache_mode="refresh")
+        self._run(cache_mode="refresh")
+        self.assertEqual(self.execute.call_count, 3)
+
+        self._run(cache_mode="only")
+        self.assertEqual(self.execute.call_count, 3)
+
+    def test_non_deterministic_queries_always_execute(self):
+        """Queries using now() go to the cluster every time."""
+        bypassed = get_result_cache().get_stats()["bypassed"]
+        self._run("StormEvents | where StartTime > now() | count")
+        self._run("StormEvents | where StartTime > now() | count")
+        self.assertEqual(self.execute.call_count, 2)
+        self.assertEqual(get_result_cache().get_stats()["entries"], 0)
+        self.assertEqual(get_result_cache().get_stats()["bypassed"], bypassed + 2)
+
+
+def legacy_records(df):
+    """Reference: the per-cell iterrows conversion the serializer replaces."""
+    try:
+        records = []
+        for _, row in df.iterrows():
+            record = {}
+            for col, value in row.items():
+                if pd.isna(value):
+                    record[col] = None
+                elif hasattr(value, 'isoformat'):
+                    record[col] = value.isoformat()
+                elif hasattr(value, 'strftime'):
+                    record[col] = value.strftime('%Y-%m-%d %H:%M:%S')
+                elif isinstance(value, type):
+                    record[col] = value.__name__
+                elif hasattr(value, 'item'):
+                    record[col] = value.item()
+                else:
+                    record[col] = value
+            records.append(record)
+        return records
+    except Exception:
+        return df.astype(str).to_dict("records")
+
+
+class TestDataFrameToRecords(unittest.TestCase):
+    """The column-wise serializer must match the iterrows output exactly."""
+
+    def assertSameOutput(self, df):
+        expected = json.dumps(legacy_records(df), default=str)
+        actual = json.dumps(dataframe_to_records(df), default=str)
+        self.assertEqual(actual, expected)
+
+    def test_mixed_kusto_types(self):
+        """Strings, longs, reals, bools, datetimes, timespans and dynamics."""
+        self.assertSameOutput(pd.DataFrame({
+            "State": ["TEXAS", None, "KANSAS"],
+            "Count": [10, 3, 7],
+            "Ratio": [0.5, np.nan, float("inf")],
+            "Flag": [True, False, True],
+            "StartTime": pd.to_datetime(["2024-01-01T00:00:00Z", None, "2024-03-01T12:30:45.123456789Z"], format="ISO8601"),
+            "Local": pd.to_datetime(["2024-01-01 00:00:00.5", "1969-12-31 23:59:59.000001", None], format="ISO8601"),
+            "Duration": pd.to_timedelta(["-1.5s", "1 days 02:03:04.000005", None]),
+            "Props": [{"a": 1}, ["x"], None],
+            "Small": np.array([1, 2, 3], dtype=np.int8),
+        }))
+
+    def test_numeric_frames_use_the_row_dtype(self):
+        """int + float frames come out as floats, like iterrows rows."""
+        self.assertSameOutput(pd.DataFrame({"a": [1, 2], "b": [0.5, np.nan]}))
+        self.assertSameOutput(pd.DataFrame({"a": [1, 2], "b": np.array([0.1, 0.2], dtype=np.float32)}))
+        self.assertSameOutput(pd.DataFrame({"a": [1, 2], "b": [True, False]}))
+        self.assertSameOutput(pd.DataFrame({"a": [True, False]}))
+
+    def test_datetime_only_and_timezone_frames(self):
+        """Frames of only datetimes, and non-UTC timezones."""
+        self.assertSameOutput(pd.DataFrame({"t": pd.to_datetime(["2024-01-01", "2024-06-01 01:02:03.250"], format="ISO8601")}))
+        eastern = pd.to_datetime(["2024-01-01 08:00", "2024-07-01 08:00"]).tz_localize("US/Eastern")
+        self.assertSameOutput(pd.DataFrame({"t": eastern, "n": [1, 2]}))
+
+    def test_extension_and_object_columns(self):
+        """Nullable, categorical and miscellaneous Python objects."""
+        self.assertSameOutput(pd.DataFrame({
+            "i": pd.array([1, None], dtype="Int64"),
+            "b": pd.array([True, None], dtype="boolean"),
+            "c": pd.Categorical(["x", "y"]),
+            "o": [Decimal("1.5"), datetime.date(2024, 1, 2)],
+            "t": [int, np.float64(2.5)],
+        }))
+        self.assertSameOutput(pd.DataFrame({"i": pd.array([1, 2], dtype="Int64")}))
+
+    def test_unconvertible_cells_fall_back_to_strings(self):
+        """Multi-element arrays in a cell trip the same whole-frame fallback."""
+        df = pd.DataFrame({"arr": [[1, 2], [3]], "n": [1, 2]})
+        self.assertSameOutput(df)
+        self.assertEqual(dataframe_to_records(df)[0], {"arr": "[1, 2]", "n": "1"})
+
+    def test_edge_shapes(self):
+        """Empty frames, no columns and duplicate column labels."""
+        self.assertSameOutput(pd.DataFrame({"a": []}))
+        self.assertSameOutput(pd.DataFrame(index=range(2)))
+        self.assertSameOutput(pd.DataFrame([[1, "x"]], columns=["a", "a"]))
+
+    def test_random_frames(self):
+        """Randomized frames with nulls match the reference."""
+        rng = np.random.default_rng(7)
+        for _ in range(5):
+            n = 50
+            df = pd.DataFrame({
+                "long": rng.integers(-1000, 1000, n),
+                "real": np.where(rng.random(n) < 0.2, np.nan, rng.normal(size=n)),
+                "ts": pd.to_datetime(rng.integers(0, 2 * 10**18, n)).where(rng.random(n) > 0.1),
+                "span": pd.to_timedelta(rng.integers(-10**14, 10**14, n)),
+                "text": np.where(rng.random(n) < 0.2, None, rng.choice(["a", "b", "c"], n)).astype(object),
+            })
+            self.assertSameOutput(df)
+            self.assertSameOutput(df[["long", "real"]])
+
+
+def result_table(columns, rows):
+    """Build an SDK primary result table from (name, type) pairs and raw rows."""
+    return KustoResultTable({
+        "TableName": "PrimaryResult",
+        "TableKind": "PrimaryResult",
+        "Columns": [{"ColumnName": name, "ColumnType": ctype} for name, ctype in columns],
+        "Rows": rows,
+    })
+
+
+class TestDecodeResultTable(unittest.TestCase):
+    """Test cases for building typed DataFrames from raw Kusto rows."""
+
+    def test_columns_get_dtypes_from_kusto_types(self):
+        """Kusto types map to NumPy/pandas dtypes, nullable where needed."""
+        df = decode_result_table(result_table(
+            [("State", "string"), ("Count", "long"), ("Maybe", "long"), ("Ratio", "real"),
+             ("Flag", "bool"), ("StartTime", "datetime"), ("Props", "dynamic"), ("Amount", "decimal")],
+            [["TEXAS", 10, None, 0.5, True, "2024-01-01T00:00:00.1234567Z", {"a": 1}, "1.5"],
+             [None, 3, 4, "NaN", False, None, [1, 2], None]],
+        ))
+        self.assertEqual(
+            [str(dtype) for dtype in df.dtypes],
+            ["object", "int64", "Int64", "float64", "bool", "datetime64[ns, UTC]", "object", "object"],
+        )
+        self.assertEqual(df["StartTime"][0], pd.Timestamp("2024-01-01T00:00:00.1234567Z"))
+        self.assertTrue(pd.isna(df["Maybe"][0]))
+        self.assertTrue(np.isnan(df["Ratio"][1]))
+        self.assertEqual(df["Props"].tolist(), [{"a": 1}, [1, 2]])
+        self.assertEqual(df["Amount"][0], Decimal("1.5"))
+
+    def test_timespans(self):
+        """Day-prefixed, negative, tick and null timespans decode to timedelta64."""
+        df = decode_result_table(result_table(
+            [("Duration", "timespan")],
+            [["1.02:03:04.5670000"], ["-00:00:01.5"], [600000000], [None]],
+        ))
+        self.assertEqual(str(df["Duration"].dtype), "timedelta64[ns]")
+        self.assertEqual(df["Duration"].tolist()[:3], [
+            pd.Timedelta(days=1, hours=2, minutes=3, seconds=4.567),
+            pd.Timedelta(seconds=-1.5),
+            pd.Timedelta(seconds=60),
+        ])
+        self.assertTrue(pd.isna(df["Duration"][3]))
+
+    def test_undecodable_columns_fall_back_to_per_value_conversion(self):
+        """A column that fails bulk conversion converts the values it can and keeps the rest as sent."""
+        df = decode_result_table(result_table([("Count", "long")], [[1], ["many"]]))
+        self.assertEqual(df["Count"].tolist(), [1, "many"])
+
+        df = decode_result_table(result_table(
+            [("When", "datetime"), ("Duration", "timespan"), ("Amount", "decimal")],
+            [["2024-01-02T03:04:05Z", "00:01:00", "1.5"], ["soon", "a while", "lots"], [None, None, None]],
+        ))
+        self.assertEqual(df["When"].tolist(), [pd.Timestamp("2024-01-02T03:04:05Z"), "soon", None])
+        self.assertEqual(df["Duration"].tolist(), [pd.Timedelta(minutes=1), "a while", None])
+        self.assertEqual(df["Amount"].tolist(), [Decimal("1.5"), "lots", None])
+
+    def test_parse_response_uses_decoder(self):
+        """_parse_kusto_response returns typed columns and keeps the to_dict path for other objects."""
+        from unittest.mock import MagicMock
+
+        response = MagicMock()
+        response.primary_results = [result_table([("Count", "long")], [[1], [2]])]
+        self.assertEqual(str(_parse_kusto_response(response)["Count"].dtype), "int64")
+
+        response.primary_results = [MagicMock(**{"to_dict.return_value": {"data": [{"Count": 1}]}})]
+        self.assertEqual(_parse_kusto_response(response)["Count"].tolist(), [1])
+
+
+class TestResultStore(unittest.TestCase):
+    """Tests for the paginated result store."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def make_store(self, **kwargs):
+        kwargs.setdefault("spill_root", self._tmp.name)
+        store = ResultStore(**kwargs)
+        self.addCleanup(store.shutdown)
+        return store
+
+    def test_pages_slice_stored_result(self):
+        """Pages are contiguous slices and the entry carries the total row count."""
+        store = self.make_store()
+        result_id = store.put(pd.DataFrame({"n": range(10)}), {"query": "T"})
+
+        page, entry = store.get_page(result_id, offset=4, limit=4)
+        self.assertEqual(page["n"].tolist(), [4, 5, 6, 7])
+        self.assertEqual(entry.rows, 10)
+        self.assertEqual(entry.metadata["query"], "T")
+        self.assertTrue(store.get_page(result_id, offset=10, limit=4)[0].empty)
+
+    def test_expired_results_are_not_found(self):
+        """Results expire ttl_seconds after their last access."""
+        store = self.make_store(ttl_seconds=0.05)
+        result_id = store.put(pd.DataFrame({"n": [1]}))
+        time.sleep(0.1)
+        with self.assertRaises(ResultNotFound):
+            store.get_page(result_id)
+        self.assertEqual(store.get_stats()["expired"], 1)
+
+    def test_results_over_memory_budget_spill_to_disk(self):
+        """Least recently used results move to disk and are read back transparently."""
+        df = pd.DataFrame({"n": range(1000)})
+        store = self.make_store(max_bytes=int(dataframe_nbytes(df) * 1.5))
+        first = store.put(df)
+        second = store.put(df + 1)
+
+        stats = store.get_stats()
+        self.assertEqual((stats["in_memory"], stats["on_disk"]), (1, 1))
+        page, _ = store.get_page(first, offset=998, limit=5)
+        self.assertEqual(page["n"].tolist(), [998, 999])
+        self.assertEqual(store.get_page(second, limit=1)[0]["n"].tolist(), [1])
+        self.assertEqual(store.get_stats()["disk_reads"], 1)
+
+    def test_disk_budget_evicts_oldest_spilled_result(self):
+        """Spilled results past the disk budget are evicted oldest first."""
+        df = pd.DataFrame({"n": range(1000)})
+        store = self.make_store(max_bytes=1, max_disk_bytes=int(dataframe_nbytes(df) * 1.5))
+        first = store.put(df)
+        second = store.put(df)
+
+        with self.assertRaises(ResultNotFound):
+            store.get_page(first)
+        self.assertEqual(len(store.get_page(second)[0]), 1000)
+        self.assertEqual(store.get_stats()["evicted"], 1)
+
+    def test_result_larger_than_both_budgets_is_rejected(self):
+        """A result that fits neither tier is not stored."""
+        store = self.make_store(max_bytes=10, max_disk_bytes=10)
+        self.assertIsNone(store.put(pd.DataFrame({"n": range(100)})))
+        self.assertEqual(store.get_stats()["rejected_too_large"], 1)
+
+    def test_shutdown_removes_spill_directory(self):
+        """Shutting down deletes spill files along with the process directory."""
+        store = self.make_store(max_bytes=1)
+        store.put(pd.DataFrame({"n": range(100)}))
+        spill_dir = store._spill_dir
+        self.assertTrue(any(spill_dir.iterdir()))
+
+        store.shutdown()
+        self.assertFalse(spill_dir.exists())
+        self.assertEqual(store.get_stats()["entries"], 0)
+
+    def test_results_over_row_threshold_spill_immediately(self):
+        """Results with more rows than spill_rows never stay in memory."""
+        store = self.make_store(spill_rows=50)
+        kept = store.put(pd.DataFrame({"n": range(10)}))
+        spilled = store.put(pd.DataFrame({"n": range(100), "s": [f"v{i}" for i in range(100)]}))
+
+        stats = store.get_stats()
+        self.assertEqual((stats["in_memory"], stats["on_disk"]), (1, 1))
+        page, _ = store.get_page(spilled, offset=98, limit=10)
+        self.assertEqual(page["s"].tolist(), ["v98", "v99"])
+        self.assertEqual(len(store.get_page(kept)[0]), 10)
+
+    def test_export_requires_pyarrow(self):
+        """Arrow and Parquet output report a clear error when pyarrow is missing."""
+        store = self.make_store()
+        with patch.object(results_module, "pa", None):
+            with self.assertRaises(ImportError):
+                store.export(pd.DataFrame({"n": [1]}), "arrow")
+        with self.assertRaises(ValueError):
+            store.export(pd.DataFrame({"n": [1]}), "xlsx")
+
+    @unittest.skipUnless(results_module.pa is not None, "pyarrow is not installed")
+    def test_arrow_spill_pages_from_memory_map(self):
+        """Spilled results are Arrow files whose pages keep their column types."""
+        df = pd.DataFrame({
+            "n": pd.array([1, None, 3], dtype="Int64"),
+            "t": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"], utc=True),
+            "d": pd.to_timedelta([1, 2, 3], unit="s"),
+        })
+        store = self.make_store(max_bytes=1)
+        result_id = store.put(df)
+
+        self.assertEqual(store._entries[result_id].file_format, "arrow")
+        page, _ = store.get_page(result_id, offset=1, limit=2)
+        pd.testing.assert_frame_equal(page.reset_index(drop=True), df.iloc[1:].reset_index(drop=True))
+
+    def test_dynamic_columns_spill_unchanged(self):
+        """Dynamic columns are spilled as pickle so values keep their own keys and types."""
+        df = pd.DataFrame({
+            "props": [{"a": 1}, {"b": "x"}, None],
+            "mixed": pd.Series([1, 2, None], dtype=object),
+            "s": ["p", "q", "r"],
+        })
+        store = self.make_store(max_bytes=1)
+        result_id = store.put(df)
+
+        self.assertEqual(store._entries[result_id].file_format, "pickle")
+        page, _ = store.get_page(result_id)
+        self.assertEqual(page["props"].tolist(), [{"a": 1}, {"b": "x"}, None])
+        self.assertEqual(page["mixed"].tolist(), [1, 2, None])
+
+    def test_pickled_spill_is_read_once_until_memory_is_needed(self):
+        """Pages of a pickled spill reuse one read; the frame is dropped when the budget needs room."""
+        df = pd.DataFrame({"props": [{"a": i} for i in range(10)]})
+        store = self.make_store(max_bytes=dataframe_nbytes(df) + 1, spill_rows=5)
+        result_id = store.put(df)
+
+        for offset in (0, 5):
+            page, _ = store.get_page(result_id, offset=offset, limit=5)
+            self.assertEqual(page["props"].iloc[0], {"a": offset})
+        stats = store.get_stats()
+        self.assertEqual((stats["disk_reads"], stats["memory_bytes"]), (1, dataframe_nbytes(df)))
+
+        store.put(pd.DataFrame({"n": range(3)}))
+        self.assertIsNone(store._entries[result_id].view)
+        self.assertLessEqual(store.get_stats()["memory_bytes"], store.max_bytes)
+
+    def test_spill_files_are_written_outside_the_lock(self):
+        """Other callers can use the store while a spill file is being written."""
+        store = self.make_store(max_bytes=1)
+        write_spill_file = results_module._write_spill_file
+        lock_free = []
+
+        def probe_lock():
+            acquired = store._lock.acquire(timeout=1)
+            if acquired:
+                store._lock.release()
+            lock_free.append(acquired)
+
+        def check_lock_then_write(df, stem):
+            probe = threading.Thread(target=probe_lock)
+            probe.start()
+            probe.join()
+            return write_spill_file(df, stem)
+
+        with patch.object(results_module, "_write_spill_file", side_effect=check_lock_then_write):
+            result_id = store.put(pd.DataFrame({"n": range(10)}))
+        self.assertEqual(lock_free, [True])
+        self.assertIsNone(store._entries[result_id].df)
+        self.assertEqual(store.get_stats()["memory_bytes"], 0)
+
+    @unittest.skipUnless(results_module.pa is not None, "pyarrow is not installed")
+    def test_export_writes_dynamic_columns_as_json(self):
+        """Exported files hold dynamic values as JSON text, and pages decode them again."""
+        df = pd.DataFrame({"props": [{"a": 1}, {"b": "x"}, None], "s": ["p", "q", "r"], "tags": [["t"], 2, "u"]})
+        store = self.make_store()
+        for file_format in ("arrow", "parquet"):
+            entry = store.export(df, file_format)
+            table = results_module._open_result_file(entry.path, file_format)
+            self.assertEqual(table.column("props").to_pylist(), ['{"a": 1}', '{"b": "x"}', None])
+            page, _ = store.get_page(entry.result_id)
+            self.assertEqual(page["props"].tolist(), [{"a": 1}, {"b": "x"}, None])
+            self.assertEqual(page["tags"].tolist(), [["t"], 2, "u"])
+            self.assertEqual(page["s"].tolist(), ["p", "q", "r"])
+            page, _ = store.get_page(entry.result_id, offset=1, limit=1)
+            self.assertEqual(page["props"].tolist(), [{"b": "x"}])
+        store.shutdown()
+
+    @unittest.skipUnless(results_module.pa is not None, "pyarrow is not installed")
+    def test_export_writes_pageable_files(self):
+        """Exported Arrow and Parquet files round-trip and are removed on shutdown."""
+        df = pd.DataFrame({"n": range(5), "s": list("abcde")})
+        store = self.make_store()
+        for file_format in ("arrow", "parquet"):
+            entry = store.export(df, file_format)
+            self.assertTrue(entry.path.name.endswith(f".{file_format}"))
+            page, _ = store.get_page(entry.result_id, offset=3)
+            self.assertEqual(page["s"].tolist(), ["d", "e"])
+
+        paths = [entry.path for entry in store._entries.values()]
+        store.shutdown()
+        self.assertFalse(any(path.exists() for path in paths))
+
+
+if __name__ == "__main__":
+    unittest.main()
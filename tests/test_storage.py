@@ -0,0 +1,533 @@
+"""
+Unit tests for the storage module.
+
+Author: Arjun Trivedi
+Email: arjuntrivedi42@yahoo.com
+"""
+
+import asyncio
+import json
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from mcp_kql_server.memory import MemoryManager, _memory_lock
+from mcp_kql_server.storage import _make_signal_handler, ALL_SECTIONS, JsonFileStorage, entry_size, MemoryWriter, SQLiteStorage, open_memory_storage
+
+CLUSTER = "https://help.kusto.windows.net"
+
+
+def _schema(*columns):
+    return {"columns": {name: {"data_type": "string"} for name in columns}}
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    """Test cases for the SQLite memory backend."""
+
+    def setUp(self):
+        """Create a memory directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        """Remove the memory directory."""
+        self.tmp.cleanup()
+
+    def _manager(self):
+        with patch.dict("mcp_kql_server.storage.MEMORY_STORAGE_CONFIG", {"backend": "sqlite"}):
+            return MemoryManager(custom_memory_path=str(self.path))
+
+    def test_corpus_round_trip(self):
+        """Schemas, queries and sessions written through the manager load back unchanged."""
+        manager = self._manager()
+        self.assertIsInstance(manager.storage, SQLiteStorage)
+        manager.store_schema(CLUSTER, "Samples", "StormEvents", _schema("State", "EventType"))
+        manager.store_schema(CLUSTER, "Samples", "PopulationData", _schema("State"))
+        manager.add_successful_query(CLUSTER, "Samples", "StormEvents", "StormEvents | take 1", "first")
+        manager.add_successful_query(CLUSTER, "Samples", "StormEvents", "StormEvents | take 2", "second")
+        manager.add_global_successful_query(CLUSTER, "Samples", "print 1", "global")
+        manager._store_session_learning("s1", {"execution_type": "query", "result_metadata": {"row_count": 3}})
+        expected = json.loads(json.dumps(manager.corpus, default=str))
+        manager.close()
+
+        reloaded = self._manager()
+        # Table data stays on disk until the database is first accessed
+        self.assertEqual(reloaded.corpus["clusters"][CLUSTER]["databases"]["Samples"]["tables"], {})
+        reloaded._get_database_data(CLUSTER, "Samples")
+        self.assertEqual(json.loads(json.dumps(reloaded.corpus, default=str))["clusters"], expected["clusters"])
+        queries = reloaded.corpus["clusters"][CLUSTER]["databases"]["Samples"]["tables"]["StormEvents"]["successful_queries"]
+        self.assertEqual([q["description"] for q in queries], ["first", "second"])
+        self.assertEqual(reloaded.get_session_data("s1")["query_count"], 1)
+        self.assertEqual(list(reloaded.corpus["clusters"][CLUSTER]["databases"]["Samples"]["tables"]), ["StormEvents", "PopulationData"])
+
+    def test_save_writes_only_dirty_sections(self):
+        """Storing one table upserts its rows without rewriting the others."""
+        manager = self._manager()
+        for i in range(20):
+            manager.store_schema(CLUSTER, "Samples", f"Table{i}", _schema("A", "B", "C"))
+        manager.save_corpus()
+        full = manager.storage.save(manager.corpus)
+
+        with patch.object(manager.storage, "snapshot", wraps=manager.storage.snapshot) as snapshot:
+            manager.store_schema(CLUSTER, "Samples", "Table3", _schema("A", "B", "C", "D"))
+            manager.save_corpus()
+
+        dirty = snapshot.call_args[0][1]
+        self.assertIn(("table", CLUSTER, "Samples", "Table3"), dirty)
+        self.assertFalse(any(key[0] == "table" and key[3] != "Table3" for key in dirty))
+        self.assertLess(manager.storage.save(manager.corpus, dirty), full / 5)
+
+    def test_removed_tables_are_deleted(self):
+        """Tables removed from the corpus disappear from storage on the next save."""
+        manager = self._manager()
+        manager.store_schema(CLUSTER, "Samples", "Old", _schema("A"))
+        manager.add_successful_query(CLUSTER, "Samples", "Old", "Old | take 1", "q")
+        manager.save_corpus()
+        manager.remove_tables(CLUSTER, "Samples", ["Old"])
+        manager.close()
+
+        reloaded = self._manager()
+        self.assertNotIn("Old", reloaded._get_database_data(CLUSTER, "Samples")["tables"])
+        count = reloaded.storage._connection().execute("SELECT COUNT(*) FROM successful_queries").fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_legacy_json_is_migrated_once(self):
+        """An existing unified_memory.json is imported and kept as a .migrated backup."""
+        legacy = self.path / "unified_memory.json"
+        with patch.dict("mcp_kql_server.storage.MEMORY_STORAGE_CONFIG", {"backend": "json"}):
+            manager = MemoryManager(custom_memory_path=str(self.path))
+        manager.store_schema(CLUSTER, "Samples", "StormEvents", _schema("State"))
+        manager.close()
+        self.assertTrue(legacy.exists())
+
+        migrated = self._manager()
+        self.assertTrue(migrated.storage.migrated)
+        self.assertFalse(legacy.exists())
+        self.assertTrue((self.path / "unified_memory.json.migrated").exists())
+        schema = migrated.get_schema(CLUSTER, "Samples", "StormEvents", enable_fallback=False)
+        self.assertIn("State", schema["columns"])
+        migrated.close()
+
+        # Later starts read the database and do not migrate again
+        reopened = self._manager()
+        self.assertFalse(reopened.storage.migrated)
+        reopened.close()
+
+
+class TestMemoryShards(unittest.TestCase):
+    """Test cases for lazily loaded per-database shards."""
+
+    def setUp(self):
+        """Store two databases in each of three clusters and reopen the memory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.config = patch.dict(
+            "mcp_kql_server.storage.MEMORY_STORAGE_CONFIG", {"backend": "sqlite", "flush_interval": 60.0}
+        )
+        self.config.start()
+        self.clusters = [CLUSTER, "https://other.kusto.windows.net", "https://third.kusto.windows.net"]
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        for cluster in self.clusters:
+            for database in ("Samples", "Logs"):
+                for i in range(3):
+                    manager.store_schema(cluster, database, f"Table{i}", _schema("A", "B"))
+        manager.add_successful_query(CLUSTER, "Samples", "Table0", "Table0 | take 1", "q")
+        manager.close()
+        self.manager = MemoryManager(custom_memory_path=str(self.path))
+
+    def tearDown(self):
+        """Close the memory and remove its directory."""
+        self.manager.close()
+        self.config.stop()
+        self.tmp.cleanup()
+
+    def _tables(self, cluster, database):
+        return self.manager.corpus["clusters"][cluster]["databases"][database]["tables"]
+
+    def test_startup_loads_only_the_index(self):
+        """Clusters and databases are known at startup but no table data is read."""
+        self.assertEqual(list(self.manager.corpus["clusters"]), self.clusters)
+        for cluster in self.clusters:
+            self.assertEqual(self.manager.corpus["clusters"][cluster]["databases"]["Samples"]["meta"]["table_count"], 3)
+            self.assertEqual(self._tables(cluster, "Samples"), {})
+        self.assertEqual(self.manager.get_memory_stats()["shards_on_disk"], 6)
+
+    def test_shards_load_on_first_access(self):
+        """Each database is read from storage once, when it is first needed."""
+        with patch.object(self.manager.storage, "load_shard", wraps=self.manager.storage.load_shard) as load_shard:
+            schema = self.manager.get_schema(CLUSTER, "Samples", "Table1", enable_fallback=False)
+            self.manager.get_schema(CLUSTER, "Samples", "Table2", enable_fallback=False)
+            validation = asyncio.run(self.manager._get_schema_for_validation(self.clusters[1], "Logs"))
+
+        self.assertIn("A", schema["columns"])
+        self.assertEqual(sorted(validation["tables"]), ["Table0", "Table1", "Table2"])
+        self.assertEqual(
+            [c.args for c in load_shard.call_args_list], [(CLUSTER, "Samples"), (self.clusters[1], "Logs")]
+        )
+        self.assertEqual(len(self.manager.get_successful_queries(CLUSTER, "Samples", "Table0")), 1)
+        self.assertEqual(self._tables(CLUSTER, "Logs"), {})
+
+    def test_missing_table_uses_fallback_strategies(self):
+        """A table missing from a loaded shard goes to the fallback strategies without an error."""
+        fallback = {"columns": {"A": {"data_type": "string"}}}
+        with patch.object(self.manager, "_apply_schema_fallback_strategies", return_value=fallback) as strategies, \
+                patch("mcp_kql_server.memory.logger.warning") as warning:
+            schema = self.manager.get_schema(CLUSTER, "Samples", "Missing")
+
+        self.assertEqual(schema, fallback)
+        strategies.assert_called_once_with(CLUSTER, "Samples", "Missing")
+        warning.assert_not_called()
+
+    def test_idle_shards_are_evicted(self):
+        """Idle shards leave RAM and load again on the next access; shards with unsaved changes stay."""
+        self.manager.get_schema(CLUSTER, "Samples", "Table1", enable_fallback=False)
+        self.manager.store_schema(CLUSTER, "Logs", "Table9", _schema("C"))
+        with patch.dict("mcp_kql_server.memory.MEMORY_STORAGE_CONFIG", {"shard_idle_seconds": 0.0}):
+            with _memory_lock:
+                self.assertEqual(self.manager._evict_idle_shards_locked(force=True), 1)
+            self.assertEqual(self._tables(CLUSTER, "Samples"), {})
+            self.assertIn("Table9", self._tables(CLUSTER, "Logs"))
+
+            # Once saved, the changed shard can be evicted as well
+            self.manager.save_corpus()
+            with _memory_lock:
+                self.manager._evict_idle_shards_locked(force=True)
+            self.assertEqual(self._tables(CLUSTER, "Logs"), {})
+
+        schema = self.manager.get_schema(CLUSTER, "Logs", "Table9", enable_fallback=False)
+        self.assertIn("C", schema["columns"])
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Loading a shard over shard_memory_budget evicts the least recently used one."""
+        with patch.dict("mcp_kql_server.memory.MEMORY_STORAGE_CONFIG", {"shard_memory_budget": 1}):
+            self.manager.get_schema(CLUSTER, "Samples", "Table1", enable_fallback=False)
+            self.manager.get_schema(CLUSTER, "Logs", "Table1", enable_fallback=False)
+        self.assertEqual(self._tables(CLUSTER, "Samples"), {})
+        self.assertEqual(len(self._tables(CLUSTER, "Logs")), 3)
+
+    def test_full_rewrite_keeps_shards_on_disk(self):
+        """Rewriting every section loads the shards still on disk instead of dropping them."""
+        self.manager._mark_dirty(ALL_SECTIONS)
+        self.manager.save_corpus()
+        self.manager.close()
+
+        self.manager = MemoryManager(custom_memory_path=str(self.path))
+        stats = self.manager.get_memory_stats()
+        self.assertEqual(stats["total_tables"], 18)
+        self.assertEqual(stats["total_queries"], 1)
+        self.assertEqual(stats["shards_loaded"], 0)
+
+
+class TestSizeAccounting(unittest.TestCase):
+    """Test cases for the incremental byte counters."""
+
+    def setUp(self):
+        """Create a memory directory and keep the writer from flushing on its own."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.config = patch.dict(
+            "mcp_kql_server.storage.MEMORY_STORAGE_CONFIG", {"backend": "sqlite", "flush_interval": 60.0}
+        )
+        self.config.start()
+        self.manager = MemoryManager(custom_memory_path=str(self.path))
+
+    def tearDown(self):
+        """Close the memory and remove its directory."""
+        self.manager.close()
+        self.config.stop()
+        self.tmp.cleanup()
+
+    def _measured(self, cluster=None):
+        """Size of the corpus (or one cluster) measured from scratch, section by section."""
+        corpus = self.manager.corpus
+        total = 0 if cluster else entry_size({k: v for k, v in corpus.items() if k not in ("clusters", "sessions")})
+        for uri, cluster_data in corpus["clusters"].items():
+            if cluster and uri != cluster:
+                continue
+            total += entry_size({k: v for k, v in cluster_data.items() if k != "databases"})
+            for db_data in cluster_data["databases"].values():
+                total += entry_size({k: v for k, v in db_data.items() if k != "tables"})
+                total += sum(entry_size(table_data) for table_data in db_data["tables"].values())
+        if not cluster:
+            total += sum(entry_size(session) for session in (corpus.get("sessions") or {}).values())
+        return total
+
+    def test_counters_follow_changes(self):
+        """Added, replaced, trimmed and removed entries keep the counters equal to a full measurement."""
+        for i in range(5):
+            self.manager.store_schema(CLUSTER, "Samples", f"Table{i}", _schema("A", "B"))
+        self.manager.store_schema(CLUSTER, "Samples", "Table0", _schema("A", "B", "C", "D"))
+        for i in range(15):
+            self.manager.add_successful_query(CLUSTER, "Samples", "Table1", f"Table1 | take {i}", "q")
+        self.manager.add_global_successful_query(CLUSTER, "Samples", "print 1", "global")
+        self.manager._store_cluster_learning(CLUSTER, {"timestamp": "t", "result_metadata": {"row_count": 5}})
+        self.manager._store_session_learning("s1", {"execution_type": "query", "result_metadata": {"row_count": 3}})
+        self.manager.remove_tables(CLUSTER, "Samples", ["Table4"])
+        self.manager._compress_cluster_data(CLUSTER)
+
+        with _memory_lock:
+            self.assertEqual(self.manager._corpus_size_locked(), self._measured())
+            self.assertEqual(self.manager._cluster_size_locked(CLUSTER), self._measured(CLUSTER))
+        self.assertEqual(self.manager.get_memory_stats()["memory_size_kb"], round(self._measured() / 1024, 2))
+
+    def test_store_measures_only_what_changed(self):
+        """Storing one table re-measures that table and its parents, not the whole cluster."""
+        for i in range(50):
+            self.manager.store_schema(CLUSTER, "Samples", f"Table{i}", _schema("A", "B", "C"))
+        with patch("mcp_kql_server.memory.entry_size", wraps=entry_size) as measure:
+            self.manager.store_schema(CLUSTER, "Samples", "Table7", _schema("A", "B", "C", "D"))
+            with _memory_lock:
+                size = self.manager._cluster_size_locked(CLUSTER)
+        self.assertEqual(measure.call_count, 3)
+        self.assertEqual(size, self._measured(CLUSTER))
+
+    def test_shards_on_disk_are_sized_by_storage(self):
+        """Clusters whose shards were never loaded are sized from the stored rows."""
+        for database in ("Samples", "Logs"):
+            for i in range(10):
+                self.manager.store_schema(CLUSTER, database, f"Table{i}", _schema("A", "B", "C"))
+        with _memory_lock:
+            expected = self.manager._cluster_size_locked(CLUSTER)
+        self.manager.close()
+
+        self.manager = MemoryManager(custom_memory_path=str(self.path))
+        with _memory_lock:
+            estimated = self.manager._cluster_size_locked(CLUSTER)
+        self.assertAlmostEqual(estimated, expected, delta=expected * 0.1)
+
+        # Loading the shards replaces the stored sizes with measured ones
+        self.manager._get_database_data(CLUSTER, "Samples")
+        self.manager._get_database_data(CLUSTER, "Logs")
+        with _memory_lock:
+            self.assertEqual(self.manager._cluster_size_locked(CLUSTER), expected)
+
+
+class TestMemoryJournal(unittest.TestCase):
+    """Test cases for the successful query and learning journal."""
+
+    def setUp(self):
+        """Create a memory directory and keep the writer from flushing on its own."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.config = patch.dict(
+            "mcp_kql_server.storage.MEMORY_STORAGE_CONFIG", {"backend": "sqlite", "flush_interval": 60.0}
+        )
+        self.config.start()
+
+    def tearDown(self):
+        """Remove the memory directory."""
+        self.config.stop()
+        self.tmp.cleanup()
+
+    def _crash(self, manager):
+        """Drop a manager without flushing, as a killed process would."""
+        manager._writer.shutdown(flush=False)
+        manager._journal.close()
+        manager.storage.close()
+
+    def test_recording_a_query_only_appends_to_the_journal(self):
+        """Queries and learning events cost one journal line, not a store write."""
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        with patch.object(manager.storage, "write") as write:
+            for i in range(20):
+                manager.add_successful_query(CLUSTER, "Samples", "StormEvents", f"StormEvents | take {i}", "q")
+            manager._store_session_learning("s1", {"execution_type": "query", "result_metadata": {"row_count": 1}})
+        write.assert_not_called()
+        lines = (self.path / "memory_journal.jsonl").read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 21)
+        self.assertEqual(json.loads(lines[0])["op"], "table_query")
+        self._crash(manager)
+
+    def test_journal_is_replayed_and_compacted(self):
+        """Events lost with the process are replayed at startup and then compacted."""
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        for i in range(12):
+            manager.add_successful_query(CLUSTER, "Samples", "StormEvents", f"StormEvents | take {i}", f"q{i}")
+        manager.add_global_successful_query(CLUSTER, "Samples", "print 1", "global")
+        manager._store_cluster_learning(CLUSTER, {"timestamp": "t", "result_metadata": {"row_count": 5}})
+        self._crash(manager)
+
+        restarted = MemoryManager(custom_memory_path=str(self.path))
+        cluster = restarted.corpus["clusters"][CLUSTER]
+        queries = cluster["databases"]["Samples"]["tables"]["StormEvents"]["successful_queries"]
+        self.assertEqual([q["description"] for q in queries], [f"q{i}" for i in range(2, 12)])
+        self.assertEqual(len(cluster["successful_queries"]), 1)
+        self.assertEqual(len(cluster["learning_results"]), 1)
+
+        # Compaction writes the events to the main store and empties the journal
+        restarted.save_corpus()
+        self.assertEqual((self.path / "memory_journal.jsonl").stat().st_size, 0)
+        restarted.close()
+
+        reloaded = MemoryManager(custom_memory_path=str(self.path))
+        queries = reloaded.get_successful_queries(CLUSTER, "Samples", "StormEvents")
+        self.assertEqual(len(queries), 10)
+        reloaded.close()
+
+    def test_events_recorded_during_a_save_stay_journaled(self):
+        """The store is written outside the memory lock, and events logged meanwhile survive compaction."""
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        manager.add_successful_query(CLUSTER, "Samples", "StormEvents", "StormEvents | take 1", "before")
+        write = manager.storage.write
+        recorded = []
+
+        def write_while_recording(snapshot):
+            recorder = threading.Thread(
+                target=manager.add_successful_query,
+                args=(CLUSTER, "Samples", "StormEvents", "StormEvents | take 2", "during"),
+            )
+            recorder.start()
+            recorder.join(5)
+            recorded.append(not recorder.is_alive())
+            return write(snapshot)
+
+        with patch.object(manager.storage, "write", side_effect=write_while_recording):
+            manager.save_corpus()
+        self.assertEqual(recorded, [True])
+        journal = (self.path / "memory_journal.jsonl").read_text(encoding="utf-8")
+        self.assertIn('"during"', journal)
+        self.assertNotIn('"before"', journal)
+        self._crash(manager)
+
+        restarted = MemoryManager(custom_memory_path=str(self.path))
+        queries = restarted.get_successful_queries(CLUSTER, "Samples", "StormEvents")
+        self.assertEqual(sorted(q["description"] for q in queries), ["before", "during"])
+        restarted.close()
+
+    def test_replay_skips_events_already_saved(self):
+        """A crash between a save and the journal truncation does not duplicate events."""
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        manager.add_successful_query(CLUSTER, "Samples", "StormEvents", "StormEvents | take 1", "q")
+        journal = (self.path / "memory_journal.jsonl").read_text(encoding="utf-8")
+        manager.close()
+        (self.path / "memory_journal.jsonl").write_text(journal, encoding="utf-8")
+
+        restarted = MemoryManager(custom_memory_path=str(self.path))
+        queries = restarted.get_successful_queries(CLUSTER, "Samples", "StormEvents")
+        self.assertEqual(len(queries), 1)
+        restarted.close()
+
+    def test_replay_skips_saved_events_trimmed_from_the_corpus(self):
+        """Saved events that fell out of the kept window are not re-added on replay."""
+        manager = MemoryManager(custom_memory_path=str(self.path))
+        for i in range(12):
+            manager.add_successful_query(CLUSTER, "Samples", "StormEvents", f"StormEvents | take {i}", f"q{i}")
+        saved_events = (self.path / "memory_journal.jsonl").read_text(encoding="utf-8").splitlines(keepends=True)
+        manager.save_corpus()
+        manager.add_successful_query(CLUSTER, "Samples", "StormEvents", "StormEvents | take 12", "q12")
+        journal = (self.path / "memory_journal.jsonl").read_text(encoding="utf-8")
+        self._crash(manager)
+        # The first two saved events, no longer among the kept queries, were left in the journal
+        (self.path / "memory_journal.jsonl").write_text("".join(saved_events[:2]) + journal, encoding="utf-8")
+
+        restarted = MemoryManager(custom_memory_path=str(self.path))
+        queries = restarted.get_successful_queries(CLUSTER, "Samples", "StormEvents")
+        self.assertEqual([q["description"] for q in queries], [f"q{i}" for i in range(3, 13)])
+        restarted.close()
+
+    def test_large_journal_is_compacted_in_the_background(self):
+        """Reaching the journal size threshold wakes the writer to compact it."""
+        with patch.dict("mcp_kql_server.memory.MEMORY_STORAGE_CONFIG", {"journal_compact_bytes": 2000}):
+            manager = MemoryManager(custom_memory_path=str(self.path))
+            for i in range(20):
+                manager.add_successful_query(CLUSTER, "Samples", "StormEvents", f"StormEvents | take {i}", "q")
+            deadline = time.monotonic() + 5
+            while manager._journal.size >= 2000 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertLess(manager._journal.size, 2000)
+        self.assertEqual(manager._writer.get_stats()["errors"], 0)
+        manager.close()
+
+
+class TestMemoryWriter(unittest.TestCase):
+    """Test cases for the write-behind memory writer."""
+
+    def setUp(self):
+        """Set up a writer around a counting flush."""
+        self.flushes = []
+        self.flushed = threading.Event()
+
+        def flush():
+            self.flushes.append(time.monotonic())
+            self.flushed.set()
+            return 100
+
+        self.flush = flush
+
+    def test_bursts_are_coalesced(self):
+        """Many notifications within the interval produce one write."""
+        writer = MemoryWriter(self.flush, flush_interval=0.1, max_dirty_sections=1000)
+        for i in range(50):
+            writer.notify(i + 1)
+        self.assertTrue(self.flushed.wait(2))
+        time.sleep(0.2)
+        self.assertEqual(len(self.flushes), 1)
+
+        stats = writer.get_stats()
+        self.assertEqual(stats["flushes"], 1)
+        self.assertEqual(stats["bytes_written"], 100)
+        self.assertFalse(stats["pending"])
+        writer.shutdown()
+
+    def test_size_threshold_flushes_early(self):
+        """Reaching the dirty-section threshold skips the rest of the interval."""
+        writer = MemoryWriter(self.flush, flush_interval=30.0, max_dirty_sections=10)
+        writer.notify(3)
+        self.assertFalse(self.flushed.wait(0.1))
+        writer.notify(10)
+        self.assertTrue(self.flushed.wait(2))
+        writer.shutdown(flush=False)
+
+    def test_shutdown_flushes_pending_changes(self):
+        """Changes still waiting when the writer stops are written by shutdown."""
+        writer = MemoryWriter(self.flush, flush_interval=30.0, max_dirty_sections=1000)
+        writer.notify(1)
+        writer.shutdown()
+        self.assertEqual(len(self.flushes), 1)
+        writer.notify(1)
+        self.assertEqual(len(self.flushes), 1)
+
+
+class TestShutdownSignals(unittest.TestCase):
+    """Test cases for the SIGTERM/SIGHUP handlers."""
+
+    def test_signal_exits_without_flushing(self):
+        """The handler leaves flushing to atexit, outside any lock the interrupted code holds."""
+        target = MagicMock()
+        with patch("mcp_kql_server.storage._shutdown_targets", {target}), patch("mcp_kql_server.storage.signal.signal") as set_handler:
+            with self.assertRaises(SystemExit) as ctx:
+                _make_signal_handler(signal.SIG_DFL)(signal.SIGTERM, None)
+        self.assertEqual(ctx.exception.code, 128 + signal.SIGTERM)
+        set_handler.assert_called_once_with(signal.SIGTERM, signal.SIG_DFL)
+        target.flush.assert_not_called()
+
+    def test_signal_chains_to_previous_handler(self):
+        """A handler installed before ours is restored and called instead of exiting."""
+        previous = MagicMock()
+        with patch("mcp_kql_server.storage.signal.signal") as set_handler:
+            _make_signal_handler(previous)(signal.SIGTERM, None)
+        set_handler.assert_called_once_with(signal.SIGTERM, previous)
+        previous.assert_called_once_with(signal.SIGTERM, None)
+
+
+class TestOpenMemoryStorage(unittest.TestCase):
+    """Test cases for backend selection."""
+
+    def test_backends(self):
+        """Backends are chosen by name and unknown names are rejected."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "unified_memory.json"
+            self.assertIsInstance(open_memory_storage(path, "json"), JsonFileStorage)
+            storage = open_memory_storage(path, "sqlite")
+            self.assertIsInstance(storage, SQLiteStorage)
+            self.assertEqual(storage.path, Path(tmp) / "unified_memory.db")
+            with self.assertRaises(ValueError):
+                open_memory_storage(path, "redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
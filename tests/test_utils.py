@@ -8,11 +8,17 @@ Author: Arjun Trivedi
 Email: arjuntrivedi42@yahoo.com
 """
 
+import asyncio
+import json
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
+from mcp_kql_server.constants import MEMORY_STORAGE_CONFIG
+from mcp_kql_server.memory import MemoryManager
 from mcp_kql_server.utils import (
+    SchemaManager,
     ensure_directory_exists,
     fix_query_with_real_schema,
     get_default_cluster_memory_path,
@@ -190,5 +196,115 @@ class TestSchemaDiscoveryMethods:
         assert result == "https://mycluster.kusto.windows.net"
 
 
+
+class TestBulkSchemaDiscovery:
+    """Test whole-database schema refresh."""
+
+    DATABASE_SCHEMA = {
+        "Databases": {
+            "Samples": {
+                "Name": "Samples",
+                "Tables": {
+                    "StormEvents": {"Name": "StormEvents", "OrderedColumns": [
+                        {"Name": "State", "Type": "System.String", "CslType": "string"},
+                        {"Name": "DamageProperty", "Type": "System.Int32", "CslType": "int"},
+                    ]},
+                    "Broken": {"Name": "Broken", "OrderedColumns": [{"Type": "System.String"}]},
+                },
+                "MaterializedViews": {
+                    "DailyStorms": {"Name": "DailyStorms", "OrderedColumns": [
+                        {"Name": "Day", "Type": "System.DateTime", "CslType": "datetime"},
+                    ]},
+                },
+            }
+        }
+    }
+
+    def _manager(self, tmp_path):
+        # A long flush interval keeps the background writer from saving mid-test
+        with patch.dict(MEMORY_STORAGE_CONFIG, {"flush_interval": 60.0}):
+            memory = MemoryManager(custom_memory_path=str(tmp_path / "memory.json"))
+        return SchemaManager(memory)
+
+    def test_refresh_uses_one_bulk_command(self, tmp_path):
+        """All parsable tables come from one command and one save; the rest fall back per table."""
+        manager = self._manager(tmp_path)
+        commands = []
+
+        async def fake_execute(query, cluster, database, is_mgmt=False):
+            commands.append(query)
+            if query == ".show database schema as json":
+                return [{"DatabaseSchema": json.dumps(self.DATABASE_SCHEMA)}]
+            raise Exception("per-table strategy failed")
+
+        with patch.object(manager, "_execute_kusto_async", side_effect=fake_execute), \
+                patch.object(manager.memory_manager.storage, "snapshot", wraps=manager.memory_manager.storage.snapshot) as snapshot:
+            result = asyncio.run(manager.refresh_database_schema("https://help.kusto.windows.net", "Samples"))
+            manager.memory_manager.save_corpus()
+
+        assert result["method"] == "database_schema_json"
+        assert sorted(entry["table"] for entry in result["refreshed"]) == ["DailyStorms", "StormEvents"]
+        assert [entry["table"] for entry in result["failed"]] == ["Broken"]
+        # One bulk command, then the three per-table strategies for the unparsable table only
+        assert commands[0] == ".show database schema as json"
+        assert len(commands) == 4
+        # The bulk store and the database table list are coalesced into one write
+        assert snapshot.call_count == 1
+
+        schema = manager.memory_manager.get_schema("https://help.kusto.windows.net", "Samples", "StormEvents", enable_fallback=False)
+        assert schema["columns"]["DamageProperty"]["data_type"] == "int"
+
+    def test_refresh_only_rebuilds_changed_tables(self, tmp_path):
+        """A second refresh compares fingerprints and reports added, changed and dropped tables."""
+        manager = self._manager(tmp_path)
+        cluster = "https://help.kusto.windows.net"
+        schema = json.loads(json.dumps(self.DATABASE_SCHEMA))
+        tables = schema["Databases"]["Samples"]["Tables"]
+        tables["OldTable"] = {"Name": "OldTable", "OrderedColumns": [{"Name": "Id", "CslType": "long"}]}
+
+        async def fake_execute(query, cluster, database, is_mgmt=False):
+            if query == ".show database schema as json":
+                return [{"DatabaseSchema": json.dumps(schema)}]
+            raise Exception("per-table strategy failed")
+
+        with patch.object(manager, "_execute_kusto_async", side_effect=fake_execute):
+            first = asyncio.run(manager.refresh_database_schema(cluster, "Samples"))
+        assert sorted(first["added"]) == ["DailyStorms", "OldTable", "StormEvents"]
+
+        # StormEvents gains a column, OldTable is dropped, DailyStorms is untouched
+        del tables["OldTable"]
+        tables["StormEvents"]["OrderedColumns"].append({"Name": "EndTime", "CslType": "datetime"})
+        tables["NewTable"] = {"Name": "NewTable", "OrderedColumns": [{"Name": "Id", "CslType": "long"}]}
+
+        with patch.object(manager, "_execute_kusto_async", side_effect=fake_execute), \
+                patch.object(manager.memory_manager, "store_schemas_bulk", wraps=manager.memory_manager.store_schemas_bulk) as bulk_store:
+            second = asyncio.run(manager.refresh_database_schema(cluster, "Samples"))
+
+        assert sorted(bulk_store.call_args[0][2]) == ["NewTable", "StormEvents"]
+        assert second["added"] == ["NewTable"]
+        assert second["changed"] == ["StormEvents"]
+        assert second["dropped"] == ["OldTable"]
+        assert second["unchanged"] == ["DailyStorms"]
+        assert "OldTable" not in manager.memory_manager.get_database_schema(cluster, "Samples")["tables"]
+        assert manager.memory_manager.get_schema(cluster, "Samples", "OldTable", enable_fallback=False) == {}
+
+    def test_cslschema_fallback(self, tmp_path):
+        """When the JSON command fails, .show database cslschema is parsed instead."""
+        manager = self._manager(tmp_path)
+
+        async def fake_execute(query, cluster, database, is_mgmt=False):
+            if query == ".show database cslschema":
+                return [{"TableName": "StormEvents", "Schema": "State:string,['Event Type']:string,Count:long"}]
+            raise Exception("unsupported")
+
+        with patch.object(manager, "_execute_kusto_async", side_effect=fake_execute):
+            bulk = asyncio.run(manager.discover_database_schemas("https://help.kusto.windows.net", "Samples"))
+
+        assert bulk["method"] == "database_cslschema"
+        columns = bulk["schemas"]["StormEvents"]["columns"]
+        assert list(columns) == ["State", "Event Type", "Count"]
+        assert columns["Count"]["data_type"] == "long"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])